@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+
+# Import configurations from config.py
+import config
+import embedding_cache
+
+EMBEDDING_BACKENDS = ("google", "hashing", "fake")
+LLM_BACKENDS = ("google", "stub")
+
+TOKEN_REGEX = re.compile(r"[a-z0-9_]+")
+
+# Reply of the stub LLM when STUB_LLM_REPLY_FILE is not set; follows the JSON format the prompt asks for
+DEFAULT_STUB_REPLY = {
+    "llm_analysis_feedback": {
+        "confidence_level": "Low",
+        "context_sufficiency": "Insufficient",
+        "needed_additional_info": "Stub LLM backend: no analysis was performed."
+    },
+    "summary": "Stub analysis (offline LLM backend).",
+    "severity": "Medium",
+    "impact_assessment": "Not assessed (stub backend).",
+    "root_cause_hypothesis": "Not assessed (stub backend).",
+    "affected_components": ["N/A"],
+    "response_plan": {
+        "devops_sre_actions": [
+            {"step_description": "Review the log entry manually.", "responsible_team": "DevOps/SRE",
+             "responsible_module_or_component": "N/A", "specific_effect_on_problem": "N/A",
+             "expected_outcome_or_status": "N/A", "type": "DIAGNOSTIC_ONLY"}
+        ],
+        "developer_actions": [],
+        "security_actions": []
+    },
+    "temporary_mitigations": ["None identified"]
+}
+
+
+# --- Local Backends ---
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embedder: signed feature hashing of word unigrams and bigrams with sublinear
+    term frequency, L2-normalized. Texts sharing words get similar vectors, so retrieval behaves like a
+    (vocabulary-free) bag-of-words search; no model, network or fitting step, and vectors never change.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.model = f"local-hashing-{dimensions}" # Scopes cached embeddings (see rag_builder.embedding_model_name)
+
+    def _vector(self, text: str) -> list:
+        tokens = TOKEN_REGEX.findall(text.lower())
+        features = {}
+        for feature in tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]:
+            features[feature] = features.get(feature, 0) + 1
+
+        vector = [0.0] * self.dimensions
+        for feature, count in features.items():
+            feature_hash = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+            sign = 1.0 if feature_hash >> 63 else -1.0
+            vector[feature_hash % self.dimensions] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._vector(text)
+
+    def embed_queries(self, texts: list) -> list:
+        """Batch query embedding (used by retrieval_service)."""
+        return self.embed_documents(texts)
+
+
+class StubChatModel:
+    """
+    Offline stand-in for ChatGoogleGenerativeAI: invoke(prompt) waits `latency_seconds` (simulated
+    provider latency) and returns a canned JSON reply as an AIMessage, like the real model would.
+    Counts calls and prompt sizes so load tests can report what the pipeline sent; the reply's
+    usage_metadata carries approximate token counts (about 4 characters per token).
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, reply: dict = None):
+        self.latency_seconds = latency_seconds
+        self.reply_json = json.dumps(reply if reply is not None else DEFAULT_STUB_REPLY)
+        self.calls = 0
+        self.prompt_chars = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt) -> AIMessage:
+        prompt_chars = len(str(prompt))
+        with self.lock:
+            self.calls += 1
+            self.prompt_chars += prompt_chars
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        input_tokens, output_tokens = prompt_chars // 4, len(self.reply_json) // 4
+        return AIMessage(content=self.reply_json, usage_metadata={
+            'input_tokens': input_tokens, 'output_tokens': output_tokens, 'total_tokens': input_tokens + output_tokens
+        })
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'calls': self.calls, 'prompt_chars': self.prompt_chars}
+
+
+# --- Backend Factories ---
+def create_embedding_model(backend: str = None) -> Embeddings:
+    """Embedding model for the knowledge base, chosen by config.EMBEDDING_BACKEND unless given."""
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend == "google":
+        return GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL, google_api_key=os.getenv("GOOGLE_API_KEY"))
+    if backend == "hashing":
+        return HashingEmbeddings(config.LOCAL_EMBEDDING_DIMENSIONS)
+    if backend == "fake":
+        return embedding_cache.FakeEmbeddings(config.LOCAL_EMBEDDING_DIMENSIONS)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+
+def create_llm(backend: str = None):
+    """LLM used for solution generation, chosen by config.LLM_BACKEND unless given."""
+    backend = backend or config.LLM_BACKEND
+    if backend == "google":
+        return ChatGoogleGenerativeAI(
+            model=config.LLM_MODEL,
+            temperature=config.LLM_TEMPERATURE,
+            max_output_tokens=config.LLM_MAX_OUTPUT_TOKENS,
+            google_api_key=os.getenv("GOOGLE_API_KEY")
+        )
+    if backend == "stub":
+        reply = None
+        if config.STUB_LLM_REPLY_FILE:
+            with open(config.STUB_LLM_REPLY_FILE, 'r', encoding='utf-8') as f_reply:
+                reply = json.load(f_reply)
+        return StubChatModel(config.STUB_LLM_LATENCY_SECONDS, reply)
+    raise ValueError(f"Unknown LLM backend '{backend}'. Expected one of {LLM_BACKENDS}.")
@@ -0,0 +1,84 @@
+"""
+Benchmark: staged CompiledNormalizer vs. the sequential re.sub normalizer on a real HDFS log sample.
+
+Usage (from the project root):
+    python benchmarks/bench_normalizer.py [path/to/node.log] [--max-lines N] [--repeat R]
+
+Defaults to the first .log/.txt file in config.RAW_LOGS_DIR. Exits non-zero if any template differs.
+"""
+import os
+import sys
+import time
+import argparse
+
+# Allow running as a script from the project root or the benchmarks/ folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import log_processor
+
+
+def load_contents(log_file_path: str, max_lines: int) -> list:
+    """Reads header lines from a raw HDFS log and returns their raw content strings."""
+    contents = []
+    with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f_raw:
+        for raw_line in f_raw:
+            header_info = log_processor.parse_log_line_hybrid_single(raw_line)
+            if header_info:
+                contents.append(header_info['content_raw'])
+                if len(contents) >= max_lines:
+                    break
+    return contents
+
+def time_normalizer(normalize_fn, contents: list, repeat: int) -> tuple:
+    """Returns (best wall time in seconds, templates from the last run)."""
+    best_time = float('inf')
+    templates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        templates = [normalize_fn(content) for content in contents]
+        best_time = min(best_time, time.perf_counter() - start)
+    return best_time, templates
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log_file', nargs='?', help="Raw HDFS log file to sample")
+    parser.add_argument('--max-lines', type=int, default=200000, help="Maximum number of log entries to normalize")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    log_file_path = args.log_file
+    if not log_file_path:
+        if not os.path.isdir(config.RAW_LOGS_DIR):
+            sys.exit(f"ERROR: No log file given and {config.RAW_LOGS_DIR} does not exist.")
+        candidates = sorted(f for f in os.listdir(config.RAW_LOGS_DIR) if f.endswith(('.log', '.txt')))
+        if not candidates:
+            sys.exit(f"ERROR: No raw log files found in {config.RAW_LOGS_DIR}.")
+        log_file_path = os.path.join(config.RAW_LOGS_DIR, candidates[0])
+
+    contents = load_contents(log_file_path, args.max_lines)
+    if not contents:
+        sys.exit(f"ERROR: No parseable HDFS log entries in {log_file_path}.")
+    print(f"Sample: {log_file_path} ({len(contents)} entries)")
+
+    sequential_time, sequential_templates = time_normalizer(log_processor.normalize_log_content_sequential, contents, args.repeat)
+    compiled_time, compiled_templates = time_normalizer(log_processor.normalize_log_content, contents, args.repeat)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(sequential_templates, compiled_templates)) if a != b]
+
+    print(f"Sequential re.sub normalizer: {sequential_time:.3f}s ({len(contents) / sequential_time:,.0f} entries/s)")
+    print(f"Compiled staged normalizer:   {compiled_time:.3f}s ({len(contents) / compiled_time:,.0f} entries/s)")
+    print(f"Speed-up: {sequential_time / compiled_time:.2f}x")
+    print(f"Distinct templates: {len(set(compiled_templates))}")
+
+    if mismatches:
+        first = mismatches[0]
+        print(f"MISMATCH in {len(mismatches)} entries. First: {contents[first]!r}")
+        print(f"  sequential: {sequential_templates[first]!r}")
+        print(f"  compiled:   {compiled_templates[first]!r}")
+        sys.exit(1)
+    print("Templates are identical.")
+
+
+if __name__ == "__main__":
+    main()
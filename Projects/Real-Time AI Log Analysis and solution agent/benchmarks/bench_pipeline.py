@@ -0,0 +1,466 @@
+"""
+Benchmark: hot paths of the ingestion pipeline on synthetic HDFS node logs, with JSON results.
+
+Usage (from the project root):
+    python benchmarks/bench_pipeline.py [--lines N] [--files F] [--error-rate R] [--multiline-ratio M]
+        [--template-skew S] [--extra-templates T] [--seed S] [--workers W] [--worker-seconds W]
+        [--sequence-lookups L] [--coalescing] [--output results.json] [--keep-dir DIR] [--verbose]
+
+Stages:
+    parse      header regex over every raw line                          (lines/s)
+    normalize  template normalization, uncached and via the template cache (entries/s)
+    write      parsed JSONL + offset index writes                         (entries/s, MB/s)
+    ingest     the full stream (stream_simulator, backfill pacing,        (lines/s, entries/s)
+               secondary index on as configured)
+    queue      problem enqueue -> worker dequeue latency during ingest    (seconds, per level)
+               (burst coalescing is off unless --coalescing, so every problem goes through the queue)
+    recent     sequence lookups in the recent-entry buffer at dequeue time (hit rate, latency)
+    sequence   preceding-sequence reads from the parsed JSONL             (lookups/s, latency;
+               one at a time, and all targets through the batch API)
+    columnar   the parsed JSONL converted to the columnar store            (size ratio, entries/s; per-template
+               counts and a time-range scan vs decoding every JSONL line; random lookups by line id)
+    query      incident queries on the secondary index vs a full JSONL scan (latency, matches; the index is built
+               during ingest, or from the JSONL here when SECONDARY_INDEX_ENABLED is off)
+    timeline   cross-node sequences: CROSS_NODE_SEQUENCE_EVENTS entries of all files (latency, entries;
+               merged from the secondary index, without the recent-entry buffer)
+
+Results are printed and, with --output, written as JSON for comparison across releases.
+Everything runs in a temporary directory; no files under data/ are touched.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+# Allow running as a script from the project root or the benchmarks/ folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import columnar_store
+import log_processor
+import sequence_reader
+import template_normalizer
+import offset_index
+import parsed_log_writer
+import problem_scheduler
+import secondary_index
+import stream_simulator
+import timeline
+import synthetic_hdfs
+
+RESULTS_FORMAT_VERSION = 1
+BENCH_TEMPLATE_CACHE_SIZE = 50000 # Template cache size for the normalize stage when config.TEMPLATE_CACHE_SIZE is 0
+
+
+def _rate(items: int, seconds: float, unit: str) -> dict:
+    return {'items': items, 'unit': unit, 'seconds': round(seconds, 6), 'per_second': round(items / seconds, 1) if seconds > 0 else None}
+
+def _percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'max': ordered[-1],
+    }
+
+def read_raw_lines(file_paths: list) -> list:
+    raw_lines = []
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f_raw:
+            raw_lines.extend(f_raw)
+    return raw_lines
+
+
+# --- Stages ---
+def bench_parse(raw_lines: list) -> tuple:
+    start = time.perf_counter()
+    headers = [log_processor.parse_log_line_hybrid_single(raw_line) for raw_line in raw_lines]
+    elapsed = time.perf_counter() - start
+    return _rate(len(raw_lines), elapsed, "lines"), [header for header in headers if header]
+
+def bench_normalize(headers: list) -> dict:
+    contents = [header['content_raw'] for header in headers]
+    # Both loops time normalization plus EventId derivation, the work the cache replaces
+    start = time.perf_counter()
+    for content in contents:
+        log_processor._normalize_and_derive_event_id(content)
+    uncached_time = time.perf_counter() - start
+
+    # A fresh cache, so the run includes its cold start like a real stream (measured even if disabled in config)
+    template_cache = template_normalizer.TemplateCache(
+        config.TEMPLATE_CACHE_SIZE or BENCH_TEMPLATE_CACHE_SIZE,
+        template_normalizer.build_digit_signature_table(config.NORMALIZATION_RULES),
+        config.TEMPLATE_CACHE_MIN_HIT_RATE,
+        config.TEMPLATE_CACHE_PROBE_LOOKUPS
+    )
+    start = time.perf_counter()
+    for content in contents:
+        template_cache.get_or_compute(content, log_processor._normalize_and_derive_event_id)
+    cached_time = time.perf_counter() - start
+    return {
+        'uncached': _rate(len(contents), uncached_time, "entries"),
+        'template_cache': dict(_rate(len(contents), cached_time, "entries"), cache=template_cache.stats()),
+    }
+
+def bench_write(headers: list, work_dir: str) -> dict:
+    entries = [{
+        "line_id_in_file_header": line_number,
+        "source_file": "bench.log",
+        "original_log_full": header['content_raw'],
+        "timestamp": header['timestamp'],
+        "level": header['level'],
+        "component": header['component'],
+        "event_id": "HDFS_00000000",
+        "event_template": header['content_raw'],
+        "parameters": ""
+    } for line_number, header in enumerate(headers, start=1)]
+    jsonl_path = os.path.join(work_dir, "write_bench.jsonl")
+    start = time.perf_counter()
+    with parsed_log_writer.ParsedLogWriter(jsonl_path, os.path.join(work_dir, "write_bench_index"),
+                                           columnar_store_dir="", secondary_index_dir="") as writer:
+        for entry in entries:
+            writer.write(entry)
+    elapsed = time.perf_counter() - start
+    written_bytes = os.path.getsize(jsonl_path)
+    return dict(_rate(len(entries), elapsed, "entries"), megabytes_per_second=round(written_bytes / 1e6 / elapsed, 2) if elapsed > 0 else None)
+
+def bench_ingest(raw_dir: str, work_dir: str, workers: int, worker_seconds: float, coalescing: bool, verbose: bool) -> tuple:
+    """Runs the stream over raw_dir with a consumer thread standing in for the LLM worker."""
+    config.RAW_LOGS_DIR = raw_dir
+    config.OUTPUT_PARSED_JSONL = os.path.join(work_dir, "parsed.jsonl")
+    config.OFFSET_INDEX_DIR = os.path.join(work_dir, "offset_index")
+    config.COLUMNAR_STORE_DIR = os.path.join(work_dir, "ingest_columnar")
+    config.SECONDARY_INDEX_DIR = os.path.join(work_dir, "secondary_index")
+    config.OUTPUT_TEMPLATES_CSV = os.path.join(work_dir, "templates.csv")
+    config.INGESTION_CHECKPOINT_FILE = os.path.join(work_dir, "ingestion_checkpoint.json")
+    config.REGENERATE_ALL_FROM_RAW_LOGS = True
+    config.FOLLOW_RAW_LOGS = False
+    config.STREAM_REPLAY_MODE = "backfill"
+    config.INGESTION_WORKERS = workers
+    config.PROBLEM_COALESCING_ENABLED = coalescing
+
+    problem_queue = problem_scheduler.ProblemPriorityQueue.from_config()
+    stop_event = threading.Event()
+    offset_map = offset_index.OffsetMap()
+    templates = {}
+    counter = [0]
+    received_problems = []
+    recent_latencies = [] # Recent-entry buffer lookups by the consumer, as the LLM worker does them
+    recent_hits = 0
+
+    def consume():
+        nonlocal recent_hits
+        while True:
+            problem_context = problem_queue.get()
+            received_problems.append(problem_context)
+            lookup_start = time.perf_counter()
+            sequence = log_processor.RECENT_ENTRIES.get_sequence(problem_context['parsed_entry_metadata'])
+            recent_latencies.append(time.perf_counter() - lookup_start)
+            recent_hits += sequence is not None
+            if worker_seconds > 0:
+                time.sleep(worker_seconds)
+            problem_queue.task_done()
+
+    consumer_thread = threading.Thread(target=consume, name="bench-worker", daemon=True)
+    consumer_thread.start()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        stream_simulator.simulate_raw_log_stream(problem_queue, stop_event, offset_map, templates, counter)
+    elapsed = time.perf_counter() - start
+    problem_queue.join()
+
+    raw_line_count = sum(len(read_raw_lines([os.path.join(raw_dir, name)])) for name in os.listdir(raw_dir))
+    ingest_result = {
+        'lines': _rate(raw_line_count, elapsed, "lines"),
+        'entries': _rate(counter[0], elapsed, "entries"),
+        'workers': workers,
+        'templates': len(templates),
+        'problems_received': len(received_problems),
+    }
+    queue_stats = problem_queue.stats()
+    queue_result = {
+        'worker_seconds': worker_seconds,
+        'enqueued': queue_stats['enqueued'],
+        'dropped': queue_stats['dropped'],
+        'max_depth': queue_stats['max_depth'],
+        'wait_seconds': queue_stats['wait_seconds'],
+    }
+    recent_result = {
+        'lookups': len(recent_latencies),
+        'hits': recent_hits,
+        'hit_rate': round(recent_hits / len(recent_latencies), 4) if recent_latencies else None,
+        'latency_seconds': _percentiles(recent_latencies),
+    }
+    return ingest_result, queue_result, recent_result, offset_map, received_problems
+
+def bench_sequence(offset_map, problems: list, lookups: int, seed: int) -> dict:
+    if not problems:
+        return {}
+    rng = random.Random(seed)
+    targets = [rng.choice(problems)['parsed_entry_metadata'] for _ in range(lookups)]
+    latencies = []
+    entries_returned = 0
+    start = time.perf_counter()
+    for target in targets:
+        lookup_start = time.perf_counter()
+        sequence = log_processor.get_contextual_log_sequence_from_disk(
+            config.OUTPUT_PARSED_JSONL, target, config.NUM_PRECEDING_LOGS_FOR_SEQUENCE, offset_map
+        )
+        latencies.append(time.perf_counter() - lookup_start)
+        entries_returned += len(sequence)
+    elapsed = time.perf_counter() - start
+
+    batch_start = time.perf_counter()
+    sequence_reader.reader_for(config.OUTPUT_PARSED_JSONL).read_sequences(
+        targets, config.NUM_PRECEDING_LOGS_FOR_SEQUENCE, offset_map
+    )
+    batch_elapsed = time.perf_counter() - batch_start
+    return dict(
+        _rate(len(targets), elapsed, "lookups"),
+        latency_seconds=_percentiles(latencies),
+        mean_entries_returned=round(entries_returned / len(targets), 2),
+        batch=_rate(len(targets), batch_elapsed, "lookups"),
+    )
+
+def bench_columnar(problems: list, work_dir: str, lookups: int, seed: int) -> dict:
+    store_dir = os.path.join(work_dir, "columnar")
+    start = time.perf_counter()
+    entries = columnar_store.convert_parsed_jsonl(config.OUTPUT_PARSED_JSONL, store_dir)
+    convert_elapsed = time.perf_counter() - start
+    jsonl_bytes = os.path.getsize(config.OUTPUT_PARSED_JSONL)
+    reader = columnar_store.ColumnarLogReader(store_dir)
+    store_bytes = reader.stats()['bytes']
+
+    # Per-template counts over everything
+    start = time.perf_counter()
+    jsonl_counts = {}
+    with open(config.OUTPUT_PARSED_JSONL, 'rb') as f_parsed:
+        for line in f_parsed:
+            event_id = json.loads(line)['event_id']
+            jsonl_counts[event_id] = jsonl_counts.get(event_id, 0) + 1
+    jsonl_counts_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    columnar_counts = reader.count_by_template()
+    columnar_counts_elapsed = time.perf_counter() - start
+    assert {event_id: summary['count'] for event_id, summary in columnar_counts.items()} == jsonl_counts
+
+    # Entries of the middle tenth of the time span
+    timestamps = [entry['timestamp'] for entry in reader.scan(('timestamp',))]
+    timestamps.sort()
+    range_start, range_end = timestamps[len(timestamps) * 45 // 100], timestamps[len(timestamps) * 55 // 100]
+    start = time.perf_counter()
+    with open(config.OUTPUT_PARSED_JSONL, 'rb') as f_parsed:
+        jsonl_matches = sum(1 for line in f_parsed if range_start <= json.loads(line)['timestamp'] < range_end)
+    jsonl_range_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    columnar_matches = sum(1 for _ in reader.scan(start_timestamp=range_start, end_timestamp=range_end))
+    columnar_range_elapsed = time.perf_counter() - start
+    assert columnar_matches == jsonl_matches
+
+    rng = random.Random(seed)
+    targets = [rng.choice(problems)['parsed_entry_metadata'] for _ in range(lookups)] if problems else []
+    latencies = []
+    for target in targets:
+        lookup_start = time.perf_counter()
+        reader.get(target['source_file'], target['line_id_in_file_header'])
+        latencies.append(time.perf_counter() - lookup_start)
+    reader.close()
+    return {
+        'entries': entries,
+        'jsonl_bytes': jsonl_bytes,
+        'store_bytes': store_bytes,
+        'compression_ratio': round(jsonl_bytes / store_bytes, 2) if store_bytes else None,
+        'convert': _rate(entries, convert_elapsed, "entries"),
+        'template_counts': {'jsonl': _rate(entries, jsonl_counts_elapsed, "entries"), 'columnar': _rate(entries, columnar_counts_elapsed, "entries")},
+        'time_range': {'matches': columnar_matches, 'jsonl': _rate(entries, jsonl_range_elapsed, "entries"),
+                       'columnar': _rate(entries, columnar_range_elapsed, "entries")},
+        'lookup_latency_seconds': _percentiles(latencies),
+    }
+
+def bench_query(problems: list, seed: int) -> dict:
+    """A few incident queries (level / event / window combinations), each checked against a full JSONL scan."""
+    if not problems:
+        return {}
+    # Builds (or catches up) the index from the JSONL if ingest did not
+    secondary_index.SecondaryIndexWriter.from_config(config.OUTPUT_PARSED_JSONL, os.path.getsize(config.OUTPUT_PARSED_JSONL)).close()
+    index = secondary_index.SecondaryIndex.from_config()
+
+    rng = random.Random(seed)
+    anchor = rng.choice(problems)['parsed_entry_metadata']
+    window_start = anchor['timestamp'][:15] + "0" # Start of the anchor's 10-minute window
+    window_end = secondary_index.columnar_store.ms_to_timestamps([secondary_index.columnar_store.timestamp_to_ms(window_start) + 5 * 60 * 1000])[0]
+    queries = {
+        'level_window': {'levels': ['ERROR', 'FATAL'], 'start_timestamp': window_start, 'end_timestamp': window_end},
+        'event_level_window': {'levels': anchor['level'], 'event_ids': anchor['event_id'], 'start_timestamp': window_start, 'end_timestamp': window_end},
+        'event_all_time': {'event_ids': anchor['event_id']},
+        'window': {'start_timestamp': window_start, 'end_timestamp': window_end},
+    }
+    scan_start = time.perf_counter()
+    with open(config.OUTPUT_PARSED_JSONL, 'rb') as f_parsed:
+        entries = [json.loads(line) for line in f_parsed]
+    scan_elapsed = time.perf_counter() - scan_start
+
+    results = {'stats': index.stats(), 'jsonl_decode_seconds': round(scan_elapsed, 6), 'queries': {}}
+    for name, query in queries.items():
+        levels, event_ids = query.get('levels'), query.get('event_ids')
+        levels = [levels] if isinstance(levels, str) else levels
+        event_ids = [event_ids] if isinstance(event_ids, str) else event_ids
+        expected = [entry for entry in entries
+                    if (levels is None or entry['level'] in levels) and (event_ids is None or entry['event_id'] in event_ids)
+                    and (query.get('start_timestamp') is None or query['start_timestamp'] <= entry['timestamp'] < query['end_timestamp'])]
+        latencies = []
+        for _ in range(5):
+            start = time.perf_counter()
+            matches = index.search(**query)
+            latencies.append(time.perf_counter() - start)
+        key = lambda entry: (entry['timestamp'], entry['source_file'], entry['line_id_in_file_header'])
+        assert sorted(matches, key=key) == sorted(expected, key=key), name
+        results['queries'][name] = dict(query, matches=len(matches), latency_seconds=_percentiles(latencies))
+    return results
+
+def bench_timeline(offset_map, problems: list, lookups: int, seed: int) -> dict:
+    if not problems:
+        return {}
+    rng = random.Random(seed)
+    targets = [rng.choice(problems)['parsed_entry_metadata'] for _ in range(lookups)]
+    cross_node = timeline.CrossNodeTimeline(secondary_index.SecondaryIndex.from_config())
+    latencies = []
+    entries_returned = 0
+    other_files = 0
+    for target in targets:
+        start = time.perf_counter()
+        sequence = cross_node.preceding_entries(target, config.CROSS_NODE_SEQUENCE_EVENTS, config.CROSS_NODE_WINDOW_SECONDS, offset_map)
+        latencies.append(time.perf_counter() - start)
+        entries_returned += len(sequence)
+        other_files += sum(1 for entry in sequence if entry['source_file'] != target['source_file'])
+    return {
+        'lookups': len(targets),
+        'events': config.CROSS_NODE_SEQUENCE_EVENTS,
+        'window_seconds': config.CROSS_NODE_WINDOW_SECONDS,
+        'latency_seconds': _percentiles(latencies),
+        'mean_entries_returned': round(entries_returned / len(targets), 2),
+        'share_from_other_files': round(other_files / entries_returned, 3) if entries_returned else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000, help="Approximate total raw lines to generate")
+    parser.add_argument('--files', type=int, default=4, help="Number of node log files")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Share of WARN/ERROR/FATAL entries")
+    parser.add_argument('--multiline-ratio', type=float, default=0.02, help="Share of entries with a stack trace")
+    parser.add_argument('--template-skew', type=float, default=1.0, help="Zipf exponent of the template mix (0 = uniform)")
+    parser.add_argument('--extra-templates', type=int, default=0, help="Additional distinct INFO templates")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help="INGESTION_WORKERS for the ingest stage")
+    parser.add_argument('--worker-seconds', type=float, default=0.0, help="Simulated analysis time per problem in the queue stage")
+    parser.add_argument('--sequence-lookups', type=int, default=2000, help="Sequence reads in the sequence stage")
+    parser.add_argument('--coalescing', action='store_true', help="Keep burst coalescing on in the ingest stage")
+    parser.add_argument('--output', help="Write JSON results to this file")
+    parser.add_argument('--keep-dir', help="Work in this directory and keep it (default: temporary, removed)")
+    parser.add_argument('--verbose', action='store_true', help="Show the stream's own output during the ingest stage")
+    args = parser.parse_args()
+
+    work_dir = args.keep_dir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(work_dir, exist_ok=True)
+    raw_dir = os.path.join(work_dir, "raw_logs")
+    try:
+        dataset = synthetic_hdfs.generate_node_logs(
+            raw_dir, args.lines, args.files, args.error_rate, args.multiline_ratio,
+            args.template_skew, args.extra_templates, args.seed
+        )
+        print(f"Dataset: {dataset['raw_lines']} lines, {dataset['entries']} entries, {dataset['problem_entries']} problems, "
+              f"{dataset['bytes'] / 1e6:.1f} MB in {len(dataset['files'])} files")
+
+        raw_lines = read_raw_lines(dataset['files'])
+        stages = {}
+        stages['parse'], headers = bench_parse(raw_lines)
+        stages['normalize'] = bench_normalize(headers)
+        stages['write'] = bench_write(headers, work_dir)
+        stages['ingest'], stages['queue'], stages['recent'], offset_map, problems = bench_ingest(
+            raw_dir, work_dir, args.workers, args.worker_seconds, args.coalescing, args.verbose
+        )
+        stages['sequence'] = bench_sequence(offset_map, problems, args.sequence_lookups, args.seed)
+        stages['columnar'] = bench_columnar(problems, work_dir, args.sequence_lookups, args.seed)
+        stages['query'] = bench_query(problems, args.seed)
+        stages['timeline'] = bench_timeline(offset_map, problems, args.sequence_lookups, args.seed)
+        offset_map.clear()
+        sequence_reader.close_readers()
+    finally:
+        if not args.keep_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'benchmark': 'pipeline',
+        'version': RESULTS_FORMAT_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'keep_dir', 'verbose')},
+        'dataset': {key: value for key, value in dataset.items() if key != 'files'},
+        'stages': stages,
+    }
+
+    print(f"parse:     {stages['parse']['per_second']:>12,.0f} lines/s")
+    print(f"normalize: {stages['normalize']['uncached']['per_second']:>12,.0f} entries/s uncached, "
+          f"{stages['normalize']['template_cache']['per_second']:,.0f} entries/s with template cache")
+    print(f"write:     {stages['write']['per_second']:>12,.0f} entries/s ({stages['write']['megabytes_per_second']} MB/s)")
+    print(f"ingest:    {stages['ingest']['lines']['per_second']:>12,.0f} lines/s, {stages['ingest']['entries']['per_second']:,.0f} entries/s "
+          f"({stages['ingest']['workers']} workers)")
+    for level, wait in stages['queue']['wait_seconds'].items():
+        print(f"queue:     {level:>5} wait p50 {wait['p50'] * 1000:.2f} ms, p95 {wait['p95'] * 1000:.2f} ms over {wait['count']} problems")
+    if stages['recent']['lookups']:
+        latency = stages['recent']['latency_seconds']
+        print(f"recent:    hit rate {stages['recent']['hit_rate']:.1%} at dequeue (p50 {latency['p50'] * 1e6:.1f} us, p95 {latency['p95'] * 1e6:.1f} us)")
+    if stages['sequence']:
+        latency = stages['sequence']['latency_seconds']
+        print(f"sequence:  {stages['sequence']['per_second']:>12,.0f} lookups/s (p50 {latency['p50'] * 1000:.3f} ms, p95 {latency['p95'] * 1000:.3f} ms), "
+              f"{stages['sequence']['batch']['per_second']:,.0f} lookups/s batched")
+    columnar = stages['columnar']
+    print(f"columnar:  {columnar['compression_ratio']}x smaller than JSONL ({columnar['store_bytes'] / 1e6:.1f} MB), "
+          f"converted at {columnar['convert']['per_second']:,.0f} entries/s")
+    print(f"           template counts {columnar['template_counts']['columnar']['per_second']:,.0f} entries/s "
+          f"(JSONL {columnar['template_counts']['jsonl']['per_second']:,.0f}), time range {columnar['time_range']['columnar']['per_second']:,.0f} entries/s "
+          f"(JSONL {columnar['time_range']['jsonl']['per_second']:,.0f})")
+    if columnar['lookup_latency_seconds']:
+        print(f"           lookup by line id p50 {columnar['lookup_latency_seconds']['p50'] * 1000:.3f} ms, "
+              f"p95 {columnar['lookup_latency_seconds']['p95'] * 1000:.3f} ms")
+
+    if stages['query']:
+        print(f"query:     full JSONL decode {stages['query']['jsonl_decode_seconds'] * 1000:,.0f} ms; with the secondary index:")
+        for name, query in stages['query']['queries'].items():
+            print(f"           {name:<18} {query['matches']:>7} matches, p50 {query['latency_seconds']['p50'] * 1000:.2f} ms")
+    if stages['timeline']:
+        latency = stages['timeline']['latency_seconds']
+        print(f"timeline:  {stages['timeline']['events']} events across files in p50 {latency['p50'] * 1000:.2f} ms, p95 {latency['p95'] * 1000:.2f} ms "
+              f"({stages['timeline']['share_from_other_files']:.0%} from other files)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f_results:
+            json.dump(results, f_results, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Synthetic HDFS node log generator (config.HDFS_HEADER_REGEX_PATTERN format) for benchmarks and load tests.
+
+Usage (from the project root):
+    python benchmarks/synthetic_hdfs.py OUTPUT_DIR [--lines N] [--files F] [--error-rate R]
+        [--multiline-ratio M] [--template-skew S] [--extra-templates T] [--seed S]
+
+Writes F files (node-00.log, ...) with about N raw lines in total. Output is deterministic for a seed.
+"""
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+
+DATANODE = "org.apache.hadoop.hdfs.server.datanode.DataNode"
+
+# (level, component, content format); placeholders are filled per entry
+INFO_TEMPLATES = [
+    ("INFO", DATANODE, "Receiving BP-{bp}:blk_{blk}_{gen} src: /{ip}:{port} dest: /{ip2}:50010"),
+    ("INFO", DATANODE, "Received BP-{bp}:blk_{blk}_{gen} size {size} from /{ip}:{port}"),
+    ("INFO", DATANODE, "PacketResponder: BP-{bp}:blk_{blk}_{gen}, type=LAST_IN_PIPELINE, downstreams=0:[] terminating"),
+    ("INFO", DATANODE + ".clienttrace", "src: /{ip}:{port}, dest: /{ip2}:50010, bytes: {size}, op: HDFS_WRITE, "
+                                        "cliID: DFSClient_NONMAPREDUCE_{num}_1, offset: 0, srvID: {uuid}, "
+                                        "blockid: BP-{bp}:blk_{blk}_{gen}, duration: {num}"),
+    ("INFO", "org.apache.hadoop.hdfs.server.datanode.fsdataset.impl.FsDatasetAsyncDiskService",
+     "Deleted BP-{bp} blk_{blk}_{gen} file /opt/hdfs/data/current/BP-{bp}/current/finalized/subdir{num}/blk_{blk}"),
+    ("INFO", "org.apache.hadoop.hdfs.server.datanode.BlockPoolSliceScanner", "Verification succeeded for BP-{bp}:blk_{blk}_{gen}"),
+    ("INFO", DATANODE, "Successfully sent block report 0x{hex},  containing 1 storage report(s), of which we sent 1. "
+                       "The reports had {num} total blocks and used 1 RPC(s). This took {ms} msec to generate and {ms} msecs "
+                       "for RPC and NN processing. Got back one command: FinalizeCommand/5."),
+]
+PROBLEM_TEMPLATES = {
+    "WARN": [
+        ("WARN", DATANODE, "Slow BlockReceiver write packet to mirror took {ms}ms (threshold=300ms)"),
+        ("WARN", DATANODE, "IOException in BlockReceiver.run(): "),
+        ("WARN", "org.apache.hadoop.ipc.Client", "Failed to connect to server: mesos-master-1/{ip}:9000: "
+                                                 "retries get failed due to exceeded maximum allowed retries number: 10"),
+    ],
+    "ERROR": [
+        ("ERROR", DATANODE, "mesos-slave-{node}:50010:DataXceiver error processing WRITE_BLOCK operation  "
+                            "src: /{ip}:{port} dst: /{ip2}:50010"),
+        ("ERROR", DATANODE, "Exception in receiveBlock for BP-{bp}:blk_{blk}_{gen}"),
+    ],
+    "FATAL": [
+        ("FATAL", DATANODE, "Initialization failed for Block pool BP-{bp} (Datanode Uuid {uuid}) service to "
+                            "mesos-master-1/{ip}:9000. Exiting. "),
+    ],
+}
+# Share of problem entries per level
+PROBLEM_LEVEL_WEIGHTS = {"WARN": 0.70, "ERROR": 0.28, "FATAL": 0.02}
+
+STACK_TRACE_HEADS = [
+    "java.io.IOException: Connection reset by peer",
+    "java.io.EOFException: Premature EOF: no length prefix available",
+    "java.net.SocketTimeoutException: 60000 millis timeout while waiting for channel to be ready for read",
+]
+STACK_TRACE_FRAMES = [
+    "\tat sun.nio.ch.FileDispatcherImpl.read0(Native Method)",
+    "\tat org.apache.hadoop.net.SocketInputStream.read(SocketInputStream.java:{num})",
+    "\tat org.apache.hadoop.hdfs.protocol.datatransfer.PacketReceiver.doRead(PacketReceiver.java:{num})",
+    "\tat org.apache.hadoop.hdfs.server.datanode.BlockReceiver.receivePacket(BlockReceiver.java:{num})",
+    "\tat org.apache.hadoop.hdfs.server.datanode.DataXceiver.writeBlock(DataXceiver.java:{num})",
+    "\tat java.lang.Thread.run(Thread.java:745)",
+]
+
+
+def _zipf_weights(count: int, skew: float) -> list:
+    """Weight of the i-th template: 1 / (i+1)^skew (skew 0 = uniform)."""
+    return [1.0 / (rank + 1) ** skew for rank in range(count)]
+
+def _fill(content_format: str, rng: random.Random, node: int) -> str:
+    return content_format.format(
+        bp=f"{rng.randint(100000000, 999999999)}-10.10.34.{rng.randint(1, 254)}-{rng.randint(10**11, 10**12)}",
+        blk=rng.randint(10**11, 10**12),
+        gen=rng.randint(1000, 99999),
+        ip=f"10.10.34.{rng.randint(1, 254)}",
+        ip2=f"10.10.34.{rng.randint(1, 254)}",
+        port=rng.randint(1024, 65535),
+        size=rng.randint(1, 134217728),
+        num=rng.randint(1, 99999),
+        ms=rng.randint(1, 5000),
+        hex=f"{rng.getrandbits(48):x}",
+        uuid=f"{rng.getrandbits(32):08x}-{rng.getrandbits(16):04x}-{rng.getrandbits(16):04x}-{rng.getrandbits(16):04x}-{rng.getrandbits(48):012x}",
+        node=node,
+    )
+
+def generate_node_logs(
+    output_dir: str,
+    total_lines: int = 100000,
+    num_files: int = 4,
+    error_rate: float = 0.05,
+    multiline_ratio: float = 0.02,
+    template_skew: float = 1.0,
+    extra_templates: int = 0,
+    seed: int = 42
+) -> dict:
+    """
+    Writes synthetic node logs to output_dir and returns a summary of what was generated.
+      - error_rate: share of entries at a problem level (WARN/ERROR/FATAL, see PROBLEM_LEVEL_WEIGHTS)
+      - multiline_ratio: share of entries followed by a stack trace (2-6 continuation lines)
+      - template_skew: Zipf exponent of the template mix within INFO and within each problem level
+      - extra_templates: additional distinct INFO templates (more template variety for the caches)
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    info_templates = INFO_TEMPLATES + [
+        ("INFO", DATANODE, f"Synthetic event type {template_number} for BP-{{bp}}:blk_{{blk}}_{{gen}} took {{ms}} ms")
+        for template_number in range(extra_templates)
+    ]
+    info_weights = _zipf_weights(len(info_templates), template_skew)
+    problem_weights = {level: _zipf_weights(len(templates), template_skew) for level, templates in PROBLEM_TEMPLATES.items()}
+    problem_levels = list(PROBLEM_LEVEL_WEIGHTS)
+
+    summary = {'files': [], 'raw_lines': 0, 'entries': 0, 'problem_entries': 0, 'multiline_entries': 0, 'bytes': 0}
+    lines_per_file = max(1, total_lines // num_files)
+    for file_number in range(num_files):
+        file_path = os.path.join(output_dir, f"node-{file_number:02d}.log")
+        node = 200 + file_number
+        timestamp = datetime(2016, 4, 13, 13, 0, 0)
+        lines_written = 0
+        with open(file_path, 'w', encoding='utf-8', newline='\n') as f_log:
+            while lines_written < lines_per_file:
+                if rng.random() < error_rate:
+                    level = rng.choices(problem_levels, weights=[PROBLEM_LEVEL_WEIGHTS[name] for name in problem_levels])[0]
+                    _, component, content_format = rng.choices(PROBLEM_TEMPLATES[level], weights=problem_weights[level])[0]
+                    summary['problem_entries'] += 1
+                else:
+                    level, component, content_format = rng.choices(info_templates, weights=info_weights)[0]
+                timestamp += timedelta(milliseconds=rng.randint(0, 50))
+                lines = [f"{timestamp:%Y-%m-%d %H:%M:%S},{timestamp.microsecond // 1000:03d} {level} {component}: {_fill(content_format, rng, node)}"]
+                if rng.random() < multiline_ratio:
+                    lines.append(rng.choice(STACK_TRACE_HEADS))
+                    lines.extend(rng.choice(STACK_TRACE_FRAMES).format(num=rng.randint(100, 999)) for _ in range(rng.randint(1, 5)))
+                    summary['multiline_entries'] += 1
+                text = "\n".join(lines) + "\n"
+                f_log.write(text)
+                lines_written += len(lines)
+                summary['entries'] += 1
+                summary['bytes'] += len(text.encode('utf-8'))
+        summary['raw_lines'] += lines_written
+        summary['files'].append(file_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output_dir', help="Directory to write the node logs to")
+    parser.add_argument('--lines', type=int, default=100000, help="Approximate total raw lines")
+    parser.add_argument('--files', type=int, default=4, help="Number of node log files")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Share of WARN/ERROR/FATAL entries")
+    parser.add_argument('--multiline-ratio', type=float, default=0.02, help="Share of entries with a stack trace")
+    parser.add_argument('--template-skew', type=float, default=1.0, help="Zipf exponent of the template mix (0 = uniform)")
+    parser.add_argument('--extra-templates', type=int, default=0, help="Additional distinct INFO templates")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    summary = generate_node_logs(
+        args.output_dir, args.lines, args.files, args.error_rate,
+        args.multiline_ratio, args.template_skew, args.extra_templates, args.seed
+    )
+    print(f"Wrote {summary['raw_lines']} lines ({summary['entries']} entries, {summary['problem_entries']} problems, "
+          f"{summary['multiline_entries']} multi-line, {summary['bytes'] / 1e6:.1f} MB) to {len(summary['files'])} files in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+import os
+import json
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Import configurations from config.py
+import config
+
+# --- On-Disk Columnar Store Format ---
+# The store is a directory next to the parsed JSONL:
+#   files.json  -> {"version": 1, "files": ["<source_file>", ...]}  (file id = position in the list)
+#   blocks.dat  -> self-contained blocks of up to COLUMNAR_BLOCK_ENTRIES parsed entries, appended in stream order
+#   blocks.idx  -> fixed-width BLOCK_INDEX_RECORDs, one per (block, source file in it): where the block is,
+#                  the line id and time range it holds for that file, and how far into the JSONL it reaches
+# A block is BLOCK_HEADER (magic, version, header length), a JSON header (row count, per-block dictionaries,
+# section lengths) and zlib-compressed column sections:
+#   source_file, level, component, event, parameters -> uint32 codes into the block's dictionaries
+#                                                       (event = (event_id, event_template) pairs)
+#   line_id, timestamp                               -> int64 deltas (timestamps as epoch milliseconds)
+#   message_lengths, messages                        -> original_log_full as UTF-8, concatenated
+# Messages come last, so scans that don't need them read and decompress only the small sections before them.
+# Blocks are only trusted once their index records exist; a torn trailing block or record is ignored.
+
+STORE_FORMAT_VERSION = 1
+FILES_TABLE_NAME = "files.json"
+BLOCKS_FILE_NAME = "blocks.dat"
+INDEX_FILE_NAME = "blocks.idx"
+BLOCK_MAGIC = b"PLCB"
+BLOCK_HEADER = struct.Struct('<4sHI') # magic, format version, JSON header length
+# block offset, block length, JSONL end offset, file id, rows, min/max line id, min/max timestamp (epoch ms)
+BLOCK_INDEX_RECORD = struct.Struct('<QIQIIqqqq')
+INDEX_DTYPE = np.dtype([
+    ('block_offset', '<u8'), ('block_length', '<u4'), ('jsonl_end_offset', '<u8'), ('file_id', '<u4'), ('rows', '<u4'),
+    ('min_line_id', '<i8'), ('max_line_id', '<i8'), ('min_timestamp', '<i8'), ('max_timestamp', '<i8'),
+])
+DICTIONARY_COLUMNS = ('source_file', 'level', 'component', 'event', 'parameters')
+DELTA_COLUMNS = ('line_id', 'timestamp')
+SECTION_ORDER = DICTIONARY_COLUMNS + DELTA_COLUMNS + ('message_lengths', 'messages')
+# Parsed JSONL field -> sections needed to decode it
+FIELD_SECTIONS = {
+    'line_id_in_file_header': ('line_id',),
+    'source_file': ('source_file',),
+    'original_log_full': ('message_lengths', 'messages'),
+    'timestamp': ('timestamp',),
+    'level': ('level',),
+    'component': ('component',),
+    'event_id': ('event',),
+    'event_template': ('event',),
+    'parameters': ('parameters',),
+}
+ALL_FIELDS = tuple(FIELD_SECTIONS)
+HEADER_READ_BYTES = 4096 # First read of a block; usually covers the JSON header
+
+assert BLOCK_INDEX_RECORD.size == INDEX_DTYPE.itemsize
+
+
+def _load_files_table(store_dir: str) -> list:
+    table_path = os.path.join(store_dir, FILES_TABLE_NAME)
+    if not os.path.exists(table_path):
+        return []
+    with open(table_path, 'r', encoding='utf-8') as f_table:
+        table = json.load(f_table)
+    if table.get('version') != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar store version {table.get('version')} in {table_path}")
+    return list(table['files'])
+
+def _save_files_table(store_dir: str, files: list):
+    table_path = os.path.join(store_dir, FILES_TABLE_NAME)
+    tmp_path = table_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f_table:
+        json.dump({'version': STORE_FORMAT_VERSION, 'files': files}, f_table)
+    os.replace(tmp_path, table_path)
+
+def store_exists(store_dir: str) -> bool:
+    return os.path.exists(os.path.join(store_dir, INDEX_FILE_NAME))
+
+
+# --- Timestamps ("YYYY-MM-DD HH:MM:SS,mmm" <-> epoch milliseconds) ---
+TIMESTAMP_LENGTH = 23
+TIMESTAMP_SEPARATORS = {4: b'-', 7: b'-', 10: b' ', 13: b':', 16: b':', 19: b','}
+TIMESTAMP_DIGITS = [position for position in range(TIMESTAMP_LENGTH) if position not in TIMESTAMP_SEPARATORS]
+DAYS_BEFORE_MONTH = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334], dtype=np.int64)
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+def _fixed_width_timestamps_to_ms(timestamps: list) -> np.ndarray | None:
+    """Vectorized conversion when every value is a valid "YYYY-MM-DD HH:MM:SS,mmm" (the parser's format); else None."""
+    joined = "".join(timestamps)
+    if len(joined) != TIMESTAMP_LENGTH * len(timestamps) or not joined.isascii():
+        return None
+    chars = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, TIMESTAMP_LENGTH)
+    for position, separator in TIMESTAMP_SEPARATORS.items():
+        if not (chars[:, position] == separator[0]).all():
+            return None
+    digits = chars[:, TIMESTAMP_DIGITS].astype(np.int64) - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        return None
+    number = lambda first, count: digits[:, first:first + count] @ (10 ** np.arange(count - 1, -1, -1))
+    year, month, day = number(0, 4), number(4, 2), number(6, 2)
+    hour, minute, second, millisecond = number(8, 2), number(10, 2), number(12, 2), number(14, 3)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    if ((month < 1) | (month > 12)).any():
+        return None
+    if ((day < 1) | (day > DAYS_IN_MONTH[month - 1] + (leap & (month == 2))) | (hour > 23) | (minute > 59) | (second > 59)).any():
+        return None
+    # Days since 1970-01-01 (proleptic Gregorian)
+    previous_year = year - 1
+    days = (365 * (year - 1970) + previous_year // 4 - previous_year // 100 + previous_year // 400 - 477
+            + DAYS_BEFORE_MONTH[month - 1] + (leap & (month > 2)) + day - 1)
+    return ((days * 24 + hour) * 60 + minute) * 60000 + second * 1000 + millisecond
+
+def timestamps_to_ms(timestamps: list) -> tuple:
+    """
+    Returns (int64 epoch-ms array, {row: original string} for values that don't round-trip exactly).
+    Exception rows repeat the previous value so the delta encoding stays small.
+    """
+    values = _fixed_width_timestamps_to_ms(timestamps)
+    if values is not None:
+        return values, {}
+    iso = [timestamp.replace(' ', 'T', 1).replace(',', '.', 1) for timestamp in timestamps]
+    try:
+        values = np.array(iso, dtype='datetime64[ms]').astype(np.int64)
+    except ValueError:
+        values = np.zeros(len(iso), dtype=np.int64)
+        for row, text in enumerate(iso):
+            try:
+                values[row] = np.datetime64(text, 'ms').astype(np.int64)
+            except ValueError:
+                values[row] = np.iinfo(np.int64).min # Replaced below
+    exceptions = {}
+    decoded = ms_to_timestamps(values)
+    for row, (timestamp, round_trip) in enumerate(zip(timestamps, decoded)):
+        if timestamp != round_trip:
+            exceptions[row] = timestamp
+            values[row] = values[row - 1] if row else 0
+    return values, exceptions
+
+def ms_to_timestamps(values: np.ndarray) -> list:
+    iso = np.datetime_as_string(np.asarray(values, dtype=np.int64).astype('datetime64[ms]'), unit='ms')
+    return [f"{text[:10]} {text[11:19]},{text[20:23]}" for text in iso.tolist()]
+
+def timestamp_to_ms(timestamp: str) -> int:
+    """Epoch milliseconds of one "YYYY-MM-DD HH:MM:SS,mmm" timestamp (a date alone means its midnight)."""
+    return int(np.datetime64(timestamp.replace(' ', 'T', 1).replace(',', '.', 1), 'ms').astype(np.int64))
+
+
+# --- Block Encoding ---
+def _dictionary_encode(values: list) -> tuple:
+    dictionary = {}
+    codes = np.fromiter((dictionary.setdefault(value, len(dictionary)) for value in values), dtype=np.uint32, count=len(values))
+    return codes, list(dictionary)
+
+def _delta_encode(values: np.ndarray) -> np.ndarray:
+    return np.diff(values, prepend=np.int64(0)).astype(np.int64)
+
+def encode_block(entries: list, compression_level: int = 6) -> tuple:
+    """Encodes parsed entries as one block. Returns (block bytes, timestamps in epoch ms, timestamp exception rows)."""
+    columns = {
+        'source_file': [entry['source_file'] for entry in entries],
+        'level': [entry['level'] for entry in entries],
+        'component': [entry['component'] for entry in entries],
+        'event': [(entry['event_id'], entry['event_template']) for entry in entries],
+        'parameters': [entry.get('parameters', '') for entry in entries],
+    }
+    sections = {}
+    dictionaries = {}
+    for name in DICTIONARY_COLUMNS:
+        codes, dictionaries[name] = _dictionary_encode(columns[name])
+        sections[name] = codes.tobytes()
+    line_ids = np.fromiter((entry['line_id_in_file_header'] for entry in entries), dtype=np.int64, count=len(entries))
+    timestamps, timestamp_exceptions = timestamps_to_ms([entry['timestamp'] for entry in entries])
+    sections['line_id'] = _delta_encode(line_ids).tobytes()
+    sections['timestamp'] = _delta_encode(timestamps).tobytes()
+    messages = [entry['original_log_full'].encode('utf-8') for entry in entries]
+    sections['message_lengths'] = np.fromiter(map(len, messages), dtype=np.uint32, count=len(messages)).tobytes()
+    sections['messages'] = b"".join(messages)
+
+    compressed = [zlib.compress(sections[name], compression_level) for name in SECTION_ORDER]
+    header = json.dumps({
+        'rows': len(entries),
+        'dictionaries': dictionaries,
+        'timestamp_exceptions': {str(row): value for row, value in timestamp_exceptions.items()},
+        'sections': [[name, len(data)] for name, data in zip(SECTION_ORDER, compressed)],
+    }).encode('utf-8')
+    block = BLOCK_HEADER.pack(BLOCK_MAGIC, STORE_FORMAT_VERSION, len(header)) + header + b"".join(compressed)
+    return block, timestamps, timestamp_exceptions
+
+
+# --- Writer ---
+class ColumnarLogWriter:
+    """
+    Appends parsed entries to a columnar store directory. Entries are buffered and written as a block once
+    `block_entries` are pending, and on flush_block() / close(). Each entry comes with the JSONL offset just
+    past it, so truncate_to() can drop blocks written after an ingestion checkpoint (see ParsedLogWriter).
+    """
+
+    def __init__(self, store_dir: str, block_entries: int = 2048, compression_level: int = 6):
+        self.store_dir = store_dir
+        self.block_entries = max(1, block_entries)
+        self.compression_level = compression_level
+        os.makedirs(store_dir, exist_ok=True)
+        self.files = _load_files_table(store_dir)
+        self.file_ids = {name: file_id for file_id, name in enumerate(self.files)}
+        self.f_blocks = open(os.path.join(store_dir, BLOCKS_FILE_NAME), 'ab')
+        self.f_index = open(os.path.join(store_dir, INDEX_FILE_NAME), 'ab')
+        self.pending = [] # Parsed entries of the next block
+        self.pending_jsonl_end_offset = 0
+        self._discard_unindexed_tail()
+
+    @classmethod
+    def from_config(cls, store_dir: str = None) -> "ColumnarLogWriter":
+        return cls(store_dir or config.COLUMNAR_STORE_DIR, config.COLUMNAR_BLOCK_ENTRIES, config.COLUMNAR_COMPRESSION_LEVEL)
+
+    def _index_records(self) -> np.ndarray:
+        with open(os.path.join(self.store_dir, INDEX_FILE_NAME), 'rb') as f_index:
+            data = f_index.read()
+        return np.frombuffer(data[:len(data) - len(data) % INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+
+    def _truncate(self, keep_records: int, blocks_size: int):
+        self.f_index.truncate(keep_records * INDEX_DTYPE.itemsize)
+        self.f_blocks.truncate(blocks_size)
+
+    def _discard_unindexed_tail(self):
+        """Drops a block or index record torn by a crash (bytes past the last complete index entry)."""
+        records = self._index_records()
+        blocks_size = int(records['block_offset'][-1]) + int(records['block_length'][-1]) if len(records) else 0
+        self._truncate(len(records), blocks_size)
+
+    def truncate_to(self, jsonl_size: int):
+        """Drops the blocks holding entries past jsonl_size bytes of the parsed JSONL (after a restore)."""
+        self.pending = []
+        records = self._index_records()
+        beyond = np.nonzero(records['jsonl_end_offset'] > jsonl_size)[0]
+        if len(beyond):
+            first = int(beyond[0])
+            self._truncate(first, int(records['block_offset'][first]))
+
+    def _file_id(self, source_file: str) -> int:
+        file_id = self.file_ids.get(source_file)
+        if file_id is None:
+            file_id = self.file_ids[source_file] = len(self.files)
+            self.files.append(source_file)
+            _save_files_table(self.store_dir, self.files)
+        return file_id
+
+    def add(self, parsed_entry: dict, jsonl_end_offset: int):
+        self.pending.append(parsed_entry)
+        self.pending_jsonl_end_offset = jsonl_end_offset
+        if len(self.pending) >= self.block_entries:
+            self.flush_block()
+
+    def flush_block(self):
+        """Writes the pending entries as one block, then its index records."""
+        if not self.pending:
+            return
+        block, timestamps, timestamp_exceptions = encode_block(self.pending, self.compression_level)
+        self.f_blocks.seek(0, os.SEEK_END)
+        block_offset = self.f_blocks.tell()
+        self.f_blocks.write(block)
+        self.f_blocks.flush() # The block is on its way to disk before the index points at it
+
+        valid_timestamp = np.ones(len(self.pending), dtype=bool)
+        valid_timestamp[list(timestamp_exceptions)] = False
+        rows_by_file = {}
+        for row, entry in enumerate(self.pending):
+            rows_by_file.setdefault(entry['source_file'], []).append(row)
+        records = []
+        for source_file, rows in rows_by_file.items():
+            line_ids = [self.pending[row]['line_id_in_file_header'] for row in rows]
+            file_timestamps = timestamps[rows][valid_timestamp[rows]]
+            records.append(BLOCK_INDEX_RECORD.pack(
+                block_offset, len(block), self.pending_jsonl_end_offset, self._file_id(source_file), len(rows),
+                min(line_ids), max(line_ids),
+                int(file_timestamps.min()) if len(file_timestamps) else np.iinfo(np.int64).max,
+                int(file_timestamps.max()) if len(file_timestamps) else np.iinfo(np.int64).min,
+            ))
+        self.f_index.write(b"".join(records))
+        self.f_index.flush()
+        self.pending = []
+
+    def sync(self):
+        self.flush_block()
+        os.fsync(self.f_blocks.fileno())
+        os.fsync(self.f_index.fileno())
+
+    def close(self):
+        try:
+            self.flush_block()
+        finally:
+            self.f_blocks.close()
+            self.f_index.close()
+
+
+# --- Reader ---
+class ColumnarLogReader:
+    """
+    Reads a columnar store: random access by (source_file, line_id) via the block index, and scans that
+    decode only the columns they need, skipping blocks outside the requested source file / time range.
+    Index records appended by a live writer are picked up on the next call.
+    """
+
+    def __init__(self, store_dir: str, cache_blocks: int = 8):
+        self.store_dir = store_dir
+        self.files = []
+        self.file_ids = {}
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.index_bytes_read = 0
+        self.f_blocks = open(os.path.join(store_dir, BLOCKS_FILE_NAME), 'rb')
+        self.cache = OrderedDict() # (block offset, sections) -> decoded block
+        self.cache_blocks = cache_blocks
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Loads index records appended since the last call."""
+        with open(os.path.join(self.store_dir, INDEX_FILE_NAME), 'rb') as f_index:
+            f_index.seek(self.index_bytes_read)
+            data = f_index.read()
+        data = data[:len(data) - len(data) % INDEX_DTYPE.itemsize]
+        if len(data):
+            self.index = np.concatenate([self.index, np.frombuffer(data, dtype=INDEX_DTYPE)])
+            self.index_bytes_read += len(data)
+            self.files = _load_files_table(self.store_dir)
+            self.file_ids = {name: file_id for file_id, name in enumerate(self.files)}
+
+    # --- Blocks ---
+    def _read(self, offset: int, length: int) -> bytes:
+        with self.lock:
+            self.f_blocks.seek(offset)
+            return self.f_blocks.read(length)
+
+    def _decode_block(self, block_offset: int, block_length: int, sections: tuple) -> dict:
+        """Decodes the given sections of a block into {'rows', 'dictionaries', <section>: array / bytes, ...}."""
+        cache_key = (block_offset, sections)
+        with self.lock:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache.move_to_end(cache_key)
+                return cached
+
+        prefix = self._read(block_offset, min(block_length, HEADER_READ_BYTES))
+        magic, version, header_length = BLOCK_HEADER.unpack_from(prefix)
+        if magic != BLOCK_MAGIC or version != STORE_FORMAT_VERSION:
+            raise ValueError(f"Not a columnar block (version {STORE_FORMAT_VERSION}) at offset {block_offset}")
+        if BLOCK_HEADER.size + header_length > len(prefix):
+            prefix = self._read(block_offset, BLOCK_HEADER.size + header_length)
+        header = json.loads(prefix[BLOCK_HEADER.size:BLOCK_HEADER.size + header_length])
+
+        # Only the byte range from the first to the last needed section is read
+        section_ranges = {}
+        position = BLOCK_HEADER.size + header_length
+        for name, length in header['sections']:
+            section_ranges[name] = (position, position + length)
+            position += length
+        wanted = [name for name in SECTION_ORDER if name in sections]
+        first, last = section_ranges[wanted[0]][0], section_ranges[wanted[-1]][1]
+        data = self._read(block_offset + first, last - first)
+
+        block = {'rows': header['rows'], 'dictionaries': header['dictionaries'],
+                 'timestamp_exceptions': {int(row): value for row, value in header['timestamp_exceptions'].items()}}
+        for name in wanted:
+            start, end = section_ranges[name]
+            raw = zlib.decompress(data[start - first:end - first])
+            if name in DICTIONARY_COLUMNS:
+                block[name] = np.frombuffer(raw, dtype=np.uint32)
+            elif name in DELTA_COLUMNS:
+                block[name] = np.cumsum(np.frombuffer(raw, dtype=np.int64))
+            elif name == 'message_lengths':
+                block[name] = np.frombuffer(raw, dtype=np.uint32)
+            else:
+                block[name] = raw
+
+        with self.lock:
+            self.cache[cache_key] = block
+            while len(self.cache) > self.cache_blocks:
+                self.cache.popitem(last=False)
+        return block
+
+    def _field_values(self, block: dict, field: str, rows: np.ndarray) -> list:
+        """Values of one JSONL field for the given rows of a decoded block."""
+        if field == 'line_id_in_file_header':
+            return block['line_id'][rows].tolist()
+        if field == 'timestamp':
+            values = ms_to_timestamps(block['timestamp'][rows])
+            exceptions = block['timestamp_exceptions']
+            if exceptions:
+                values = [exceptions.get(row, value) for row, value in zip(rows.tolist(), values)]
+            return values
+        if field == 'original_log_full':
+            ends = np.cumsum(block['message_lengths'], dtype=np.int64)
+            messages = block['messages']
+            return [messages[end - length:end].decode('utf-8') for end, length in
+                    zip(ends[rows].tolist(), block['message_lengths'][rows].tolist())]
+        if field in ('event_id', 'event_template'):
+            position = 0 if field == 'event_id' else 1
+            dictionary = [pair[position] for pair in block['dictionaries']['event']]
+            return [dictionary[code] for code in block['event'][rows].tolist()]
+        dictionary = block['dictionaries'][field]
+        return [dictionary[code] for code in block[field][rows].tolist()]
+
+    def _candidate_records(self, source_file: str = None, start_ms: int = None, end_ms: int = None) -> np.ndarray:
+        mask = np.ones(len(self.index), dtype=bool)
+        if source_file is not None:
+            file_id = self.file_ids.get(source_file)
+            if file_id is None:
+                return self.index[:0]
+            mask &= self.index['file_id'] == file_id
+        if start_ms is not None:
+            mask &= self.index['max_timestamp'] >= start_ms
+        if end_ms is not None:
+            mask &= self.index['min_timestamp'] < end_ms
+        return self.index[mask]
+
+    def _candidate_blocks(self, source_file: str = None, start_timestamp: str = None, end_timestamp: str = None) -> tuple:
+        """(block offsets and lengths in file order, start ms, end ms) for a source file / [start, end) time filter."""
+        self.refresh()
+        start_ms = timestamp_to_ms(start_timestamp) if start_timestamp else None
+        end_ms = timestamp_to_ms(end_timestamp) if end_timestamp else None
+        records = self._candidate_records(source_file, start_ms, end_ms)
+        blocks = sorted({(int(record['block_offset']), int(record['block_length'])) for record in records})
+        return blocks, start_ms, end_ms
+
+    def _row_mask(self, block: dict, source_file: str, start_ms: int, end_ms: int) -> np.ndarray:
+        mask = np.ones(block['rows'], dtype=bool)
+        if source_file is not None:
+            dictionary = block['dictionaries']['source_file']
+            mask &= block['source_file'] == (dictionary.index(source_file) if source_file in dictionary else -1)
+        if start_ms is not None or end_ms is not None:
+            timestamps = block['timestamp']
+            if start_ms is not None:
+                mask &= timestamps >= start_ms
+            if end_ms is not None:
+                mask &= timestamps < end_ms
+            mask[list(block['timestamp_exceptions'])] = False # Unparseable timestamps never match a range
+        return mask
+
+    @staticmethod
+    def _sections_for(fields: tuple, source_file: str, time_filter: bool) -> tuple:
+        sections = set()
+        for field in fields:
+            sections.update(FIELD_SECTIONS[field])
+        if source_file is not None:
+            sections.add('source_file')
+        if time_filter:
+            sections.add('timestamp')
+        return tuple(name for name in SECTION_ORDER if name in sections)
+
+    # --- Queries ---
+    def get(self, source_file: str, line_id: int, fields: tuple = ALL_FIELDS) -> dict | None:
+        """The entry at (source_file, line_id) as a parsed JSONL record (restricted to fields), or None."""
+        self.refresh()
+        file_id = self.file_ids.get(source_file)
+        if file_id is None:
+            return None
+        matches = np.nonzero((self.index['file_id'] == file_id) & (self.index['min_line_id'] <= line_id) &
+                             (self.index['max_line_id'] >= line_id))[0]
+        for record in self.index[matches[::-1]]: # Latest block first
+            block = self._decode_block(int(record['block_offset']), int(record['block_length']),
+                                       self._sections_for(fields, source_file, False) + ('line_id',))
+            mask = self._row_mask(block, source_file, None, None) & (block['line_id'] == line_id)
+            rows = np.nonzero(mask)[0]
+            if len(rows):
+                rows = rows[-1:]
+                return {field: self._field_values(block, field, rows)[0] for field in fields}
+        return None
+
+    def scan(self, fields: tuple = ALL_FIELDS, source_file: str = None, start_timestamp: str = None, end_timestamp: str = None):
+        """
+        Yields parsed JSONL records (only `fields`) in write order, optionally for one source file and
+        timestamps in [start_timestamp, end_timestamp) ("YYYY-MM-DD HH:MM:SS,mmm" or a prefix such as a date).
+        """
+        blocks, start_ms, end_ms = self._candidate_blocks(source_file, start_timestamp, end_timestamp)
+        sections = self._sections_for(fields, source_file, start_ms is not None or end_ms is not None)
+        for block_offset, block_length in blocks:
+            block = self._decode_block(block_offset, block_length, sections)
+            rows = np.nonzero(self._row_mask(block, source_file, start_ms, end_ms))[0]
+            if not len(rows):
+                continue
+            columns = [self._field_values(block, field, rows) for field in fields]
+            for values in zip(*columns):
+                yield dict(zip(fields, values))
+
+    def count_by_template(self, source_file: str = None, start_timestamp: str = None, end_timestamp: str = None) -> dict:
+        """{event_id: {'event_template', 'count'}} over the matching entries, decoding only the event codes."""
+        blocks, start_ms, end_ms = self._candidate_blocks(source_file, start_timestamp, end_timestamp)
+        sections = self._sections_for(('event_id',), source_file, start_ms is not None or end_ms is not None)
+        counts = {}
+        for block_offset, block_length in blocks:
+            block = self._decode_block(block_offset, block_length, sections)
+            codes = block['event'][self._row_mask(block, source_file, start_ms, end_ms)]
+            for code, count in enumerate(np.bincount(codes, minlength=len(block['dictionaries']['event'])).tolist()):
+                if count:
+                    event_id, event_template = block['dictionaries']['event'][code]
+                    summary = counts.setdefault(event_id, {'event_template': event_template, 'count': 0})
+                    summary['count'] += count
+        return counts
+
+    def stats(self) -> dict:
+        self.refresh()
+        blocks = np.unique(self.index['block_offset']) if len(self.index) else []
+        return {
+            'blocks': len(blocks),
+            'entries': int(self.index['rows'].sum()) if len(self.index) else 0,
+            'source_files': len(self.files),
+            'bytes': os.path.getsize(os.path.join(self.store_dir, BLOCKS_FILE_NAME)),
+        }
+
+    def close(self):
+        self.f_blocks.close()
+
+
+def convert_parsed_jsonl(parsed_jsonl_path: str, store_dir: str, block_entries: int = None, compression_level: int = None) -> int:
+    """Builds a columnar store from an existing parsed JSONL (e.g. output from before the store was enabled). Returns entries written."""
+    writer = ColumnarLogWriter(
+        store_dir,
+        config.COLUMNAR_BLOCK_ENTRIES if block_entries is None else block_entries,
+        config.COLUMNAR_COMPRESSION_LEVEL if compression_level is None else compression_level,
+    )
+    writer.truncate_to(0)
+    entries_written = 0
+    jsonl_offset = 0
+    try:
+        with open(parsed_jsonl_path, 'rb') as f_parsed:
+            for line in f_parsed:
+                jsonl_offset += len(line)
+                try:
+                    parsed_entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                writer.add(parsed_entry, jsonl_offset)
+                entries_written += 1
+    finally:
+        writer.close()
+    return entries_written
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import re
+import multiprocessing
 
 # Load environment variables from .env file (for API keys)
 load_dotenv()
@@ -15,8 +16,14 @@ RAW_LOGS_DIR = os.path.join("data", "raw_logs", "hdfs_v2", "HDFS_v2", "node_logs
 # Generated Parsed Log File (Live-updating stream output)
 OUTPUT_PARSED_JSONL = os.path.join("data", "parsed_logs", "realtime_parsed_logs.jsonl")
 
-# Byte-Offset Index File (Live-updating index for parsed logs)
-OFFSET_INDEX_FILE = os.path.join("data", "parsed_logs", "realtime_offset_index.csv")
+# Byte-Offset Index Directory (Live-updating, memory-mapped binary index for parsed logs; see offset_index.py)
+OFFSET_INDEX_DIR = os.path.join("data", "parsed_logs", "realtime_offset_index")
+
+# Columnar Store Directory (optional compressed copy of the parsed logs for analytic scans; see columnar_store.py)
+COLUMNAR_STORE_DIR = os.path.join("data", "parsed_logs", "realtime_columnar")
+
+# Secondary Index Directory (time-bucketed level / event_id / source_file postings for incident queries; see secondary_index.py)
+SECONDARY_INDEX_DIR = os.path.join("data", "parsed_logs", "realtime_secondary_index")
 
 # Generated Templates CSV (Output of stream processing)
 OUTPUT_TEMPLATES_CSV = os.path.join("data", "templates", "realtime_templates.csv")
@@ -29,11 +36,57 @@ SOLUTION_DOCS_DIR = os.path.join("data", "solution_docs")
 
 # FAISS Index Persistence Path
 FAISS_INDEX_PATH = "faiss_index/" 
+# Knowledge-base manifest: per solution document its mtime, size, hash and FAISS vector ids (see rag_builder.py)
+KB_MANIFEST_FILE = os.path.join(FAISS_INDEX_PATH, "kb_manifest.json")
 
 # --- 2. LLM Configuration ---
+# Backends (see ai_backends.py):
+#   "google" -> Gemini (needs GOOGLE_API_KEY)
+#   "stub"   -> offline stand-in: waits STUB_LLM_LATENCY_SECONDS, then returns a canned JSON reply
+#               (for load tests / benchmarks without network or API key)
+LLM_BACKEND = "google"
+STUB_LLM_LATENCY_SECONDS = 0.5
+STUB_LLM_REPLY_FILE = None # JSON file with the stub's reply; None = built-in placeholder plan
 LLM_MODEL = "gemini-2.0-flash"
 LLM_TEMPERATURE = 0.0
 LLM_MAX_OUTPUT_TOKENS = 4096 # Max tokens for LLM response
+# Max problems analyzed concurrently by the LLM worker pool (1 = one problem at a time).
+# Throughput scales with this until the provider's rate limit is reached.
+LLM_WORKER_CONCURRENCY = 4
+# Solution cache: repeated problems reuse an earlier analysis instead of a new retrieval + LLM call.
+#   "event_id"              -> one solution per log template
+#   "event_id_and_sequence" -> per template and set of templates in the preceding sequence
+# A coalesced burst twice as large as the one behind the cached solution is analyzed again (and replaces it).
+SOLUTION_CACHE_ENABLED = True
+SOLUTION_CACHE_KEY_MODE = "event_id"
+SOLUTION_CACHE_TTL_SECONDS = 3600 # Re-analyze a problem once its cached solution is this old (0 = never expires)
+SOLUTION_CACHE_MAX_ENTRIES = 1000 # Least recently used solutions are evicted beyond this
+SOLUTION_CACHE_FILE = os.path.join("data", "solution_cache.json")
+SOLUTION_CACHE_SAVE_INTERVAL_SECONDS = 30.0
+
+# --- Embeddings (RAG knowledge base) ---
+# "google"  -> Gemini embeddings (needs GOOGLE_API_KEY)
+# "hashing" -> deterministic local bag-of-words embedder (feature hashing; offline, word-overlap retrieval)
+# "fake"    -> deterministic random vectors per text (offline; no semantic similarity at all)
+EMBEDDING_BACKEND = "google"
+EMBEDDING_MODEL = "models/embedding-001"
+LOCAL_EMBEDDING_DIMENSIONS = 512 # Vector size of the "hashing" and "fake" backends
+# Chunk embeddings are cached on disk by content hash + model, so a FAISS rebuild only embeds new or changed chunks
+EMBEDDING_CACHE_FILE = os.path.join("data", "embedding_cache.sqlite3")
+EMBEDDING_BATCH_SIZE = 64 # Chunks per embedding request
+EMBEDDING_CONCURRENCY = 4 # Embedding requests in flight at once
+# Incremental knowledge-base indexing: new, changed and deleted documents in SOLUTION_DOCS_DIR are applied
+# to the FAISS index in place. With background indexing on, the docs dir is re-checked while the agent runs.
+KB_BACKGROUND_INDEXING = True
+KB_INDEX_SYNC_INTERVAL_SECONDS = 60.0
+# Processes that load and split solution documents in parallel (PDF parsing is CPU-bound); 1 = serial, in-process
+KB_LOADER_WORKERS = os.cpu_count() or 1
+# Retrieval layer (see retrieval_service.py): knowledge-base results cached by normalized query, and
+# cache misses from concurrent problems embedded and searched in FAISS as one batch
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_MAX_ENTRIES = 1000 # Least recently used queries are evicted beyond this
+RETRIEVAL_BATCH_MAX_SIZE = 16
+RETRIEVAL_BATCH_WAIT_SECONDS = 0.01 # How long a cache miss waits for others to join its batch
 
 # --- 3. Parsing & Problem Detection Configuration ---
 # Regex for parsing log line headers (used to extract Date, Time, Level, Component, Content)
@@ -67,15 +120,122 @@ NORMALIZATION_RULES = [
 
 PROBLEMATIC_LEVELS_TO_ANALYZE = ['ERROR', 'WARN', 'FATAL']
 NUM_PRECEDING_LOGS_FOR_SEQUENCE = 10 # Number of lines before problematic one to retrieve
+# Fields of each preceding entry given to the LLM as the log sequence (see sequence_reader.py). By default the
+# complete parsed entries, as in the prompt so far (changing the fields also changes the solution cache keys).
+# To trim the prompt, drop "original_log_full" (and "source_file"): templates, levels and components still carry
+# the event chain, but block ids, IPs and stack traces of the preceding lines are lost.
+SEQUENCE_FIELDS = ['line_id_in_file_header', 'source_file', 'original_log_full', 'timestamp', 'level', 'component',
+                   'event_id', 'event_template', 'parameters']
+# The most recent parsed entries of each source file are kept in memory (see sequence_reader.RecentEntryBuffer), so
+# live problems get their sequence without disk reads. Per file NUM_PRECEDING_LOGS_FOR_SEQUENCE + this many entries
+# are kept: the headroom covers problems still waiting in problem_queue. Older problems are read from disk.
+RECENT_ENTRIES_ENABLED = True
+RECENT_ENTRIES_HEADROOM = 1000
+# Cross-node sequence (see timeline.py): give the LLM the CROSS_NODE_SEQUENCE_EVENTS latest entries of all source
+# files (NameNode and DataNodes) up to the problem, at most CROSS_NODE_WINDOW_SECONDS before it, merged by timestamp,
+# instead of the preceding entries of the problem's own file. Entries then also carry their source_file.
+# Entries no longer in the recent-entry buffer come from the secondary index, so this requires SECONDARY_INDEX_ENABLED.
+CROSS_NODE_SEQUENCE_ENABLED = False
+CROSS_NODE_SEQUENCE_EVENTS = 20
+CROSS_NODE_WINDOW_SECONDS = 60.0
+# Template cache (see template_normalizer.TemplateCache): content signature -> (template, EventId). Off by default:
+# on the synthetic HDFS data, block pool / UUID hex ids keep signatures unique (~7% hits) and the cache makes
+# normalization slower. Enable it for logs whose lines repeat per template; it bypasses itself if the hit rate
+# over the first TEMPLATE_CACHE_PROBE_LOOKUPS lookups is below TEMPLATE_CACHE_MIN_HIT_RATE.
+TEMPLATE_CACHE_SIZE = 0 # Max cached content signatures; 0 disables the cache
+TEMPLATE_CACHE_PROBE_LOOKUPS = 10000
+TEMPLATE_CACHE_MIN_HIT_RATE = 0.3
+# Burst coalescing (see problem_coalescer.py): the first problem of a level/template/component goes to
+# problem_queue at once; its duplicates within the window follow as one representative plus a burst summary.
+PROBLEM_COALESCING_ENABLED = True
+PROBLEM_COALESCING_WINDOW_SECONDS = 5.0 # Measured from a group's first problem
+PROBLEM_COALESCING_MAX_GROUPS = 10000 # Open groups kept in memory; the oldest is forwarded early beyond this
+PROBLEM_QUEUE_MAX_SIZE = 1000 # problem_queue bound: detection blocks (backpressure) while the LLM side catches up
+# problem_queue scheduling (see problem_scheduler.py): served by level, then template rarity, then age
+PROBLEM_LEVEL_PRIORITY = ['FATAL', 'ERROR', 'WARN'] # Highest priority first
+# What happens to a new problem when problem_queue is full:
+#   "block"  -> wait for room (backpressure on detection)
+#   "drop"   -> discard the lowest-priority problem (queued or new)
+#   "sample" -> like "drop", but keep 1 in PROBLEM_QUEUE_SAMPLE_RATE overflowing problems per template
+PROBLEM_QUEUE_OVERFLOW_POLICY = "sample"
+PROBLEM_QUEUE_SAMPLE_RATE = 10
+PROBLEM_QUEUE_PROTECTED_LEVELS = ['FATAL', 'ERROR'] # Never dropped on overflow
 
 # --- 4. Stream Simulation Configuration ---
 STREAM_DELAY_SECONDS = 0.001 # 1 millisecond delay per raw log line processed
+# Replay pacing (see replay_scheduler.py):
+#   "delay"     -> sleep STREAM_DELAY_SECONDS per raw line (original behaviour)
+#   "backfill"  -> no pacing, process as fast as possible (historical reprocessing)
+#   "rate"      -> token-bucket limit of STREAM_RATE_LIMIT lines or bytes per second (STREAM_RATE_UNIT)
+#   "timestamp" -> replay the gaps between log timestamps, sped up by STREAM_REPLAY_SPEEDUP
+STREAM_REPLAY_MODE = "delay"
+STREAM_RATE_LIMIT = 5000
+STREAM_RATE_UNIT = "lines" # "lines" or "bytes"
+STREAM_REPLAY_SPEEDUP = 60.0
+STREAM_REPLAY_MAX_GAP_SECONDS = 60.0 # Longest log-time gap honoured in "timestamp" mode (None = no cap)
+# Number of worker processes used to ingest raw log files.
+# 1 keeps the serial, real-time paced stream (STREAM_DELAY_SECONDS per line).
+# > 1 splits the raw files into byte ranges of about INGESTION_SHARD_BYTES (starting at entry headers), parses them
+# in worker processes and merges results in file order (always runs as "backfill"). Parsed results held in memory
+# stay within about 2 * INGESTION_WORKERS shards.
+INGESTION_WORKERS = 1
+INGESTION_SHARD_BYTES = 8 * 1024 * 1024
+# Start method of the process pools (ingestion workers, KB_LOADER_WORKERS). They are created while the LLM worker,
+# retrieval batcher, metrics server and other threads run, so children are not forked from this process (a fork
+# can copy a lock another thread holds and deadlock the child). "spawn" where forkserver is unavailable (Windows).
+PROCESS_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+# Parsed JSONL output is written in batches: flush once the buffer reaches this size or this much time has passed
+PARSED_WRITE_BUFFER_BYTES = 1024 * 1024
+PARSED_WRITE_FLUSH_INTERVAL_SECONDS = 1.0
+# Also write every parsed entry to COLUMNAR_STORE_DIR: blocks of COLUMNAR_BLOCK_ENTRIES entries with dictionary-encoded
+# level/component/event, delta-encoded line ids and timestamps and zlib-compressed messages. The JSONL stays the
+# source of truth (sequences for the LLM are read from it); the store serves template counts and time-range scans.
+COLUMNAR_STORE_ENABLED = False
+COLUMNAR_BLOCK_ENTRIES = 2048
+COLUMNAR_COMPRESSION_LEVEL = 6 # zlib level (1 = fastest, 9 = smallest)
+# Build the secondary index in SECONDARY_INDEX_DIR while ingesting (queried with secondary_index.SecondaryIndex).
+# Postings are written in batches of SECONDARY_INDEX_FLUSH_ENTRIES entries or every SECONDARY_INDEX_FLUSH_INTERVAL_SECONDS;
+# queries decode the JSONL written since the last batch. Time buckets only narrow what a query reads (the time
+# filter itself is exact); the bucket width of an existing index is kept.
+# Off by default: when enabled on an existing parsed JSONL, the stream indexes all of it when it opens (it can be
+# tens of GB), so build the index first with `python secondary_index.py`.
+SECONDARY_INDEX_ENABLED = False
+SECONDARY_INDEX_BUCKET_SECONDS = 300
+SECONDARY_INDEX_FLUSH_ENTRIES = 50000
+SECONDARY_INDEX_FLUSH_INTERVAL_SECONDS = 10.0
+# Resumable ingestion: per raw file (inode, byte position, line id) plus the parsed JSONL size they match.
+# With REGENERATE_ALL_FROM_RAW_LOGS = False a restart continues from here and only reads new raw bytes.
+INGESTION_CHECKPOINT_FILE = os.path.join("data", "parsed_logs", "ingestion_checkpoint.json")
+INGESTION_CHECKPOINT_INTERVAL_SECONDS = 5.0
+
+# Follow mode: tail the files in RAW_LOGS_DIR live (like `tail -F`) instead of reading them once
+FOLLOW_RAW_LOGS = False
+FOLLOW_POLL_INTERVAL_SECONDS = 0.5 # Poll interval where inotify is unavailable; upper bound on inotify waits
+FOLLOW_ENTRY_FLUSH_SECONDS = 0.2 # A multi-line entry is considered complete after its file is idle this long
+FOLLOW_CHECKPOINT_INTERVAL_SECONDS = 1.0 # Follow mode saves INGESTION_CHECKPOINT_FILE more often
+FOLLOW_STATUS_INTERVAL_SECONDS = 30.0
 
 # NEW: Template Saving Interval
 TEMPLATE_SAVE_INTERVAL_LINES = 100000 # Save template CSV every 100,000 parsed log entries
 # Set to True to regenerate the entire parsed JSONL and offset index from RAW logs at app startup.
-# Set to False if you want to use existing parsed log file and offset index (if they exist).
+# Set to False if you want to use existing parsed log file and offset index (if they exist);
+# ingestion then resumes from INGESTION_CHECKPOINT_FILE instead of re-reading the raw logs.
 # Recommended: True for first run, then False for faster subsequent runs.
 REGENERATE_ALL_FROM_RAW_LOGS = True 
 # Set to True to force rebuilding FAISS index from solution docs, even if it exists
-REBUILD_FAISS_INDEX = False
\ No newline at end of file
+# (otherwise an existing index is updated incrementally from its manifest)
+REBUILD_FAISS_INDEX = False
+
+# --- 5. Metrics & Profiling (see metrics.py) ---
+# Counters and stage latency histograms are always recorded in memory. With METRICS_ENABLED they are served,
+# together with the cache / queue stats, in Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics
+# (localhost only by default)
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+# Sampling profiler: with PROFILER_ENABLED every thread's stack is sampled for the whole run and written to
+# PROFILER_OUTPUT_FILE as collapsed stacks (flame graph input). /debug/profile?seconds=N profiles on demand.
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_INTERVAL_SECONDS = 0.01
+PROFILER_OUTPUT_FILE = os.path.join("data", "profile.collapsed")
+PROFILER_MAX_REQUEST_SECONDS = 60.0 # Longest on-demand profile
@@ -0,0 +1,171 @@
+import os
+import array
+import random
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+
+# Import configurations from config.py
+import config
+
+# Keys looked up per SELECT (stays below SQLite's bound-parameter limit)
+LOOKUP_BATCH_SIZE = 500
+
+
+def chunk_cache_key(model_name: str, text: str) -> str:
+    """Cache key of one chunk: content hash of its text, scoped to the embedding model that embeds it."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk key -> vector store (SQLite). Vectors are kept as float32, the precision FAISS indexes them at.
+    Thread-safe; one connection guarded by a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        store_dir = os.path.dirname(path)
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dimensions INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get_many(self, keys: list) -> dict:
+        """Returns {key: vector} for the keys present in the store."""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                key_batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(key_batch))})", key_batch
+                )
+                for key, blob in rows:
+                    found[key] = array.array('f', blob).tolist()
+        return found
+
+    def put_many(self, model_name: str, items: list):
+        """Stores [(key, vector), ...] in one transaction."""
+        rows = [(key, model_name, len(vector), array.array('f', vector).tobytes()) for key, vector in items]
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector) VALUES (?, ?, ?, ?)", rows
+                )
+
+    def count(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model (e.g. GoogleGenerativeAIEmbeddings) with the on-disk EmbeddingStore.
+
+    embed_documents() looks every text up by chunk_cache_key(model_name, text) and only sends the
+    misses to the wrapped model, in batches of `batch_size` with up to `concurrency` batches in flight.
+    Results come back in input order; each finished batch is stored at once, so an interrupted build
+    keeps the embeddings it already paid for. Queries are not cached and go straight to the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, store: EmbeddingStore, batch_size: int = 64, concurrency: int = 1):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    @classmethod
+    def from_config(cls, embeddings: Embeddings, model_name: str) -> "CachedEmbeddings":
+        return cls(
+            embeddings,
+            model_name,
+            EmbeddingStore(config.EMBEDDING_CACHE_FILE),
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            concurrency=config.EMBEDDING_CONCURRENCY,
+        )
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [chunk_cache_key(self.model_name, text) for text in texts]
+        vectors = self.store.get_many(list(set(keys)))
+
+        # Distinct texts still to embed (duplicate chunks are embedded once)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            key_batches = [missing_keys[start:start + self.batch_size] for start in range(0, len(missing_keys), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(key_batches)), thread_name_prefix="embedding-batch") as executor:
+                batch_results = executor.map(
+                    lambda key_batch: self.embeddings.embed_documents([missing[key] for key in key_batch]),
+                    key_batches
+                )
+                for key_batch, batch_vectors in zip(key_batches, batch_results):
+                    # Rounded to float32 like stored vectors, so results do not depend on whether the cache was warm
+                    items = [(key, array.array('f', vector).tolist()) for key, vector in zip(key_batch, batch_vectors)]
+                    self.store.put_many(self.model_name, items)
+                    vectors.update(items)
+                    self.batches += 1
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text: str) -> list:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> dict:
+        requested = self.hits + self.misses
+        return {
+            'cached': self.hits,
+            'embedded': self.misses,
+            'batches': self.batches,
+            'hit_rate': self.hits / requested if requested else 0.0,
+            'store_size': self.store.count(),
+        }
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic offline embedding backend for tests and development without an API key: each text
+    maps to a fixed pseudo-random unit vector seeded by its hash. Identical texts get identical vectors;
+    there is no semantic similarity. Counts calls so tests can check what was actually embedded.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.documents_embedded = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _vector(self, text: str) -> list:
+        rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.dimensions)]
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        with self.lock:
+            self.calls += 1
+            self.documents_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._vector(text)
@@ -0,0 +1,150 @@
+import os
+import json
+
+# Import the offset index, whose records are truncated together with the parsed JSONL
+import offset_index
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class CheckpointStore:
+    """
+    Durable per-source-file ingestion checkpoints, stored as one JSON document:
+        {"version": 1, "files": {"<source_file>": {"inode": ..., "position": ..., "line_id": ...}},
+         "parsed_jsonl_size": ..., "parsed_entry_count": ...}
+    `position` is the byte offset in the raw file up to which every line has been turned into parsed
+    output, and `line_id` the id of the last raw line consumed before that position.
+    `parsed_jsonl_size` is the size of the parsed JSONL holding exactly that output (see restore_parsed_output).
+    Saves are atomic (temp file + fsync + rename), so a crash leaves either the old or the new checkpoint.
+    """
+
+    def __init__(self, checkpoint_path: str):
+        self.checkpoint_path = checkpoint_path
+        self.files = {}
+        self.parsed_jsonl_size = None
+        self.parsed_entry_count = 0
+
+    def load(self) -> "CheckpointStore":
+        """Loads the checkpoint file if it exists; a missing or unreadable file means "start from scratch"."""
+        self.files = {}
+        self.parsed_jsonl_size = None
+        self.parsed_entry_count = 0
+        if os.path.exists(self.checkpoint_path):
+            try:
+                with open(self.checkpoint_path, 'r', encoding='utf-8') as f_checkpoint:
+                    document = json.load(f_checkpoint)
+                if document.get('version') == CHECKPOINT_FORMAT_VERSION:
+                    self.files = document.get('files', {})
+                    self.parsed_jsonl_size = document.get('parsed_jsonl_size')
+                    self.parsed_entry_count = document.get('parsed_entry_count', 0)
+                else:
+                    print(f"WARNING: Ignoring checkpoint {self.checkpoint_path} with unsupported version {document.get('version')}.")
+            except (OSError, ValueError) as e:
+                print(f"WARNING: Could not read checkpoint {self.checkpoint_path}: {e}. Starting from scratch.")
+        return self
+
+    def get(self, source_file: str) -> dict | None:
+        return self.files.get(source_file)
+
+    def update(self, source_file: str, inode: int, position: int, line_id: int):
+        self.files[source_file] = {'inode': inode, 'position': position, 'line_id': line_id}
+
+    def resume_point(self, raw_log_path: str) -> tuple:
+        """
+        Returns (inode, position, line_id) to continue reading raw_log_path from. A file that was
+        replaced (new inode) or truncated below its checkpoint is read again from byte 0, with line ids
+        continuing after the checkpointed ones so (source_file, line_id) stays unique.
+        """
+        stat_result = os.stat(raw_log_path)
+        checkpoint = self.get(os.path.basename(raw_log_path))
+        if not checkpoint:
+            return stat_result.st_ino, 0, 0
+        if checkpoint['inode'] == stat_result.st_ino and checkpoint['position'] <= stat_result.st_size:
+            return stat_result.st_ino, checkpoint['position'], checkpoint['line_id']
+        return stat_result.st_ino, 0, checkpoint['line_id']
+
+    def restore_parsed_output(self, parsed_jsonl_path: str, offset_index_dir: str = None) -> bool:
+        """
+        Brings the parsed JSONL back in line with this checkpoint after a crash: bytes appended after
+        the last save are truncated away, and so are the offset index records (in offset_index_dir)
+        pointing into them; their raw lines are re-read on resume. Returns False if output and
+        checkpoint can no longer be reconciled and ingestion must start over: the JSONL is shorter than
+        the checkpoint says, or it holds entries but there is no checkpoint (output of an earlier run
+        that did not checkpoint; resuming would read every raw file again and append its entries twice).
+        """
+        current_size = os.path.getsize(parsed_jsonl_path) if os.path.exists(parsed_jsonl_path) else 0
+        restored_size = 0 if self.parsed_jsonl_size is None else self.parsed_jsonl_size
+        if current_size < restored_size or (self.parsed_jsonl_size is None and current_size > 0):
+            return False
+        if current_size > restored_size:
+            print(f"Discarding {current_size - restored_size} bytes of parsed output written after the last checkpoint.")
+            with open(parsed_jsonl_path, 'r+b') as f_parsed_jsonl:
+                f_parsed_jsonl.truncate(restored_size)
+        if offset_index_dir and offset_index.index_exists(offset_index_dir):
+            removed = offset_index.truncate_index(offset_index_dir, restored_size)
+            if removed:
+                print(f"Discarding {removed} offset index records written after the last checkpoint.")
+        return True
+
+    def save(self, parsed_jsonl_size: int = None, parsed_entry_count: int = None):
+        """Persists the checkpoint. Call only after the parsed output it describes is synced to disk."""
+        if parsed_jsonl_size is not None:
+            self.parsed_jsonl_size = parsed_jsonl_size
+        if parsed_entry_count is not None:
+            self.parsed_entry_count = parsed_entry_count
+        checkpoint_dir = os.path.dirname(self.checkpoint_path)
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f_checkpoint:
+            json.dump({
+                'version': CHECKPOINT_FORMAT_VERSION,
+                'files': self.files,
+                'parsed_jsonl_size': self.parsed_jsonl_size,
+                'parsed_entry_count': self.parsed_entry_count,
+            }, f_checkpoint)
+            f_checkpoint.flush()
+            os.fsync(f_checkpoint.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear(self):
+        self.files = {}
+        self.parsed_jsonl_size = None
+        self.parsed_entry_count = 0
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+class IngestionFrontier:
+    """
+    Tracks, while raw files are streamed in order, how far each file has been turned into parsed
+    entries, and records it in a CheckpointStore. The entry being assembled ("pending") is not written
+    until the next header arrives, possibly in the next file (leading continuation lines attach to the
+    previous file's last entry), so:
+      - a file's resume point is the start of its pending entry while that entry is unwritten;
+      - a file read to the end only commits its end once the pending entry has been written.
+    """
+
+    def __init__(self, checkpoint_store: CheckpointStore):
+        self.checkpoint_store = checkpoint_store
+        self.has_pending_entry = False
+        self.finished_files = [] # (source_file, inode, position, line_id) waiting for the pending entry
+
+    def entry_started(self, source_file: str, inode: int, position: int, line_id: int):
+        """A header at (position, line_id before it) started a new pending entry; the previous one was written."""
+        self.pending_entry_written()
+        self.checkpoint_store.update(source_file, inode, position, line_id)
+        self.has_pending_entry = True
+
+    def file_finished(self, source_file: str, inode: int, position: int, line_id: int):
+        """source_file was read up to position / line_id (normally its end)."""
+        if self.has_pending_entry:
+            self.finished_files.append((source_file, inode, position, line_id))
+        else:
+            self.checkpoint_store.update(source_file, inode, position, line_id)
+
+    def pending_entry_written(self):
+        for finished_file in self.finished_files:
+            self.checkpoint_store.update(*finished_file)
+        self.finished_files = []
+        self.has_pending_entry = False
@@ -1,8 +1,11 @@
 import json
 import os
+import time
 
 # Import configurations from config.py
 import config
+import solution_cache
+import metrics
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
@@ -81,33 +84,112 @@ Format your entire response as a single JSON object with the following keys:
     input_variables=["log_entry_full", "sequence_of_events_json", "context"] # <--- ADD THIS LINE
 )
 
+# --- Solution Cache (shared by all worker threads) ---
+SOLUTION_CACHE = solution_cache.SolutionCache(
+    max_entries=config.SOLUTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.SOLUTION_CACHE_TTL_SECONDS,
+    persist_path=config.SOLUTION_CACHE_FILE,
+    save_interval_seconds=config.SOLUTION_CACHE_SAVE_INTERVAL_SECONDS,
+    key_mode=config.SOLUTION_CACHE_KEY_MODE,
+)
+
 # --- Main LLM Processing Function ---
 def analyze_and_generate_solution(
     parsed_entry_metadata: dict,
     llm_instance: ChatGoogleGenerativeAI,
     retriever_instance,
-    offset_map: dict,
+    offset_map, # offset_index.OffsetMap shared with the stream
     parsed_jsonl_path: str
 ) -> dict:
     """
     Processes a single parsed log entry, retrieves context, invokes LLM, and returns structured solution.
+    With config.SOLUTION_CACHE_ENABLED, repeated problems reuse a cached solution (see solution_cache.py),
+    tagged with 'solution_cache': {'status', 'key', 'occurrence_count', 'first_seen'}.
     """
+    with metrics.ANALYSIS_SECONDS.time():
+        return _analyze_problem(parsed_entry_metadata, llm_instance, retriever_instance, offset_map, parsed_jsonl_path)
+
+
+def _analyze_problem(
+    parsed_entry_metadata: dict,
+    llm_instance: ChatGoogleGenerativeAI,
+    retriever_instance,
+    offset_map,
+    parsed_jsonl_path: str
+) -> dict:
+    """Body of analyze_and_generate_solution, timed as the "analysis" stage."""
 
     # It's generally better to import at the top of the file if possible to avoid
     # repeated imports or unexpected behavior, but for circular dependencies,
     # importing locally as you've done is a valid workaround.
-    from log_processor import get_contextual_log_sequence_from_disk
+    from log_processor import get_contextual_log_sequence_from_disk, get_cross_node_log_sequence, RECENT_ENTRIES
     # The 'config' module is already imported at the top, no need to re-import it here.
     # import config # This line is redundant here and can be removed.
 
 
-    # 1. Retrieve Contextual Sequence (from the 43GB parsed JSONL file on disk)
-    log_sequence = get_contextual_log_sequence_from_disk(
-        all_parsed_jsonl_path=parsed_jsonl_path,
-        target_entry_metadata=parsed_entry_metadata,
-        num_lines_before=config.NUM_PRECEDING_LOGS_FOR_SEQUENCE,
-        offset_map=offset_map
-    )
+    event_id = parsed_entry_metadata.get('event_id')
+    use_cache = config.SOLUTION_CACHE_ENABLED and event_id is not None
+    # A large enough burst is re-analyzed so its summary reaches the LLM (see solution_cache.SolutionCache)
+    burst_count = (parsed_entry_metadata.get('burst_summary') or {}).get('count', 1)
+
+    def retrieve_sequence():
+        # 1. Retrieve Contextual Sequence: from the recent-entry buffer for live problems,
+        # otherwise from the 43GB parsed JSONL file on disk
+        with metrics.SEQUENCE_SECONDS.time():
+            if config.CROSS_NODE_SEQUENCE_ENABLED:
+                sequence = get_cross_node_log_sequence(
+                    parsed_jsonl_path, parsed_entry_metadata, config.CROSS_NODE_SEQUENCE_EVENTS,
+                    config.CROSS_NODE_WINDOW_SECONDS, offset_map
+                )
+                if sequence:
+                    return sequence
+            if config.RECENT_ENTRIES_ENABLED:
+                sequence = RECENT_ENTRIES.get_sequence(parsed_entry_metadata, config.NUM_PRECEDING_LOGS_FOR_SEQUENCE)
+                if sequence is not None:
+                    return sequence
+            return get_contextual_log_sequence_from_disk(
+                all_parsed_jsonl_path=parsed_jsonl_path,
+                target_entry_metadata=parsed_entry_metadata,
+                num_lines_before=config.NUM_PRECEDING_LOGS_FOR_SEQUENCE,
+                offset_map=offset_map
+            )
+
+    if use_cache and SOLUTION_CACHE.key_mode == "event_id":
+        # Keyed on the template alone: a cache hit needs neither the sequence nor retrieval
+        return _mark_cached_feedback(SOLUTION_CACHE.get_or_compute(
+            solution_cache.make_cache_key(event_id),
+            lambda: _generate_solution(parsed_entry_metadata, llm_instance, retriever_instance, retrieve_sequence()),
+            burst_count
+        ))
+
+    log_sequence = retrieve_sequence()
+    if use_cache:
+        return _mark_cached_feedback(SOLUTION_CACHE.get_or_compute(
+            solution_cache.make_cache_key(event_id, log_sequence),
+            lambda: _generate_solution(parsed_entry_metadata, llm_instance, retriever_instance, log_sequence),
+            burst_count
+        ))
+    return _generate_solution(parsed_entry_metadata, llm_instance, retriever_instance, log_sequence)
+
+
+def _mark_cached_feedback(solution: dict) -> dict:
+    """
+    On a cache hit, the retrieval counts in llm_analysis_feedback are those of the earlier analysis,
+    not of the current problem (which skipped retrieval): tag them with 'retrieval_source' so they
+    are not reported as this problem's.
+    """
+    if solution.get('solution_cache', {}).get('status') == 'hit':
+        solution.setdefault('llm_analysis_feedback', {})['retrieval_source'] = 'cached_analysis'
+    return solution
+
+
+def _generate_solution(
+    parsed_entry_metadata: dict,
+    llm_instance: ChatGoogleGenerativeAI,
+    retriever_instance,
+    log_sequence: list
+) -> dict:
+    """Retrieves knowledge-base context for a problem and its log sequence, invokes the LLM and parses its JSON."""
     sequence_json_str = json.dumps(log_sequence, indent=2)
 
     # --- NEW: Capture sequence retrieval status and count ---
@@ -119,7 +201,8 @@ def analyze_and_generate_solution(
     retriever_query = f"HDFS troubleshooting for {parsed_entry_metadata.get('level', 'N/A')} log: {parsed_entry_metadata.get('event_template', '')}. Original log snippet: {parsed_entry_metadata.get('original_log_full', '')[:200]}"
 
     # 3. Retrieve relevant context from knowledge base
-    retrieved_docs = retriever_instance.invoke(retriever_query)
+    with metrics.RETRIEVAL_SECONDS.time():
+        retrieved_docs = retriever_instance.invoke(retriever_query)
     context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
 
     # --- NEW: Capture RAG retrieval count ---
@@ -129,15 +212,27 @@ def analyze_and_generate_solution(
         context_text = "No specific context found in the knowledge base. The LLM will generate a general solution."
 
     # 4. Prepare the final prompt for the LLM
+    log_entry_full = parsed_entry_metadata['original_log_full']
+    burst_summary = parsed_entry_metadata.get('burst_summary')
+    if burst_summary and burst_summary['count'] > 1:
+        # A coalesced burst: tell the LLM how widespread the problem is
+        log_entry_full += (
+            f"\n\n(This entry represents a burst of {burst_summary['count']} occurrences of the same problem "
+            f"between {burst_summary['first_timestamp']} and {burst_summary['last_timestamp']}, "
+            f"seen in: {', '.join(burst_summary['source_files'])})"
+        )
     final_prompt_for_llm = PROMPT_TEMPLATE_LLM.format(
-        log_entry_full=parsed_entry_metadata['original_log_full'],
+        log_entry_full=log_entry_full,
         sequence_of_events_json=sequence_json_str,
         context=context_text
     )
 
     # 5. Invoke the LLM directly with the prepared prompt
+    llm_started = time.perf_counter()
     try:
         llm_response = llm_instance.invoke(final_prompt_for_llm)
+        metrics.LLM_SECONDS.observe(time.perf_counter() - llm_started)
+        metrics.record_llm_usage(llm_response)
         solution_json_str = llm_response.content.strip()
 
         if solution_json_str.startswith("```json"):
@@ -154,9 +249,12 @@ def analyze_and_generate_solution(
         generated_solution['llm_analysis_feedback']['sequence_retrieved_count'] = sequence_retrieved_count
         generated_solution['llm_analysis_feedback']['rag_chunks_retrieved_count'] = rag_chunks_retrieved_count
 
+        metrics.LLM_REQUESTS.labels("ok").inc()
         return generated_solution
 
     except json.JSONDecodeError as e:
+        metrics.LLM_REQUESTS.labels("invalid_json").inc()
         return {"error": "JSON parsing failed", "raw_response_snippet": solution_json_str[:500]}
     except Exception as e:
+        metrics.LLM_REQUESTS.labels("error").inc()
         return {"error": str(e)}
\ No newline at end of file
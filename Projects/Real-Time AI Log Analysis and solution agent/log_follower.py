@@ -0,0 +1,280 @@
+import os
+import sys
+import time
+import select
+import ctypes
+import ctypes.util
+import threading
+from collections import deque
+
+# Import configurations and helper functions from other modules
+import config
+import log_processor
+import metrics
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+# --- Directory Watchers ---
+class InotifyWatcher:
+    """
+    Blocks until something changes in a directory, using Linux inotify through ctypes (no extra
+    dependency). Used by follow mode instead of busy polling.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> bool:
+        """Waits up to timeout seconds for a change. Returns True if one was signalled."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024): # Drain queued events; we re-check the files anyway
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Portable fallback: waits a fixed interval between stat checks (interruptible by the stop event)."""
+
+    def __init__(self, poll_interval_seconds: float, stop_event: threading.Event):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.stop_event = stop_event
+
+    def wait(self, timeout: float) -> bool:
+        self.stop_event.wait(min(timeout, self.poll_interval_seconds))
+        return True
+
+    def close(self):
+        pass
+
+
+def create_directory_watcher(directory: str, stop_event: threading.Event):
+    """Returns an InotifyWatcher on Linux, or a PollingWatcher where inotify is unavailable."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"WARNING: inotify unavailable ({e}). Falling back to polling every {config.FOLLOW_POLL_INTERVAL_SECONDS}s.")
+    return PollingWatcher(config.FOLLOW_POLL_INTERVAL_SECONDS, stop_event)
+
+
+# --- Per-File Tail ---
+class RawLogTail:
+    """
+    Follows one growing raw log file: reads complete new lines, assembles multi-line entries and
+    tracks what has been consumed so it can be checkpointed as (inode, byte position, line id).
+
+    Line ids keep increasing across rotation and truncation of the same source file name, so
+    (source_file, line_id) stays a unique key for the offset map.
+
+    An entry is emitted once its file has been idle for a moment (see pending_is_idle), and emitted
+    entries are never rewritten. Continuation lines arriving after that (e.g. a stack trace flushed
+    in several writes further apart than config.FOLLOW_ENTRY_FLUSH_SECONDS) cannot be attached to
+    their entry: they are counted in `late_lines` and reported, unlike the batch stream, which holds
+    each entry until the next header and so attaches them.
+    """
+
+    def __init__(self, path: str, checkpoint: dict | None = None):
+        self.path = path
+        self.source_file = os.path.basename(path)
+        self.handle = None
+        self.inode = None
+        self.position = 0 # Byte offset after the last complete line read
+        self.line_id = 0 # Id of the last complete line read
+        self.partial_line = b'' # Bytes of a line whose newline has not been written yet
+        self.pending_header_info = None # Entry being assembled (may still get continuation lines)
+        self.pending_lines = []
+        self.pending_start = (0, 0) # (position, line_id) just before the pending entry's header line
+        self.last_data_time = 0.0
+        self.late_lines = 0 # Continuation lines with no entry left to attach them to
+        self.warned_late_run = False # One warning per run of late lines
+        self._open(checkpoint)
+
+    def _open(self, checkpoint: dict | None = None):
+        self.handle = open(self.path, 'rb')
+        stat_result = os.fstat(self.handle.fileno())
+        self.inode = stat_result.st_ino
+        self.position = 0
+        self.partial_line = b''
+        if checkpoint:
+            self.line_id = checkpoint['line_id']
+            # Resume only if it is still the same file and it was not truncated underneath us
+            if checkpoint['inode'] == self.inode and checkpoint['position'] <= stat_result.st_size:
+                self.position = checkpoint['position']
+                self.handle.seek(self.position)
+        self.pending_start = (self.position, self.line_id)
+
+    def checkpoint_state(self) -> dict:
+        """Returns the resume point: everything before it has been emitted as parsed entries."""
+        position, line_id = self.pending_start if self.pending_header_info else (self.position, self.line_id)
+        return {'inode': self.inode, 'position': position, 'line_id': line_id}
+
+    def _consume_lines(self, data: bytes, read_time: float, completed_entries: list):
+        lines = (self.partial_line + data).split(b'\n')
+        self.partial_line = lines.pop() # Last element has no newline yet (b'' if data ended on one)
+
+        for line_bytes in lines:
+            line_start = (self.position, self.line_id)
+            self.position += len(line_bytes) + 1
+            self.line_id += 1
+            if line_bytes.endswith(b'\r'):
+                line_bytes = line_bytes[:-1] # Match the universal-newline text reading of the batch stream
+            raw_line = line_bytes.decode('utf-8', errors='ignore') + '\n'
+
+            header_info = log_processor.parse_log_line_hybrid_single(raw_line)
+            if header_info:
+                if self.pending_header_info:
+                    completed_entries.append((self.pending_header_info, self.pending_lines))
+                header_info['line_id_in_file_header'] = self.line_id
+                header_info['source_file'] = self.source_file
+                header_info['read_time'] = read_time
+                self.pending_header_info = header_info
+                self.pending_lines = [raw_line]
+                self.pending_start = line_start
+                self.warned_late_run = False
+            elif self.pending_header_info:
+                self.pending_lines.append(raw_line)
+            else:
+                self._late_line()
+
+    def _late_line(self):
+        """Counts a continuation line whose entry was already emitted (or that no header precedes)."""
+        self.late_lines += 1
+        metrics.RAW_LINES.inc()
+        metrics.FOLLOW_LATE_LINES.inc()
+        if not self.warned_late_run:
+            self.warned_late_run = True
+            print(f"WARNING: [Follow] {self.source_file} line {self.line_id} continues an entry that was already emitted "
+                  f"and is not attached to it. Raise FOLLOW_ENTRY_FLUSH_SECONDS if stack traces are written in pieces.")
+
+    def read_new_entries(self) -> list:
+        """Reads everything appended since the last call. Returns completed (header_info, lines) entries."""
+        completed_entries = []
+        while True:
+            data = self.handle.read(READ_CHUNK_BYTES)
+            if not data:
+                break
+            # Arrival time of these bytes: when this read first returned them (the file's mtime would be
+            # the latest write, newer than every earlier line of the chunk)
+            read_time = time.time()
+            self.last_data_time = time.monotonic()
+            self._consume_lines(data, read_time, completed_entries)
+        return completed_entries
+
+    def take_pending_entry(self) -> tuple | None:
+        """Hands over the entry being assembled (e.g. once its file has gone idle)."""
+        if not self.pending_header_info:
+            return None
+        entry = (self.pending_header_info, self.pending_lines)
+        self.pending_header_info = None
+        self.pending_lines = []
+        self.pending_start = (self.position, self.line_id)
+        return entry
+
+    def pending_is_idle(self, idle_seconds: float) -> bool:
+        if self.pending_header_info is None:
+            return False
+        if self.partial_line:
+            # The writer is mid-line (likely a continuation line); give it much longer to finish
+            idle_seconds *= 10
+        return time.monotonic() - self.last_data_time >= idle_seconds
+
+    def check_rotation(self) -> list:
+        """
+        Detects rotation (path now points to a different inode) and truncation (file shrank).
+        Drains the old file first, then reopens from the start. Returns entries completed on the way.
+        """
+        try:
+            stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            return [] # Rotated away and not recreated yet: keep reading the old handle
+
+        completed_entries = []
+        if stat_result.st_ino != self.inode:
+            completed_entries.extend(self.read_new_entries())
+            pending_entry = self.take_pending_entry()
+            if pending_entry:
+                completed_entries.append(pending_entry)
+            old_handle = self.handle
+            try:
+                self._open({'inode': None, 'position': 0, 'line_id': self.line_id})
+            except OSError:
+                return completed_entries # The new file is already gone again: keep the old handle and retry on the next check
+            old_handle.close()
+            print(f"[Follow] {self.source_file} was rotated. Reopening from the start.")
+        elif stat_result.st_size < self.position:
+            pending_entry = self.take_pending_entry()
+            if pending_entry:
+                completed_entries.append(pending_entry)
+            print(f"[Follow] {self.source_file} was truncated. Reading again from the start.")
+            self.handle.seek(0)
+            self.position = 0
+            self.partial_line = b''
+            self.pending_start = (0, self.line_id)
+        return completed_entries
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+
+# --- Write-to-Detection Latency Metric ---
+class LatencyTracker:
+    """
+    Keeps recent read-to-detection latencies (seconds) and summarizes them: from the read that first
+    returned a problem entry's header line to its detection, i.e. the wait for the entry to complete
+    plus parsing and indexing. The time between the write and that read is not included (with inotify
+    it is small; with polling up to config.FOLLOW_POLL_INTERVAL_SECONDS), so this is a lower bound on
+    write-to-detection latency.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def record(self, latency_seconds: float):
+        self.samples.append(max(latency_seconds, 0.0))
+        self.count += 1
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {'count': self.count}
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'mean': sum(ordered) / len(ordered),
+            'p50': ordered[len(ordered) // 2],
+            'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            'max': ordered[-1],
+        }
+
+    def format_summary(self) -> str:
+        stats = self.summary()
+        if stats['count'] == 0:
+            return "no problems detected yet"
+        return (f"{stats['count']} problems, read-to-detection latency mean {stats['mean'] * 1000:.0f}ms, "
+                f"p50 {stats['p50'] * 1000:.0f}ms, p95 {stats['p95'] * 1000:.0f}ms, max {stats['max'] * 1000:.0f}ms")
@@ -1,11 +1,14 @@
 import os
 import re
-import json
 import hashlib
 import pandas as pd # Used for offset_map loading if done here, but primarily in app.py
 
 # Import configurations from config.py
 import config # Contains global configurations like HDFS_HEADER_REGEX_PATTERN, NORMALIZATION_RULES, NUM_PRECEDING_LOGS_FOR_SEQUENCE
+import template_normalizer
+import sequence_reader
+import timeline
+import parsed_log_writer
 
 # --- Global Regex Patterns (from config.py) ---
 # These are compiled here for efficiency
@@ -14,10 +17,28 @@ HDFS_HEADER_REGEX = re.compile(config.HDFS_HEADER_REGEX_PATTERN)
 # Normalization Rules (from config.py)
 NORMALIZATION_RULES = config.NORMALIZATION_RULES
 
+# Staged normalization engine compiled once from the ordered rules (see template_normalizer.py)
+COMPILED_NORMALIZER = template_normalizer.CompiledNormalizer(NORMALIZATION_RULES)
+
+# Bounded cache: content signature -> (normalized template, EventId), off by default (see config.TEMPLATE_CACHE_SIZE)
+TEMPLATE_CACHE = template_normalizer.TemplateCache(
+    config.TEMPLATE_CACHE_SIZE,
+    template_normalizer.build_digit_signature_table(NORMALIZATION_RULES),
+    config.TEMPLATE_CACHE_MIN_HIT_RATE,
+    config.TEMPLATE_CACHE_PROBE_LOOKUPS
+)
+
+# Recent parsed entries per source file, filled by the stream: live problems get their sequence from memory
+RECENT_ENTRIES = sequence_reader.RecentEntryBuffer.from_config()
+
 # --- Helper Functions for Log Parsing ---
 
 def normalize_log_content(content: str) -> str:
     """Applies normalization rules to the log message content."""
+    return COMPILED_NORMALIZER.normalize(content)
+
+def normalize_log_content_sequential(content: str) -> str:
+    """Reference implementation: applies every normalization rule in order with re.sub."""
     normalized_content = content
     for regex, placeholder in NORMALIZATION_RULES:
         normalized_content = regex.sub(placeholder, normalized_content)
@@ -25,6 +46,25 @@ def normalize_log_content(content: str) -> str:
     normalized_content = re.sub(r'\s+', ' ', normalized_content).strip()
     return normalized_content
 
+def derive_event_id(normalized_template: str) -> str:
+    """Derives the stable EventId of a normalized template."""
+    event_id_hash = hashlib.md5(normalized_template.encode('utf-8')).hexdigest()[:8].upper()
+    return f'HDFS_{event_id_hash}'
+
+def _normalize_and_derive_event_id(content: str) -> tuple:
+    normalized_template = normalize_log_content(content)
+    return normalized_template, derive_event_id(normalized_template)
+
+def get_template_and_event_id(content: str) -> tuple:
+    """Returns (normalized template, EventId) for raw log content, served from TEMPLATE_CACHE when possible."""
+    return TEMPLATE_CACHE.get_or_compute(content, _normalize_and_derive_event_id)
+
+def decode_raw_line(raw_bytes: bytes) -> str:
+    """Decodes one raw log line read in binary mode like text-mode reading would ('\\r\\n' -> '\\n')."""
+    if raw_bytes.endswith(b'\r\n'):
+        raw_bytes = raw_bytes[:-2] + b'\n'
+    return raw_bytes.decode('utf-8', errors='ignore')
+
 def parse_log_line_hybrid_single(raw_line: str) -> dict | None:
     """
     Parses a single HDFS log line for its header components.
@@ -41,59 +81,51 @@ def parse_log_line_hybrid_single(raw_line: str) -> dict | None:
         "content_raw": groups.get('Content', '').strip(),
     }
 
+def _flush_parsed_output_through(all_parsed_jsonl_path: str, target_entry_metadata: dict, offset_map):
+    """
+    The entries preceding a live target may still sit in the stream's write buffer: has the writer write
+    them out before they are read from disk (the whole buffer if the target's offset is not known).
+    """
+    target_offset = offset_map.get((target_entry_metadata.get('source_file'), target_entry_metadata.get('line_id_in_file_header')))
+    parsed_log_writer.flush_through(all_parsed_jsonl_path, float('inf') if target_offset is None else target_offset)
+
 def get_contextual_log_sequence_from_disk(
     all_parsed_jsonl_path: str, # <--- CORRECTED: This parameter is needed here
     target_entry_metadata: dict, # Problematic entry's metadata: {'source_file': ..., 'line_id_in_file_header': ...}
     num_lines_before: int, 
-    offset_map: dict # The loaded (source_file, line_id) -> byte_offset map
+    offset_map # (source_file, line_id) -> byte_offset lookup: offset_index.OffsetMap / MmapOffsetIndex (or a plain dict)
 ) -> list:
     """
     Retrieves a sequence of log entries preceding a target problematic entry from the JSONL file on disk.
-    Uses the byte-offset map for efficient seeking.
+    Uses the byte-offset index to read exactly the bytes between the sequence start and the target, through
+    a shared, persistent reader (see sequence_reader.py). Entries carry only config.SEQUENCE_FIELDS.
     """
-    target_source_file = target_entry_metadata.get('source_file')
-    target_line_id = target_entry_metadata.get('line_id_in_file_header')
-
-    if not target_source_file or not isinstance(target_line_id, int):
-        # print(f"Error in get_contextual_log_sequence_from_disk: Missing 'source_file' or 'line_id_in_file_header' in target_entry_metadata.") # Avoid print in function loop
+    try:
+        _flush_parsed_output_through(all_parsed_jsonl_path, target_entry_metadata, offset_map)
+        return sequence_reader.reader_for(all_parsed_jsonl_path).read_sequence(target_entry_metadata, num_lines_before, offset_map)
+    except Exception as e:
+        # print(f"Error retrieving sequence from disk for {target_entry_metadata.get('source_file')}: {e}") # Avoid print in function loop
         return []
 
-    sequence = []
-    
-    # Calculate the start line ID for the sequence
-    start_line_id_in_file = max(1, target_line_id - num_lines_before)
-    
-    # Attempt to find the byte offset for the start of the sequence
-    # Offset map key is (source_file, line_id_in_file_header)
-    start_offset_key = (target_source_file, start_line_id_in_file)
-    start_byte_offset = offset_map.get(start_offset_key)
-
-    if start_byte_offset is None:
-        # print(f"Warning: Exact start offset for line {start_line_id_in_file} in {target_source_file} not found in offset map. Returning empty sequence.") # Avoid print in function loop
-        return [] 
-
+def get_cross_node_log_sequence(
+    all_parsed_jsonl_path: str,
+    target_entry_metadata: dict, # Problematic entry's metadata, including its 'timestamp'
+    num_events: int,
+    window_seconds: float,
+    offset_map
+) -> list:
+    """
+    Retrieves the entries of all source files (nodes) preceding a target problematic entry within window_seconds,
+    merged by timestamp (see timeline.py): live entries from RECENT_ENTRIES, older ones via the secondary index.
+    Entries carry config.SEQUENCE_FIELDS plus source_file.
+    """
+    if not config.SECONDARY_INDEX_ENABLED:
+        return [] # Without a maintained index the whole JSONL would be decoded as its unindexed tail
     try:
-        with open(all_parsed_jsonl_path, 'r', encoding='utf-8', errors='ignore') as f:
-            f.seek(start_byte_offset) 
-
-            lines_read_from_seek = 0
-            for line in f:
-                if lines_read_from_seek >= num_lines_before + 5: # Read a bit extra to be safe
-                    break 
-                try:
-                    parsed_seq_entry = json.loads(line)
-                    if (parsed_seq_entry.get('source_file') == target_source_file and 
-                        parsed_seq_entry.get('line_id_in_file_header', 0) < target_line_id):
-                        sequence.append(parsed_seq_entry)
-                    lines_read_from_seek += 1
-                except json.JSONDecodeError:
-                    pass 
-
-        sequence.sort(key=lambda x: x.get('line_id_in_file_header', 0))
-        sequence = sequence[-num_lines_before:] 
-
+        recent_entries = RECENT_ENTRIES if config.RECENT_ENTRIES_ENABLED else None
+        _flush_parsed_output_through(all_parsed_jsonl_path, target_entry_metadata, offset_map)
+        return timeline.timeline_for(config.SECONDARY_INDEX_DIR, all_parsed_jsonl_path, recent_entries).preceding_entries(
+            target_entry_metadata, num_events, window_seconds, offset_map
+        )
     except Exception as e:
-        # print(f"Error retrieving sequence from disk for {target_source_file} line {target_line_id}: {e}") # Avoid print in function loop
         return []
-
-    return sequence
\ No newline at end of file
@@ -0,0 +1,446 @@
+"""
+In-process metrics for the log agent: counters, histograms and the stats() of the caches and queues,
+served in Prometheus text format on a local HTTP endpoint, plus an optional sampling profiler.
+
+Hot paths hold on to a labelled child (e.g. WRITE_SECONDS) so recording is one lock and an add; per raw
+line only a plain counter is kept, added to RAW_LINES in batches.
+"""
+import os
+import sys
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Import configurations from config.py
+import config
+
+# Upper bounds (seconds) of the latency histograms: 0.1 ms (an entry written) up to a minute (a slow LLM call)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Metric Types ---
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float):
+        with self.lock:
+            self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        self.bucket_counts = [0] * (len(upper_bounds) + 1) # Last slot: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        bucket = bisect.bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.bucket_counts[bucket] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> "_Timer":
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def snapshot(self) -> tuple:
+        with self.lock:
+            return list(self.bucket_counts), self.sum, self.count
+
+
+class _Timer:
+    def __init__(self, histogram_child: _HistogramChild):
+        self.histogram_child = histogram_child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram_child.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metric:
+    """
+    A named metric with optional labels. labels(*values) returns the child for one label combination
+    (created on first use); without labels the metric records directly (inc / set / observe).
+    """
+    TYPE = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children = {} # label values -> child
+        self.lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *label_values):
+        child = self.children.get(label_values)
+        if child is not None:
+            return child
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {label_values}")
+        with self.lock:
+            child = self.children.setdefault(tuple(str(value) for value in label_values), self._new_child())
+            self.children.setdefault(label_values, child) # Alias for non-string label values, skipped when rendering
+        return child
+
+    def _items(self) -> list:
+        with self.lock:
+            return sorted((label_values, child) for label_values, child in self.children.items()
+                          if all(type(value) is str for value in label_values))
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for label_values, child in self._items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(child.value)}")
+        return lines
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, child in self._items():
+            bucket_counts, total, count = child.snapshot()
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.upper_bounds + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(upper_bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# --- Registry ---
+class MetricsRegistry:
+    """
+    Holds the metrics and the stats() sources exported at scrape time. A stats source is a callable
+    returning the usual stats() dict of a component (cache, queue, ...); its numbers become gauges named
+    <prefix>_<key>, and nested per-level / per-name dicts become labelled gauges.
+    """
+
+    def __init__(self):
+        self.metrics = {} # name -> Metric, in registration order
+        self.stats_sources = {} # prefix -> (stats function, label name)
+        self.lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def register_stats(self, prefix: str, stats_function, label_name: str = "key"):
+        """Exports stats_function() at every scrape (replaces an earlier source with the same prefix)."""
+        with self.lock:
+            self.stats_sources[prefix] = (stats_function, label_name)
+
+    def unregister_stats(self, prefix: str):
+        with self.lock:
+            self.stats_sources.pop(prefix, None)
+
+    def _render_stats(self, prefix: str, stats_function, label_name: str) -> list:
+        try:
+            stats = stats_function()
+        except Exception as e:
+            return [f"# {prefix}: stats unavailable ({type(e).__name__}: {e})"]
+
+        samples = {} # metric name -> list of (labels, value)
+        for key, value in stats.items():
+            if isinstance(value, bool) or value is None:
+                continue
+            if isinstance(value, (int, float)):
+                samples.setdefault(f"{prefix}_{key}", []).append(("", value))
+            elif isinstance(value, dict):
+                for label_value, inner in value.items():
+                    label = f'{label_name}="{_escape_label_value(label_value)}"'
+                    if isinstance(inner, (int, float)) and not isinstance(inner, bool):
+                        samples.setdefault(f"{prefix}_{key}", []).append(("{" + label + "}", inner))
+                    elif isinstance(inner, dict):
+                        for inner_key, inner_value in inner.items():
+                            if isinstance(inner_value, (int, float)) and not isinstance(inner_value, bool):
+                                samples.setdefault(f"{prefix}_{key}_{inner_key}", []).append(("{" + label + "}", inner_value))
+
+        lines = []
+        for name, name_samples in samples.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for labels, value in name_samples)
+        return lines
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            stats_sources = list(self.stats_sources.items())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, (stats_function, label_name) in stats_sources:
+            lines.extend(self._render_stats(prefix, stats_function, label_name))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Pipeline Metrics ---
+RAW_LINES = REGISTRY.counter("log_agent_raw_lines_total", "Raw log lines read by ingestion")
+FOLLOW_LATE_LINES = REGISTRY.counter("log_agent_follow_late_lines_total", "Follow mode: continuation lines arriving after their entry was emitted")
+PARSED_ENTRIES = REGISTRY.counter("log_agent_parsed_entries_total", "Logical log entries parsed and indexed", ("level",))
+PROBLEMS_DETECTED = REGISTRY.counter("log_agent_problems_detected_total", "Entries at a level that needs analysis", ("level",))
+STAGE_SECONDS = REGISTRY.histogram("log_agent_stage_seconds", "Latency of one item in a pipeline stage", ("stage",))
+SOLUTIONS = REGISTRY.counter("log_agent_solutions_total", "Analysis results written by the LLM worker", ("outcome",))
+LLM_REQUESTS = REGISTRY.counter("log_agent_llm_requests_total", "LLM calls by outcome (ok, invalid_json, error)", ("outcome",))
+LLM_TOKENS = REGISTRY.counter("log_agent_llm_tokens_total", "LLM tokens reported by the model (input, output)", ("kind",))
+
+# Stage children used on hot paths
+NORMALIZE_SECONDS = STAGE_SECONDS.labels("normalize") # Template + EventId of one entry
+WRITE_SECONDS = STAGE_SECONDS.labels("write") # JSONL + offset index append of one entry
+ENQUEUE_SECONDS = STAGE_SECONDS.labels("enqueue") # Handing a problem to the coalescer / problem_queue (incl. backpressure)
+DETECTION_SECONDS = STAGE_SECONDS.labels("detection") # Follow mode: raw read to problem detection (a lower bound from the write)
+SEQUENCE_SECONDS = STAGE_SECONDS.labels("sequence") # Preceding-sequence lookup on disk
+RETRIEVAL_SECONDS = STAGE_SECONDS.labels("retrieval") # Knowledge-base retrieval
+LLM_SECONDS = STAGE_SECONDS.labels("llm") # One LLM call
+ANALYSIS_SECONDS = STAGE_SECONDS.labels("analysis") # Whole analysis of one problem (cached or not)
+
+
+def record_llm_usage(llm_response):
+    """Counts the tokens of an LLM reply where the model reports them (LangChain usage_metadata)."""
+    usage = getattr(llm_response, 'usage_metadata', None) or {}
+    if usage.get('input_tokens'):
+        LLM_TOKENS.labels("input").inc(usage['input_tokens'])
+    if usage.get('output_tokens'):
+        LLM_TOKENS.labels("output").inc(usage['output_tokens'])
+
+
+# --- Sampling Profiler ---
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread each `interval_seconds` and counts identical stacks.
+    collapsed() returns them in the folded format flame graph tools read ("thread;outer;...;inner count").
+    Sampling costs one sys._current_frames() walk per interval, so it can stay on under load.
+    """
+
+    def __init__(self, interval_seconds: float = 0.01, output_path: str = None):
+        self.interval_seconds = interval_seconds
+        self.output_path = output_path
+        self.stack_counts = {}
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_config(cls) -> "SamplingProfiler":
+        return cls(config.PROFILER_SAMPLE_INTERVAL_SECONDS, config.PROFILER_OUTPUT_FILE)
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            frames.append(thread_names.get(ident, f"thread-{ident}"))
+            stacks.append(";".join(reversed(frames)))
+        with self.lock:
+            self.samples += 1
+            for stack in stacks:
+                self.stack_counts[stack] = self.stack_counts.get(stack, 0) + 1
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            self._sample()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops sampling and writes the collapsed stacks to output_path (if set)."""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        if self.output_path:
+            os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+            tmp_path = self.output_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f_profile:
+                f_profile.write(self.collapsed())
+            os.replace(tmp_path, self.output_path)
+            print(f"Profile ({self.samples} samples) written to {self.output_path}")
+
+    def collapsed(self) -> str:
+        with self.lock:
+            items = sorted(self.stack_counts.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def format_top(self, limit: int = 15) -> str:
+        """The functions most often on top of a stack (where threads spend their time), as text lines."""
+        with self.lock:
+            leaf_counts = {}
+            for stack, count in self.stack_counts.items():
+                leaf = stack.rsplit(";", 1)[-1]
+                leaf_counts[leaf] = leaf_counts.get(leaf, 0) + count
+            total = sum(leaf_counts.values())
+        ranked = sorted(leaf_counts.items(), key=lambda item: -item[1])[:limit]
+        return "\n".join(f"{count / total:6.1%}  {leaf}" for leaf, count in ranked) if total else "(no samples)"
+
+
+# --- HTTP Endpoint ---
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Request handler; the registry is taken from the server (self.server.registry)."""
+
+    def _reply(self, status: int, body: str, content_type: str = "text/plain; charset=utf-8"):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._reply(200, self.server.registry.render(), PROMETHEUS_CONTENT_TYPE)
+        elif url.path == "/debug/profile":
+            # On-demand profile: samples for ?seconds=N (default 5), then returns the collapsed stacks
+            try:
+                seconds = float(parse_qs(url.query).get('seconds', ['5'])[0])
+            except ValueError:
+                self._reply(400, "seconds must be a number\n")
+                return
+            seconds = min(max(seconds, 0.1), config.PROFILER_MAX_REQUEST_SECONDS)
+            profiler = SamplingProfiler(config.PROFILER_SAMPLE_INTERVAL_SECONDS)
+            profiler.start()
+            time.sleep(seconds)
+            profiler.stop()
+            self._reply(200, profiler.collapsed())
+        else:
+            self._reply(404, "Not found. Try /metrics or /debug/profile?seconds=5\n")
+
+    def log_message(self, format, *args):
+        pass # Scrapes would otherwise print a line each
+
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics (and /debug/profile) from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, registry: MetricsRegistry = None) -> "MetricsServer":
+        return cls(registry or REGISTRY, config.METRICS_HOST, config.METRICS_PORT)
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = self.registry
+        self.port = self.httpd.server_address[1] # Actual port when 0 was requested
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+        print(f"Metrics endpoint: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join()
+            self.httpd = None
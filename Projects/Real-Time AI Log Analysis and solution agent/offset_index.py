@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import threading
+from array import array
+
+# --- On-Disk Byte-Offset Index Format ---
+# The index is a directory:
+#   files.json          -> {"version": 1, "files": ["<source_file>", ...]}  (file id = position in the list)
+#   <file_id>.offsets   -> fixed-width little-endian uint64 records, one per raw line of that source file.
+#                          Record k holds (byte offset of line_id k+1 in the parsed JSONL) + 1; 0 means "no entry"
+#                          (a continuation line, or not indexed yet).
+# Lookups are a direct read at (line_id - 1) * 8 of a memory-mapped file, so opening the index costs
+# O(number of source files) and only the pages actually looked up become resident.
+
+INDEX_FORMAT_VERSION = 1
+FILES_TABLE_NAME = "files.json"
+RECORD = struct.Struct('<Q')
+RECORD_SIZE = RECORD.size
+
+
+def _records_path(index_dir: str, file_id: int) -> str:
+    return os.path.join(index_dir, f"{file_id:05d}.offsets")
+
+def load_files_table(index_dir: str) -> list:
+    """Returns the interned source file names (file id = list position), or [] if the index has none."""
+    table_path = os.path.join(index_dir, FILES_TABLE_NAME)
+    if not os.path.exists(table_path):
+        return []
+    with open(table_path, 'r', encoding='utf-8') as f_table:
+        table = json.load(f_table)
+    if table.get('version') != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported offset index version {table.get('version')} in {table_path}")
+    return list(table['files'])
+
+def _save_files_table(index_dir: str, files: list):
+    """Writes the files table atomically so readers never see a partial table."""
+    table_path = os.path.join(index_dir, FILES_TABLE_NAME)
+    tmp_path = table_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f_table:
+        json.dump({'version': INDEX_FORMAT_VERSION, 'files': files}, f_table)
+    os.replace(tmp_path, table_path)
+
+def index_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, FILES_TABLE_NAME))
+
+def truncate_index(index_dir: str, parsed_jsonl_size: int) -> int:
+    """
+    Drops the records pointing at or past parsed_jsonl_size (entries of a parsed JSONL that was truncated
+    back to that size), so the index never serves offsets of discarded entries. A file's records hold
+    increasing offsets, so only its tail is scanned. Returns the number of record slots removed.
+    """
+    removed = 0
+    for file_id in range(len(load_files_table(index_dir))):
+        path = _records_path(index_dir, file_id)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r+b') as f_records:
+            record_count = os.path.getsize(path) // RECORD_SIZE
+            keep = record_count
+            while keep:
+                # Walk back in blocks until a record inside the restored JSONL is found
+                block_start = max(0, keep - 65536)
+                f_records.seek(block_start * RECORD_SIZE)
+                block = array('Q')
+                block.frombytes(f_records.read((keep - block_start) * RECORD_SIZE))
+                if sys.byteorder == 'big':
+                    block.byteswap() # Records are little-endian
+                position = len(block)
+                while position and not 0 < block[position - 1] <= parsed_jsonl_size:
+                    position -= 1 # Stored values are byte_offset + 1 (0 = no entry)
+                keep = block_start + position
+                if position:
+                    break
+            if keep < record_count or os.path.getsize(path) % RECORD_SIZE:
+                f_records.truncate(keep * RECORD_SIZE)
+                removed += record_count - keep
+    return removed
+
+
+# --- Writer ---
+class OffsetIndexWriter:
+    """Appends (source_file, line_id) -> byte_offset records to an on-disk offset index directory."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        self.files = load_files_table(index_dir)
+        self.file_ids = {name: file_id for file_id, name in enumerate(self.files)}
+        self.handles = {} # file_id -> open binary handle
+        self.record_counts = {} # file_id -> number of records currently in that file
+
+    def _handle_for(self, source_file: str) -> tuple:
+        file_id = self.file_ids.get(source_file)
+        if file_id is None:
+            file_id = len(self.files)
+            self.files.append(source_file)
+            self.file_ids[source_file] = file_id
+            _save_files_table(self.index_dir, self.files)
+
+        handle = self.handles.get(file_id)
+        if handle is None:
+            path = _records_path(self.index_dir, file_id)
+            handle = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+            handle.seek(0, os.SEEK_END)
+            self.handles[file_id] = handle
+            self.record_counts[file_id] = handle.tell() // RECORD_SIZE
+        return file_id, handle
+
+    def add(self, source_file: str, line_id: int, byte_offset: int):
+        """Records the byte offset of line_id (1-based) in source_file."""
+        file_id, handle = self._handle_for(source_file)
+        record_count = self.record_counts[file_id]
+        record = RECORD.pack(byte_offset + 1)
+
+        if line_id > record_count:
+            # Usual case: append, zero-filling the gap left by continuation lines
+            gap = line_id - 1 - record_count
+            handle.write(b'\0' * (gap * RECORD_SIZE) + record if gap else record)
+            self.record_counts[file_id] = line_id
+        else:
+            # Re-indexing an existing line: overwrite in place, then return to the end
+            handle.seek((line_id - 1) * RECORD_SIZE)
+            handle.write(record)
+            handle.seek(record_count * RECORD_SIZE)
+
+    def flush(self):
+        for handle in self.handles.values():
+            handle.flush()
+
+    def sync(self):
+        self.flush()
+        for handle in self.handles.values():
+            os.fsync(handle.fileno())
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- Memory-Mapped Reader ---
+class MmapOffsetIndex:
+    """
+    Read-only view of an on-disk offset index. Supports the same `get((source_file, line_id))`
+    lookup as the old offset_map dict. Record files are mapped lazily and re-mapped when they grow,
+    so entries appended by a live writer become visible once flushed.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.file_ids = {}
+        self.maps = {} # file_id -> (mmap or None, mapped length in bytes)
+        self.lock = threading.Lock()
+        self._reload_files_table()
+
+    def _reload_files_table(self):
+        self.file_ids = {name: file_id for file_id, name in enumerate(load_files_table(self.index_dir))}
+
+    def _mapping_covering(self, file_id: int, position: int):
+        """Returns an mmap of file_id covering [position, position + RECORD_SIZE), or None."""
+        mapped, mapped_length = self.maps.get(file_id, (None, 0))
+        if position + RECORD_SIZE <= mapped_length:
+            return mapped
+
+        path = _records_path(self.index_dir, file_id)
+        try:
+            current_length = os.path.getsize(path)
+        except OSError:
+            return None
+        current_length -= current_length % RECORD_SIZE # Ignore a torn trailing record
+        if position + RECORD_SIZE > current_length:
+            return None
+
+        # The file grew since it was mapped: map it again at its new size
+        if mapped is not None:
+            mapped.close()
+        with open(path, 'rb') as f_records:
+            mapped = mmap.mmap(f_records.fileno(), current_length, access=mmap.ACCESS_READ)
+        self.maps[file_id] = (mapped, current_length)
+        return mapped
+
+    def get(self, key: tuple, default=None):
+        """Returns the byte offset for (source_file, line_id), or default if it is not indexed."""
+        source_file, line_id = key
+        if not isinstance(line_id, int) or line_id < 1:
+            return default
+        with self.lock:
+            file_id = self.file_ids.get(source_file)
+            if file_id is None:
+                self._reload_files_table() # The file may have been added after we opened the index
+                file_id = self.file_ids.get(source_file)
+                if file_id is None:
+                    return default
+            position = (line_id - 1) * RECORD_SIZE
+            mapped = self._mapping_covering(file_id, position)
+            if mapped is None:
+                return default
+            stored = RECORD.unpack_from(mapped, position)[0]
+        return stored - 1 if stored else default
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.get(key) is not None
+
+    def source_files(self) -> list:
+        return list(self.file_ids)
+
+    def max_line_id(self, source_file: str) -> int:
+        """Returns the highest line id with a record slot for source_file (0 if unknown)."""
+        file_id = self.file_ids.get(source_file)
+        if file_id is None:
+            return 0
+        try:
+            return os.path.getsize(_records_path(self.index_dir, file_id)) // RECORD_SIZE
+        except OSError:
+            return 0
+
+    def close(self):
+        with self.lock:
+            for mapped, _ in self.maps.values():
+                if mapped is not None:
+                    mapped.close()
+            self.maps.clear()
+
+
+# --- Compact In-Memory Offset Map ---
+class CompactOffsetMap:
+    """
+    In-memory (source_file, line_id) -> byte_offset map with the same layout as the on-disk index:
+    source file names are interned to integer ids and each file owns a growable array('Q') holding
+    byte_offset + 1 (0 = no entry). That is 8 bytes per raw line instead of a str reference, an int
+    and a tuple per entry in a dict. A file's array starts at the first line id indexed in this run,
+    not at 1: a resumed file keeps numbering lines where it stopped, and its earlier lines are
+    served by the persisted index.
+    Appends come from the stream thread and reads from the worker thread; single array operations
+    and the (first_line_id, array) swaps are atomic under the GIL, so no lock is needed.
+    """
+
+    def __init__(self):
+        self.file_ids = {}
+        self.files = []
+        self.offsets = [] # file_id -> (first_line_id, array('Q'))
+        self.entry_count = 0
+
+    def intern(self, source_file: str) -> int:
+        """Returns the integer id of source_file, assigning the next id on first use."""
+        file_id = self.file_ids.get(source_file)
+        if file_id is None:
+            file_id = len(self.files)
+            self.files.append(source_file)
+            self.offsets.append((1, array('Q')))
+            self.file_ids[source_file] = file_id
+        return file_id
+
+    def __setitem__(self, key: tuple, byte_offset: int):
+        source_file, line_id = key
+        file_id = self.intern(source_file)
+        first_line_id, file_offsets = self.offsets[file_id]
+        if not file_offsets:
+            first_line_id = line_id
+            self.offsets[file_id] = (first_line_id, file_offsets)
+        elif line_id < first_line_id:
+            # An entry before the array's start (not expected from the stream): re-base the array
+            rebased = array('Q', bytes((first_line_id - line_id) * file_offsets.itemsize))
+            rebased.extend(file_offsets)
+            first_line_id, file_offsets = line_id, rebased
+            self.offsets[file_id] = (first_line_id, file_offsets)
+        slot = line_id - first_line_id
+        if slot < len(file_offsets):
+            if not file_offsets[slot]:
+                self.entry_count += 1
+            file_offsets[slot] = byte_offset + 1
+            return
+        gap = slot - len(file_offsets)
+        if gap:
+            # Continuation lines have no entry of their own; leave their slots empty
+            file_offsets.frombytes(bytes(gap * file_offsets.itemsize))
+        file_offsets.append(byte_offset + 1)
+        self.entry_count += 1
+
+    def get(self, key: tuple, default=None):
+        source_file, line_id = key
+        file_id = self.file_ids.get(source_file)
+        if file_id is None or not isinstance(line_id, int):
+            return default
+        first_line_id, file_offsets = self.offsets[file_id]
+        slot = line_id - first_line_id
+        if slot < 0 or slot >= len(file_offsets):
+            return default
+        stored = file_offsets[slot]
+        return stored - 1 if stored else default
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def items(self):
+        """Yields ((source_file, line_id), byte_offset) for every entry, grouped by file."""
+        for file_id, (first_line_id, file_offsets) in enumerate(self.offsets):
+            source_file = self.files[file_id]
+            for slot, stored in enumerate(file_offsets):
+                if stored:
+                    yield (source_file, first_line_id + slot), stored - 1
+
+    @staticmethod
+    def _last_line_id(first_line_id: int, file_offsets: array) -> int:
+        return first_line_id + len(file_offsets) - 1 if file_offsets else 0
+
+    def max_line_id(self, source_file: str = None) -> int:
+        """Highest line id with a slot, for one source file or across all of them."""
+        if source_file is not None:
+            file_id = self.file_ids.get(source_file)
+            return 0 if file_id is None else self._last_line_id(*self.offsets[file_id])
+        return max((self._last_line_id(*file_span) for file_span in self.offsets), default=0)
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the offset arrays (excluding the small interning tables)."""
+        return sum(file_offsets.buffer_info()[1] * file_offsets.itemsize for _, file_offsets in self.offsets)
+
+    def clear(self):
+        self.file_ids = {}
+        self.files = []
+        self.offsets = []
+        self.entry_count = 0
+
+
+# --- Shared Offset Map (live entries + persisted index) ---
+class OffsetMap:
+    """
+    The (source_file, line_id) -> byte_offset map shared by the stream and the LLM worker.
+    Entries indexed during this run live in a CompactOffsetMap; entries from earlier runs are served
+    from an attached MmapOffsetIndex instead of being loaded into memory at startup.
+    """
+
+    def __init__(self):
+        self.live = CompactOffsetMap()
+        self.persisted = None
+
+    def attach_persisted_index(self, index_dir: str) -> bool:
+        """Attaches the on-disk index at index_dir (if present). Returns True if an index is attached."""
+        if self.persisted is None and index_exists(index_dir):
+            self.persisted = MmapOffsetIndex(index_dir)
+        return self.persisted is not None
+
+    def __setitem__(self, key: tuple, byte_offset: int):
+        self.live[key] = byte_offset
+
+    def get(self, key: tuple, default=None):
+        byte_offset = self.live.get(key)
+        if byte_offset is None and self.persisted is not None:
+            byte_offset = self.persisted.get(key)
+        return default if byte_offset is None else byte_offset
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def max_line_id(self) -> int:
+        """Highest line id known across all source files (live and persisted)."""
+        max_line_id = self.live.max_line_id()
+        if self.persisted is not None:
+            for source_file in self.persisted.source_files():
+                max_line_id = max(max_line_id, self.persisted.max_line_id(source_file))
+        return max_line_id
+
+    def clear(self):
+        self.live.clear()
+        if self.persisted is not None:
+            self.persisted.close()
+            self.persisted = None
@@ -55,8 +55,9 @@ def format_solution_for_display(solution: dict) -> str:
     formatted_output.append(f"  Confidence Level: {feedback.get('confidence_level', 'N/A')}")
     formatted_output.append(f"  Context Sufficiency: {feedback.get('context_sufficiency', 'N/A')}")
     formatted_output.append(f"  Needed Additional Info: {feedback.get('needed_additional_info', 'N/A')}")
-    formatted_output.append(f"  Sequence Retrieval Status: {feedback.get('sequence_retrieval_status', 'N/A')} ({feedback.get('sequence_retrieved_count', 'N/A')} entries)")
-    formatted_output.append(f"  RAG Chunks Retrieved: {feedback.get('rag_chunks_retrieved_count', 'N/A')}")
+    retrieval_note = " (from the cached analysis)" if feedback.get('retrieval_source') == 'cached_analysis' else ""
+    formatted_output.append(f"  Sequence Retrieval Status: {feedback.get('sequence_retrieval_status', 'N/A')} ({feedback.get('sequence_retrieved_count', 'N/A')} entries){retrieval_note}")
+    formatted_output.append(f"  RAG Chunks Retrieved: {feedback.get('rag_chunks_retrieved_count', 'N/A')}{retrieval_note}")
     formatted_output.append("-" * 40)
 
     return "\n".join(formatted_output)
\ No newline at end of file
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import threading
+
+# Import configurations, the offset index writer and the optional columnar store / secondary index writers
+import config
+import offset_index
+import columnar_store
+import secondary_index
+
+
+class ParsedLogWriter:
+    """
+    Output stage for parsed log entries: appends them to the parsed JSONL and records their byte
+    offsets in the on-disk offset index.
+
+    Entries are serialized into an in-memory byte buffer and written with one syscall per batch.
+    Byte offsets are tracked from the file size at open plus the bytes written since, so no `tell()`
+    is needed. The buffer is flushed when it exceeds `buffer_bytes` or when `flush_interval_seconds`
+    has passed since the last flush (checked on each write), and on `flush()` / `close()`.
+
+    With a columnar store directory (by default if config.COLUMNAR_STORE_ENABLED) every entry is also added
+    to the columnar store. Its blocks are completed on `sync()`, so each ingestion checkpoint falls on a
+    block boundary, and blocks past the JSONL size at open (output undone by a checkpoint restore) are dropped.
+    Likewise with a secondary index directory (by default if config.SECONDARY_INDEX_ENABLED): entries are posted
+    to the secondary index, in batches written after their JSONL bytes.
+
+    Readers in other threads that need entries still in the buffer call flush_through() (the module function),
+    so problems do not force a flush each: the buffer is written early only when a disk read actually needs it.
+    """
+
+    def __init__(
+        self,
+        parsed_jsonl_path: str,
+        offset_index_dir: str,
+        buffer_bytes: int = None,
+        flush_interval_seconds: float = None,
+        columnar_store_dir: str = None,
+        secondary_index_dir: str = None
+    ):
+        self.buffer_bytes = config.PARSED_WRITE_BUFFER_BYTES if buffer_bytes is None else buffer_bytes
+        self.flush_interval_seconds = config.PARSED_WRITE_FLUSH_INTERVAL_SECONDS if flush_interval_seconds is None else flush_interval_seconds
+
+        # Unbuffered binary append: our own buffer decides when bytes reach the file
+        self.f_parsed_jsonl = open(parsed_jsonl_path, 'ab', buffering=0)
+        self.file_offset = os.fstat(self.f_parsed_jsonl.fileno()).st_size # Offset of the first buffered byte
+        self.buffer = bytearray()
+        self.lock = threading.Lock() # Serializes the stream's writes with flushes requested by readers
+        self.offset_writer = offset_index.OffsetIndexWriter(offset_index_dir)
+        if columnar_store_dir is None and config.COLUMNAR_STORE_ENABLED:
+            columnar_store_dir = config.COLUMNAR_STORE_DIR
+        self.columnar_writer = None
+        if columnar_store_dir:
+            self.columnar_writer = columnar_store.ColumnarLogWriter.from_config(columnar_store_dir)
+            self.columnar_writer.truncate_to(self.file_offset)
+        if secondary_index_dir is None and config.SECONDARY_INDEX_ENABLED:
+            secondary_index_dir = config.SECONDARY_INDEX_DIR
+        self.secondary_writer = None
+        if secondary_index_dir:
+            self.secondary_writer = secondary_index.SecondaryIndexWriter.from_config(parsed_jsonl_path, self.file_offset, secondary_index_dir)
+        self.last_flush_time = time.monotonic()
+        self.parsed_jsonl_key = os.path.abspath(parsed_jsonl_path)
+        with _OPEN_WRITERS_LOCK:
+            _OPEN_WRITERS[self.parsed_jsonl_key] = self
+
+    def write(self, parsed_entry: dict) -> int:
+        """Buffers one parsed entry and returns the byte offset it will occupy in the JSONL file."""
+        with self.lock:
+            byte_offset = self.file_offset + len(self.buffer)
+            self.buffer += json.dumps(parsed_entry).encode('utf-8')
+            self.buffer += b'\n'
+            self.offset_writer.add(parsed_entry['source_file'], parsed_entry['line_id_in_file_header'], byte_offset)
+            if self.columnar_writer is not None:
+                self.columnar_writer.add(parsed_entry, self.file_offset + len(self.buffer))
+            if self.secondary_writer is not None:
+                self.secondary_writer.add(parsed_entry, byte_offset, self.file_offset + len(self.buffer))
+
+            if len(self.buffer) >= self.buffer_bytes or time.monotonic() - self.last_flush_time >= self.flush_interval_seconds:
+                self._flush_buffer()
+        return byte_offset
+
+    def flush(self):
+        """Writes all buffered entries (and their index records) to disk."""
+        with self.lock:
+            self._flush_buffer()
+
+    def flush_through(self, byte_offset: int):
+        """Makes sure every byte before byte_offset is written to the JSONL (flushing the buffer if needed)."""
+        with self.lock:
+            if self.file_offset < byte_offset:
+                self._flush_buffer()
+
+    def _flush_buffer(self):
+        if self.buffer:
+            view = memoryview(self.buffer)
+            written = 0
+            while written < len(view): # Raw writes may be partial
+                written += self.f_parsed_jsonl.write(view[written:])
+            view.release()
+            self.file_offset += len(self.buffer)
+            self.buffer.clear()
+            self.offset_writer.flush()
+            if self.secondary_writer is not None:
+                self.secondary_writer.maybe_flush()
+        self.last_flush_time = time.monotonic()
+
+    def sync(self):
+        """Flushes and fsyncs the JSONL, the offset index and the columnar store, e.g. before an ingestion checkpoint is saved."""
+        with self.lock:
+            self._flush_buffer()
+            os.fsync(self.f_parsed_jsonl.fileno())
+            self.offset_writer.sync()
+            if self.columnar_writer is not None:
+                self.columnar_writer.sync()
+
+    def close(self):
+        with _OPEN_WRITERS_LOCK:
+            if _OPEN_WRITERS.get(self.parsed_jsonl_key) is self:
+                del _OPEN_WRITERS[self.parsed_jsonl_key]
+        try:
+            self.flush()
+        finally:
+            self.f_parsed_jsonl.close()
+            self.offset_writer.close()
+            if self.columnar_writer is not None:
+                self.columnar_writer.close()
+            if self.secondary_writer is not None:
+                self.secondary_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- Open Writers (for flushes requested by readers) ---
+_OPEN_WRITERS = {} # absolute parsed JSONL path -> its open ParsedLogWriter in this process
+_OPEN_WRITERS_LOCK = threading.Lock()
+
+def flush_through(parsed_jsonl_path: str, byte_offset: int):
+    """
+    Makes sure the entries before byte_offset in parsed_jsonl_path are on disk, if a writer in this process
+    still buffers them. Called by disk readers before reading up to a target entry.
+    """
+    with _OPEN_WRITERS_LOCK:
+        writer = _OPEN_WRITERS.get(os.path.abspath(parsed_jsonl_path))
+    if writer is not None:
+        writer.flush_through(byte_offset)
@@ -0,0 +1,130 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+
+# Import configurations from config.py
+import config
+
+
+class BurstCoalescer:
+    """
+    Windowed aggregation stage between problem detection and problem_queue.
+
+    Problems are grouped by (level, event_id, component). The first problem of a group is forwarded at
+    once, so an isolated problem reaches problem_queue without delay, and opens a window of
+    `window_seconds`. Later duplicates within the window are folded: when the window ends they are
+    forwarded as one item, the first duplicate (the representative) with a 'burst_summary' added to
+    its parsed_entry_metadata:
+        {'count', 'first_timestamp', 'last_timestamp', 'source_files', 'window_seconds'}
+    counting the duplicates only. Each level/template/component gets its own window starting at its
+    first occurrence, so a storm of N identical errors costs at most two LLM analyses per window
+    instead of N.
+
+    Memory stays bounded: at most `max_groups` groups are open (the oldest is forwarded early beyond
+    that), and forwarding uses a blocking put, so a bounded problem_queue pushes back on detection.
+    Exposes put() like queue.Queue, so it can be handed to the stream in place of problem_queue.
+    """
+
+    def __init__(self, problem_queue: queue.Queue, window_seconds: float, max_groups: int):
+        self.problem_queue = problem_queue
+        self.window_seconds = window_seconds
+        self.max_groups = max_groups
+        self.groups = OrderedDict() # (level, event_id, component) -> group dict, oldest first
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.problems_received = 0
+        self.problems_forwarded = 0
+        self.flusher_thread = threading.Thread(target=self._flush_expired_loop, name="burst-coalescer", daemon=True)
+        self.flusher_thread.start()
+
+    @classmethod
+    def from_config(cls, problem_queue: queue.Queue) -> "BurstCoalescer":
+        return cls(problem_queue, config.PROBLEM_COALESCING_WINDOW_SECONDS, config.PROBLEM_COALESCING_MAX_GROUPS)
+
+    def put(self, problem_context: dict):
+        """Forwards the first problem of a burst group at once; folds later ones into the group's summary."""
+        metadata = problem_context['parsed_entry_metadata']
+        key = (metadata.get('level'), metadata.get('event_id'), metadata.get('component'))
+        overflow = []
+        with self.lock:
+            self.problems_received += 1
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = {'opened_at': time.monotonic(), 'count': 0, 'problem_context': None}
+                while len(self.groups) > self.max_groups:
+                    overflow.append(self.groups.popitem(last=False)[1])
+            elif group['count'] == 0:
+                group.update({
+                    'problem_context': problem_context,
+                    'count': 1,
+                    'first_timestamp': metadata.get('timestamp'),
+                    'last_timestamp': metadata.get('timestamp'),
+                    'source_files': {metadata.get('source_file')},
+                })
+            else:
+                group['count'] += 1
+                group['last_timestamp'] = metadata.get('timestamp')
+                group['source_files'].add(metadata.get('source_file'))
+        if group is None:
+            self._send(problem_context)
+        for group in overflow:
+            self._forward(group)
+
+    def _send(self, problem_context: dict):
+        self.problem_queue.put(problem_context) # Blocks while a bounded problem_queue is full
+        with self.lock:
+            self.problems_forwarded += 1
+
+    def _forward(self, group: dict):
+        """Forwards a closed group's folded duplicates (if any) as one summarized problem."""
+        problem_context = group['problem_context']
+        if problem_context is None:
+            return # No duplicates: the group's first problem was already forwarded
+        problem_context['parsed_entry_metadata']['burst_summary'] = {
+            'count': group['count'],
+            'first_timestamp': group['first_timestamp'],
+            'last_timestamp': group['last_timestamp'],
+            'source_files': sorted(source_file for source_file in group['source_files'] if source_file),
+            'window_seconds': self.window_seconds,
+        }
+        self._send(problem_context)
+
+    def _take_expired_groups(self, now: float) -> list:
+        expired = []
+        with self.lock:
+            while self.groups:
+                key, group = next(iter(self.groups.items()))
+                if now - group['opened_at'] < self.window_seconds:
+                    break # Groups are ordered by opening time
+                del self.groups[key]
+                expired.append(group)
+        return expired
+
+    def _flush_expired_loop(self):
+        poll_seconds = min(max(self.window_seconds / 4, 0.01), 0.5)
+        while not self.closed.wait(poll_seconds):
+            for group in self._take_expired_groups(time.monotonic()):
+                self._forward(group)
+
+    def flush(self):
+        """Closes every open group now, regardless of its window, forwarding their folded duplicates."""
+        with self.lock:
+            groups = list(self.groups.values())
+            self.groups.clear()
+        for group in groups:
+            self._forward(group)
+
+    def close(self):
+        """Stops the background flusher and forwards whatever duplicates are still folded (end of stream)."""
+        self.closed.set()
+        self.flusher_thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'received': self.problems_received,
+                'forwarded': self.problems_forwarded,
+                'open_groups': len(self.groups),
+            }
@@ -0,0 +1,222 @@
+import time
+import heapq
+import queue
+from collections import deque
+
+# Import configurations from config.py
+import config
+
+OVERFLOW_POLICIES = ("block", "drop", "sample")
+
+
+class ProblemPriorityQueue(queue.Queue):
+    """
+    Bounded priority queue for detected problems, a drop-in replacement for problem_queue's
+    queue.Queue (same put/get/task_done/join API).
+
+    Items are served by (level rank, template rarity, age):
+      - level rank: position of the entry's level in `level_priority` (e.g. FATAL before ERROR before WARN)
+      - template rarity: templates seen less often so far go first (log2 buckets of their occurrence
+        count, burst sizes included), so a new kind of error is not stuck behind a known storm
+      - age: oldest first among equals
+
+    When the queue is full, `overflow_policy` decides what happens to a problem that is not in
+    `protected_levels`:
+      - "block":  put() waits for room (plain backpressure)
+      - "drop":   the lowest-priority problem (queued or new) is discarded
+      - "sample": like "drop", but 1 in `sample_rate` overflowing problems of each template is kept
+                  (put() waits for room) so every template stays represented
+    Protected levels are never dropped: they wait for room, after evicting a droppable problem if any.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        level_priority: list = None,
+        overflow_policy: str = "block",
+        sample_rate: int = 10,
+        protected_levels: list = None,
+        max_wait_samples: int = 10000
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'. Expected one of {OVERFLOW_POLICIES}.")
+        self.level_ranks = {level: rank for rank, level in enumerate(level_priority or [])}
+        self.overflow_policy = overflow_policy
+        self.sample_rate = max(1, sample_rate)
+        self.protected_levels = set(protected_levels or [])
+        self.template_occurrences = {} # event_id -> problems seen (rarity)
+        self.overflow_counts = {} # event_id -> overflowing problems seen ("sample" policy)
+        self.sequence = 0 # Tie-breaker: enqueue order
+        # Metrics
+        self.enqueued_by_level = {}
+        self.dropped_by_level = {}
+        self.max_depth = 0
+        self.wait_samples_by_level = {} # level -> deque of recent wait times (seconds)
+        self.max_wait_samples = max_wait_samples
+        super().__init__(maxsize)
+
+    @classmethod
+    def from_config(cls) -> "ProblemPriorityQueue":
+        return cls(
+            maxsize=config.PROBLEM_QUEUE_MAX_SIZE,
+            level_priority=config.PROBLEM_LEVEL_PRIORITY,
+            overflow_policy=config.PROBLEM_QUEUE_OVERFLOW_POLICY,
+            sample_rate=config.PROBLEM_QUEUE_SAMPLE_RATE,
+            protected_levels=config.PROBLEM_QUEUE_PROTECTED_LEVELS,
+        )
+
+    # --- queue.Queue storage hooks (called with the queue's mutex held) ---
+    # Evicted problems stay in `heap` and served ones stay in `droppable` until they surface (lazy
+    # deletion); `queued` holds the sequence numbers of the problems actually in the queue.
+    def _init(self, maxsize):
+        self.heap = [] # (level_rank, rarity, sequence, enqueue_time, level, problem_context)
+        self.droppable = [] # (-level_rank, -rarity, -sequence, heap_item) for unprotected levels: worst first
+        self.queued = set()
+
+    def _qsize(self):
+        return len(self.queued)
+
+    def _put(self, heap_item):
+        heapq.heappush(self.heap, heap_item)
+        self.queued.add(heap_item[2])
+        level = heap_item[4]
+        if level not in self.protected_levels:
+            heapq.heappush(self.droppable, (-heap_item[0], -heap_item[1], -heap_item[2], heap_item))
+        self.max_depth = max(self.max_depth, len(self.queued))
+        self.enqueued_by_level[level] = self.enqueued_by_level.get(level, 0) + 1
+        self._compact()
+
+    def _get(self):
+        while self.heap[0][2] not in self.queued:
+            heapq.heappop(self.heap)
+        _, _, sequence, enqueue_time, level, problem_context = heapq.heappop(self.heap)
+        self.queued.discard(sequence)
+        samples = self.wait_samples_by_level.get(level)
+        if samples is None:
+            samples = self.wait_samples_by_level[level] = deque(maxlen=self.max_wait_samples)
+        samples.append(time.monotonic() - enqueue_time)
+        return problem_context
+
+    # --- Priority ---
+    @staticmethod
+    def _level_of(problem_context: dict) -> str:
+        return problem_context['parsed_entry_metadata'].get('level', '').strip().upper()
+
+    def _heap_item(self, problem_context: dict) -> tuple:
+        metadata = problem_context['parsed_entry_metadata']
+        level = self._level_of(problem_context)
+        event_id = metadata.get('event_id')
+        burst_count = (metadata.get('burst_summary') or {}).get('count', 1)
+        occurrences = self.template_occurrences.get(event_id, 0) + burst_count
+        self.template_occurrences[event_id] = occurrences
+        self.sequence += 1
+        return (
+            self.level_ranks.get(level, len(self.level_ranks)),
+            occurrences.bit_length(), # 1, 2-3, 4-7, ... occurrences -> rarer templates first
+            self.sequence,
+            time.monotonic(),
+            level,
+            problem_context,
+        )
+
+    def _drop(self, heap_item: tuple):
+        level = heap_item[4]
+        self.dropped_by_level[level] = self.dropped_by_level.get(level, 0) + 1
+
+    def _make_room(self, new_item: tuple) -> bool:
+        """
+        Applies the overflow policy to a full queue (mutex held). Returns True if new_item was dropped,
+        False if the caller should go on and enqueue it (possibly after waiting for room).
+        """
+        new_level = new_item[4]
+        if new_level not in self.protected_levels and self.overflow_policy == "sample":
+            event_id = new_item[5]['parsed_entry_metadata'].get('event_id')
+            overflow_count = self.overflow_counts.get(event_id, 0) + 1
+            self.overflow_counts[event_id] = overflow_count
+            if overflow_count % self.sample_rate == 1 or self.sample_rate == 1:
+                return False # Sampled: keep it and wait for room like "block"
+
+        # The lowest-priority droppable problem in the queue (largest heap key)
+        while self.droppable and self.droppable[0][3][2] not in self.queued:
+            heapq.heappop(self.droppable)
+        worst_item = self.droppable[0][3] if self.droppable else None
+
+        if new_level not in self.protected_levels and (worst_item is None or new_item[:3] > worst_item[:3]):
+            self._drop(new_item)
+            return True
+        if worst_item is not None:
+            heapq.heappop(self.droppable)
+            self.queued.discard(worst_item[2]) # Left in self.heap until it surfaces
+            self._drop(worst_item)
+            self.unfinished_tasks -= 1 # It will never be get() / task_done()
+        return False
+
+    def _compact(self):
+        """Rebuilds a heap once lazily deleted items make up more than half of it (amortized O(1) per put)."""
+        if len(self.heap) > 2 * len(self.queued) + 64:
+            self.heap = [item for item in self.heap if item[2] in self.queued]
+            heapq.heapify(self.heap)
+        if len(self.droppable) > 2 * len(self.queued) + 64:
+            self.droppable = [item for item in self.droppable if item[3][2] in self.queued]
+            heapq.heapify(self.droppable)
+
+    def put(self, problem_context: dict, block: bool = True, timeout: float = None):
+        """Enqueues a problem, applying the overflow policy when the queue is full."""
+        with self.not_full:
+            heap_item = self._heap_item(problem_context)
+            if self.maxsize > 0 and self._qsize() >= self.maxsize and self.overflow_policy != "block":
+                if self._make_room(heap_item):
+                    return
+
+            # Same waiting logic as queue.Queue.put
+            if self.maxsize > 0:
+                if not block:
+                    if self._qsize() >= self.maxsize:
+                        raise queue.Full
+                elif timeout is None:
+                    while self._qsize() >= self.maxsize:
+                        self.not_full.wait()
+                elif timeout < 0:
+                    raise ValueError("'timeout' must be a non-negative number")
+                else:
+                    endtime = time.monotonic() + timeout
+                    while self._qsize() >= self.maxsize:
+                        remaining = endtime - time.monotonic()
+                        if remaining <= 0.0:
+                            raise queue.Full
+                        self.not_full.wait(remaining)
+            self._put(heap_item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    # --- Metrics ---
+    def stats(self) -> dict:
+        """Queue depth, per-level enqueue / drop counts and wait times (seconds) from put to get."""
+        with self.mutex:
+            wait_times = {}
+            for level, samples in self.wait_samples_by_level.items():
+                ordered = sorted(samples)
+                wait_times[level] = {
+                    'count': len(ordered),
+                    'mean': sum(ordered) / len(ordered),
+                    'p50': ordered[len(ordered) // 2],
+                    'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    'max': ordered[-1],
+                }
+            return {
+                'depth': len(self.queued),
+                'max_depth': self.max_depth,
+                'maxsize': self.maxsize,
+                'enqueued': dict(self.enqueued_by_level),
+                'dropped': dict(self.dropped_by_level),
+                'wait_seconds': wait_times,
+            }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        lines = [f"depth {stats['depth']} (max {stats['max_depth']}/{stats['maxsize']}), "
+                 f"enqueued {stats['enqueued']}, dropped {stats['dropped']}"]
+        for level, wait in sorted(stats['wait_seconds'].items(), key=lambda item: self.level_ranks.get(item[0], len(self.level_ranks))):
+            lines.append(f"  {level}: wait mean {wait['mean']:.2f}s, p50 {wait['p50']:.2f}s, "
+                         f"p95 {wait['p95']:.2f}s, max {wait['max']:.2f}s over {wait['count']} problems")
+        return "\n".join(lines)
@@ -1,80 +1,380 @@
 import os
+import json
+import hashlib
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import faiss
 import pandas as pd # Used for offset_map loading if done here, but primarily in app.py
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredFileLoader, UnstructuredMarkdownLoader 
-from langchain.text_splitter import RecursiveCharacterTextSplitter 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS 
+from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredFileLoader, UnstructuredMarkdownLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
 
 # Import configurations from config.py
 import config
+import embedding_cache
 
-# --- RAG Builder Functions ---
-def build_or_load_rag_knowledge_base(embedding_model_instance: GoogleGenerativeAIEmbeddings) -> FAISS:
+MANIFEST_FORMAT_VERSION = 1
+PDF_EXTENSIONS = ('.pdf',)
+UNSTRUCTURED_EXTENSIONS = ('.txt', '.md', '.html', '.docx', '.xlsx')
+HASH_READ_BYTES = 1024 * 1024
+
+# Split Documents into Chunks
+TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=1000,     # Size of each chunk
+    chunk_overlap=200,   # Overlap between chunks to maintain context
+    length_function=len  # Use character length
+)
+
+# Knowledge-base indexer set up by build_or_load_rag_knowledge_base (keeps the index in sync with SOLUTION_DOCS_DIR)
+KB_INDEXER = None
+
+
+# --- Solution Document Helpers ---
+def embedding_model_name(embedding_model_instance: Embeddings) -> str:
+    """Name that scopes cached embeddings to the model producing them (vectors of different models never mix)."""
+    model_name = getattr(embedding_model_instance, 'model', None)
+    if model_name:
+        return model_name
+    dimensions = getattr(embedding_model_instance, 'dimensions', None)
+    return f"{type(embedding_model_instance).__name__}-{dimensions}" if dimensions else type(embedding_model_instance).__name__
+
+def is_supported_solution_doc(file_path: str) -> bool:
+    return file_path.endswith(PDF_EXTENSIONS + UNSTRUCTURED_EXTENSIONS)
+
+def load_and_split_solution_doc(file_path: str) -> list:
+    """Loads one solution document (PDF pages or unstructured elements) and splits it into RAG chunks."""
+    if file_path.endswith(PDF_EXTENSIONS):
+        loader = PyPDFLoader(file_path)
+    else:
+        loader = UnstructuredFileLoader(file_path)
+    docs = loader.load()
+    return TEXT_SPLITTER.split_documents(docs)
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f_doc:
+        for block in iter(lambda: f_doc.read(HASH_READ_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- Incremental Knowledge-Base Indexer ---
+class KnowledgeBaseIndexer:
     """
-    Builds or loads the FAISS vector store for RAG.
+    Keeps the FAISS index in sync with SOLUTION_DOCS_DIR without full rebuilds.
+
+    A manifest (next to the index) records, per document path relative to the docs dir, its mtime,
+    size, content hash and the FAISS docstore ids of its chunks. sync() compares the docs dir to it:
+    new and changed documents are loaded, split and embedded (through the embedding cache) and their
+    vectors added; vectors of changed and deleted documents are removed by id. Unchanged documents
+    are never reloaded (mtime + size match, or the hash matches after a touch). Documents are loaded
+    and split on `loader_workers` processes and their chunks embedded as each document completes.
+
+    While a retriever is being served, changes are applied to a copy of the index that then replaces
+    the retriever's vector store in one assignment, so queries never see a half-applied update.
+    One sync runs at a time; start() repeats it on a background thread.
     """
-    print("\n--- Building/Loading RAG Knowledge Base (with FAISS Persistence) ---")
 
-    # Check if FAISS index already exists on disk
-    faiss_index_exists = os.path.exists(config.FAISS_INDEX_PATH) and os.listdir(config.FAISS_INDEX_PATH)
-
-    if faiss_index_exists and not config.REBUILD_FAISS_INDEX:
-        print(f"Loading existing FAISS index from {config.FAISS_INDEX_PATH}...")
-        try:
-            vectorstore = FAISS.load_local(config.FAISS_INDEX_PATH, embedding_model_instance, allow_dangerous_deserialization=True) 
-            print("FAISS index loaded successfully and contains data.")
-        except Exception as e:
-            print(f"Error loading FAISS index: {e}. Rebuilding from scratch.")
-            faiss_index_exists = False 
-
-    if not faiss_index_exists or config.REBUILD_FAISS_INDEX: 
-        print("No existing valid FAISS index found or rebuilding forced. Building from scratch...")
-        
-        # Load Solution Documents
-        solution_doc_files_to_load = []
-        if not os.path.exists(config.SOLUTION_DOCS_DIR):
-            print(f"ERROR: Solution documents directory not found at {config.SOLUTION_DOCS_DIR}. RAG will not have context.")
-        else:
-            for root, _, files in os.walk(config.SOLUTION_DOCS_DIR):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if file_path.endswith('.pdf'):
-                        loader = PyPDFLoader(file_path) 
-                    elif file_path.endswith(('.txt', '.md', '.html', '.docx', '.xlsx')):
-                        loader = UnstructuredFileLoader(file_path) 
-                    else:
+    def __init__(
+        self,
+        embedding_model_instance: Embeddings,
+        docs_dir: str,
+        index_path: str,
+        manifest_path: str,
+        loader_workers: int = 1
+    ):
+        self.embedding_model = embedding_model_instance
+        self.model_name = embedding_model_name(embedding_model_instance)
+        self.docs_dir = docs_dir
+        self.index_path = index_path
+        self.manifest_path = manifest_path
+        self.loader_workers = max(1, loader_workers)
+        self.cached_embeddings = embedding_cache.CachedEmbeddings.from_config(embedding_model_instance, self.model_name)
+        self.vectorstore = None
+        self.retriever = None
+        self.files = {} # relative path -> {'mtime_ns', 'size', 'sha256', 'ids'}
+        self.skipped_files = set() # Unsupported files already reported
+        self.sync_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.sync_thread = None
+
+    @classmethod
+    def from_config(cls, embedding_model_instance: Embeddings) -> "KnowledgeBaseIndexer":
+        return cls(
+            embedding_model_instance,
+            config.SOLUTION_DOCS_DIR,
+            config.FAISS_INDEX_PATH,
+            config.KB_MANIFEST_FILE,
+            loader_workers=config.KB_LOADER_WORKERS,
+        )
+
+    # --- Manifest ---
+    def _load_manifest(self) -> dict | None:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r', encoding='utf-8') as f_manifest:
+            manifest = json.load(f_manifest)
+        if manifest.get('version') != MANIFEST_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _save_manifest(self, files: dict):
+        """Writes the manifest atomically (temp file + rename)."""
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f_manifest:
+            json.dump({'version': MANIFEST_FORMAT_VERSION, 'embedding_model': self.model_name, 'files': files}, f_manifest)
+        os.replace(tmp_path, self.manifest_path)
+
+    # --- Vector Store ---
+    def _empty_vectorstore(self) -> FAISS:
+        dimensions = len(self.embedding_model.embed_query("dimension probe"))
+        return FAISS(
+            embedding_function=self.embedding_model,
+            index=faiss.IndexFlatL2(dimensions),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+
+    def _copy_vectorstore(self) -> FAISS:
+        return FAISS.deserialize_from_bytes(
+            self.vectorstore.serialize_to_bytes(), self.embedding_model, allow_dangerous_deserialization=True
+        )
+
+    def load_or_build(self, rebuild: bool = False) -> FAISS:
+        """Loads the persisted index and manifest (or starts an empty index), then syncs it with the docs dir."""
+        faiss_index_exists = os.path.exists(self.index_path) and os.listdir(self.index_path)
+
+        if faiss_index_exists and not rebuild:
+            print(f"Loading existing FAISS index from {self.index_path}...")
+            try:
+                vectorstore = FAISS.load_local(self.index_path, self.embedding_model, allow_dangerous_deserialization=True)
+                manifest = self._load_manifest()
+                if manifest is None:
+                    print(f"No knowledge-base manifest at {self.manifest_path}. Rebuilding to track documents.")
+                elif manifest.get('embedding_model') != self.model_name:
+                    print(f"FAISS index was built with embedding model '{manifest.get('embedding_model')}', not '{self.model_name}'. Rebuilding.")
+                elif set(vectorstore.index_to_docstore_id.values()) != {doc_id for entry in manifest['files'].values() for doc_id in entry['ids']}:
+                    print("FAISS index does not match its manifest (interrupted update?). Rebuilding.")
+                else:
+                    self.vectorstore = vectorstore
+                    self.files = manifest['files']
+                    print(f"FAISS index loaded successfully: {vectorstore.index.ntotal} vectors from {len(self.files)} documents.")
+            except Exception as e:
+                print(f"Error loading FAISS index: {e}. Rebuilding from scratch.")
+
+        if self.vectorstore is None:
+            print("No existing valid FAISS index found or rebuilding forced. Building from scratch...")
+            if not os.path.exists(self.docs_dir):
+                print(f"ERROR: Solution documents directory not found at {self.docs_dir}. RAG will not have context.")
+            self.files = {}
+            self.vectorstore = self._empty_vectorstore()
+            # Replace any previous index on disk right away, so it is never paired with the new manifest
+            self.vectorstore.save_local(self.index_path)
+            self._save_manifest(self.files)
+
+        summary = self.sync()
+        print(f"Knowledge base: {summary['added']} documents added, {summary['changed']} changed, "
+              f"{summary['removed']} removed, {summary['unchanged']} unchanged ({self.vectorstore.index.ntotal} vectors).")
+        if not self.vectorstore.index.ntotal:
+            print("WARNING: No solution documents were loaded. RAG will not have context.")
+        return self.vectorstore
+
+    def as_retriever(self):
+        """Retriever over the index; sync() swaps its vector store when documents change."""
+        if self.retriever is None:
+            self.retriever = self.vectorstore.as_retriever()
+        return self.retriever
+
+    # --- Sync ---
+    def _scan_docs_dir(self) -> dict:
+        """Returns {relative path: (path, mtime_ns, size)} for the supported documents in the docs dir."""
+        scanned = {}
+        for root, _, files in os.walk(self.docs_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                if not is_supported_solution_doc(file_path):
+                    if file_path not in self.skipped_files:
+                        self.skipped_files.add(file_path)
                         print(f"Skipping unsupported file type: {file_path}")
-                        continue
+                    continue
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError:
+                    continue # Deleted while scanning
+                scanned[os.path.relpath(file_path, self.docs_dir)] = (file_path, file_stat.st_mtime_ns, file_stat.st_size)
+        return scanned
+
+    def sync(self) -> dict:
+        """
+        Applies document additions, changes and deletions to the index, saves it with the manifest and
+        returns how many documents were 'added', 'changed', 'removed', 'unchanged' or 'failed' to load.
+        """
+        with self.sync_lock:
+            summary = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'failed': 0}
+            files = {rel_path: dict(entry) for rel_path, entry in self.files.items()}
+            scanned = self._scan_docs_dir()
+            removed_ids = []
+            to_load = {} # file_path -> (rel_path, mtime_ns, size, content_hash, previous manifest entry)
+
+            for rel_path in sorted(set(files) - set(scanned)):
+                removed_ids.extend(files.pop(rel_path)['ids'])
+                summary['removed'] += 1
+                print(f"Removed {rel_path} from the knowledge base")
+
+            for rel_path, (file_path, mtime_ns, size) in sorted(scanned.items()):
+                entry = files.get(rel_path)
+                if entry and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+                    summary['unchanged'] += 1
+                    continue
+                try:
+                    content_hash = file_sha256(file_path)
+                except OSError as e:
+                    print(f"ERROR: Could not load {file_path}: {e}")
+                    summary['failed'] += 1
+                    continue
+                if entry and entry['sha256'] == content_hash:
+                    entry.update(mtime_ns=mtime_ns, size=size) # Touched, not changed
+                    summary['unchanged'] += 1
+                    continue
+                to_load[file_path] = (rel_path, mtime_ns, size, content_hash, entry)
+
+            if not removed_ids and not to_load:
+                if files != self.files:
+                    self._save_manifest(files)
+                self.files = files
+                return summary
+
+            # Served indexes are updated on a copy, then swapped in
+            vectorstore = self._copy_vectorstore() if self.retriever is not None else self.vectorstore
+            if removed_ids:
+                vectorstore.delete(removed_ids)
+
+            # Chunks are embedded and added as documents finish loading, a full round of embedding batches at a time
+            pending_chunks = [] # (chunk Document, docstore id)
+            embed_threshold = self.cached_embeddings.batch_size * self.cached_embeddings.concurrency
+            largest_first = sorted(to_load, key=lambda file_path: to_load[file_path][2], reverse=True)
+            for file_path, chunks, error in self._load_and_split_solution_docs(largest_first):
+                rel_path, mtime_ns, size, content_hash, entry = to_load[file_path]
+                if error is not None:
+                    # A changed document keeps its previous vectors; it is retried on the next sync
+                    print(f"ERROR: Could not load {file_path}: {error}")
+                    summary['failed'] += 1
+                    continue
+                chunk_ids = [f"{rel_path}#{content_hash[:16]}#{chunk_number}" for chunk_number in range(len(chunks))]
+                if entry:
+                    vectorstore.delete(entry['ids'])
+                    summary['changed'] += 1
+                else:
+                    summary['added'] += 1
+                files[rel_path] = {'mtime_ns': mtime_ns, 'size': size, 'sha256': content_hash, 'ids': chunk_ids}
+                pending_chunks.extend(zip(chunks, chunk_ids))
+                print(f"Loaded {len(chunks)} chunks from {rel_path}")
+                if len(pending_chunks) >= embed_threshold:
+                    self._add_chunks(vectorstore, pending_chunks)
+                    pending_chunks = []
+            self._add_chunks(vectorstore, pending_chunks)
+
+            if summary['added'] or summary['changed'] or summary['removed']:
+                vectorstore.save_local(self.index_path)
+                self._save_manifest(files)
+                self.vectorstore = vectorstore
+                if self.retriever is not None:
+                    self.retriever.vectorstore = vectorstore
+            elif files != self.files:
+                self._save_manifest(files)
+
+            self.files = files
+            return summary
+
+    def _add_chunks(self, vectorstore: FAISS, chunk_pairs: list):
+        """Embeds [(chunk Document, docstore id), ...] through the embedding cache and adds them to vectorstore."""
+        if not chunk_pairs:
+            return
+        texts = [chunk.page_content for chunk, _ in chunk_pairs]
+        vectorstore.add_embeddings(
+            text_embeddings=list(zip(texts, self.cached_embeddings.embed_documents(texts))),
+            metadatas=[chunk.metadata for chunk, _ in chunk_pairs],
+            ids=[chunk_id for _, chunk_id in chunk_pairs]
+        )
+
+    def _load_and_split_solution_docs(self, file_paths: list):
+        """
+        Yields (file_path, chunks, error) per document as soon as it is loaded and split.
+        With more than one loader worker, documents are parsed in a process pool (PDF parsing is
+        CPU-bound); a bounded window is kept in flight so chunks don't pile up ahead of the embedder.
+        """
+        if self.loader_workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                try:
+                    yield file_path, load_and_split_solution_doc(file_path), None
+                except Exception as e:
+                    yield file_path, None, e
+            return
+
+        max_in_flight = self.loader_workers * 2
+        file_paths_iter = iter(file_paths)
+        with ProcessPoolExecutor(max_workers=min(self.loader_workers, len(file_paths)),
+                                 mp_context=multiprocessing.get_context(config.PROCESS_POOL_START_METHOD)) as executor:
+            in_flight = {}
+            for file_path in itertools.islice(file_paths_iter, max_in_flight):
+                in_flight[executor.submit(load_and_split_solution_doc, file_path)] = file_path
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    next_file_path = next(file_paths_iter, None)
+                    if next_file_path is not None:
+                        in_flight[executor.submit(load_and_split_solution_doc, next_file_path)] = next_file_path
                     try:
-                        docs = loader.load()
-                        solution_doc_files_to_load.extend(docs)
-                        print(f"Loaded {len(docs)} pages/chunks from {os.path.basename(file_path)}")
+                        yield file_path, future.result(), None
                     except Exception as e:
-                        print(f"ERROR: Could not load {file_path}: {e}")
+                        yield file_path, None, e
 
-        print(f"\nTotal raw documents loaded for RAG: {len(solution_doc_files_to_load)}")
-        if not solution_doc_files_to_load:
-            print("WARNING: No solution documents were loaded. RAG will not have context.")
+    # --- Background Sync ---
+    def _sync_loop(self, interval_seconds: float):
+        while not self.stop_event.wait(interval_seconds):
+            try:
+                summary = self.sync()
+                if summary['added'] or summary['changed'] or summary['removed']:
+                    print(f"[KB Indexer] Knowledge base updated: {summary['added']} added, {summary['changed']} changed, "
+                          f"{summary['removed']} removed ({self.vectorstore.index.ntotal} vectors).")
+            except Exception as e:
+                print(f"ERROR in knowledge-base indexer: {e}")
 
-        # Split Documents into Chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,     # Size of each chunk
-            chunk_overlap=200,   # Overlap between chunks to maintain context
-            length_function=len  # Use character length
-        )
-        rag_chunks = text_splitter.split_documents(solution_doc_files_to_load)
-        print(f"Split into {len(rag_chunks)} chunks for RAG.")
+    def start(self, interval_seconds: float):
+        """Re-syncs the docs dir every interval_seconds on a background thread."""
+        self.sync_thread = threading.Thread(target=self._sync_loop, args=(interval_seconds,), name="kb-indexer", daemon=True)
+        self.sync_thread.start()
+        print(f"Knowledge-base indexer watching {self.docs_dir} (every {interval_seconds:.0f}s).")
 
-        if not rag_chunks:
-            print("WARNING: No chunks created for RAG. Check document loading or text splitter settings.")
+    def stop(self):
+        self.stop_event.set()
+        if self.sync_thread is not None:
+            self.sync_thread.join()
+        self.cached_embeddings.store.close()
 
-        # Create Embeddings and Store in FAISS
-        print(f"Creating embeddings and storing in FAISS (in-memory and saving to disk at {config.FAISS_INDEX_PATH})...")
-        vectorstore = FAISS.from_documents(
-            documents=rag_chunks,
-            embedding=embedding_model_instance
-        )
-        vectorstore.save_local(config.FAISS_INDEX_PATH) 
-        print("Embeddings created and stored in FAISS, and saved to disk.")
 
-    return vectorstore.as_retriever()
\ No newline at end of file
+# --- RAG Builder Functions ---
+def build_or_load_rag_knowledge_base(embedding_model_instance: Embeddings):
+    """
+    Builds or loads the FAISS vector store for RAG and returns a retriever over it.
+    An existing index is brought up to date incrementally (see KnowledgeBaseIndexer); a full rebuild
+    happens only when forced or when the index cannot be used. The indexer is kept in KB_INDEXER.
+    """
+    global KB_INDEXER
+    print("\n--- Building/Loading RAG Knowledge Base (with FAISS Persistence) ---")
+
+    KB_INDEXER = KnowledgeBaseIndexer.from_config(embedding_model_instance)
+    KB_INDEXER.load_or_build(rebuild=config.REBUILD_FAISS_INDEX)
+    embedding_stats = KB_INDEXER.cached_embeddings.stats()
+    print(f"Embeddings: {embedding_stats['cached']} chunks reused from cache, {embedding_stats['embedded']} embedded "
+          f"in {embedding_stats['batches']} batches (cache holds {embedding_stats['store_size']}).")
+
+    return KB_INDEXER.as_retriever()
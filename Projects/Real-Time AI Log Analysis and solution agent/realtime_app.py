@@ -21,9 +21,16 @@ from langchain.prompts import PromptTemplate
 import config 
 import log_processor 
 import rag_builder 
+import ai_backends
+import retrieval_service
 import llm_service 
 import stream_simulator 
 import worker_manager 
+import offset_index 
+import ingestion_checkpoint
+import problem_scheduler
+import metrics
+import sequence_reader
 
 # --- 1. Global Configuration (ALL GLOBALS DEFINED AT THE TOP) ---
 load_dotenv() 
@@ -39,11 +46,14 @@ REBUILD_FAISS_INDEX = config.REBUILD_FAISS_INDEX
 llm_instance = None 
 embedding_model_instance = None
 retriever_instance = None
-offset_map = {} 
-problem_queue = queue.Queue() 
+offset_map = offset_index.OffsetMap() # (source_file, line_id) -> byte offset; persisted part is memory-mapped
+problem_queue = problem_scheduler.ProblemPriorityQueue.from_config() # Bounded; FATAL first, see problem_scheduler.py
+ui_update_queue = queue.Queue() # Solutions / errors / worker status from the LLM worker, for a UI to consume
 stop_event = threading.Event() 
 parsed_line_counter = [0] 
 unique_templates_map = {} 
+metrics_server = None # Prometheus endpoint (config.METRICS_ENABLED)
+profiler = None # Whole-run sampling profiler (config.PROFILER_ENABLED)
 
 # --- 3. Helper Functions (These are now imported from log_processor.py if needed elsewhere in realtime_app.py) ---
 # --- 4. Core AI Component Initialization ---
@@ -60,52 +70,52 @@ def initialize_ai_components():
     os.makedirs(config.SOLUTION_DOCS_DIR, exist_ok=True) 
     os.makedirs(config.FAISS_INDEX_PATH, exist_ok=True) 
 
-    # 1. Initialize LLM
-    llm_instance = ChatGoogleGenerativeAI(
-        model=config.LLM_MODEL, 
-        temperature=config.LLM_TEMPERATURE, 
-        max_output_tokens=config.LLM_MAX_OUTPUT_TOKENS, 
-        google_api_key=os.getenv("GOOGLE_API_KEY")
-    )
-    print("Gemini LLM initialized.")
+    # 1. Initialize LLM (config.LLM_BACKEND)
+    llm_instance = ai_backends.create_llm()
+    print(f"LLM initialized ({config.LLM_BACKEND} backend).")
 
-    # 2. Initialize Embedding Model
-    embedding_model_instance = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001", 
-        google_api_key=os.getenv("GOOGLE_API_KEY")
-    )
-    print("Gemini Embedding model initialized.")
+    # 2. Initialize Embedding Model (config.EMBEDDING_BACKEND)
+    embedding_model_instance = ai_backends.create_embedding_model()
+    print(f"Embedding model initialized ({config.EMBEDDING_BACKEND} backend).")
 
-    # 3. Load or initialize the global offset_map
+    # 3. Attach or initialize the global offset_map
+    # The persisted index is memory-mapped, so startup cost does not depend on its size.
     if not config.REGENERATE_ALL_FROM_RAW_LOGS: 
-        if os.path.exists(config.OFFSET_INDEX_FILE): 
-            try:
-                offset_df = pd.read_csv(config.OFFSET_INDEX_FILE) 
-                for index, row in tqdm(offset_df.iterrows(), total=len(offset_df), desc="Loading offset map"):
-                    offset_map[(str(row['source_file']), int(row['line_id_in_file_header']))] = int(row['byte_offset'])
-                print(f"Loaded byte-offset index with {len(offset_map)} entries for live usage.")
-                
-                if offset_map:
-                    max_line_id = 0
-                    for (src_file, line_id), byte_offset in offset_map.items():
-                        if line_id > max_line_id:
-                            max_line_id = line_id
-                    parsed_line_counter[0] = max_line_id 
-                    print(f"Initialized parsed_line_counter to {parsed_line_counter[0]} based on existing offset index.")
-                
-            except Exception as e:
-                print(f"Error loading offset index CSV: {e}. Starting with empty offset map.")
-                offset_map = {} 
-        else:
-            print("Byte-offset index CSV not found. Starting with empty offset map for live generation during stream.")
-            offset_map = {}
+        try:
+            if offset_map.attach_persisted_index(config.OFFSET_INDEX_DIR):
+                print(f"Attached memory-mapped byte-offset index from {config.OFFSET_INDEX_DIR} for live usage.")
+                parsed_line_counter[0] = ingestion_checkpoint.CheckpointStore(config.INGESTION_CHECKPOINT_FILE).load().parsed_entry_count
+                print(f"Initialized parsed_line_counter to {parsed_line_counter[0]} based on the ingestion checkpoint.")
+            else:
+                print("Byte-offset index not found. Starting with empty offset map for live generation during stream.")
+        except Exception as e:
+            print(f"Error opening offset index: {e}. Starting with empty offset map.")
+            offset_map.clear() 
     else: 
         print("REGENERATE_ALL_FROM_RAW_LOGS is True. Offset map will be built during stream simulation.")
-        offset_map = {}
+        offset_map.clear()
 
 
     # 4. Build/Load RAG Knowledge Base (with FAISS Persistence)
     retriever_instance = rag_builder.build_or_load_rag_knowledge_base(embedding_model_instance) 
+    if config.KB_BACKGROUND_INDEXING:
+        rag_builder.KB_INDEXER.start(config.KB_INDEX_SYNC_INTERVAL_SECONDS)
+    if config.RETRIEVAL_CACHE_ENABLED:
+        retriever_instance = retrieval_service.BatchingRetriever.from_config(retriever_instance)
+
+    # 5. Load persisted solutions so repeated problems from earlier runs skip the LLM
+    if config.SOLUTION_CACHE_ENABLED:
+        llm_service.SOLUTION_CACHE.load()
+
+    # 6. Export the queue and cache stats with the metrics (read at every scrape)
+    metrics.REGISTRY.register_stats("log_agent_problem_queue", problem_queue.stats, label_name="level")
+    metrics.REGISTRY.register_stats("log_agent_template_cache", log_processor.TEMPLATE_CACHE.stats)
+    metrics.REGISTRY.register_stats("log_agent_recent_entries", log_processor.RECENT_ENTRIES.stats)
+    metrics.REGISTRY.register_stats("log_agent_embedding_cache", rag_builder.KB_INDEXER.cached_embeddings.stats)
+    if config.SOLUTION_CACHE_ENABLED:
+        metrics.REGISTRY.register_stats("log_agent_solution_cache", llm_service.SOLUTION_CACHE.stats)
+    if config.RETRIEVAL_CACHE_ENABLED:
+        metrics.REGISTRY.register_stats("log_agent_retrieval_cache", retriever_instance.stats)
     
     print("\n--- AI Components Setup Complete ---")
 
@@ -137,11 +147,24 @@ if __name__ == "__main__":
     
     # 1. Initialize all AI components (LLM, Embedder, RAG, Offset Map) once at startup
     initialize_ai_components()
+
+    # Metrics endpoint and profiler (see metrics.py)
+    if config.METRICS_ENABLED:
+        metrics_server = metrics.MetricsServer.from_config()
+        try:
+            metrics_server.start()
+        except OSError as e:
+            print(f"WARNING: Could not start metrics endpoint on {config.METRICS_HOST}:{config.METRICS_PORT}: {e}")
+            metrics_server = None
+    if config.PROFILER_ENABLED:
+        profiler = metrics.SamplingProfiler.from_config()
+        profiler.start()
+        print(f"Sampling profiler running (every {config.PROFILER_SAMPLE_INTERVAL_SECONDS * 1000:.0f} ms).")
     
     # 2. Start the LLM Analysis Worker Thread
     llm_worker_thread = threading.Thread(
         target=worker_manager.llm_analysis_worker_thread, 
-        args=(llm_instance, retriever_instance, problem_queue, offset_map, config.OUTPUT_PARSED_JSONL, stop_event), 
+        args=(llm_instance, retriever_instance, problem_queue, offset_map, config.OUTPUT_PARSED_JSONL, stop_event, ui_update_queue), 
         daemon=True 
     )
     llm_worker_thread.start()
@@ -164,7 +187,31 @@ if __name__ == "__main__":
     problem_queue.join() 
     stop_event.set() 
     llm_worker_thread.join() # Removed timeout for robustness
+    rag_builder.KB_INDEXER.stop()
+    sequence_reader.close_readers()
     
+    print(f"\n--- Problem Queue ---\n{problem_queue.format_stats()}")
+
+    if profiler:
+        profiler.stop()
+        print(f"\n--- Profile: where threads spent their samples ---\n{profiler.format_top()}")
+    if metrics_server:
+        metrics_server.stop()
+
+    # Final save of the solution cache
+    if config.SOLUTION_CACHE_ENABLED:
+        llm_service.SOLUTION_CACHE.save()
+        cache_stats = llm_service.SOLUTION_CACHE.stats()
+        print(f"Solution cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"(hit rate {cache_stats['hit_rate']:.1%}), {cache_stats['evictions']} evictions, "
+              f"{cache_stats['expirations']} expirations, size {cache_stats['size']}/{cache_stats['max_entries']}")
+
+    if config.RETRIEVAL_CACHE_ENABLED:
+        retrieval_stats = retriever_instance.stats()
+        print(f"Retrieval cache: {retrieval_stats['hits']} hits, {retrieval_stats['misses']} misses "
+              f"(hit rate {retrieval_stats['hit_rate']:.1%}) in {retrieval_stats['batches']} batched searches, "
+              f"{retrieval_stats['evictions']} evictions, size {retrieval_stats['size']}/{retrieval_stats['max_entries']}")
+
     # Final save of templates (accumulated in unique_templates_map during stream)
     print("\n--- Final Save of Templates ---")
     templates_data_list = []
@@ -0,0 +1,150 @@
+import time
+import threading
+from datetime import datetime
+
+# Import configurations from config.py
+import config
+
+REPLAY_MODES = ("delay", "backfill", "rate", "timestamp")
+
+# Sleeping is only worth a syscall once we are at least this far ahead of schedule;
+# smaller debts are carried over, so pacing costs one sleep per batch of lines, not one per line.
+MIN_SLEEP_SECONDS = 0.005
+
+
+def parse_log_timestamp(timestamp: str) -> float | None:
+    """Converts an HDFS header timestamp ('YYYY-MM-DD HH:MM:SS,mmm') to seconds since the epoch."""
+    try:
+        whole_seconds = datetime.strptime(timestamp[:19], "%Y-%m-%d %H:%M:%S").timestamp()
+        return whole_seconds + int(timestamp[20:23]) / 1000.0
+    except (ValueError, TypeError):
+        return None
+
+
+class ReplayScheduler:
+    """
+    Paces the raw log replay in stream_simulator. Modes:
+      - "delay":     legacy behaviour, sleep `delay_seconds` after every raw line.
+      - "backfill":  no pacing at all, process as fast as possible.
+      - "rate":      token bucket limited to `rate` lines/s or bytes/s (`rate_unit`).
+      - "timestamp": reproduce the gaps between log header timestamps, divided by `speedup`.
+                     Gaps longer than `max_gap_seconds` (log time) are capped and backward jumps
+                     (e.g. the next file starting earlier) count as no gap.
+    """
+
+    def __init__(
+        self,
+        mode: str = "delay",
+        delay_seconds: float = 0.0,
+        rate: float = 0.0,
+        rate_unit: str = "lines",
+        speedup: float = 1.0,
+        max_gap_seconds: float = None,
+        stop_event: threading.Event = None
+    ):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode '{mode}'. Expected one of {REPLAY_MODES}.")
+        if mode == "rate" and (rate <= 0 or rate_unit not in ("lines", "bytes")):
+            raise ValueError("Rate-limited replay needs rate > 0 and rate_unit 'lines' or 'bytes'.")
+        if mode == "timestamp" and speedup <= 0:
+            raise ValueError("Timestamp-faithful replay needs speedup > 0.")
+
+        self.mode = mode
+        self.delay_seconds = delay_seconds
+        self.rate = rate
+        self.rate_unit = rate_unit
+        self.speedup = speedup
+        self.max_gap_seconds = max_gap_seconds
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+
+        # Token bucket state ("rate" mode): allow bursts of up to 100 ms worth of tokens
+        self.bucket_capacity = max(rate * 0.1, 1.0)
+        self.tokens = self.bucket_capacity
+        self.last_refill_time = time.monotonic()
+
+        # Log clock state ("timestamp" mode)
+        self.replay_start_time = None
+        self.last_log_time = None
+        self.log_elapsed_seconds = 0.0
+        self._cached_second_key = None
+        self._cached_second_value = None
+
+        self.total_sleep_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, stop_event: threading.Event = None) -> "ReplayScheduler":
+        return cls(
+            mode=config.STREAM_REPLAY_MODE,
+            delay_seconds=config.STREAM_DELAY_SECONDS,
+            rate=config.STREAM_RATE_LIMIT,
+            rate_unit=config.STREAM_RATE_UNIT,
+            speedup=config.STREAM_REPLAY_SPEEDUP,
+            max_gap_seconds=config.STREAM_REPLAY_MAX_GAP_SECONDS,
+            stop_event=stop_event,
+        )
+
+    def _sleep(self, seconds: float):
+        self.total_sleep_seconds += seconds
+        self.stop_event.wait(seconds) # Wakes up immediately on shutdown
+
+    def _log_time(self, timestamp: str) -> float | None:
+        # Consecutive lines usually share the same second, so only the milliseconds need parsing
+        second_key = timestamp[:19]
+        if second_key != self._cached_second_key:
+            whole_seconds = parse_log_timestamp(second_key + ",000")
+            if whole_seconds is None:
+                return None
+            self._cached_second_key, self._cached_second_value = second_key, whole_seconds
+        try:
+            return self._cached_second_value + int(timestamp[20:23]) / 1000.0
+        except ValueError:
+            return None
+
+    def pace(self, raw_line: str, timestamp: str = None, raw_byte_count: int = None):
+        """
+        Called once per raw line before it is processed; blocks as needed to respect the replay mode.
+        raw_byte_count is the line's size in the raw file ("bytes" rate); defaults to its UTF-8 length.
+        """
+        if self.mode == "backfill":
+            return
+        if self.mode == "delay":
+            self._sleep(self.delay_seconds)
+            return
+        if self.mode == "rate":
+            if self.rate_unit == "bytes":
+                self._pace_rate(len(raw_line.encode('utf-8')) if raw_byte_count is None else raw_byte_count)
+            else:
+                self._pace_rate(1)
+        elif timestamp:
+            self._pace_timestamp(timestamp)
+
+    def _pace_rate(self, cost: float):
+        now = time.monotonic()
+        self.tokens = min(self.bucket_capacity, self.tokens + (now - self.last_refill_time) * self.rate)
+        self.last_refill_time = now
+        self.tokens -= cost
+        if self.tokens < 0:
+            wait_seconds = -self.tokens / self.rate
+            if wait_seconds >= MIN_SLEEP_SECONDS:
+                self._sleep(wait_seconds)
+
+    def _pace_timestamp(self, timestamp: str):
+        log_time = self._log_time(timestamp)
+        if log_time is None:
+            return
+        if self.replay_start_time is None:
+            self.replay_start_time = time.monotonic()
+            self.last_log_time = log_time
+            return
+
+        gap = log_time - self.last_log_time
+        self.last_log_time = log_time
+        if gap <= 0:
+            return # Same instant, or the clock went backwards (next file / node)
+        if self.max_gap_seconds is not None:
+            gap = min(gap, self.max_gap_seconds)
+        self.log_elapsed_seconds += gap
+
+        ahead_seconds = self.replay_start_time + self.log_elapsed_seconds / self.speedup - time.monotonic()
+        if ahead_seconds >= MIN_SLEEP_SECONDS:
+            self._sleep(ahead_seconds)
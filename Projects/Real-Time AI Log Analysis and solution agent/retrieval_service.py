@@ -0,0 +1,173 @@
+import time
+import inspect
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import faiss
+import numpy as np
+
+# Import configurations from config.py
+import config
+import log_processor
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key of a retriever query: the query with log variables (IPs, block ids, numbers, ...) replaced
+    by placeholders, so problems of one template share a key even though their raw snippets differ.
+    """
+    return log_processor.normalize_log_content(query)
+
+
+class BatchingRetriever:
+    """
+    Retrieval layer in front of the FAISS retriever, a drop-in for it (invoke(query) -> documents).
+
+    Results are cached by normalized query (LRU, `max_entries`). A miss searches with its original query
+    text, as the plain retriever would; later queries with the same normalized form reuse that result.
+    Misses wait up to `batch_wait_seconds` for other misses, then a background thread embeds up to
+    `max_batch_size` distinct queries in one provider call and runs one vectorized FAISS search for all
+    of them. Concurrent misses for the same key share one search. The cache is cleared when the knowledge base's vector store is
+    replaced (see rag_builder.KnowledgeBaseIndexer).
+    """
+
+    def __init__(self, retriever, max_entries: int = 1000, max_batch_size: int = 16, batch_wait_seconds: float = 0.01):
+        self.retriever = retriever # VectorStoreRetriever over FAISS; its vectorstore may be swapped
+        self.max_entries = max_entries
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_wait_seconds = batch_wait_seconds
+        self.top_k = retriever.search_kwargs.get('k', 4)
+        self.cache = OrderedDict() # normalized query -> list of Documents
+        self.cached_vectorstore = retriever.vectorstore # The vector store the cached results came from
+        self.in_progress = {} # normalized query -> Future shared by everyone waiting for it
+        self.pending = [] # (normalized query, original query) pairs waiting for the next batch
+        self.lock = threading.Lock()
+        self.pending_added = threading.Condition(self.lock)
+        self.embed_executor = ThreadPoolExecutor(max_workers=self.max_batch_size, thread_name_prefix="query-embedding")
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.evictions = 0
+        self.batcher_thread = threading.Thread(target=self._batch_loop, name="retrieval-batcher", daemon=True)
+        self.batcher_thread.start()
+
+    @classmethod
+    def from_config(cls, retriever) -> "BatchingRetriever":
+        return cls(
+            retriever,
+            max_entries=config.RETRIEVAL_CACHE_MAX_ENTRIES,
+            max_batch_size=config.RETRIEVAL_BATCH_MAX_SIZE,
+            batch_wait_seconds=config.RETRIEVAL_BATCH_WAIT_SECONDS,
+        )
+
+    # --- Lookup ---
+    def _check_vectorstore(self):
+        """Drops cached results once the knowledge base has been updated (lock held)."""
+        if self.retriever.vectorstore is not self.cached_vectorstore:
+            self.cache.clear()
+            self.cached_vectorstore = self.retriever.vectorstore
+
+    def invoke(self, query: str) -> list:
+        """Returns the documents relevant to query, from the cache or the next batched search."""
+        key = normalize_query(query)
+        with self.lock:
+            self._check_vectorstore()
+            docs = self.cache.get(key)
+            if docs is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return list(docs)
+            self.misses += 1
+            future = self.in_progress.get(key)
+            if future is None:
+                future = self.in_progress[key] = Future()
+                self.pending.append((key, query))
+                self.pending_added.notify()
+        return list(future.result())
+
+    # --- Batched Search ---
+    def _embed_queries(self, embedding_model, queries: list) -> list:
+        """
+        One batch call where the model offers it: embed_queries, or embed_documents with the query task type
+        (GoogleGenerativeAIEmbeddings; embed_query embeds with task_type "retrieval_query", embed_documents does
+        not by default). Otherwise concurrent embed_query calls.
+        """
+        embed_queries = getattr(embedding_model, 'embed_queries', None)
+        if embed_queries is not None:
+            return embed_queries(queries)
+        if 'task_type' in inspect.signature(embedding_model.embed_documents).parameters:
+            return embedding_model.embed_documents(queries, task_type="retrieval_query")
+        if len(queries) == 1:
+            return [embedding_model.embed_query(queries[0])]
+        return list(self.embed_executor.map(embedding_model.embed_query, queries))
+
+    def _search(self, queries: list) -> tuple:
+        """Embeds queries and runs one FAISS search for all of them. Returns (documents per query, vector store searched)."""
+        vectorstore = self.retriever.vectorstore
+        vectors = np.array(self._embed_queries(vectorstore.embedding_function, queries), dtype=np.float32)
+        if getattr(vectorstore, '_normalize_L2', False):
+            faiss.normalize_L2(vectors)
+        _, indices = vectorstore.index.search(vectors, self.top_k)
+        results = []
+        for row in indices:
+            docs = []
+            for index_position in row:
+                if index_position == -1:
+                    continue # Fewer than top_k vectors in the index
+                docs.append(vectorstore.docstore.search(vectorstore.index_to_docstore_id[index_position]))
+            results.append(docs)
+        return results, vectorstore
+
+    def _take_batch(self) -> list:
+        with self.lock:
+            while not self.pending:
+                self.pending_added.wait()
+        # Give other problems a moment to join the batch
+        deadline = time.monotonic() + self.batch_wait_seconds
+        with self.lock:
+            while len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.pending_added.wait(remaining)
+            batch = self.pending[:self.max_batch_size]
+            del self.pending[:self.max_batch_size]
+            return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                results, vectorstore = self._search([query for _, query in batch])
+            except Exception as e:
+                with self.lock:
+                    futures = [self.in_progress.pop(key) for key, _ in batch]
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self.lock:
+                self.batches += 1
+                self._check_vectorstore()
+                futures = [self.in_progress.pop(key) for key, _ in batch]
+                if vectorstore is self.cached_vectorstore: # Not stale: the knowledge base was not swapped meanwhile
+                    for (key, _), docs in zip(batch, results):
+                        self.cache[key] = docs
+                        self.cache.move_to_end(key)
+                    while len(self.cache) > self.max_entries:
+                        self.cache.popitem(last=False)
+                        self.evictions += 1
+            for future, docs in zip(futures, results):
+                future.set_result(docs)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.cache),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'batches': self.batches,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,413 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+from operator import itemgetter
+import numpy as np
+
+# Import configurations and the timestamp encoding shared with the columnar store
+import config
+import columnar_store
+
+# --- On-Disk Secondary Index Format ---
+# Postings for incident queries ("ERRORs of event X between 10:00 and 10:05 on any node"). The index is a directory
+# next to the offset index:
+#   keys.json    -> {"version": 1, "bucket_seconds": N, "keys": [["level", "ERROR"], ["event_id", "..."], ...]}
+#                   (key id = position in the list; dimensions are DIMENSIONS)
+#   postings.dat -> POSTING_DTYPE records (entry timestamp in epoch ms, byte offset of the entry in the parsed JSONL)
+#   chunks.idx   -> fixed-width CHUNK_RECORDs: the postings of one key within one time bucket
+#                   (bucket_seconds wide, by entry timestamp), in JSONL order, and how far into the JSONL they reach
+# Every entry is posted once per dimension. A query loads only the chunks of its keys and time buckets, intersects
+# them by byte offset and reads just the matching entries from the JSONL.
+# Postings are written in batches (see SecondaryIndexWriter). Chunk records are written after their postings and
+# a torn trailing record is ignored; the JSONL written since the last batch is indexed again on the next open.
+
+INDEX_FORMAT_VERSION = 1
+KEYS_TABLE_NAME = "keys.json"
+POSTINGS_FILE_NAME = "postings.dat"
+CHUNKS_FILE_NAME = "chunks.idx"
+DIMENSIONS = ('level', 'event_id', 'source_file')
+POSTING_DTYPE = np.dtype([('timestamp', '<i8'), ('offset', '<u8')])
+# key id, postings in the chunk, bucket start (epoch ms), first posting (record number in postings.dat), JSONL end offset
+CHUNK_RECORD = struct.Struct('<IIqQQ')
+CHUNK_DTYPE = np.dtype([('key_id', '<u4'), ('count', '<u4'), ('bucket', '<i8'), ('first_posting', '<u8'), ('jsonl_end_offset', '<u8')])
+
+assert CHUNK_RECORD.size == CHUNK_DTYPE.itemsize
+
+
+def _load_keys_table(index_dir: str) -> tuple:
+    """Returns (bucket_seconds or None, [(dimension, value), ...])."""
+    table_path = os.path.join(index_dir, KEYS_TABLE_NAME)
+    if not os.path.exists(table_path):
+        return None, []
+    with open(table_path, 'r', encoding='utf-8') as f_table:
+        table = json.load(f_table)
+    if table.get('version') != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported secondary index version {table.get('version')} in {table_path}")
+    return table['bucket_seconds'], [tuple(key) for key in table['keys']]
+
+def _save_keys_table(index_dir: str, bucket_seconds: int, keys: list):
+    table_path = os.path.join(index_dir, KEYS_TABLE_NAME)
+    tmp_path = table_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f_table:
+        json.dump({'version': INDEX_FORMAT_VERSION, 'bucket_seconds': bucket_seconds, 'keys': keys}, f_table)
+    os.replace(tmp_path, table_path)
+
+def index_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, KEYS_TABLE_NAME))
+
+def _read_records(path: str, dtype: np.dtype, start_record: int = 0) -> np.ndarray:
+    """Complete records of a fixed-width file from start_record on (a torn trailing record is left out)."""
+    try:
+        with open(path, 'rb') as f_records:
+            f_records.seek(start_record * dtype.itemsize)
+            data = f_records.read()
+    except FileNotFoundError:
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+
+
+# --- Writer ---
+class SecondaryIndexWriter:
+    """
+    Posts parsed entries to the secondary index. add() only buffers; flush() writes the buffered postings,
+    grouped into one chunk per (key, time bucket). The owner calls maybe_flush() after the JSONL bytes of the
+    buffered entries are written (ParsedLogWriter does), which flushes every `flush_entries` entries or
+    `flush_interval_seconds`, so few chunks are written per batch.
+    On open, chunks reaching past `parsed_jsonl_size` (output undone by a checkpoint restore) are dropped and
+    the JSONL not covered by the index (written after the last batch, or before the index existed) is indexed.
+    """
+
+    def __init__(self, index_dir: str, parsed_jsonl_path: str, parsed_jsonl_size: int, bucket_seconds: int = 300,
+                 flush_entries: int = 50000, flush_interval_seconds: float = 10.0):
+        self.index_dir = index_dir
+        self.flush_entries = flush_entries
+        self.flush_interval_seconds = flush_interval_seconds
+        os.makedirs(index_dir, exist_ok=True)
+        stored_bucket_seconds, self.keys = _load_keys_table(index_dir)
+        if stored_bucket_seconds is not None and stored_bucket_seconds != bucket_seconds:
+            print(f"WARNING: {index_dir} uses {stored_bucket_seconds}s time buckets (configured: {bucket_seconds}s). Keeping {stored_bucket_seconds}s.")
+            bucket_seconds = stored_bucket_seconds
+        self.bucket_ms = bucket_seconds * 1000
+        self.bucket_seconds = bucket_seconds
+        if stored_bucket_seconds is None:
+            _save_keys_table(index_dir, bucket_seconds, self.keys)
+        self.key_ids = {dimension: {} for dimension in DIMENSIONS} # dimension -> value -> key id
+        for key_id, (dimension, value) in enumerate(self.keys):
+            self.key_ids[dimension][value] = key_id
+        self.f_postings = open(os.path.join(index_dir, POSTINGS_FILE_NAME), 'ab')
+        self.f_chunks = open(os.path.join(index_dir, CHUNKS_FILE_NAME), 'ab')
+        self.pending_entries = [] # Buffered parsed entries (by reference) and their byte offsets
+        self.pending_offsets = []
+        self.pending_jsonl_end_offset = 0
+        self.last_flush_time = time.monotonic()
+
+        indexed_size = self._truncate_to(parsed_jsonl_size)
+        if indexed_size < parsed_jsonl_size:
+            self._index_existing(parsed_jsonl_path, indexed_size, parsed_jsonl_size)
+
+    @classmethod
+    def from_config(cls, parsed_jsonl_path: str, parsed_jsonl_size: int, index_dir: str = None) -> "SecondaryIndexWriter":
+        return cls(index_dir or config.SECONDARY_INDEX_DIR, parsed_jsonl_path, parsed_jsonl_size, config.SECONDARY_INDEX_BUCKET_SECONDS,
+                   config.SECONDARY_INDEX_FLUSH_ENTRIES, config.SECONDARY_INDEX_FLUSH_INTERVAL_SECONDS)
+
+    def _truncate_to(self, parsed_jsonl_size: int) -> int:
+        """Drops torn records and chunks past parsed_jsonl_size. Returns the JSONL size the remaining chunks cover."""
+        chunks = _read_records(os.path.join(self.index_dir, CHUNKS_FILE_NAME), CHUNK_DTYPE)
+        beyond = np.nonzero(chunks['jsonl_end_offset'] > parsed_jsonl_size)[0]
+        keep = int(beyond[0]) if len(beyond) else len(chunks)
+        postings_end = int(chunks['first_posting'][keep]) if keep < len(chunks) else \
+            (int(chunks['first_posting'][-1]) + int(chunks['count'][-1]) if len(chunks) else 0)
+        self.f_chunks.truncate(keep * CHUNK_DTYPE.itemsize)
+        self.f_postings.truncate(postings_end * POSTING_DTYPE.itemsize)
+        return int(chunks['jsonl_end_offset'][keep - 1]) if keep else 0
+
+    def _index_existing(self, parsed_jsonl_path: str, start_offset: int, end_offset: int):
+        print(f"Indexing {end_offset - start_offset} bytes of {parsed_jsonl_path} not yet in the secondary index {self.index_dir}...")
+        with open(parsed_jsonl_path, 'rb') as f_parsed:
+            f_parsed.seek(start_offset)
+            byte_offset = start_offset
+            while byte_offset < end_offset:
+                line = f_parsed.readline(end_offset - byte_offset)
+                if not line:
+                    break
+                try:
+                    parsed_entry = json.loads(line)
+                    if all(field in parsed_entry for field in DIMENSIONS + ('timestamp',)):
+                        self.add(parsed_entry, byte_offset, byte_offset + len(line))
+                except json.JSONDecodeError:
+                    pass # A torn line; it is simply not indexed
+                byte_offset += len(line)
+                if len(self.pending_offsets) >= self.flush_entries:
+                    self.flush()
+        self.flush()
+
+    def add(self, parsed_entry: dict, byte_offset: int, jsonl_end_offset: int):
+        """Buffers the postings of the entry at byte_offset (jsonl_end_offset: where its line ends)."""
+        self.pending_entries.append(parsed_entry)
+        self.pending_offsets.append(byte_offset)
+        self.pending_jsonl_end_offset = jsonl_end_offset
+
+    def maybe_flush(self):
+        if len(self.pending_offsets) >= self.flush_entries or time.monotonic() - self.last_flush_time >= self.flush_interval_seconds:
+            self.flush()
+
+    def _key_ids(self, dimension: str, values: list) -> np.ndarray:
+        dimension_keys = self.key_ids[dimension]
+        for value in set(values).difference(dimension_keys):
+            dimension_keys[value] = len(self.keys)
+            self.keys.append((dimension, value))
+        return np.fromiter(map(dimension_keys.__getitem__, values), dtype=np.uint32, count=len(values))
+
+    def flush(self):
+        """Writes the buffered postings as chunks, then their chunk records."""
+        self.last_flush_time = time.monotonic()
+        if not self.pending_offsets:
+            return
+        known_keys = len(self.keys)
+        offsets = np.array(self.pending_offsets, dtype=np.uint64)
+        # Timestamps that are not valid dates are posted at the previous entry's time
+        timestamps, _ = columnar_store.timestamps_to_ms(list(map(itemgetter('timestamp'), self.pending_entries)))
+        buckets = timestamps // self.bucket_ms * self.bucket_ms
+        key_ids = np.concatenate([self._key_ids(dimension, list(map(itemgetter(dimension), self.pending_entries))) for dimension in DIMENSIONS])
+        offsets = np.tile(offsets, len(DIMENSIONS))
+        timestamps = np.tile(timestamps, len(DIMENSIONS))
+        buckets = np.tile(buckets, len(DIMENSIONS))
+        if len(self.keys) > known_keys:
+            _save_keys_table(self.index_dir, self.bucket_seconds, self.keys) # Before any chunk refers to the new keys
+
+        # Group by (key, bucket); within a group postings stay in JSONL order
+        order = np.lexsort((offsets, buckets, key_ids))
+        key_ids, buckets = key_ids[order], buckets[order]
+        postings = np.empty(len(order), dtype=POSTING_DTYPE)
+        postings['timestamp'] = timestamps[order]
+        postings['offset'] = offsets[order]
+        group_starts = np.nonzero(np.concatenate(([True], (key_ids[1:] != key_ids[:-1]) | (buckets[1:] != buckets[:-1]))))[0]
+        group_counts = np.diff(np.append(group_starts, len(order)))
+
+        self.f_postings.seek(0, os.SEEK_END)
+        first_posting = self.f_postings.tell() // POSTING_DTYPE.itemsize
+        self.f_postings.write(postings.tobytes())
+        self.f_postings.flush() # Postings reach the file before the chunk records that point at them
+        chunks = np.empty(len(group_starts), dtype=CHUNK_DTYPE)
+        chunks['key_id'] = key_ids[group_starts]
+        chunks['count'] = group_counts
+        chunks['bucket'] = buckets[group_starts]
+        chunks['first_posting'] = first_posting + group_starts
+        chunks['jsonl_end_offset'] = self.pending_jsonl_end_offset
+        self.f_chunks.write(chunks.tobytes())
+        self.f_chunks.flush()
+
+        self.pending_entries = []
+        self.pending_offsets = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.f_postings.close()
+            self.f_chunks.close()
+
+
+# --- Query API ---
+class SecondaryIndex:
+    """
+    Answers incident queries from the secondary index: entries matching any of the given values per dimension
+    (levels, event ids, source files) and timestamps in [start, end). Only chunks of the requested keys and time
+    buckets are read; the smallest dimension drives, the others are intersected with it bucket by bucket.
+    Chunks appended by a live writer are picked up on the next query. With the parsed JSONL path, entries
+    written after the writer's last batch are found by decoding that (bounded) tail of the JSONL.
+    """
+
+    def __init__(self, index_dir: str, parsed_jsonl_path: str = None):
+        self.index_dir = index_dir
+        self.parsed_jsonl_path = parsed_jsonl_path
+        self.bucket_ms = None
+        self.key_ids = {dimension: {} for dimension in DIMENSIONS} # dimension -> value -> key id
+        self.chunks = np.zeros(0, dtype=CHUNK_DTYPE)
+        self.postings = np.zeros(0, dtype=POSTING_DTYPE) # Memory map of postings.dat, remapped when it grows
+        self.lock = threading.Lock()
+        # Decoded JSONL past the indexed size: [tail start, bytes decoded up to, [(byte offset, entry), ...]]
+        self.tail = [0, 0, []]
+        self.tail_lock = threading.Lock()
+        self.refresh()
+
+    @classmethod
+    def from_config(cls) -> "SecondaryIndex":
+        return cls(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL)
+
+    def refresh(self):
+        """Loads chunk records appended since the last call."""
+        with self.lock:
+            new_chunks = _read_records(os.path.join(self.index_dir, CHUNKS_FILE_NAME), CHUNK_DTYPE, len(self.chunks))
+            if len(new_chunks) or self.bucket_ms is None:
+                self.chunks = np.concatenate([self.chunks, new_chunks])
+                bucket_seconds, keys = _load_keys_table(self.index_dir)
+                self.bucket_ms = (bucket_seconds or 0) * 1000
+                for key_id, (dimension, value) in enumerate(keys):
+                    self.key_ids[dimension][value] = key_id
+            postings_needed = int((self.chunks['first_posting'] + self.chunks['count']).max()) if len(self.chunks) else 0
+            if postings_needed > len(self.postings):
+                self.postings = np.memmap(os.path.join(self.index_dir, POSTINGS_FILE_NAME), dtype=POSTING_DTYPE, mode='r', shape=(postings_needed,))
+
+    def indexed_jsonl_size(self) -> int:
+        return int(self.chunks['jsonl_end_offset'][-1]) if len(self.chunks) else 0
+
+    def _dimension_chunks(self, dimension: str, values: list, start_ms: int, end_ms: int) -> np.ndarray:
+        """Chunks of the dimension's keys for values (None = all of them) overlapping [start_ms, end_ms)."""
+        dimension_keys = self.key_ids[dimension]
+        key_ids = list(dimension_keys.values()) if values is None else [dimension_keys[value] for value in values if value in dimension_keys]
+        mask = np.isin(self.chunks['key_id'], key_ids)
+        if start_ms is not None:
+            mask &= self.chunks['bucket'] + self.bucket_ms > start_ms
+        if end_ms is not None:
+            mask &= self.chunks['bucket'] < end_ms
+        return self.chunks[mask]
+
+    def source_file_chunks(self, start_ms: int, end_ms: int) -> dict:
+        """source_file -> its chunks in buckets overlapping [start_ms, end_ms], in JSONL order (for timeline.py)."""
+        self.refresh()
+        with self.lock:
+            chunks = self._dimension_chunks('source_file', None, start_ms, end_ms + 1)
+            files = {key_id: value for value, key_id in self.key_ids['source_file'].items()}
+        chunks = chunks[np.lexsort((chunks['first_posting'], chunks['key_id']))]
+        boundaries = np.nonzero(np.diff(chunks['key_id']))[0] + 1
+        return {files[int(file_chunks['key_id'][0])]: file_chunks for file_chunks in np.split(chunks, boundaries) if len(file_chunks)}
+
+    def _load(self, chunks: np.ndarray, start_ms: int, end_ms: int) -> np.ndarray:
+        """Postings of the chunks within [start_ms, end_ms), as one array sorted by JSONL offset."""
+        if not len(chunks):
+            return np.zeros(0, dtype=POSTING_DTYPE)
+        postings = np.concatenate([self.postings[first:first + count] for first, count in
+                                   zip(chunks['first_posting'].tolist(), chunks['count'].tolist())])
+        if start_ms is not None:
+            postings = postings[postings['timestamp'] >= start_ms]
+        if end_ms is not None:
+            postings = postings[postings['timestamp'] < end_ms]
+        return postings[np.argsort(postings['offset'], kind='stable')]
+
+    @staticmethod
+    def _values(values) -> list | None:
+        return [values] if isinstance(values, str) else (None if values is None else list(values))
+
+    def query(self, levels=None, event_ids=None, source_files=None, start_timestamp: str = None, end_timestamp: str = None) -> np.ndarray:
+        """
+        Postings (fields 'timestamp' in epoch ms and 'offset' in the parsed JSONL) of the matching indexed entries,
+        in time order. Each filter is a value or a list of values (None = any); timestamps are
+        "YYYY-MM-DD HH:MM:SS,mmm" or a prefix such as a date, the range is [start, end).
+        """
+        self.refresh()
+        start_ms = columnar_store.timestamp_to_ms(start_timestamp) if start_timestamp else None
+        end_ms = columnar_store.timestamp_to_ms(end_timestamp) if end_timestamp else None
+        filters = {'level': self._values(levels), 'event_id': self._values(event_ids), 'source_file': self._values(source_files)}
+        # Every entry is posted under each dimension, so a query without value filters reads all source_file keys
+        dimensions = [dimension for dimension, values in filters.items() if values is not None] or ['source_file']
+        with self.lock:
+            dimension_chunks = [self._dimension_chunks(dimension, filters[dimension], start_ms, end_ms) for dimension in dimensions]
+            dimension_chunks.sort(key=lambda chunks: int(chunks['count'].sum()))
+            driver_chunks = dimension_chunks[0]
+            result = self._load(driver_chunks, start_ms, end_ms)
+            buckets = np.unique(driver_chunks['bucket'])
+            for chunks in dimension_chunks[1:]:
+                if not len(result):
+                    break
+                # Only the buckets the driving postings fall in
+                chunks = chunks[np.isin(chunks['bucket'], buckets)]
+                result = result[np.isin(result['offset'], self._load(chunks, start_ms, end_ms)['offset'], assume_unique=True)]
+        return result[np.lexsort((result['offset'], result['timestamp']))]
+
+    def count(self, **filters) -> int:
+        """Number of indexed entries matching query(**filters), without reading the JSONL."""
+        return len(self.query(**filters))
+
+    def unindexed_tail(self) -> list:
+        """
+        (byte offset, entry) pairs in the JSONL past the indexed size (written after the writer's last batch), in
+        JSONL order. Decoded incrementally: each call only decodes lines appended since the previous one.
+        The list is extended in place until the index catches up, then replaced.
+        """
+        if not self.parsed_jsonl_path or not os.path.exists(self.parsed_jsonl_path):
+            return []
+        indexed_size = self.indexed_jsonl_size()
+        with self.tail_lock:
+            tail_start, decoded_to, entries = self.tail
+            if tail_start != indexed_size or os.path.getsize(self.parsed_jsonl_path) < decoded_to:
+                tail_start = decoded_to = indexed_size
+                entries = []
+            with open(self.parsed_jsonl_path, 'rb') as f_parsed:
+                f_parsed.seek(decoded_to)
+                for line in f_parsed:
+                    if not line.endswith(b'\n'):
+                        break # Still being written
+                    try:
+                        entry = json.loads(line)
+                        if all(field in entry for field in DIMENSIONS + ('timestamp',)):
+                            entries.append((decoded_to, entry))
+                    except json.JSONDecodeError:
+                        pass
+                    decoded_to += len(line)
+            self.tail = [tail_start, decoded_to, entries]
+        return entries
+
+    def unindexed_entries(self, filters: dict = None, start_timestamp: str = None, end_timestamp: str = None) -> list:
+        """Matching (byte offset, entry) pairs of unindexed_tail(). filters: dimension -> list of values (None = any)."""
+        filters = filters or {}
+        return [(byte_offset, entry) for byte_offset, entry in self.unindexed_tail()
+                if all(values is None or entry[dimension] in values for dimension, values in filters.items())
+                and (start_timestamp is None or entry['timestamp'] >= start_timestamp)
+                and (end_timestamp is None or entry['timestamp'] < end_timestamp)]
+
+    def read_entries(self, offsets) -> list:
+        """The parsed entries at the given JSONL byte offsets, in the given order."""
+        offsets = np.asarray(offsets, dtype=np.uint64)
+        if not len(offsets):
+            return []
+        entries = [None] * len(offsets)
+        with open(self.parsed_jsonl_path, 'rb') as f_parsed, mmap.mmap(f_parsed.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            order = np.argsort(offsets, kind='stable') # Read in file order
+            for position, byte_offset in zip(order.tolist(), offsets[order].tolist()):
+                entries[position] = json.loads(mapped[byte_offset:mapped.find(b'\n', byte_offset)])
+        return entries
+
+    def search(self, levels=None, event_ids=None, source_files=None, start_timestamp: str = None, end_timestamp: str = None,
+               limit: int = None, include_unindexed: bool = True) -> list:
+        """
+        The matching parsed entries (as in the JSONL) in time order, at most `limit` (the earliest ones).
+        With include_unindexed, entries not yet in the index are found by scanning the JSONL tail.
+        """
+        postings = self.query(levels, event_ids, source_files, start_timestamp, end_timestamp)
+        entries = self.read_entries(postings['offset'][:limit])
+        if include_unindexed:
+            filters = {'level': self._values(levels), 'event_id': self._values(event_ids), 'source_file': self._values(source_files)}
+            tail = self.unindexed_entries(filters, start_timestamp, end_timestamp)
+            if tail:
+                entries = sorted(entries + [entry for _, entry in tail], key=lambda entry: entry['timestamp'])[:limit]
+        return entries
+
+    def stats(self) -> dict:
+        self.refresh()
+        return {
+            'keys': {dimension: len(dimension_keys) for dimension, dimension_keys in self.key_ids.items()},
+            'chunks': len(self.chunks),
+            'postings': len(self.postings),
+            'bucket_seconds': self.bucket_ms // 1000 if self.bucket_ms else None,
+            'indexed_jsonl_bytes': self.indexed_jsonl_size(),
+        }
+
+
+def build_index(parsed_jsonl_path: str = None, index_dir: str = None) -> dict:
+    """
+    Builds (or catches up) the secondary index for an existing parsed JSONL, e.g. output from before the index was
+    enabled, so the ingestion stream does not have to do it when it opens. Returns the index stats.
+    """
+    parsed_jsonl_path = parsed_jsonl_path or config.OUTPUT_PARSED_JSONL
+    index_dir = index_dir or config.SECONDARY_INDEX_DIR
+    SecondaryIndexWriter.from_config(parsed_jsonl_path, os.path.getsize(parsed_jsonl_path), index_dir).close()
+    return SecondaryIndex(index_dir).stats()
+
+
+if __name__ == "__main__":
+    # python secondary_index.py: index config.OUTPUT_PARSED_JSONL into config.SECONDARY_INDEX_DIR before enabling it
+    print(build_index())
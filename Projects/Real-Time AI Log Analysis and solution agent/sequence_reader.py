@@ -0,0 +1,307 @@
+import os
+import json
+import bisect
+import threading
+from collections import deque
+from itertools import islice
+from operator import itemgetter
+
+# Import configurations from config.py
+import config
+
+# Spans closer than this are read with one positional read in a batch (one read beats two seeks on disk)
+BATCH_MERGE_GAP_BYTES = 64 * 1024
+# Read size when the target's own offset is unknown and the span end has to be found by counting lines
+FALLBACK_READ_BYTES = 64 * 1024
+
+# Decodes one record at a given position of a str, straight into the C scanner (no per-line slice or bytes detection)
+JSON_DECODER = json.JSONDecoder()
+
+
+class ParsedLogSequenceReader:
+    """
+    Reads the entries preceding a problem from the parsed JSONL, for the LLM prompt.
+
+    One read-only descriptor stays open and is read with positional reads (os.pread), so worker threads
+    share it without seeking. For a target it reads exactly the bytes between the offset of the sequence's
+    first entry and the target's own offset (both from the offset index). Only records of the target's
+    source file are JSON-decoded (others are skipped by a byte search), and only `fields` are returned.
+    read_sequences() serves many targets in one pass over the file, in offset order, reading nearby spans
+    together and decoding records shared by several sequences once. The descriptor is reopened when the
+    file is replaced (regeneration removes and recreates it).
+    """
+
+    def __init__(self, parsed_jsonl_path: str, fields: list = None):
+        self.path = parsed_jsonl_path
+        self.fields = tuple(config.SEQUENCE_FIELDS if fields is None else fields)
+        self.fd = None
+        self.file_identity = None # (st_dev, st_ino) of the open file
+        self.retired_fds = [] # Descriptors of replaced files; closed in close(), other threads may still read them
+        self.lock = threading.Lock()
+
+    # --- File Access ---
+    def _descriptor(self) -> int | None:
+        """The open descriptor for self.path (reopened if the path now names another file); None if missing."""
+        try:
+            stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        identity = (stat_result.st_dev, stat_result.st_ino)
+        with self.lock:
+            if self.fd is None or self.file_identity != identity:
+                if self.fd is not None:
+                    self.retired_fds.append(self.fd)
+                self.fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+                self.file_identity = identity
+            return self.fd
+
+    def _read(self, fd: int, offset: int, length: int) -> bytes:
+        if hasattr(os, 'pread'):
+            chunks = []
+            while length > 0:
+                chunk = os.pread(fd, length, offset)
+                if not chunk:
+                    break # End of file
+                chunks.append(chunk)
+                offset += len(chunk)
+                length -= len(chunk)
+            return b"".join(chunks)
+        with self.lock: # No positional reads on this platform: seek + read must not interleave
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, length)
+
+    def _read_lines(self, fd: int, offset: int, max_lines: int) -> bytes:
+        """Reads forward from offset until max_lines complete lines (or EOF)."""
+        data = b""
+        while data.count(b'\n') < max_lines:
+            chunk = self._read(fd, offset + len(data), FALLBACK_READ_BYTES)
+            if not chunk:
+                break
+            data += chunk
+        lines = data.split(b'\n')
+        return b'\n'.join(lines[:max_lines])
+
+    # --- Sequences ---
+    def _span(self, target_entry_metadata: dict, num_lines_before: int, offset_map) -> tuple | None:
+        """(source_file, target_line_id, start_offset, end_offset or None) for a target, or None if unreadable."""
+        source_file = target_entry_metadata.get('source_file')
+        target_line_id = target_entry_metadata.get('line_id_in_file_header')
+        if not source_file or not isinstance(target_line_id, int) or num_lines_before <= 0:
+            return None
+        start_line_id = max(1, target_line_id - num_lines_before)
+        start_offset = offset_map.get((source_file, start_line_id))
+        if start_offset is None:
+            return None # The sequence must start at an indexed entry, as in the original lookup
+        return source_file, target_line_id, start_offset, offset_map.get((source_file, target_line_id))
+
+    def _build_sequence(self, records: list, target_line_id: int, num_lines_before: int) -> list:
+        records = [record for record in records if record.get('line_id_in_file_header', 0) < target_line_id]
+        records.sort(key=lambda record: record.get('line_id_in_file_header', 0))
+        return [{field: record[field] for field in self.fields if field in record} for record in records[-num_lines_before:]]
+
+    def _decode_records(self, data: bytes, data_offset: int, source_file: str, decoded: dict) -> list:
+        """Records of source_file in data (which starts at data_offset), decoded once per offset via `decoded`."""
+        source_marker = b'"source_file": ' + json.dumps(source_file).encode('utf-8') # As ParsedLogWriter encodes it
+        # ParsedLogWriter writes ASCII-only JSON, so byte positions are also str positions
+        text = data.decode('ascii') if data.isascii() else None
+        records = []
+        line_start = 0
+        while line_start < len(data):
+            line_end = data.find(b'\n', line_start)
+            if line_end == -1:
+                line_end = len(data)
+            if data.find(source_marker, line_start, line_end) != -1:
+                record = decoded.get(data_offset + line_start)
+                if record is None:
+                    try:
+                        if text is not None:
+                            record = JSON_DECODER.raw_decode(text, line_start)[0]
+                        else:
+                            record = json.loads(data[line_start:line_end])
+                    except json.JSONDecodeError:
+                        record = {}
+                    decoded[data_offset + line_start] = record
+                if record.get('source_file') == source_file:
+                    records.append(record)
+            line_start = line_end + 1
+        return records
+
+    def read_sequence(self, target_entry_metadata: dict, num_lines_before: int, offset_map) -> list:
+        """Up to num_lines_before entries preceding the target, oldest first ([] if they cannot be located)."""
+        return self.read_sequences([target_entry_metadata], num_lines_before, offset_map)[0]
+
+    def read_sequences(self, targets: list, num_lines_before: int, offset_map) -> list:
+        """read_sequence() for many targets (one list per target, in the given order), in one sorted pass."""
+        results = [[] for _ in targets]
+        fd = self._descriptor()
+        if fd is None:
+            return results
+
+        spans = [] # (start_offset, end_offset, target index, source_file, target_line_id)
+        for target_index, target in enumerate(targets):
+            span = self._span(target, num_lines_before, offset_map)
+            if span is None:
+                continue
+            source_file, target_line_id, start_offset, end_offset = span
+            if end_offset is None:
+                # Target not indexed: read as many lines as the sequence can span, plus a few
+                data = self._read_lines(fd, start_offset, num_lines_before + 5)
+                records = self._decode_records(data, start_offset, source_file, {})
+                results[target_index] = self._build_sequence(records, target_line_id, num_lines_before)
+            elif end_offset > start_offset:
+                spans.append((start_offset, end_offset, target_index, source_file, target_line_id))
+        spans.sort()
+
+        # Group spans into regions read with one positional read each
+        position = 0
+        while position < len(spans):
+            region_start, region_end = spans[position][0], spans[position][1]
+            group_end = position + 1
+            while group_end < len(spans) and spans[group_end][0] <= region_end + BATCH_MERGE_GAP_BYTES:
+                region_end = max(region_end, spans[group_end][1])
+                group_end += 1
+            region = self._read(fd, region_start, region_end - region_start)
+            decoded = {} # Absolute line offset -> record, shared by overlapping sequences
+            for start_offset, end_offset, target_index, source_file, target_line_id in spans[position:group_end]:
+                data = region[start_offset - region_start:end_offset - region_start]
+                records = self._decode_records(data, start_offset, source_file, decoded)
+                results[target_index] = self._build_sequence(records, target_line_id, num_lines_before)
+            position = group_end
+        return results
+
+    def close(self):
+        with self.lock:
+            for fd in self.retired_fds + ([self.fd] if self.fd is not None else []):
+                os.close(fd)
+            self.fd = None
+            self.file_identity = None
+            self.retired_fds = []
+
+
+class RecentEntryBuffer:
+    """
+    The most recent parsed entries of every source file, kept in memory as the stream writes them, so a
+    problem's preceding sequence is served without touching the parsed JSONL. Per file it keeps the last
+    `num_lines_before + headroom` entries; the headroom covers problems still queued while the stream
+    moves on. get_sequence() returns exactly what ParsedLogSequenceReader would read from disk, or None
+    when the buffer no longer (or never did) cover the sequence, e.g. after eviction or a restart.
+    """
+
+    def __init__(self, num_lines_before: int, headroom: int = 1000, fields: list = None):
+        self.num_lines_before = num_lines_before
+        self.capacity = num_lines_before + headroom + 1 # + 1: the sequence's first entry is looked up by id
+        self.fields = tuple(config.SEQUENCE_FIELDS if fields is None else fields)
+        self.line_ids = {} # source_file -> deque of line ids (ascending)
+        self.entries = {} # source_file -> deque of parsed entries, parallel to line_ids
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "RecentEntryBuffer":
+        return cls(config.NUM_PRECEDING_LOGS_FOR_SEQUENCE, config.RECENT_ENTRIES_HEADROOM)
+
+    def append(self, parsed_entry: dict):
+        """Records a parsed entry just written by the stream (kept by reference, not copied)."""
+        source_file = parsed_entry['source_file']
+        line_id = parsed_entry['line_id_in_file_header']
+        with self.lock:
+            line_ids = self.line_ids.get(source_file)
+            if line_ids is None:
+                line_ids = self.line_ids[source_file] = deque(maxlen=self.capacity)
+                self.entries[source_file] = deque(maxlen=self.capacity)
+            elif line_ids and line_id <= line_ids[-1]:
+                # Line ids went back: the raw file was rotated or truncated, earlier entries are another file's
+                line_ids.clear()
+                self.entries[source_file].clear()
+            line_ids.append(line_id)
+            self.entries[source_file].append(parsed_entry)
+
+    def get_sequence(self, target_entry_metadata: dict, num_lines_before: int = None) -> list | None:
+        """Up to num_lines_before entries preceding the target, oldest first; None if not buffered."""
+        num_lines_before = self.num_lines_before if num_lines_before is None else num_lines_before
+        source_file = target_entry_metadata.get('source_file')
+        target_line_id = target_entry_metadata.get('line_id_in_file_header')
+        if not source_file or not isinstance(target_line_id, int) or num_lines_before <= 0:
+            return None
+        start_line_id = max(1, target_line_id - num_lines_before)
+
+        with self.lock:
+            line_ids = self.line_ids.get(source_file)
+            # Covered only if the target itself was buffered (everything before it was appended first)
+            # and the sequence start was not evicted yet
+            if not line_ids or line_ids[0] > start_line_id or line_ids[-1] < target_line_id:
+                self.misses += 1
+                return None
+            self.hits += 1
+            start = bisect.bisect_left(line_ids, start_line_id)
+            if line_ids[start] != start_line_id:
+                return [] # The disk lookup needs an entry at the sequence start too and returns nothing
+            end = bisect.bisect_left(line_ids, target_line_id, start)
+            entries = list(islice(self.entries[source_file], start, end))
+        return [{field: entry[field] for field in self.fields if field in entry} for entry in entries[-num_lines_before:]]
+
+    def source_files(self) -> list:
+        with self.lock:
+            return list(self.line_ids)
+
+    def latest_entries(self, source_file: str, max_entries: int, before_line_id: int = None,
+                       max_timestamp: str = None, min_timestamp: str = None) -> tuple:
+        """
+        Up to max_entries buffered entries of source_file, newest first: before line id before_line_id, not later
+        than max_timestamp and not earlier than min_timestamp (timestamps compare as strings in the log format).
+        Also returns the oldest buffered line id when the buffer ran out first (older entries are on disk), else None.
+        """
+        with self.lock:
+            line_ids = self.line_ids.get(source_file)
+            if not line_ids:
+                return [], None
+            entries = self.entries[source_file]
+            end = len(line_ids) if before_line_id is None else bisect.bisect_left(line_ids, before_line_id)
+            if max_timestamp is not None:
+                end = bisect.bisect_right(entries, max_timestamp, hi=end, key=itemgetter('timestamp'))
+            latest = []
+            for position in range(end - 1, -1, -1):
+                entry = entries[position]
+                if min_timestamp is not None and entry['timestamp'] < min_timestamp:
+                    return latest, None
+                latest.append(entry)
+                if len(latest) >= max_entries:
+                    return latest, None
+            return latest, line_ids[0]
+
+    def clear(self):
+        with self.lock:
+            self.line_ids.clear()
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'source_files': len(self.line_ids),
+                'entries': sum(len(line_ids) for line_ids in self.line_ids.values()),
+                'capacity_per_file': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# --- Shared Readers (one per parsed JSONL path) ---
+_READERS = {}
+_READERS_LOCK = threading.Lock()
+
+def reader_for(parsed_jsonl_path: str) -> ParsedLogSequenceReader:
+    """The shared reader of a parsed JSONL file (created on first use, kept open)."""
+    with _READERS_LOCK:
+        reader = _READERS.get(parsed_jsonl_path)
+        if reader is None:
+            reader = _READERS[parsed_jsonl_path] = ParsedLogSequenceReader(parsed_jsonl_path)
+        return reader
+
+def close_readers():
+    with _READERS_LOCK:
+        for reader in _READERS.values():
+            reader.close()
+        _READERS.clear()
@@ -0,0 +1,207 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_FORMAT_VERSION = 1
+KEY_MODES = ("event_id", "event_id_and_sequence")
+
+
+def make_cache_key(event_id: str, log_sequence: list = None) -> str:
+    """
+    Builds the solution cache key for a problem. With a preceding log sequence, the key also carries
+    a fingerprint of the distinct templates (EventIds) in it, so the same error is analyzed again
+    when it follows a different chain of events. Distinct ids are sorted, so interleaving of the
+    same events does not produce a new key.
+    """
+    if log_sequence is None:
+        return event_id
+    sequence_event_ids = sorted({entry.get('event_id', '') for entry in log_sequence})
+    fingerprint = hashlib.md5("|".join(sequence_event_ids).encode('utf-8')).hexdigest()[:12]
+    return f"{event_id}|{fingerprint}"
+
+
+class SolutionCache:
+    """
+    Thread-safe LRU cache of generated solutions with a time-to-live, persisted to a JSON file.
+
+    Repeated problems (same key) reuse the earlier analysis instead of a new retrieval + LLM call;
+    each reuse increments the entry's occurrence count, which is tagged onto the returned solution.
+    Concurrent requests for the same missing key are coalesced: one computes, the others wait for
+    its result. Error results are never cached.
+    A coalesced burst (see problem_coalescer.py) is re-analyzed, replacing the entry, when it is at least
+    twice as large as the largest burst the cached analysis saw: the LLM then sees how widespread the
+    problem has become, while a sustained storm costs a logarithmic number of analyses, not one per window.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        persist_path: str = None,
+        save_interval_seconds: float = 30.0,
+        key_mode: str = "event_id"
+    ):
+        if key_mode not in KEY_MODES:
+            raise ValueError(f"Unknown solution cache key mode '{key_mode}'. Expected one of {KEY_MODES}.")
+        self.key_mode = key_mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.save_interval_seconds = save_interval_seconds
+        self.entries = OrderedDict() # key -> {'solution', 'created_at', 'last_seen', 'occurrence_count'}
+        self.in_progress = {} # key -> threading.Event set when the computing request finishes
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.last_save_time = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # --- Lookup / Store ---
+    def _lookup(self, key: str, now: float) -> dict | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl_seconds and now - entry['created_at'] > self.ttl_seconds:
+            del self.entries[key]
+            self.expirations += 1
+            self.dirty = True
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, solution: dict, now: float, burst_count: int = 1) -> dict:
+        previous = self.entries.get(key) # Replaced by a re-analyzed burst: keep counting its occurrences
+        entry = {'solution': solution, 'created_at': now, 'last_seen': now, 'burst_count': burst_count,
+                 'occurrence_count': previous['occurrence_count'] + 1 if previous else 1}
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.dirty = True
+        return entry
+
+    @staticmethod
+    def _tagged(key: str, entry: dict, status: str) -> dict:
+        """Returns a copy of the cached solution tagged with how it was obtained."""
+        solution = copy.deepcopy(entry['solution'])
+        solution['solution_cache'] = {
+            'status': status,
+            'key': key,
+            'occurrence_count': entry['occurrence_count'],
+            'first_seen': entry['created_at'],
+        }
+        return solution
+
+    def get_or_compute(self, key: str, compute_fn, burst_count: int = 1) -> dict:
+        """
+        Returns the cached solution for key (counting one more occurrence), or calls compute_fn(),
+        caches its result if it is not an error, and returns it. burst_count is the number of
+        occurrences the problem stands for (its burst summary's count, 1 for a single problem).
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+                entry = self._lookup(key, now)
+                cached_solution = None
+                if entry is not None and burst_count < 2 * entry.get('burst_count', 1):
+                    entry['occurrence_count'] += 1
+                    entry['last_seen'] = now
+                    self.hits += 1
+                    self.dirty = True
+                    cached_solution = self._tagged(key, entry, 'hit')
+                else:
+                    pending = self.in_progress.get(key)
+                    if pending is None:
+                        pending = self.in_progress[key] = threading.Event()
+                        break
+            if cached_solution is not None:
+                self.maybe_save()
+                return cached_solution
+            # Another request is analyzing this problem right now: wait and re-check
+            pending.wait()
+
+        solution = None
+        try:
+            solution = compute_fn()
+        finally:
+            with self.lock:
+                del self.in_progress[key]
+                self.misses += 1
+                entry = None
+                if solution and not solution.get('error'):
+                    entry = self._store(key, solution, time.time(), burst_count)
+            pending.set()
+        self.maybe_save()
+        if entry is None:
+            return solution
+        with self.lock:
+            return self._tagged(key, entry, 'miss')
+
+    # --- Persistence ---
+    def load(self) -> "SolutionCache":
+        """Loads persisted entries (skipping expired ones); a missing or unreadable file leaves the cache empty."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return self
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f_cache:
+                document = json.load(f_cache)
+            if document.get('version') != CACHE_FORMAT_VERSION:
+                print(f"WARNING: Ignoring solution cache {self.persist_path} with unsupported version {document.get('version')}.")
+                return self
+            now = time.time()
+            with self.lock:
+                for key, entry in document.get('entries', []): # Stored oldest (least recently used) first
+                    if not self.ttl_seconds or now - entry['created_at'] <= self.ttl_seconds:
+                        self.entries[key] = entry
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            print(f"Loaded {len(self.entries)} cached solutions from {self.persist_path}.")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"WARNING: Could not read solution cache {self.persist_path}: {e}. Starting with an empty cache.")
+        return self
+
+    def save(self):
+        """Writes the cache atomically (temp file + rename)."""
+        if not self.persist_path:
+            return
+        with self.save_lock:
+            with self.lock:
+                snapshot = [(key, dict(entry)) for key, entry in self.entries.items()]
+                self.dirty = False
+                self.last_save_time = time.monotonic()
+            cache_dir = os.path.dirname(self.persist_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = self.persist_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f_cache:
+                json.dump({'version': CACHE_FORMAT_VERSION, 'entries': snapshot}, f_cache)
+            os.replace(tmp_path, self.persist_path)
+
+    def maybe_save(self):
+        """Saves if there are unsaved changes and the save interval has passed."""
+        if self.dirty and time.monotonic() - self.last_save_time >= self.save_interval_seconds:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"WARNING: Could not save solution cache to {self.persist_path}: {e}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -5,12 +5,29 @@ import time
 import hashlib
 from tqdm import tqdm
 import queue
+import shutil
 import threading
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
 # Import configurations and helper functions from other modules
 import config
 import log_processor
+import offset_index
+import parsed_log_writer
+import replay_scheduler
+import log_follower
+import ingestion_checkpoint
+import problem_coalescer
+import metrics
+
+# Raw lines are added to metrics.RAW_LINES in batches of this size, not one by one on the hot path
+RAW_LINE_METRICS_BATCH = 1000
+# How far past a shard boundary the next entry header is looked for (parallel ingestion)
+SHARD_HEADER_SEARCH_BYTES = 1024 * 1024
 
 # --- Global State for Multi-line Log Assembly (local to this module's scope for simulation) ---
 _current_multi_line_log_buffer = []
@@ -22,11 +39,391 @@ _last_parsed_multi_line_header_info = None
 _parsed_line_counter_local = 0
 
 
+# --- Logical Entry Helpers (shared by the serial and parallel ingestion paths) ---
+def _build_parsed_entry(header_info: dict, multi_line_buffer: list, templates_map: dict) -> dict:
+    """
+    Turns one assembled logical log entry (header info + its raw lines) into the parsed JSONL record.
+    Registers the normalized template in templates_map the first time it is seen.
+    """
+    full_original_message = "".join(multi_line_buffer).strip()
+    # Parallel workers normalize ahead of time; the serial path normalizes here
+    if 'normalized_template' in header_info:
+        normalized_template_key, event_id = header_info['normalized_template'], header_info['event_id']
+    else:
+        normalize_started = time.perf_counter()
+        normalized_template_key, event_id = log_processor.get_template_and_event_id(header_info['content_raw'])
+        metrics.NORMALIZE_SECONDS.observe(time.perf_counter() - normalize_started)
+
+    # Discover unique template
+    if normalized_template_key not in templates_map:
+        templates_map[normalized_template_key] = {
+            'EventId': event_id,
+            'EventTemplate': normalized_template_key,
+            'Description': 'Auto-generated template (Needs human review)',
+            'SampleOriginalMessage': full_original_message,
+            'SampleLevel': header_info['level'],
+            'SampleComponent': header_info['component'],
+        }
+
+    return {
+        "line_id_in_file_header": header_info['line_id_in_file_header'],
+        "source_file": header_info['source_file'],
+        "original_log_full": full_original_message,
+        "timestamp": header_info['timestamp'],
+        "level": header_info['level'],
+        "component": header_info['component'],
+        "event_id": templates_map[normalized_template_key]['EventId'],
+        "event_template": templates_map[normalized_template_key]['EventTemplate'],
+        "parameters": ""
+    }
+
+def _record_parsed_entry(
+    final_parsed_entry: dict,
+    parsed_writer: parsed_log_writer.ParsedLogWriter,
+    global_offset_map: offset_index.OffsetMap,
+    global_parsed_line_counter_list: list,
+    problem_queue_instance: queue.Queue
+):
+    """
+    Appends a parsed entry to the JSONL output and offset index, updates the live offset map and the
+    recent-entry buffer, and pushes the entry to the problem queue if its level needs analysis.
+    """
+    write_started = time.perf_counter()
+    current_byte_offset = parsed_writer.write(final_parsed_entry)
+    global_offset_map[(final_parsed_entry['source_file'], final_parsed_entry['line_id_in_file_header'])] = current_byte_offset
+    global_parsed_line_counter_list[0] += 1
+    metrics.WRITE_SECONDS.observe(time.perf_counter() - write_started)
+    if config.RECENT_ENTRIES_ENABLED:
+        log_processor.RECENT_ENTRIES.append(final_parsed_entry) # Before the problem is queued, so its sequence is there
+
+    level = final_parsed_entry['level'].strip().upper()
+    metrics.PARSED_ENTRIES.labels(level).inc()
+    if level in config.PROBLEMATIC_LEVELS_TO_ANALYZE:
+        metrics.PROBLEMS_DETECTED.labels(level).inc()
+        enqueue_started = time.perf_counter()
+        # Preceding entries still in the write buffer are flushed by the worker if it needs them from disk
+        # (parsed_log_writer.flush_through), so problems do not cost a write syscall each
+        problem_queue_instance.put({
+            'raw_log_entry_string': final_parsed_entry['original_log_full'],
+            'parsed_entry_metadata': {
+                'source_file': final_parsed_entry['source_file'],
+                'line_id_in_file_header': final_parsed_entry['line_id_in_file_header'],
+                'original_log_full': final_parsed_entry['original_log_full'],
+                'timestamp': final_parsed_entry['timestamp'],
+                'level': final_parsed_entry['level'],
+                'component': final_parsed_entry['component'],
+                'event_id': final_parsed_entry['event_id'],
+                'event_template': final_parsed_entry['event_template'],
+            }
+        })
+        metrics.ENQUEUE_SECONDS.observe(time.perf_counter() - enqueue_started)
+
+
+# --- Resumable Ingestion Checkpoints ---
+def _save_ingestion_checkpoint(
+    checkpoints: ingestion_checkpoint.CheckpointStore,
+    parsed_writer: parsed_log_writer.ParsedLogWriter,
+    global_parsed_line_counter_list: list
+):
+    """Syncs the parsed output to disk, then saves the checkpoint describing it (never the other way round)."""
+    parsed_writer.sync()
+    checkpoints.save(parsed_jsonl_size=parsed_writer.file_offset, parsed_entry_count=global_parsed_line_counter_list[0])
+
+def _raw_log_resume_points(all_raw_log_files: list, checkpoints: ingestion_checkpoint.CheckpointStore) -> list:
+    """Returns (path, inode, position, line_id) for every raw file with bytes not yet ingested."""
+    resume_points = []
+    for log_file_path in all_raw_log_files:
+        inode, position, line_id = checkpoints.resume_point(log_file_path)
+        if position < os.path.getsize(log_file_path):
+            resume_points.append((log_file_path, inode, position, line_id))
+    return resume_points
+
+
+# --- Parallel (Sharded) Ingestion ---
+def _next_header_position(f_raw, position: int, file_size: int) -> int:
+    """
+    Start of the first entry header at or after position (a line start if none is found within
+    SHARD_HEADER_SEARCH_BYTES; its leading continuation lines are then attached by the merge stage).
+    """
+    if position >= file_size:
+        return file_size
+    f_raw.seek(position - 1)
+    f_raw.readline() # Skip to the start of the next line (nothing if position already starts one)
+    first_line_start = f_raw.tell()
+    while f_raw.tell() - first_line_start <= SHARD_HEADER_SEARCH_BYTES:
+        line_start = f_raw.tell()
+        raw_bytes = f_raw.readline()
+        if not raw_bytes:
+            return file_size
+        if log_processor.parse_log_line_hybrid_single(log_processor.decode_raw_line(raw_bytes)):
+            return line_start
+    return min(first_line_start, file_size)
+
+def _raw_log_shards(raw_log_resume_points: list, shard_bytes: int) -> list:
+    """
+    Splits the unread bytes of every raw file into byte ranges of about shard_bytes, each starting at an entry
+    header, so one large file is parsed by several workers. Returns, in file order,
+    (path, inode, start position, end position, line id before the shard or None if it continues the previous shard).
+    """
+    shards = []
+    for log_file_path, inode, start_position, start_line_id in raw_log_resume_points:
+        file_size = os.path.getsize(log_file_path)
+        with open(log_file_path, 'rb') as f_raw:
+            shard_start, shard_line_id = start_position, start_line_id
+            while shard_start < file_size:
+                shard_end = _next_header_position(f_raw, shard_start + shard_bytes, file_size)
+                shards.append((log_file_path, inode, shard_start, shard_end, shard_line_id))
+                shard_start, shard_line_id = shard_end, None
+    return shards
+
+def _parse_raw_log_shard(log_file_path: str, start_position: int, end_position: int) -> dict:
+    """
+    Worker-process entry point: assembles multi-line entries, parses headers and normalizes the content
+    of one byte range of a raw log file. Line ids are relative to the range start (the merge stage knows
+    how many lines precede it). Continuation lines found before the first header are returned separately
+    so the merge stage can attach them to the previous entry, exactly as the serial stream does.
+    """
+    source_file = os.path.basename(log_file_path)
+    leading_lines = []
+    entries = [] # List of (header_info, multi_line_buffer) tuples, in file order
+    current_header_info = None
+    current_buffer = []
+    position, line_id = start_position, 0
+    cache_stats_before = log_processor.TEMPLATE_CACHE.stats()
+
+    with open(log_file_path, 'rb') as f_raw:
+        f_raw.seek(start_position)
+        while position < end_position:
+            raw_bytes = f_raw.readline()
+            if not raw_bytes:
+                break
+            entry_start = (position, line_id)
+            position += len(raw_bytes)
+            line_id += 1
+            raw_line = log_processor.decode_raw_line(raw_bytes)
+            header_info = log_processor.parse_log_line_hybrid_single(raw_line)
+
+            if header_info:
+                if current_header_info:
+                    entries.append((current_header_info, current_buffer))
+                header_info['line_id_in_file_header'] = line_id
+                header_info['source_file'] = source_file
+                header_info['entry_start'] = entry_start # Resume point while this entry is unwritten
+                header_info['normalized_template'], header_info['event_id'] = log_processor.get_template_and_event_id(header_info['content_raw'])
+                current_header_info = header_info
+                current_buffer = [raw_line]
+            elif current_header_info:
+                current_buffer.append(raw_line)
+            else:
+                leading_lines.append(raw_line)
+
+    if current_header_info:
+        entries.append((current_header_info, current_buffer))
+
+    cache_stats_after = log_processor.TEMPLATE_CACHE.stats()
+    return {
+        'source_file': source_file,
+        'leading_lines': leading_lines,
+        'entries': entries,
+        'raw_lines_processed': line_id,
+        'end_position': position,
+        # Counter deltas for this shard, merged into the parent's cache stats
+        'template_cache_stats': {k: cache_stats_after[k] - cache_stats_before[k] for k in ('hits', 'misses', 'evictions', 'bypassed_lookups')},
+    }
+
+def _stream_raw_log_files_parallel(
+    raw_log_resume_points: list,
+    num_workers: int,
+    problem_queue_instance: queue.Queue,
+    stop_event: threading.Event,
+    parsed_writer: parsed_log_writer.ParsedLogWriter,
+    checkpoints: ingestion_checkpoint.CheckpointStore,
+    global_offset_map: offset_index.OffsetMap,
+    global_unique_templates_map: dict,
+    global_parsed_line_counter_list: list
+) -> int:
+    """
+    Splits the raw log files into header-aligned byte ranges (config.INGESTION_SHARD_BYTES), parses them in
+    worker processes and merges the results in file order, so the parsed JSONL, offset index, templates and
+    problem queue match the serial stream. raw_log_resume_points holds (path, inode, position, line_id) per
+    file to read. Returns the number of raw lines processed.
+    """
+    total_raw_lines_processed = 0
+    pending_entry = None # Last entry of the previous shard; it may still receive continuation lines
+    frontier = ingestion_checkpoint.IngestionFrontier(checkpoints)
+    last_checkpoint_time = time.monotonic()
+    line_id_base = 0 # Line id before the shard being merged
+
+    # Keep a bounded window of shards in flight: parsed results held in memory stay within
+    # about max_in_flight * INGESTION_SHARD_BYTES, whatever the file sizes
+    shards = _raw_log_shards(raw_log_resume_points, config.INGESTION_SHARD_BYTES)
+    max_in_flight = num_workers * 2
+    shards_iter = iter(shards)
+
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context(config.PROCESS_POOL_START_METHOD)) as executor:
+        in_flight = deque()
+        for shard in itertools.islice(shards_iter, max_in_flight):
+            in_flight.append((shard, executor.submit(_parse_raw_log_shard, shard[0], shard[2], shard[3])))
+
+        total_bytes = sum(shard_end - shard_start for _, _, shard_start, shard_end, _ in shards)
+        with tqdm(total=total_bytes, unit='B', unit_scale=True, desc=f"Streaming from raw log files ({num_workers} workers)") as progress_bar:
+            while in_flight:
+                (log_file_path, inode, shard_start, shard_end, shard_line_id), shard_future = in_flight.popleft()
+                shard = shard_future.result()
+                next_shard = next(shards_iter, None)
+                if next_shard is not None:
+                    in_flight.append((next_shard, executor.submit(_parse_raw_log_shard, next_shard[0], next_shard[2], next_shard[3])))
+
+                if stop_event.is_set():
+                    print("\nStream simulation stopped by external event.")
+                    break
+
+                if shard_line_id is not None:
+                    line_id_base = shard_line_id # First shard of a file
+                total_raw_lines_processed += shard['raw_lines_processed']
+                metrics.RAW_LINES.inc(shard['raw_lines_processed'])
+                log_processor.TEMPLATE_CACHE.absorb_stats(shard['template_cache_stats'])
+                if pending_entry:
+                    pending_entry[1].extend(shard['leading_lines'])
+
+                for header_info, multi_line_buffer in shard['entries']:
+                    if pending_entry:
+                        final_parsed_entry = _build_parsed_entry(pending_entry[0], pending_entry[1], global_unique_templates_map)
+                        _record_parsed_entry(final_parsed_entry, parsed_writer, global_offset_map,
+                                             global_parsed_line_counter_list, problem_queue_instance)
+                    header_info['line_id_in_file_header'] += line_id_base
+                    entry_position, entry_line_id = header_info['entry_start']
+                    frontier.entry_started(shard['source_file'], inode, entry_position, entry_line_id + line_id_base)
+                    pending_entry = (header_info, multi_line_buffer)
+
+                    if time.monotonic() - last_checkpoint_time >= config.INGESTION_CHECKPOINT_INTERVAL_SECONDS:
+                        _save_ingestion_checkpoint(checkpoints, parsed_writer, global_parsed_line_counter_list)
+                        last_checkpoint_time = time.monotonic()
+
+                line_id_base += shard['raw_lines_processed']
+                next_shard_continues_file = bool(in_flight) and in_flight[0][0][4] is None
+                if not next_shard_continues_file:
+                    frontier.file_finished(shard['source_file'], inode, shard['end_position'], line_id_base)
+                progress_bar.update(shard_end - shard_start)
+
+            # Drop any queued shards if we stopped early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # --- FINAL FLUSH of the last logical entry ---
+    # When stopped early it stays unwritten: the checkpoint points at its start, so a restart re-reads it
+    if pending_entry and not stop_event.is_set():
+        final_parsed_entry = _build_parsed_entry(pending_entry[0], pending_entry[1], global_unique_templates_map)
+        _record_parsed_entry(final_parsed_entry, parsed_writer, global_offset_map,
+                             global_parsed_line_counter_list, problem_queue_instance)
+        frontier.pending_entry_written()
+    _save_ingestion_checkpoint(checkpoints, parsed_writer, global_parsed_line_counter_list)
+
+    return total_raw_lines_processed
+
+
+# --- Follow (Tail) Mode for Live Log Directories ---
+def _is_raw_log_file(directory: str, file_name: str) -> bool:
+    return (file_name.endswith('.log') or file_name.endswith('.txt')) and os.path.isfile(os.path.join(directory, file_name))
+
+def follow_raw_log_stream(
+    problem_queue_instance: queue.Queue,
+    stop_event: threading.Event,
+    checkpoints: ingestion_checkpoint.CheckpointStore,
+    global_offset_map: offset_index.OffsetMap,
+    global_unique_templates_map: dict,
+    global_parsed_line_counter_list: list
+):
+    """
+    Tails the raw log files in config.RAW_LOGS_DIR (like `tail -F`) until stop_event is set.
+    New files are picked up as they appear, rotation and truncation are detected per file, and a
+    checkpoint (file, inode, byte position, line id) is saved after each flush of the parsed output
+    so a restart resumes where it stopped. Reports read-to-detection latency for problem entries.
+    """
+    latency_tracker = log_follower.LatencyTracker()
+    tails = {} # source_file -> RawLogTail
+    watcher = log_follower.create_directory_watcher(config.RAW_LOGS_DIR, stop_event)
+    print(f"Following raw logs in {config.RAW_LOGS_DIR} ({type(watcher).__name__}). Stop with Ctrl+C.")
+
+    def emit_entries(entries, parsed_writer):
+        for header_info, multi_line_buffer in entries:
+            metrics.RAW_LINES.inc(len(multi_line_buffer))
+            final_parsed_entry = _build_parsed_entry(header_info, multi_line_buffer, global_unique_templates_map)
+            _record_parsed_entry(final_parsed_entry, parsed_writer, global_offset_map,
+                                 global_parsed_line_counter_list, problem_queue_instance)
+            if final_parsed_entry['level'].strip().upper() in config.PROBLEMATIC_LEVELS_TO_ANALYZE:
+                detection_latency = time.time() - header_info['read_time']
+                latency_tracker.record(detection_latency)
+                metrics.DETECTION_SECONDS.observe(detection_latency)
+
+    def save_checkpoint(parsed_writer):
+        for source_file, tail in tails.items():
+            checkpoints.update(source_file, **tail.checkpoint_state())
+        _save_ingestion_checkpoint(checkpoints, parsed_writer, global_parsed_line_counter_list)
+
+    try:
+        with parsed_log_writer.ParsedLogWriter(config.OUTPUT_PARSED_JSONL, config.OFFSET_INDEX_DIR) as parsed_writer:
+            last_checkpoint_time = last_status_time = time.monotonic()
+
+            while not stop_event.is_set():
+                for file_name in sorted(os.listdir(config.RAW_LOGS_DIR)):
+                    if file_name not in tails and _is_raw_log_file(config.RAW_LOGS_DIR, file_name):
+                        try:
+                            tails[file_name] = log_follower.RawLogTail(os.path.join(config.RAW_LOGS_DIR, file_name), checkpoints.get(file_name))
+                        except OSError as e:
+                            # Rotated or removed since it was listed: it is picked up again on a later poll
+                            print(f"[Follow] Could not open {file_name} ({e}); retrying on the next poll.")
+                            continue
+                        print(f"[Follow] Tailing {file_name} from byte {tails[file_name].position}.")
+
+                read_any_data = False
+                for tail in tails.values():
+                    read_position_before = tail.position + len(tail.partial_line)
+                    completed_entries = tail.check_rotation()
+                    completed_entries.extend(tail.read_new_entries())
+                    read_any_data = read_any_data or tail.position + len(tail.partial_line) != read_position_before
+                    # A multi-line entry is complete once its file has been quiet for a moment
+                    if tail.pending_is_idle(config.FOLLOW_ENTRY_FLUSH_SECONDS):
+                        completed_entries.append(tail.take_pending_entry())
+                    emit_entries(completed_entries, parsed_writer)
+
+                now = time.monotonic()
+                if now - last_checkpoint_time >= config.FOLLOW_CHECKPOINT_INTERVAL_SECONDS:
+                    save_checkpoint(parsed_writer)
+                    last_checkpoint_time = now
+                if now - last_status_time >= config.FOLLOW_STATUS_INTERVAL_SECONDS:
+                    print(f"[Follow] {global_parsed_line_counter_list[0]} entries parsed; {latency_tracker.format_summary()}")
+                    last_status_time = now
+
+                if not read_any_data:
+                    wait_seconds = config.FOLLOW_POLL_INTERVAL_SECONDS
+                    if any(tail.pending_header_info for tail in tails.values()):
+                        wait_seconds = min(wait_seconds, config.FOLLOW_ENTRY_FLUSH_SECONDS)
+                    watcher.wait(wait_seconds)
+
+            # --- Shutdown: emit entries still being assembled and persist the resume point ---
+            for tail in tails.values():
+                pending_entry = tail.take_pending_entry()
+                if pending_entry:
+                    emit_entries([pending_entry], parsed_writer)
+            save_checkpoint(parsed_writer)
+    finally:
+        watcher.close()
+        for tail in tails.values():
+            tail.close()
+
+    print(f"\n--- Follow Mode Stopped ---")
+    print(f"Total logical log entries parsed and indexed: {global_parsed_line_counter_list[0]}")
+    print(f"Problem detection: {latency_tracker.format_summary()}")
+    late_lines = sum(tail.late_lines for tail in tails.values())
+    if late_lines:
+        print(f"WARNING: {late_lines} continuation lines arrived after their entry was emitted and were not attached.")
+
+
 # --- Main Log Stream Processing & Live Indexing Function ---
 def simulate_raw_log_stream(
     problem_queue_instance: queue.Queue,
     stop_event: threading.Event,
-    global_offset_map: dict,
+    global_offset_map: offset_index.OffsetMap,
     global_unique_templates_map: dict, # This is the unique_templates_map to update
     global_parsed_line_counter_list: list
 ):
@@ -34,6 +431,14 @@ def simulate_raw_log_stream(
     Simulates a real-time log stream processing.
     Reads logs from raw files, processes them, updates parsed JSONL and offset index,
     and pushes problematic entries to a queue.
+    Replay speed follows config.STREAM_REPLAY_MODE (see replay_scheduler.py).
+    Progress is checkpointed to config.INGESTION_CHECKPOINT_FILE; unless regenerating, a restart
+    only reads raw bytes that were not turned into parsed output yet (see ingestion_checkpoint.py).
+    With config.INGESTION_WORKERS > 1 the raw files are parsed by a process pool instead
+    (no pacing), producing the same output as the serial stream.
+    With config.FOLLOW_RAW_LOGS the directory is tailed live instead (see follow_raw_log_stream).
+    With config.PROBLEM_COALESCING_ENABLED, bursts of the same problem are merged before they reach
+    the queue (see problem_coalescer.py).
     """
     # Access local state variables that persist across function calls in the loop
     global _current_multi_line_log_buffer, _last_parsed_multi_line_header_info
@@ -45,46 +450,55 @@ def simulate_raw_log_stream(
 
     print("\n--- Simulating Real-time Log Stream ---")
 
-    # --- Initial Setup for Regeneration or Appending ---
+    # --- Initial Setup for Regeneration or Resuming ---
     # This part clears/initializes files and counters based on config.REGENERATE_ALL_FROM_RAW_LOGS
-    if config.REGENERATE_ALL_FROM_RAW_LOGS:
+    checkpoints = ingestion_checkpoint.CheckpointStore(config.INGESTION_CHECKPOINT_FILE)
+    regenerate = config.REGENERATE_ALL_FROM_RAW_LOGS
+    if not regenerate:
+        # Undo parsed output written after the last checkpoint (e.g. before a crash) so nothing is duplicated
+        global_offset_map.clear() # Unmap the persisted index before its records are truncated
+        if not checkpoints.load().restore_parsed_output(config.OUTPUT_PARSED_JSONL, config.OFFSET_INDEX_DIR):
+            print(f"WARNING: {config.OUTPUT_PARSED_JSONL} does not match the ingestion checkpoint "
+                  f"{config.INGESTION_CHECKPOINT_FILE}. Regenerating everything from raw logs.")
+            regenerate = True
+
+    if regenerate:
         print(f"Clearing existing {config.OUTPUT_PARSED_JSONL}")
         if os.path.exists(config.OUTPUT_PARSED_JSONL):
             os.remove(config.OUTPUT_PARSED_JSONL)
-        print(f"Clearing existing {config.OFFSET_INDEX_FILE}")
-        if os.path.exists(config.OFFSET_INDEX_FILE):
-            os.remove(config.OFFSET_INDEX_FILE)
+        print(f"Clearing existing {config.OFFSET_INDEX_DIR}")
+        if os.path.exists(config.OFFSET_INDEX_DIR):
+            shutil.rmtree(config.OFFSET_INDEX_DIR)
+        if os.path.exists(config.COLUMNAR_STORE_DIR):
+            print(f"Clearing existing {config.COLUMNAR_STORE_DIR}")
+            shutil.rmtree(config.COLUMNAR_STORE_DIR)
+        if os.path.exists(config.SECONDARY_INDEX_DIR):
+            print(f"Clearing existing {config.SECONDARY_INDEX_DIR}")
+            shutil.rmtree(config.SECONDARY_INDEX_DIR)
         print(f"Clearing existing {config.OUTPUT_TEMPLATES_CSV}")
         if os.path.exists(config.OUTPUT_TEMPLATES_CSV):
             os.remove(config.OUTPUT_TEMPLATES_CSV) # Clear existing template CSV for fresh start
+        checkpoints.clear() # Every raw file restarts from byte 0
 
         _parsed_line_counter_local = 0 # Reset local counter for this simulation run
+        global_parsed_line_counter_list[0] = 0
         global_unique_templates_map.clear() # Clear the shared global templates map
         global_offset_map.clear() # Clear the shared global offset map (from realtime_app.py)
-
-    else: # If not regenerating, try to initialize local counter and maps from existing files
-        _parsed_line_counter_local = 0 # Default to 0, will update from global_offset_map if it loads
-
-        # If offset_index exists, populate the global_offset_map and update local counter
-        if os.path.exists(config.OFFSET_INDEX_FILE):
-            try:
-                offset_df = pd.read_csv(config.OFFSET_INDEX_FILE)
-                for index, row in offset_df.iterrows():
-                    global_offset_map[(str(row['source_file']), int(row['line_id_in_file_header']))] = int(row['byte_offset'])
-
-                if global_offset_map:
-                    max_line_id_in_offset_map = 0
-                    for (src_file, line_id), byte_offset in global_offset_map.items():
-                        if line_id > max_line_id_in_offset_map:
-                            max_line_id_in_offset_map = line_id
-                    _parsed_line_counter_local = max_line_id_in_offset_map
-                    print(f"Initialized local parsed_line_counter to {_parsed_line_counter_local} based on existing offset index.")
-            except Exception as e:
-                print(f"Error loading existing offset index CSV in stream_simulator: {e}. Starting with empty offset map.")
+        log_processor.RECENT_ENTRIES.clear()
+
+    else: # Resuming: keep existing output and continue each raw file from its checkpoint
+        _parsed_line_counter_local = checkpoints.parsed_entry_count
+        global_parsed_line_counter_list[0] = checkpoints.parsed_entry_count
+        print(f"Resuming ingestion from checkpoint: {len(checkpoints.files)} raw files, "
+              f"{checkpoints.parsed_entry_count} entries already parsed.")
+
+        # If the offset index exists, attach it (memory-mapped, not loaded)
+        try:
+            if not global_offset_map.attach_persisted_index(config.OFFSET_INDEX_DIR):
+                print("Byte-offset index not found for appending. Starting from scratch in stream_simulator.")
                 global_offset_map.clear()
-                _parsed_line_counter_local = 0
-        else:
-            print("Byte-offset index CSV not found for appending. Starting from scratch in stream_simulator.")
+        except Exception as e:
+            print(f"Error opening existing offset index in stream_simulator: {e}. Starting with empty offset map.")
             global_offset_map.clear()
 
         # If template CSV exists, populate the global_unique_templates_map
@@ -110,158 +524,138 @@ def simulate_raw_log_stream(
         print(f"ERROR: Raw logs directory NOT FOUND at {config.RAW_LOGS_DIR}. Cannot simulate stream.")
         return
 
-    # Prepare list of all raw log files to process
-    all_raw_log_files = [os.path.join(config.RAW_LOGS_DIR, f) for f in os.listdir(config.RAW_LOGS_DIR) if os.path.isfile(os.path.join(config.RAW_LOGS_DIR, f)) and (f.endswith('.log') or f.endswith('.txt'))]
-    all_raw_log_files.sort()
-
-    if not all_raw_log_files:
-        print(f"ERROR: No raw log files found in {config.RAW_LOGS_DIR}. Cannot simulate stream.")
-        return
+    # Detected problems go through the burst coalescer (if enabled) on their way to problem_queue
+    problem_sink = problem_queue_instance
+    if config.PROBLEM_COALESCING_ENABLED:
+        problem_sink = problem_coalescer.BurstCoalescer.from_config(problem_queue_instance)
+        metrics.REGISTRY.register_stats("log_agent_burst_coalescer", problem_sink.stats)
 
-    # Open the output JSONL and offset index files for appending
-    # This try-except block now correctly wraps the entire processing logic within the function.
     try:
-        with open(config.OUTPUT_PARSED_JSONL, 'a', encoding='utf-8') as f_parsed_jsonl, \
-             open(config.OFFSET_INDEX_FILE, 'a', encoding='utf-8') as f_offset_index:
-
-            total_raw_lines_processed = 0
-
-            # This is the main stream loop iterating through raw log files
-            for log_file_path in tqdm(all_raw_log_files, desc="Streaming from raw log files"):
-                print(f"Processing raw log file: {os.path.basename(log_file_path)}")
-
-                with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f_raw:
-                    for i, raw_line in enumerate(f_raw):
+        if config.FOLLOW_RAW_LOGS:
+            follow_raw_log_stream(
+                problem_sink, stop_event, checkpoints, global_offset_map,
+                global_unique_templates_map, global_parsed_line_counter_list
+            )
+            return
+
+        # Prepare list of all raw log files to process
+        all_raw_log_files = [os.path.join(config.RAW_LOGS_DIR, f) for f in os.listdir(config.RAW_LOGS_DIR) if os.path.isfile(os.path.join(config.RAW_LOGS_DIR, f)) and (f.endswith('.log') or f.endswith('.txt'))]
+        all_raw_log_files.sort()
+
+        if not all_raw_log_files:
+            print(f"ERROR: No raw log files found in {config.RAW_LOGS_DIR}. Cannot simulate stream.")
+            return
+
+        # Only files with bytes past their checkpoint are read, starting at that byte
+        raw_log_resume_points = _raw_log_resume_points(all_raw_log_files, checkpoints)
+        if len(raw_log_resume_points) < len(all_raw_log_files):
+            print(f"{len(all_raw_log_files) - len(raw_log_resume_points)} raw log files have no new data since the last checkpoint.")
+
+        # Open the output JSONL and offset index for appending
+        # This try-except block now correctly wraps the entire processing logic within the function.
+        try:
+            with parsed_log_writer.ParsedLogWriter(config.OUTPUT_PARSED_JSONL, config.OFFSET_INDEX_DIR) as parsed_writer:
+
+                if config.INGESTION_WORKERS > 1:
+                    total_raw_lines_processed = _stream_raw_log_files_parallel(
+                        raw_log_resume_points, config.INGESTION_WORKERS, problem_sink, stop_event,
+                        parsed_writer, checkpoints, global_offset_map,
+                        global_unique_templates_map, global_parsed_line_counter_list
+                    )
+                else:
+                    total_raw_lines_processed = 0
+                    raw_lines_in_metrics = 0 # Part of total_raw_lines_processed already added to metrics.RAW_LINES
+                    scheduler = replay_scheduler.ReplayScheduler.from_config(stop_event)
+                    frontier = ingestion_checkpoint.IngestionFrontier(checkpoints)
+                    last_checkpoint_time = time.monotonic()
+                    print(f"Replay mode: {scheduler.mode}")
+
+                    # This is the main stream loop iterating through raw log files
+                    for log_file_path, inode, start_position, start_line_id in tqdm(raw_log_resume_points, desc="Streaming from raw log files"):
+                        source_file = os.path.basename(log_file_path)
+                        print(f"Processing raw log file: {source_file}" + (f" (resuming at byte {start_position})" if start_position else ""))
+                        position, line_id = start_position, start_line_id
+
+                        with open(log_file_path, 'rb') as f_raw:
+                            f_raw.seek(start_position)
+                            for raw_bytes in f_raw:
+                                if stop_event.is_set():
+                                    print("\nStream simulation stopped by external event.")
+                                    break # Break from the inner loop (current file)
+
+                                total_raw_lines_processed += 1
+                                line_start = position
+                                position += len(raw_bytes)
+                                line_id += 1
+                                raw_line = log_processor.decode_raw_line(raw_bytes)
+
+                                # --- Process a single raw log line ---
+                                header_info = log_processor.parse_log_line_hybrid_single(raw_line)
+
+                                scheduler.pace(raw_line, header_info['timestamp'] if header_info else None, len(raw_bytes))
+
+                                if header_info:
+                                    if _current_multi_line_log_buffer and _last_parsed_multi_line_header_info:
+                                        final_parsed_entry = _build_parsed_entry(
+                                            _last_parsed_multi_line_header_info, _current_multi_line_log_buffer, global_unique_templates_map
+                                        )
+                                        _record_parsed_entry(final_parsed_entry, parsed_writer, global_offset_map,
+                                                             global_parsed_line_counter_list, problem_sink)
+                                    frontier.entry_started(source_file, inode, line_start, line_id - 1)
+
+                                    # Start new logical log entry buffer with the current line (header)
+                                    _current_multi_line_log_buffer = [raw_line]
+                                    _last_parsed_multi_line_header_info = header_info
+                                    _last_parsed_multi_line_header_info['line_id_in_file_header'] = line_id
+                                    _last_parsed_multi_line_header_info['source_file'] = source_file
+
+                                    if time.monotonic() - last_checkpoint_time >= config.INGESTION_CHECKPOINT_INTERVAL_SECONDS:
+                                        _save_ingestion_checkpoint(checkpoints, parsed_writer, global_parsed_line_counter_list)
+                                        last_checkpoint_time = time.monotonic()
+                                    if total_raw_lines_processed - raw_lines_in_metrics >= RAW_LINE_METRICS_BATCH:
+                                        metrics.RAW_LINES.inc(total_raw_lines_processed - raw_lines_in_metrics)
+                                        raw_lines_in_metrics = total_raw_lines_processed
+
+                                else: # This line is a continuation of the previous log entry
+                                    _current_multi_line_log_buffer.append(raw_line)
+                                    if not _last_parsed_multi_line_header_info and raw_line.strip():
+                                        _current_multi_line_log_buffer = []
+
+                        metrics.RAW_LINES.inc(total_raw_lines_processed - raw_lines_in_metrics)
+                        raw_lines_in_metrics = total_raw_lines_processed
+
+                        # This check ensures we break the outer loop if the stop_event was set
                         if stop_event.is_set():
                             print("\nStream simulation stopped by external event.")
-                            break # Break from the inner loop (current file)
-
-                        total_raw_lines_processed += 1
-
-                        time.sleep(config.STREAM_DELAY_SECONDS)
-
-                        # --- Process a single raw log line ---
-                        header_info = log_processor.parse_log_line_hybrid_single(raw_line)
-
-                        if header_info:
-                            if _current_multi_line_log_buffer and _last_parsed_multi_line_header_info:
-                                full_original_message = "".join(_current_multi_line_log_buffer).strip()
-                                content_to_normalize = _last_parsed_multi_line_header_info['content_raw']
-                                normalized_template_key = log_processor.normalize_log_content(content_to_normalize)
-
-                                # Discover unique template
-                                if normalized_template_key not in global_unique_templates_map: # Use global map
-                                    event_id_hash = hashlib.md5(normalized_template_key.encode('utf-8')).hexdigest()[:8].upper()
-                                    global_unique_templates_map[normalized_template_key] = { # Use global map
-                                        'EventId': f'HDFS_{event_id_hash}',
-                                        'EventTemplate': normalized_template_key,
-                                        'Description': 'Auto-generated template (Needs human review)',
-                                        'SampleOriginalMessage': full_original_message,
-                                        'SampleLevel': _last_parsed_multi_line_header_info['level'],
-                                        'SampleComponent': _last_parsed_multi_line_header_info['component'],
-                                    }
-
-                                final_parsed_entry = {
-                                    "line_id_in_file_header": _last_parsed_multi_line_header_info['line_id_in_file_header'],
-                                    "source_file": _last_parsed_multi_line_header_info['source_file'],
-                                    "original_log_full": full_original_message,
-                                    "timestamp": _last_parsed_multi_line_header_info['timestamp'],
-                                    "level": _last_parsed_multi_line_header_info['level'],
-                                    "component": _last_parsed_multi_line_header_info['component'],
-                                    "event_id": global_unique_templates_map[normalized_template_key]['EventId'],
-                                    "event_template": global_unique_templates_map[normalized_template_key]['EventTemplate'],
-                                    "parameters": ""
-                                }
-
-                                current_byte_offset = f_parsed_jsonl.tell()
-                                json_line_str = json.dumps(final_parsed_entry) + '\n'
-                                f_parsed_jsonl.write(json_line_str)
-
-                                offset_index_entry = {
-                                    'source_file': final_parsed_entry['source_file'],
-                                    'line_id_in_file_header': final_parsed_entry['line_id_in_file_header'],
-                                    'byte_offset': current_byte_offset
-                                }
-                                f_offset_index.write(json.dumps(offset_index_entry) + '\n')
-
-                                global_offset_map[(offset_index_entry['source_file'], offset_index_entry['line_id_in_file_header'])] = offset_index_entry['byte_offset']
-                                global_parsed_line_counter_list[0] += 1
-
-                                if _last_parsed_multi_line_header_info['level'].strip().upper() in config.PROBLEMATIC_LEVELS_TO_ANALYZE:
-                                    problem_queue_instance.put({
-                                        'raw_log_entry_string': full_original_message,
-                                        'parsed_entry_metadata': {
-                                            'source_file': final_parsed_entry['source_file'],
-                                            'line_id_in_file_header': final_parsed_entry['line_id_in_file_header'],
-                                            'original_log_full': final_parsed_entry['original_log_full'],
-                                            'timestamp': final_parsed_entry['timestamp'],
-                                            'level': final_parsed_entry['level'],
-                                            'component': final_parsed_entry['component'],
-                                            'event_id': final_parsed_entry['event_id'],
-                                            'event_template': final_parsed_entry['event_template'],
-                                        }
-                                    })
-
-                            # Start new logical log entry buffer with the current line (header)
-                            _current_multi_line_log_buffer = [raw_line]
-                            _last_parsed_multi_line_header_info = header_info
-                            _last_parsed_multi_line_header_info['line_id_in_file_header'] = i + 1
-                            _last_parsed_multi_line_header_info['source_file'] = os.path.basename(log_file_path)
-
-                        else: # This line is a continuation of the previous log entry
-                            _current_multi_line_log_buffer.append(raw_line)
-                            if not _last_parsed_multi_line_header_info and raw_line.strip():
-                                _current_multi_line_log_buffer = []
-
-                # This check ensures we break the outer loop if the stop_event was set
-                if stop_event.is_set():
-                    print("\nStream simulation stopped by external event.")
-                    break # Break from the outer loop (file iteration)
-
-            # --- FINAL FLUSH after all files are processed ---
-            # This block needs to be inside the outermost try-with-open for f_parsed_jsonl and f_offset_index
-            if _current_multi_line_log_buffer and _last_parsed_multi_line_header_info:
-                full_original_message = "".join(_current_multi_line_log_buffer).strip()
-                content_to_normalize = _last_parsed_multi_line_header_info['content_raw']
-                normalized_template_key = log_processor.normalize_log_content(content_to_normalize)
-
-                if normalized_template_key not in global_unique_templates_map:
-                    event_id_hash = hashlib.md5(normalized_template_key.encode('utf-8')).hexdigest()[:8].upper()
-                    global_unique_templates_map[normalized_template_key] = {
-                        'EventId': f'HDFS_{event_id_hash}',
-                        'EventTemplate': normalized_template_key,
-                        'Description': 'Auto-generated template (Needs human review)',
-                        'SampleOriginalMessage': full_original_message,
-                        'SampleLevel': _last_parsed_multi_line_header_info['level'],
-                        'SampleComponent': _last_parsed_multi_line_header_info['component'],
-                    }
-                final_parsed_entry = {
-                    "line_id_in_file_header": _last_parsed_multi_line_header_info['line_id_in_file_header'],
-                    "source_file": _last_parsed_multi_line_header_info['source_file'],
-                    "original_log_full": full_original_message,
-                    "timestamp": _last_parsed_multi_line_header_info['timestamp'],
-                    "level": _last_parsed_multi_line_header_info['level'],
-                    "component": _last_parsed_multi_line_header_info['component'],
-                    "event_id": global_unique_templates_map[normalized_template_key]['EventId'],
-                    "event_template": normalized_template_key,
-                    "parameters": ""
-                }
-                json_line = json.dumps(final_parsed_entry) + '\n'
-                f_parsed_jsonl.write(json_line)
-
-                offset_index_entry = {
-                    'source_file': final_parsed_entry['source_file'],
-                    'line_id_in_file_header': final_parsed_entry['line_id_in_file_header'],
-                    'byte_offset': f_parsed_jsonl.tell() - len(json_line.encode('utf-8'))
-                }
-                f_offset_index.write(json.dumps(offset_index_entry) + '\n')
-                global_offset_map[(offset_index_entry['source_file'], offset_index_entry['line_id_in_file_header'])] = offset_index_entry['byte_offset']
-                global_parsed_line_counter_list[0] += 1
-
-        print(f"\n--- Raw Log Stream Simulation Complete ---")
-        print(f"Total raw lines processed: {total_raw_lines_processed}")
-        print(f"Total logical log entries parsed and indexed: {global_parsed_line_counter_list[0]}")
-
-    except Exception as e:
-        # This except block needs to be at the same indentation level as the 'try' it belongs to.
-        print(f"An error occurred during streaming or parsing: {e}")
\ No newline at end of file
+                            break # Break from the outer loop (file iteration)
+                        frontier.file_finished(source_file, inode, position, line_id)
+
+                    # --- FINAL FLUSH after all files are processed ---
+                    # When stopped early the last entry stays unwritten; the checkpoint points at its start
+                    # so a restart re-reads it together with any continuation lines still to come.
+                    if _current_multi_line_log_buffer and _last_parsed_multi_line_header_info and not stop_event.is_set():
+                        final_parsed_entry = _build_parsed_entry(
+                            _last_parsed_multi_line_header_info, _current_multi_line_log_buffer, global_unique_templates_map
+                        )
+                        _record_parsed_entry(final_parsed_entry, parsed_writer, global_offset_map,
+                                             global_parsed_line_counter_list, problem_sink)
+                        frontier.pending_entry_written()
+                    _save_ingestion_checkpoint(checkpoints, parsed_writer, global_parsed_line_counter_list)
+
+            print(f"\n--- Raw Log Stream Simulation Complete ---")
+            print(f"Total raw lines processed: {total_raw_lines_processed}")
+            print(f"Total logical log entries parsed and indexed: {global_parsed_line_counter_list[0]}")
+            cache_stats = log_processor.TEMPLATE_CACHE.stats()
+            print(f"Template cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                  f"(hit rate {cache_stats['hit_rate']:.1%}), {cache_stats['evictions']} evictions, "
+                  f"size {cache_stats['size']}/{cache_stats['max_size']}, {cache_stats['bypassed_lookups']} lookups bypassed")
+
+        except Exception as e:
+            # This except block needs to be at the same indentation level as the 'try' it belongs to.
+            print(f"An error occurred during streaming or parsing: {e}")
+    finally:
+        if problem_sink is not problem_queue_instance:
+            problem_sink.close() # Forward bursts still inside their window
+            coalescer_stats = problem_sink.stats()
+            print(f"Burst coalescing: {coalescer_stats['received']} problems detected, "
+                  f"{coalescer_stats['forwarded']} forwarded for analysis")
@@ -0,0 +1,250 @@
+import re
+from collections import OrderedDict
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants # Python 3.11+
+except ImportError:
+    import sre_parse, sre_constants
+
+# --- Trigger Extraction for Normalization Rules ---
+# A "trigger" is a set of literal strings, at least one of which must occur in any text a rule can match.
+# Checking `literal in content` is a plain substring search, far cheaper than running the regex itself,
+# so rules whose trigger is absent are skipped without changing the result.
+
+def _collect_trigger_candidates(items, candidates: list):
+    """Walks a parsed regex sequence and appends every required-literal option found to candidates."""
+    current_run = []
+
+    def end_run():
+        if current_run:
+            candidates.append(("".join(current_run),))
+            current_run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            current_run.append(chr(av))
+        elif op is sre_constants.SUBPATTERN and not av[1] and not av[2]:
+            # Plain group: whatever it requires, the whole pattern requires
+            end_run()
+            _collect_trigger_candidates(av[3], candidates)
+        elif op is sre_constants.BRANCH:
+            end_run()
+            alternatives = []
+            for branch_items in av[1]:
+                branch_option = _best_trigger(branch_items)
+                if branch_option is None:
+                    break # One branch without a literal means the whole alternation has no trigger
+                alternatives.extend(branch_option)
+            else:
+                candidates.append(tuple(alternatives))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            # Body appears at least once, so its own required literal is required too
+            end_run()
+            body_option = _best_trigger(av[2])
+            if body_option is not None:
+                candidates.append(body_option)
+        else:
+            end_run()
+    end_run()
+
+def _best_trigger(items) -> tuple | None:
+    """Returns the most selective required-literal option of a parsed regex sequence, or None."""
+    candidates = []
+    _collect_trigger_candidates(items, candidates)
+    if not candidates:
+        return None
+    # Longest shortest-alternative wins; fewer alternatives break ties
+    return max(candidates, key=lambda option: (min(len(alt) for alt in option), -len(option)))
+
+def extract_rule_trigger(regex: re.Pattern) -> tuple | None:
+    """
+    Returns a tuple of literals, at least one of which occurs in every match of regex,
+    or None if no such literal can be derived (the rule then always runs).
+    """
+    if not isinstance(regex.pattern, str) or regex.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed_items = list(sre_parse.parse(regex.pattern, regex.flags))
+    except Exception:
+        return None
+    return _best_trigger(parsed_items)
+
+
+# --- Compiled Normalizer ---
+class CompiledNormalizer:
+    """
+    Staged normalization engine for an ordered list of (compiled regex, placeholder) rules.
+
+    Produces exactly the same templates as applying every rule in order with `re.sub` followed by
+    whitespace collapsing, but each rule is gated by a substring check on its trigger literals,
+    evaluated against the content as rewritten by the earlier rules (placeholders can create triggers).
+    Typical HDFS lines only reach the regex engine for the handful of rules that can actually match.
+    """
+
+    def __init__(self, normalization_rules: list):
+        # List of (regex, placeholder, trigger) in the original rule order
+        self.stages = [(regex, placeholder, extract_rule_trigger(regex)) for regex, placeholder in normalization_rules]
+
+    def normalize(self, content: str) -> str:
+        """Applies the normalization rules to content; identical to the sequential rule application."""
+        normalized_content = content
+        for regex, placeholder, trigger in self.stages:
+            if trigger is not None:
+                for literal in trigger:
+                    if literal in normalized_content:
+                        break
+                else:
+                    continue # No trigger literal present: the rule cannot match
+            normalized_content = regex.sub(placeholder, normalized_content)
+        # Further cleanup: collapse whitespace runs created by replacements (same as re.sub(r'\s+', ' ', ...).strip())
+        return " ".join(normalized_content.split())
+
+
+# --- Structural Signatures for the Template Cache ---
+# Every digit left by the earlier rules is replaced by the final `\d+` rule, so two contents that differ only
+# in digits the rules cannot tell apart normalize to the same template. Masking those digits to one
+# representative gives a cache key that is shared by all lines of a template, while remaining exact.
+
+ASCII_DIGITS = "0123456789"
+
+def _collect_distinguished_digits(items, distinguished: set) -> bool:
+    """
+    Adds to distinguished every ASCII digit that a parsed regex matches differently from the others.
+    Returns False if the pattern uses backreferences (masking would then be unsafe).
+    """
+    for op, av in items:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL):
+            if chr(av) in ASCII_DIGITS:
+                distinguished.add(chr(av))
+        elif op is sre_constants.IN:
+            for set_op, set_av in av:
+                if set_op is sre_constants.LITERAL and chr(set_av) in ASCII_DIGITS:
+                    distinguished.add(chr(set_av))
+                elif set_op is sre_constants.RANGE:
+                    digits_in_range = {d for d in ASCII_DIGITS if set_av[0] <= ord(d) <= set_av[1]}
+                    if digits_in_range and len(digits_in_range) < len(ASCII_DIGITS):
+                        distinguished.update(digits_in_range)
+        elif op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return False
+        elif op is sre_constants.SUBPATTERN:
+            if not _collect_distinguished_digits(av[3], distinguished):
+                return False
+        elif op is sre_constants.BRANCH:
+            for branch_items in av[1]:
+                if not _collect_distinguished_digits(branch_items, distinguished):
+                    return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if not _collect_distinguished_digits(av[2], distinguished):
+                return False
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if not _collect_distinguished_digits(av[1], distinguished):
+                return False
+    return True
+
+def build_digit_signature_table(normalization_rules: list) -> dict | None:
+    """
+    Returns a str.translate table mapping interchangeable ASCII digits to one representative,
+    or None if no safe masking exists for these rules (e.g. a rule keeps digits in its output).
+    """
+    distinguished = set()
+    for regex, placeholder in normalization_rules:
+        if '\\' in placeholder or any(d in placeholder for d in ASCII_DIGITS):
+            return None # Group references or digits in a placeholder would leak the original digits
+        try:
+            parsed_items = list(sre_parse.parse(regex.pattern, regex.flags))
+        except Exception:
+            return None
+        if not _collect_distinguished_digits(parsed_items, distinguished):
+            return None
+
+    # The masking argument relies on a final catch-all digit rule removing every remaining digit
+    if not normalization_rules or normalization_rules[-1][0].pattern not in (r'\d+', r'[0-9]+'):
+        return None
+
+    interchangeable = [d for d in ASCII_DIGITS if d not in distinguished]
+    if len(interchangeable) < 2:
+        return None
+    representative = interchangeable[0]
+    return str.maketrans({d: representative for d in interchangeable[1:]})
+
+
+# --- Template Cache ---
+class TemplateCache:
+    """
+    Bounded LRU cache in front of normalization and EventId derivation.
+    Keys are the raw content passed through an optional signature table (see build_digit_signature_table).
+
+    Signatures only repeat if a template's lines differ in maskable digits alone; ids such as hex block
+    pool or UUID parts make nearly every signature unique, and the cache then costs more than it saves.
+    With `probe_lookups`, the hit rate is checked after that many lookups: below `min_hit_rate`, the
+    cache is emptied and bypassed for the rest of the run (lookups go straight to compute_fn).
+    """
+
+    def __init__(self, max_size: int, signature_table: dict | None = None, min_hit_rate: float = 0.0, probe_lookups: int = 0):
+        self.max_size = max_size
+        self.signature_table = signature_table
+        self.min_hit_rate = min_hit_rate
+        self.probe_lookups = probe_lookups
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = False
+        self.bypassed_lookups = 0
+
+    def _check_hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == self.probe_lookups and self.hits < self.min_hit_rate * lookups:
+            print(f"Template cache: hit rate {self.hits / lookups:.1%} over {lookups} lookups is below "
+                  f"{self.min_hit_rate:.0%}; bypassing the cache.")
+            self.bypassed = True
+            self.entries.clear()
+
+    def get_or_compute(self, content: str, compute_fn):
+        """Returns the cached value for content's signature, calling compute_fn(content) on a miss."""
+        if self.max_size <= 0:
+            self.misses += 1
+            return compute_fn(content)
+        if self.bypassed:
+            self.bypassed_lookups += 1
+            return compute_fn(content)
+
+        key = content.translate(self.signature_table) if self.signature_table else content
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            if self.probe_lookups:
+                self._check_hit_rate()
+            return value
+
+        self.misses += 1
+        value = compute_fn(content)
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        if self.probe_lookups:
+            self._check_hit_rate()
+        return value
+
+    def absorb_stats(self, other_stats: dict):
+        """Adds hit/miss/eviction counters reported by another cache (e.g. an ingestion worker process)."""
+        self.hits += other_stats.get('hits', 0)
+        self.misses += other_stats.get('misses', 0)
+        self.evictions += other_stats.get('evictions', 0)
+        self.bypassed_lookups += other_stats.get('bypassed_lookups', 0)
+
+    def stats(self) -> dict:
+        """Returns the cache counters, for tuning TEMPLATE_CACHE_SIZE (hit_rate covers the lookups before any bypass)."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            'bypassed': self.bypassed,
+            'bypassed_lookups': self.bypassed_lookups,
+        }
@@ -0,0 +1,59 @@
+import os
+import sys
+import queue
+import threading
+
+import pytest
+
+# Tests import the project's flat modules (and the synthetic log generator) from the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "benchmarks"))
+
+import config
+import log_processor
+import offset_index
+import stream_simulator
+
+
+@pytest.fixture
+def pipeline_dirs(tmp_path, monkeypatch):
+    """Points every ingestion input/output path in config at tmp_path; backfill replay, serial, no coalescing."""
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    monkeypatch.setattr(config, "RAW_LOGS_DIR", str(raw_dir))
+    monkeypatch.setattr(config, "OUTPUT_PARSED_JSONL", str(tmp_path / "parsed.jsonl"))
+    monkeypatch.setattr(config, "OFFSET_INDEX_DIR", str(tmp_path / "offset_index"))
+    monkeypatch.setattr(config, "COLUMNAR_STORE_DIR", str(tmp_path / "columnar"))
+    monkeypatch.setattr(config, "SECONDARY_INDEX_DIR", str(tmp_path / "secondary_index"))
+    monkeypatch.setattr(config, "OUTPUT_TEMPLATES_CSV", str(tmp_path / "templates.csv"))
+    monkeypatch.setattr(config, "INGESTION_CHECKPOINT_FILE", str(tmp_path / "ingestion_checkpoint.json"))
+    monkeypatch.setattr(config, "REGENERATE_ALL_FROM_RAW_LOGS", False)
+    monkeypatch.setattr(config, "FOLLOW_RAW_LOGS", False)
+    monkeypatch.setattr(config, "STREAM_REPLAY_MODE", "backfill")
+    monkeypatch.setattr(config, "INGESTION_WORKERS", 1)
+    monkeypatch.setattr(config, "PROBLEM_COALESCING_ENABLED", False)
+    monkeypatch.setattr(config, "COLUMNAR_STORE_ENABLED", False)
+    monkeypatch.setattr(config, "SECONDARY_INDEX_ENABLED", False)
+    log_processor.RECENT_ENTRIES.clear()
+    return tmp_path
+
+
+def run_stream() -> tuple:
+    """Runs one ingestion pass over config.RAW_LOGS_DIR. Returns (offset_map, parsed entry counter)."""
+    offset_map = offset_index.OffsetMap()
+    counter = [0]
+    stream_simulator.simulate_raw_log_stream(queue.Queue(), threading.Event(), offset_map, {}, counter)
+    return offset_map, counter[0]
+
+
+def read_parsed_jsonl(path: str) -> list:
+    """Returns (byte offset from tell(), line bytes) for every line of a parsed JSONL."""
+    lines = []
+    with open(path, 'rb') as f_parsed_jsonl:
+        while True:
+            byte_offset = f_parsed_jsonl.tell()
+            line = f_parsed_jsonl.readline()
+            if not line:
+                return lines
+            lines.append((byte_offset, line))
@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+
+import config
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_google_genai")
+import ai_backends
+import embedding_cache
+
+
+def _similarity(first: list, second: list) -> float:
+    return sum(a * b for a, b in zip(first, second))
+
+
+def test_hashing_embeddings_are_deterministic_unit_vectors_that_reflect_shared_words():
+    embeddings = ai_backends.HashingEmbeddings(dimensions=256)
+    texts = ["DataNode disk full on /data1", "disk full on the DataNode volume", "NameNode safe mode is ON"]
+    vectors = embeddings.embed_documents(texts)
+
+    assert vectors == ai_backends.HashingEmbeddings(dimensions=256).embed_documents(texts)
+    assert embeddings.embed_queries(texts[:1]) == [embeddings.embed_query(texts[0])] == vectors[:1]
+    assert all(len(vector) == 256 and _similarity(vector, vector) == pytest.approx(1.0) for vector in vectors)
+    assert _similarity(vectors[0], vectors[1]) > _similarity(vectors[0], vectors[2]) + 0.3
+    assert ai_backends.HashingEmbeddings(dimensions=128).model != embeddings.model # Separate embedding cache scopes
+
+
+def test_stub_chat_model_returns_the_reply_with_latency_and_usage():
+    llm = ai_backends.StubChatModel(latency_seconds=0.05, reply={'summary': "canned"})
+    started = time.perf_counter()
+    response = llm.invoke("x" * 400)
+
+    assert time.perf_counter() - started >= 0.05
+    assert json.loads(response.content) == {'summary': "canned"}
+    assert response.usage_metadata['input_tokens'] == 100
+    assert llm.stats() == {'calls': 1, 'prompt_chars': 400}
+
+
+def test_factories_follow_config(tmp_path, monkeypatch):
+    reply_path = tmp_path / "reply.json"
+    reply_path.write_text(json.dumps({'summary': "from file"}), encoding='utf-8')
+    monkeypatch.setattr(config, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(config, "STUB_LLM_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(config, "STUB_LLM_REPLY_FILE", str(reply_path))
+    monkeypatch.setattr(config, "LOCAL_EMBEDDING_DIMENSIONS", 32)
+
+    assert json.loads(ai_backends.create_llm().invoke("prompt").content) == {'summary': "from file"}
+    assert isinstance(ai_backends.create_embedding_model("hashing"), ai_backends.HashingEmbeddings)
+    assert len(ai_backends.create_embedding_model("fake").embed_query("text")) == 32
+    assert isinstance(ai_backends.create_embedding_model("fake"), embedding_cache.FakeEmbeddings)
+    with pytest.raises(ValueError, match="Unknown LLM backend"):
+        ai_backends.create_llm("other")
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        ai_backends.create_embedding_model("other")
+
+
+def test_offline_backends_run_solution_generation_end_to_end():
+    pytest.importorskip("faiss")
+    pytest.importorskip("langchain_community")
+    from langchain_community.vectorstores import FAISS
+    import llm_service
+
+    runbooks = ["If a DataNode disk is full, free space on the volume or add a disk.",
+                "If the NameNode is in safe mode, wait for block reports or leave safe mode manually."]
+    retriever = FAISS.from_texts(runbooks, ai_backends.HashingEmbeddings(dimensions=256)).as_retriever(search_kwargs={'k': 1})
+    problem = {'level': "ERROR", 'event_template': "DataNode disk full on <PATH>",
+               'original_log_full': "2026-10-17 10:00:00,000 ERROR dfs.DataNode: disk full on /data1"}
+
+    solution = llm_service._generate_solution(problem, ai_backends.StubChatModel(), retriever, [])
+
+    assert solution['summary'] == ai_backends.DEFAULT_STUB_REPLY['summary']
+    assert solution['llm_analysis_feedback']['rag_chunks_retrieved_count'] == 1
+    assert retriever.invoke(problem['original_log_full'])[0].page_content == runbooks[0]
@@ -0,0 +1,130 @@
+import os
+import json
+from collections import Counter
+
+import pytest
+
+import config
+import columnar_store
+import synthetic_hdfs
+
+from conftest import run_stream, read_parsed_jsonl
+
+BLOCK_ENTRIES = 64
+
+
+@pytest.fixture
+def ingested(pipeline_dirs, monkeypatch):
+    """Streams synthetic logs with the columnar store on (small blocks). Returns (parsed records, JSONL end offsets)."""
+    monkeypatch.setattr(config, "COLUMNAR_STORE_ENABLED", True)
+    monkeypatch.setattr(config, "COLUMNAR_BLOCK_ENTRIES", BLOCK_ENTRIES)
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=3000, num_files=3, error_rate=0.1,
+                                      multiline_ratio=0.2, seed=23)
+    run_stream()
+    lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+    return [json.loads(line) for _, line in lines], [byte_offset + len(line) for byte_offset, line in lines]
+
+
+def _project(record: dict, fields: tuple = columnar_store.ALL_FIELDS) -> dict:
+    return {field: record[field] for field in fields}
+
+
+def test_get_matches_brute_force(ingested):
+    records, _ = ingested
+    by_key = {(record['source_file'], record['line_id_in_file_header']): record for record in records}
+    reader = columnar_store.ColumnarLogReader(config.COLUMNAR_STORE_DIR)
+    try:
+        for record in records:
+            assert reader.get(record['source_file'], record['line_id_in_file_header']) == _project(record)
+        fields = ('level', 'event_id', 'original_log_full')
+        for source_file in ("node-00.log", "node-02.log"):
+            max_line_id = max(line_id for file_name, line_id in by_key if file_name == source_file)
+            for line_id in range(0, max_line_id + 3):
+                record = by_key.get((source_file, line_id)) # Continuation lines have no entry of their own
+                assert reader.get(source_file, line_id, fields) == (None if record is None else _project(record, fields))
+        assert reader.get("node-99.log", 1) is None
+        assert reader.stats()['entries'] == len(records) and reader.stats()['source_files'] == 3
+    finally:
+        reader.close()
+
+
+def test_scans_and_template_counts_match_brute_force(ingested):
+    records, _ = ingested
+    timestamps = sorted({record['timestamp'] for record in records})
+    ranges = [(None, None), ("2016-04-13", None), (timestamps[len(timestamps) // 3], timestamps[2 * len(timestamps) // 3]),
+              (None, timestamps[10]), (timestamps[-1], None), ("2030-01-01", None)]
+    reader = columnar_store.ColumnarLogReader(config.COLUMNAR_STORE_DIR)
+    try:
+        for source_file in (None, "node-01.log"):
+            for start_timestamp, end_timestamp in ranges:
+                matching = [record for record in records
+                            if (source_file is None or record['source_file'] == source_file)
+                            and (start_timestamp is None or record['timestamp'] >= start_timestamp)
+                            and (end_timestamp is None or record['timestamp'] < end_timestamp)]
+                assert list(reader.scan(source_file=source_file, start_timestamp=start_timestamp, end_timestamp=end_timestamp)) == \
+                    [_project(record) for record in matching]
+                assert list(reader.scan(('line_id_in_file_header', 'level'), source_file, start_timestamp, end_timestamp)) == \
+                    [_project(record, ('line_id_in_file_header', 'level')) for record in matching]
+                counts = reader.count_by_template(source_file, start_timestamp, end_timestamp)
+                assert {event_id: summary['count'] for event_id, summary in counts.items()} == \
+                    dict(Counter(record['event_id'] for record in matching))
+                assert all(summary['event_template'] == next(record['event_template'] for record in matching if record['event_id'] == event_id)
+                           for event_id, summary in counts.items())
+    finally:
+        reader.close()
+
+
+def test_converted_jsonl_reads_like_the_streamed_store(ingested, tmp_path):
+    records, _ = ingested
+    store_dir = str(tmp_path / "converted")
+    assert columnar_store.convert_parsed_jsonl(config.OUTPUT_PARSED_JSONL, store_dir, block_entries=500) == len(records)
+    reader = columnar_store.ColumnarLogReader(store_dir)
+    try:
+        assert list(reader.scan()) == [_project(record) for record in records]
+        assert reader.stats()['blocks'] == -(-len(records) // 500)
+    finally:
+        reader.close()
+
+
+def test_unusual_timestamps_round_trip_and_never_match_ranges(tmp_path):
+    entries = [{'line_id_in_file_header': line_id, 'source_file': "node-00.log", 'original_log_full': f"entry {line_id} é",
+                'timestamp': timestamp, 'level': "INFO", 'component': "dfs.DataNode", 'event_id': "HDFS_A",
+                'event_template': "entry <NUM>", 'parameters': ""}
+               for line_id, timestamp in enumerate(["2016-02-29 23:59:59,999", "not a timestamp", "2016-03-01 00:00:00,000",
+                                                    "2016-03-01T00:00:01.000", ""], start=1)]
+    writer = columnar_store.ColumnarLogWriter(str(tmp_path / "store"))
+    for jsonl_end_offset, entry in enumerate(entries, start=1):
+        writer.add(entry, jsonl_end_offset)
+    writer.close()
+
+    reader = columnar_store.ColumnarLogReader(str(tmp_path / "store"))
+    try:
+        assert list(reader.scan()) == entries
+        assert [entry['line_id_in_file_header'] for entry in reader.scan(start_timestamp="2016-01-01")] == [1, 3]
+        assert reader.get("node-00.log", 2)['timestamp'] == "not a timestamp"
+    finally:
+        reader.close()
+
+
+def test_torn_tail_is_ignored_and_truncate_to_drops_later_blocks(ingested):
+    records, end_offsets = ingested
+    store_dir = config.COLUMNAR_STORE_DIR
+    with open(os.path.join(store_dir, columnar_store.BLOCKS_FILE_NAME), 'ab') as f_blocks:
+        f_blocks.write(b"PLCB torn block")
+    with open(os.path.join(store_dir, columnar_store.INDEX_FILE_NAME), 'ab') as f_index:
+        f_index.write(b"\x01" * (columnar_store.INDEX_DTYPE.itemsize // 2))
+    reader = columnar_store.ColumnarLogReader(store_dir)
+    assert list(reader.scan()) == [_project(record) for record in records]
+    reader.close()
+
+    jsonl_size = end_offsets[len(records) // 2] - 1 # Mid-entry, as after a restore to an earlier checkpoint
+    writer = columnar_store.ColumnarLogWriter(store_dir) # Discards the torn tail
+    writer.truncate_to(jsonl_size)
+    writer.close()
+    reader = columnar_store.ColumnarLogReader(store_dir)
+    try:
+        kept = list(reader.scan())
+        assert kept == [_project(record) for record in records[:len(kept)]]
+        assert end_offsets[len(kept) - 1] <= jsonl_size and len(records) // 2 - len(kept) < BLOCK_ENTRIES
+    finally:
+        reader.close()
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_core")
+import embedding_cache
+
+
+class RecordingEmbeddings(embedding_cache.FakeEmbeddings):
+    """FakeEmbeddings that also records each batch it was sent and the peak number of batches in flight."""
+
+    def __init__(self, dimensions: int = 8):
+        super().__init__(dimensions)
+        self.batches = []
+        self.running = [0, 0] # current, max
+
+    def embed_documents(self, texts: list) -> list:
+        with self.lock:
+            self.batches.append(list(texts))
+            self.running[0] += 1
+            self.running[1] = max(self.running[1], self.running[0])
+        threading.Event().wait(0.01)
+        vectors = super().embed_documents(texts)
+        with self.lock:
+            self.running[0] -= 1
+        return vectors
+
+
+def _cached(tmp_path, embeddings, batch_size: int = 3, concurrency: int = 1) -> embedding_cache.CachedEmbeddings:
+    store = embedding_cache.EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    return embedding_cache.CachedEmbeddings(embeddings, "fake-model", store, batch_size=batch_size, concurrency=concurrency)
+
+
+def test_results_keep_input_order_and_only_misses_are_embedded(tmp_path):
+    embeddings = RecordingEmbeddings()
+    cached = _cached(tmp_path, embeddings, batch_size=3, concurrency=4)
+    texts = [f"chunk {index % 7}" for index in range(20)] # 7 distinct chunks, repeated
+
+    vectors = cached.embed_documents(texts)
+
+    reference = embedding_cache.FakeEmbeddings(dimensions=8)
+    assert vectors == [pytest.approx(reference.embed_query(text), abs=1e-6) for text in texts]
+    assert sorted(text for batch in embeddings.batches for text in batch) == [f"chunk {index}" for index in range(7)]
+    assert [len(batch) for batch in embeddings.batches] == [3, 3, 1]
+    assert 1 < embeddings.running[1] <= 4
+    assert cached.stats()['embedded'] == 7 and cached.stats()['cached'] == 0 # Repeats within one call are not store hits
+
+    embeddings.batches.clear()
+    assert cached.embed_documents(texts[::-1] + ["chunk new"])[:-1] == vectors[::-1]
+    assert embeddings.batches == [["chunk new"]]
+    assert cached.stats()['embedded'] == 8 and cached.stats()['cached'] == 20
+
+
+def test_cached_vectors_survive_a_restart_and_are_scoped_to_the_model(tmp_path):
+    first = _cached(tmp_path, RecordingEmbeddings())
+    vectors = first.embed_documents(["chunk a", "chunk b"])
+    first.store.close()
+
+    embeddings = RecordingEmbeddings()
+    second = _cached(tmp_path, embeddings)
+    assert second.embed_documents(["chunk b", "chunk a"]) == vectors[::-1]
+    assert embeddings.batches == []
+    assert second.stats()['store_size'] == 2
+
+    other_model = embedding_cache.CachedEmbeddings(embeddings, "other-model", second.store)
+    other_model.embed_documents(["chunk a"])
+    assert embeddings.batches == [["chunk a"]]
+    assert embedding_cache.chunk_cache_key("fake-model", "chunk a") != embedding_cache.chunk_cache_key("other-model", "chunk a")
+
+
+def test_queries_are_not_cached(tmp_path):
+    embeddings = RecordingEmbeddings()
+    cached = _cached(tmp_path, embeddings)
+    assert cached.embed_query("query") == embeddings.embed_query("query")
+    assert cached.stats()['store_size'] == 0
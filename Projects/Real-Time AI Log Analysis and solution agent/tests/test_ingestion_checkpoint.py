@@ -0,0 +1,227 @@
+import os
+import json
+import shutil
+
+import pytest
+
+import config
+import offset_index
+import parsed_log_writer
+import stream_simulator
+import ingestion_checkpoint
+import synthetic_hdfs
+from conftest import run_stream, read_parsed_jsonl
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+def _write_raw_logs(raw_dir: str, seed: int = 7) -> dict:
+    """Synthetic node logs with stack traces; returns {file name: raw lines}."""
+    synthetic_hdfs.generate_node_logs(raw_dir, total_lines=3000, num_files=3, error_rate=0.1, multiline_ratio=0.2, seed=seed)
+    raw_logs = {}
+    for file_name in sorted(os.listdir(raw_dir)):
+        with open(os.path.join(raw_dir, file_name), 'r', encoding='utf-8', newline='') as f_raw:
+            raw_logs[file_name] = f_raw.readlines()
+    return raw_logs
+
+def _header_split(lines: list, fraction: float) -> int:
+    """Index of the first header line at or after fraction of lines (so no entry spans the split)."""
+    split = int(len(lines) * fraction)
+    while not lines[split][:4].isdigit():
+        split += 1
+    return split
+
+def _write_lines(path: str, lines: list, mode: str = 'w'):
+    with open(path, mode, encoding='utf-8', newline='') as f_raw:
+        f_raw.writelines(lines)
+
+def _reference_output(tmp_path, raw_logs: dict) -> list:
+    """Parsed JSONL lines of one uninterrupted regenerate run over raw_logs."""
+    reference_dir = tmp_path / "reference"
+    saved = {name: getattr(config, name) for name in ("RAW_LOGS_DIR", "OUTPUT_PARSED_JSONL", "OFFSET_INDEX_DIR", "INGESTION_CHECKPOINT_FILE")}
+    try:
+        config.RAW_LOGS_DIR = str(reference_dir / "raw")
+        config.OUTPUT_PARSED_JSONL = str(reference_dir / "parsed.jsonl")
+        config.OFFSET_INDEX_DIR = str(reference_dir / "offset_index")
+        config.INGESTION_CHECKPOINT_FILE = str(reference_dir / "checkpoint.json")
+        os.makedirs(config.RAW_LOGS_DIR)
+        for file_name, lines in raw_logs.items():
+            _write_lines(os.path.join(config.RAW_LOGS_DIR, file_name), lines)
+        run_stream()
+        return [line for _, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+def _assert_offsets_exact(parsed_lines: list):
+    """Every entry is found in a freshly opened offset index at its tell() offset, and nothing else is indexed."""
+    index = offset_index.MmapOffsetIndex(config.OFFSET_INDEX_DIR)
+    try:
+        max_line_ids = {}
+        for byte_offset, line in parsed_lines:
+            entry = json.loads(line)
+            key = (entry['source_file'], entry['line_id_in_file_header'])
+            assert index.get(key) == byte_offset
+            max_line_ids[key[0]] = max(max_line_ids.get(key[0], 0), key[1])
+        for source_file in index.source_files():
+            assert index.max_line_id(source_file) == max_line_ids.get(source_file, 0)
+    finally:
+        index.close()
+
+
+def test_resume_after_crash_has_no_duplicates_or_gaps(pipeline_dirs, monkeypatch):
+    raw_dir = config.RAW_LOGS_DIR
+    raw_logs = _write_raw_logs(raw_dir)
+    expected = _reference_output(pipeline_dirs, raw_logs)
+
+    # First run over the first half of every file, checkpointed at its end
+    splits = {file_name: _header_split(lines, 0.5) for file_name, lines in raw_logs.items()}
+    for file_name, lines in raw_logs.items():
+        _write_lines(os.path.join(raw_dir, file_name), lines[:splits[file_name]])
+    run_stream()
+
+    # Second run over the complete files crashes at its 40th checkpoint: the 39 before it are saved,
+    # the output written after the last one is not covered by any checkpoint
+    for file_name, lines in raw_logs.items():
+        _write_lines(os.path.join(raw_dir, file_name), lines[splits[file_name]:], mode='a')
+    save_checkpoint = stream_simulator._save_ingestion_checkpoint
+    checkpoint_calls = []
+    def crashing_save(checkpoints, parsed_writer, counter_list):
+        checkpoint_calls.append(parsed_writer.file_offset)
+        if len(checkpoint_calls) == 40:
+            parsed_writer.flush()
+            raise SimulatedCrash()
+        save_checkpoint(checkpoints, parsed_writer, counter_list)
+    monkeypatch.setattr(config, "INGESTION_CHECKPOINT_INTERVAL_SECONDS", 0.0)
+    monkeypatch.setattr(stream_simulator, "_save_ingestion_checkpoint", crashing_save)
+    run_stream()
+    monkeypatch.setattr(stream_simulator, "_save_ingestion_checkpoint", save_checkpoint)
+    assert len(checkpoint_calls) == 40
+    with open(config.OUTPUT_PARSED_JSONL, 'ab') as f_parsed_jsonl:
+        f_parsed_jsonl.write(b'{"line_id_in_file_header": 99') # Torn write of the entry being appended at the crash
+    checkpoint = ingestion_checkpoint.CheckpointStore(config.INGESTION_CHECKPOINT_FILE).load()
+    assert os.path.getsize(config.OUTPUT_PARSED_JSONL) > checkpoint.parsed_jsonl_size
+
+    _, entries_parsed = run_stream()
+
+    # Same entries as the uninterrupted run (file order differs: each run reads the files' new bytes in turn)
+    parsed_lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+    assert sorted(line for _, line in parsed_lines) == sorted(expected)
+    assert len(set(expected)) == len(expected)
+    assert entries_parsed == len(expected)
+    _assert_offsets_exact(parsed_lines)
+
+
+def test_existing_output_without_checkpoint_is_regenerated(pipeline_dirs):
+    raw_logs = _write_raw_logs(config.RAW_LOGS_DIR)
+    run_stream()
+    expected = [line for _, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+    assert len(expected) > 0
+
+    os.remove(config.INGESTION_CHECKPOINT_FILE) # e.g. output of a run from before checkpointing
+    run_stream()
+
+    parsed_lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+    assert [line for _, line in parsed_lines] == expected
+    _assert_offsets_exact(parsed_lines)
+
+
+def test_restore_rejects_output_shorter_than_checkpoint(pipeline_dirs):
+    _write_raw_logs(config.RAW_LOGS_DIR)
+    run_stream()
+    checkpoint = ingestion_checkpoint.CheckpointStore(config.INGESTION_CHECKPOINT_FILE).load()
+    with open(config.OUTPUT_PARSED_JSONL, 'r+b') as f_parsed_jsonl:
+        f_parsed_jsonl.truncate(checkpoint.parsed_jsonl_size - 1)
+    assert not checkpoint.restore_parsed_output(config.OUTPUT_PARSED_JSONL, config.OFFSET_INDEX_DIR)
+
+
+def test_restore_truncates_offset_index_with_jsonl(pipeline_dirs):
+    _write_raw_logs(config.RAW_LOGS_DIR)
+    run_stream()
+    parsed_lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+    checkpoint = ingestion_checkpoint.CheckpointStore(config.INGESTION_CHECKPOINT_FILE).load()
+    checkpoint.parsed_jsonl_size = parsed_lines[len(parsed_lines) // 2][0] # As if the second half came after the last save
+
+    assert checkpoint.restore_parsed_output(config.OUTPUT_PARSED_JSONL, config.OFFSET_INDEX_DIR)
+
+    assert os.path.getsize(config.OUTPUT_PARSED_JSONL) == checkpoint.parsed_jsonl_size
+    _assert_offsets_exact(parsed_lines[:len(parsed_lines) // 2])
+
+
+def test_truncate_index_drops_records_past_size(tmp_path):
+    parsed_jsonl_path = str(tmp_path / "parsed.jsonl")
+    index_dir = str(tmp_path / "offset_index")
+    # Every third line is a continuation line without an entry of its own
+    entries = [{'line_id_in_file_header': line_id, 'source_file': source_file, 'original_log_full': f"message {line_id}"}
+               for source_file, count in (("node-00.log", 100), ("node-01.log", 3)) for line_id in range(1, count * 3, 3)]
+    with parsed_log_writer.ParsedLogWriter(parsed_jsonl_path, index_dir, columnar_store_dir="", secondary_index_dir="") as writer:
+        for entry in entries:
+            writer.write(entry)
+    parsed_lines = read_parsed_jsonl(parsed_jsonl_path)
+    restored_size = parsed_lines[60][0] # Keeps entries 0-59 of node-00.log
+
+    removed = offset_index.truncate_index(index_dir, restored_size)
+
+    index = offset_index.MmapOffsetIndex(index_dir)
+    assert index.max_line_id("node-00.log") == 59 * 3 + 1
+    assert index.max_line_id("node-01.log") == 0
+    assert removed == (100 * 3 - 2) - (59 * 3 + 1) + (3 * 3 - 2)
+    for byte_offset, line in parsed_lines:
+        entry = json.loads(line)
+        expected = byte_offset if byte_offset < restored_size else None
+        assert index.get((entry['source_file'], entry['line_id_in_file_header'])) == expected
+    index.close()
+
+
+# --- Rotation and Truncation ---
+def test_resume_point_follows_inode_and_size(tmp_path):
+    raw_path = tmp_path / "node-00.log"
+    _write_lines(str(raw_path), ["line\n"] * 10)
+    checkpoints = ingestion_checkpoint.CheckpointStore(str(tmp_path / "checkpoint.json"))
+    inode = os.stat(raw_path).st_ino
+    assert checkpoints.resume_point(str(raw_path)) == (inode, 0, 0)
+
+    checkpoints.update("node-00.log", inode, 30, 6)
+    assert checkpoints.resume_point(str(raw_path)) == (inode, 30, 6)
+
+    # Truncated below the checkpoint: read again from byte 0, line ids continue
+    _write_lines(str(raw_path), ["line\n"] * 2)
+    assert checkpoints.resume_point(str(raw_path)) == (inode, 0, 6)
+
+    # Rotated: a new file (new inode) under the same name
+    os.rename(raw_path, tmp_path / "node-00.log.1")
+    _write_lines(str(raw_path), ["line\n"] * 10)
+    new_inode = os.stat(raw_path).st_ino
+    assert new_inode != inode
+    assert checkpoints.resume_point(str(raw_path)) == (new_inode, 0, 6)
+
+
+@pytest.mark.parametrize("change", ["rotate", "truncate"])
+def test_resume_after_rotation_or_truncation_reads_new_file(pipeline_dirs, change):
+    raw_dir = config.RAW_LOGS_DIR
+    raw_logs = _write_raw_logs(raw_dir)
+    run_stream()
+    first_run_lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+
+    file_name = sorted(raw_logs)[0]
+    raw_path = os.path.join(raw_dir, file_name)
+    new_lines = raw_logs[file_name][:_header_split(raw_logs[file_name], 0.3)]
+    if change == "rotate":
+        shutil.move(raw_path, os.path.join(str(pipeline_dirs), file_name + ".1"))
+    _write_lines(raw_path, new_lines) # Truncates in place when not rotated
+    run_stream()
+
+    parsed_lines = read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)
+    assert parsed_lines[:len(first_run_lines)] == first_run_lines
+    new_entries = [json.loads(line) for _, line in parsed_lines[len(first_run_lines):]]
+    assert len(new_entries) == sum(1 for line in new_lines if line[:4].isdigit())
+    assert {entry['source_file'] for entry in new_entries} == {file_name}
+    # Line ids continue after those of the replaced file, so (source_file, line_id) stays unique
+    first_run_max_line_id = max(json.loads(line)['line_id_in_file_header'] for _, line in first_run_lines
+                                if json.loads(line)['source_file'] == file_name)
+    assert min(entry['line_id_in_file_header'] for entry in new_entries) > first_run_max_line_id
+    keys = [(json.loads(line)['source_file'], json.loads(line)['line_id_in_file_header']) for _, line in parsed_lines]
+    assert len(keys) == len(set(keys))
+    _assert_offsets_exact(parsed_lines)
@@ -0,0 +1,53 @@
+import time
+
+import log_follower
+
+
+HEADER = "2026-10-17 10:00:0{second},000 ERROR dfs.DataNode: Exception in receiveBlock for block blk_{second}\n"
+FRAME = "\tat org.apache.hadoop.hdfs.server.datanode.BlockReceiver.receivePacket(BlockReceiver.java:{line})\n"
+
+
+def _append(path, text: str):
+    with open(path, 'a', encoding='utf-8') as f_raw:
+        f_raw.write(text)
+
+
+def test_continuation_lines_after_emitted_entry_are_counted(tmp_path):
+    raw_log_path = tmp_path / "node-00.log"
+    _append(raw_log_path, HEADER.format(second=1) + FRAME.format(line=1))
+    tail = log_follower.RawLogTail(str(raw_log_path))
+
+    assert tail.read_new_entries() == []
+    header_info, lines = tail.take_pending_entry() # As if the file went idle
+    assert header_info['line_id_in_file_header'] == 1 and len(lines) == 2
+
+    _append(raw_log_path, FRAME.format(line=2) + FRAME.format(line=3)) # The rest of the stack trace, too late
+    assert tail.read_new_entries() == []
+    assert tail.late_lines == 2
+    assert tail.pending_header_info is None
+
+    _append(raw_log_path, HEADER.format(second=2) + FRAME.format(line=4))
+    assert tail.read_new_entries() == []
+    header_info, lines = tail.take_pending_entry()
+    assert header_info['line_id_in_file_header'] == 5 and len(lines) == 2
+    assert tail.late_lines == 2
+    tail.close()
+
+
+def test_entries_carry_the_time_of_the_read_that_returned_them(tmp_path):
+    raw_log_path = tmp_path / "node-00.log"
+    _append(raw_log_path, HEADER.format(second=1))
+    tail = log_follower.RawLogTail(str(raw_log_path))
+    before_first_read = time.time()
+    tail.read_new_entries()
+    after_first_read = time.time()
+
+    time.sleep(0.05)
+    _append(raw_log_path, HEADER.format(second=2)) # Newer mtime; must not apply to the first entry
+    before_second_read = time.time()
+    (first_entry,) = tail.read_new_entries()
+    second_entry = tail.take_pending_entry()
+
+    assert before_first_read <= first_entry[0]['read_time'] <= after_first_read
+    assert second_entry[0]['read_time'] >= before_second_read
+    tail.close()
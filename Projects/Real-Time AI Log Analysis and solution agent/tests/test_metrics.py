@@ -0,0 +1,134 @@
+import time
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import config
+import metrics
+import synthetic_hdfs
+
+from conftest import run_stream
+
+
+def test_counters_and_gauges_render_in_prometheus_format():
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ("outcome",))
+    depth = registry.gauge("test_depth", "Depth")
+    requests.labels("ok").inc()
+    requests.labels("ok").inc(2)
+    requests.labels('say "hi"\n').inc()
+    depth.set(7)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        "test_requests_total{outcome=\"ok\"} 3.0",
+        "test_requests_total{outcome=\"say \\\"hi\\\"\\n\"} 1.0",
+        "# HELP test_depth Depth",
+        "# TYPE test_depth gauge",
+        "test_depth 7",
+    ]
+    assert requests.labels(5) is requests.labels("5") # Non-string label values share the child, rendered once
+    with pytest.raises(ValueError):
+        requests.labels("ok", "extra")
+    with pytest.raises(ValueError):
+        registry.counter("test_requests_total", "Registered twice")
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    with histogram.time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'test_seconds_bucket{le="0.1"} 3',
+        'test_seconds_bucket{le="1.0"} 4',
+        'test_seconds_bucket{le="+Inf"} 5',
+        f"test_seconds_sum {metrics._format_value(histogram.labels().snapshot()[1])}",
+        "test_seconds_count 5",
+    ]
+    assert histogram.labels().snapshot()[1] == pytest.approx(2.65, abs=0.01)
+
+
+def test_registered_stats_become_gauges():
+    registry = metrics.MetricsRegistry()
+    registry.register_stats("test_cache", lambda: {
+        'size': 3, 'hit_rate': 0.5, 'enabled': True, 'last_error': None,
+        'dropped': {'WARN': 2}, 'wait_seconds': {'ERROR': {'p50': 0.25, 'label': "text"}},
+    }, label_name="level")
+    registry.register_stats("test_broken", lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# TYPE test_cache_size gauge", "test_cache_size 3",
+        "# TYPE test_cache_hit_rate gauge", "test_cache_hit_rate 0.5",
+        "# TYPE test_cache_dropped gauge", 'test_cache_dropped{level="WARN"} 2',
+        "# TYPE test_cache_wait_seconds_p50 gauge", 'test_cache_wait_seconds_p50{level="ERROR"} 0.25',
+        "# test_broken: stats unavailable (ZeroDivisionError: division by zero)",
+    ]
+    registry.unregister_stats("test_cache")
+    assert "test_cache_size" not in registry.render()
+
+
+def test_endpoint_serves_metrics_and_profiles(monkeypatch):
+    monkeypatch.setattr(config, "PROFILER_SAMPLE_INTERVAL_SECONDS", 0.005)
+    registry = metrics.MetricsRegistry()
+    registry.counter("test_scrapes_total", "Scrapes").inc()
+    server = metrics.MetricsServer(registry, port=0)
+    server.start()
+    base_url = f"http://{server.host}:{server.port}"
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"] == metrics.PROMETHEUS_CONTENT_TYPE
+            assert "test_scrapes_total 1.0" in response.read().decode('utf-8')
+        with urllib.request.urlopen(f"{base_url}/debug/profile?seconds=0.1", timeout=5) as response:
+            assert "serve_forever" in response.read().decode('utf-8') # The server's own thread was sampled
+        for path, status in (("/debug/profile?seconds=abc", 400), ("/other", 404)):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"{base_url}{path}", timeout=5)
+            assert error.value.code == status
+    finally:
+        server.stop()
+
+
+def test_profiler_writes_collapsed_stacks(tmp_path):
+    stop_event = threading.Event()
+
+    def busy_loop():
+        while not stop_event.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop, name="busy-worker")
+    worker.start()
+    profiler = metrics.SamplingProfiler(interval_seconds=0.002, output_path=str(tmp_path / "profile" / "stacks.txt"))
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    stop_event.set()
+    worker.join()
+
+    collapsed = (tmp_path / "profile" / "stacks.txt").read_text(encoding='utf-8')
+    assert collapsed == profiler.collapsed()
+    busy_stacks = [line for line in collapsed.splitlines() if line.startswith("busy-worker;")]
+    assert busy_stacks and all("busy_loop (test_metrics.py)" in line for line in busy_stacks)
+    assert "busy_loop (test_metrics.py)" in profiler.format_top()
+
+
+def test_stream_counts_raw_lines_and_entries(pipeline_dirs):
+    summary = synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=2000, num_files=2, error_rate=0.2,
+                                                multiline_ratio=0.2, seed=9)
+    raw_lines_before = metrics.RAW_LINES.labels().value
+    entries_before = sum(child.value for _, child in metrics.PARSED_ENTRIES._items())
+    problems_before = sum(child.value for _, child in metrics.PROBLEMS_DETECTED._items())
+
+    run_stream()
+
+    assert metrics.RAW_LINES.labels().value - raw_lines_before == summary['raw_lines']
+    assert sum(child.value for _, child in metrics.PARSED_ENTRIES._items()) - entries_before == summary['entries']
+    assert sum(child.value for _, child in metrics.PROBLEMS_DETECTED._items()) - problems_before == summary['problem_entries']
@@ -0,0 +1,45 @@
+import json
+
+import offset_index
+import parsed_log_writer
+from conftest import read_parsed_jsonl
+
+
+def _entries(source_file: str, count: int, first_line_id: int = 1) -> list:
+    # Every third line is a continuation line without an entry of its own; some messages are non-ASCII
+    return [
+        {'line_id_in_file_header': line_id, 'source_file': source_file,
+         'original_log_full': f"message {line_id} " + ("é€" * (line_id % 5)), 'level': 'INFO'}
+        for line_id in range(first_line_id, first_line_id + count * 3, 3)
+    ]
+
+
+def test_offsets_match_tell(tmp_path):
+    parsed_jsonl_path = str(tmp_path / "parsed.jsonl")
+    index_dir = str(tmp_path / "offset_index")
+    entries = [entry for pair in zip(_entries("node-00.log", 500), _entries("node-01.log", 500)) for entry in pair]
+    returned_offsets = {}
+    offset_map = offset_index.OffsetMap()
+
+    # Two writer sessions (the second appends to the first's output), with small buffers to force many flushes
+    for session_entries in (entries[:600], entries[600:]):
+        with parsed_log_writer.ParsedLogWriter(parsed_jsonl_path, index_dir, buffer_bytes=4096, flush_interval_seconds=60.0,
+                                               columnar_store_dir="", secondary_index_dir="") as writer:
+            for entry in session_entries:
+                key = (entry['source_file'], entry['line_id_in_file_header'])
+                returned_offsets[key] = offset_map[key] = writer.write(entry)
+
+    parsed_lines = read_parsed_jsonl(parsed_jsonl_path)
+    assert len(parsed_lines) == len(entries)
+    index = offset_index.MmapOffsetIndex(index_dir)
+    offset_map.attach_persisted_index(index_dir)
+    for byte_offset, line in parsed_lines:
+        entry = json.loads(line)
+        key = (entry['source_file'], entry['line_id_in_file_header'])
+        assert returned_offsets[key] == byte_offset
+        assert index.get(key) == byte_offset
+        assert offset_map.get(key) == byte_offset
+        assert offset_map.persisted.get(key) == byte_offset
+    assert index.get(("node-00.log", 2)) is None # Continuation line slot
+    assert index.get(("node-02.log", 1)) is None
+    index.close()
@@ -0,0 +1,49 @@
+import offset_index
+
+
+def test_array_starts_at_first_live_line_id():
+    offset_map = offset_index.CompactOffsetMap()
+    first_line_id = 100_000_000 # A file resumed from a checkpoint far into it
+
+    offset_map[("node-00.log", first_line_id)] = 10
+    offset_map[("node-00.log", first_line_id + 3)] = 250 # Two continuation lines in between
+
+    assert offset_map.memory_bytes() < 1024
+    assert offset_map.get(("node-00.log", first_line_id)) == 10
+    assert offset_map.get(("node-00.log", first_line_id + 1)) is None
+    assert offset_map.get(("node-00.log", first_line_id + 3)) == 250
+    assert offset_map.get(("node-00.log", first_line_id - 1)) is None
+    assert offset_map.get(("node-00.log", 1)) is None
+    assert offset_map.max_line_id("node-00.log") == first_line_id + 3
+    assert list(offset_map.items()) == [(("node-00.log", first_line_id), 10), (("node-00.log", first_line_id + 3), 250)]
+    assert len(offset_map) == 2
+
+
+def test_entry_before_first_line_id_rebases_array():
+    offset_map = offset_index.CompactOffsetMap()
+    offset_map[("node-00.log", 50)] = 500
+    offset_map[("node-00.log", 48)] = 480
+    offset_map[("node-00.log", 48)] = 481 # Re-indexing does not count twice
+
+    assert offset_map.get(("node-00.log", 48)) == 481
+    assert offset_map.get(("node-00.log", 49)) is None
+    assert offset_map.get(("node-00.log", 50)) == 500
+    assert offset_map.max_line_id() == 50
+    assert len(offset_map) == 2
+
+
+def test_offset_map_serves_earlier_lines_from_persisted_index(tmp_path):
+    index_dir = str(tmp_path / "offset_index")
+    with offset_index.OffsetIndexWriter(index_dir) as writer:
+        writer.add("node-00.log", 1, 0)
+        writer.add("node-00.log", 2, 100)
+    offset_map = offset_index.OffsetMap()
+    offset_map.attach_persisted_index(index_dir)
+
+    offset_map[("node-00.log", 3)] = 200
+
+    assert offset_map.get(("node-00.log", 1)) == 0
+    assert offset_map.get(("node-00.log", 2)) == 100
+    assert offset_map.get(("node-00.log", 3)) == 200
+    assert offset_map.live.memory_bytes() < 1024
+    offset_map.clear()
@@ -0,0 +1,43 @@
+import os
+
+import config
+import stream_simulator
+import synthetic_hdfs
+from conftest import run_stream, read_parsed_jsonl
+
+
+def _ingest(workers: int, shard_bytes: int, monkeypatch) -> list:
+    monkeypatch.setattr(config, "INGESTION_WORKERS", workers)
+    monkeypatch.setattr(config, "INGESTION_SHARD_BYTES", shard_bytes)
+    monkeypatch.setattr(config, "REGENERATE_ALL_FROM_RAW_LOGS", True)
+    run_stream()
+    return [line for _, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+
+
+def test_byte_range_shards_match_serial_stream(pipeline_dirs, monkeypatch):
+    # Stack traces make entries span several lines, so shard boundaries must move to the next header
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=4000, num_files=2, error_rate=0.1, multiline_ratio=0.3, seed=3)
+    expected = _ingest(1, config.INGESTION_SHARD_BYTES, monkeypatch)
+    with open(config.INGESTION_CHECKPOINT_FILE, 'rb') as f_checkpoint:
+        expected_checkpoint = f_checkpoint.read()
+
+    assert _ingest(2, 16 * 1024, monkeypatch) == expected
+    with open(config.INGESTION_CHECKPOINT_FILE, 'rb') as f_checkpoint:
+        assert f_checkpoint.read() == expected_checkpoint
+
+
+def test_shards_start_at_entry_headers(pipeline_dirs):
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=2000, num_files=1, multiline_ratio=0.5, seed=5)
+    raw_path = os.path.join(config.RAW_LOGS_DIR, os.listdir(config.RAW_LOGS_DIR)[0])
+    file_size = os.path.getsize(raw_path)
+    shards = stream_simulator._raw_log_shards([(raw_path, 1, 0, 0)], 8 * 1024)
+
+    assert len(shards) > 1
+    assert shards[0][2] == 0 and shards[-1][3] == file_size
+    assert [shard[4] for shard in shards] == [0] + [None] * (len(shards) - 1)
+    with open(raw_path, 'rb') as f_raw:
+        for previous, shard in zip(shards, shards[1:]):
+            assert previous[3] == shard[2]
+            f_raw.seek(shard[2] - 1)
+            assert f_raw.read(1) == b'\n'
+            assert stream_simulator.log_processor.parse_log_line_hybrid_single(f_raw.readline().decode('utf-8'))
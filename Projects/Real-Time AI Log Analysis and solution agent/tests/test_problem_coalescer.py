@@ -0,0 +1,141 @@
+import queue
+
+import pytest
+
+import config
+import log_processor
+import problem_coalescer
+import solution_cache
+
+
+def _problem(line_id: int, event_id: str = "HDFS_0000BEEF", level: str = "ERROR", source_file: str = "node-00.log") -> dict:
+    return {'parsed_entry_metadata': {
+        'line_id_in_file_header': line_id, 'source_file': source_file, 'level': level, 'component': "dfs.DataNode",
+        'event_id': event_id, 'event_template': "Block <HDFS_ID> is corrupt", 'original_log_full': f"line {line_id}",
+        'timestamp': f"2026-10-17 10:00:{line_id:02d},000",
+    }}
+
+
+def _drain(problem_queue: queue.Queue) -> list:
+    forwarded = []
+    while not problem_queue.empty():
+        forwarded.append(problem_queue.get_nowait()['parsed_entry_metadata'])
+    return forwarded
+
+
+def test_first_problem_is_forwarded_at_once_and_duplicates_are_folded():
+    problem_queue = queue.Queue()
+    coalescer = problem_coalescer.BurstCoalescer(problem_queue, window_seconds=3600, max_groups=100)
+    try:
+        coalescer.put(_problem(1))
+        assert [metadata['line_id_in_file_header'] for metadata in _drain(problem_queue)] == [1]
+
+        for line_id in range(2, 6):
+            coalescer.put(_problem(line_id, source_file="node-01.log" if line_id == 5 else "node-00.log"))
+        coalescer.put(_problem(6, level="WARN")) # Same template, other level: a group of its own
+        assert [metadata['line_id_in_file_header'] for metadata in _drain(problem_queue)] == [6]
+    finally:
+        coalescer.close()
+
+    (summarized,) = _drain(problem_queue)
+    assert summarized['line_id_in_file_header'] == 2 # The first duplicate represents the burst
+    assert summarized['burst_summary']['count'] == 4
+    assert summarized['burst_summary']['first_timestamp'] == "2026-10-17 10:00:02,000"
+    assert summarized['burst_summary']['last_timestamp'] == "2026-10-17 10:00:05,000"
+    assert summarized['burst_summary']['source_files'] == ["node-00.log", "node-01.log"]
+    assert coalescer.stats() == {'received': 6, 'forwarded': 3, 'open_groups': 0}
+
+
+def test_group_without_duplicates_forwards_nothing_more():
+    problem_queue = queue.Queue()
+    coalescer = problem_coalescer.BurstCoalescer(problem_queue, window_seconds=3600, max_groups=100)
+    coalescer.put(_problem(1))
+    coalescer.close()
+    assert len(_drain(problem_queue)) == 1
+
+
+def test_oldest_group_is_forwarded_beyond_max_groups():
+    problem_queue = queue.Queue()
+    coalescer = problem_coalescer.BurstCoalescer(problem_queue, window_seconds=3600, max_groups=1)
+    try:
+        coalescer.put(_problem(1, event_id="HDFS_A"))
+        coalescer.put(_problem(2, event_id="HDFS_A"))
+        coalescer.put(_problem(3, event_id="HDFS_B")) # Pushes HDFS_A's group out early
+        forwarded = _drain(problem_queue)
+    finally:
+        coalescer.close()
+    assert [(metadata['event_id'], (metadata.get('burst_summary') or {}).get('count')) for metadata in forwarded] == [
+        ("HDFS_A", None), ("HDFS_B", None), ("HDFS_A", 1)
+    ]
+
+
+# --- Bursts and the Solution Cache ---
+def test_burst_summary_is_analyzed_despite_cached_solution():
+    cache = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600)
+    problem_queue = queue.Queue()
+    coalescer = problem_coalescer.BurstCoalescer(problem_queue, window_seconds=3600, max_groups=100)
+    analyzed_bursts = []
+
+    def analyze(metadata: dict) -> dict:
+        burst_count = (metadata.get('burst_summary') or {}).get('count', 1)
+        return cache.get_or_compute(
+            solution_cache.make_cache_key(metadata['event_id']),
+            lambda: analyzed_bursts.append(burst_count) or {'summary': f"burst of {burst_count}"},
+            burst_count
+        )
+
+    for line_id in range(1, 6):
+        coalescer.put(_problem(line_id))
+    coalescer.flush() # Window ends: the 4 duplicates follow as one summarized problem
+    for line_id in range(6, 9):
+        coalescer.put(_problem(line_id))
+    coalescer.flush() # A smaller burst: served from the burst analysis
+    for line_id in range(9, 20):
+        coalescer.put(_problem(line_id))
+    coalescer.close() # The storm grew past twice the analyzed burst: analyzed again
+    solutions = [analyze(metadata) for metadata in _drain(problem_queue)]
+
+    assert analyzed_bursts == [1, 4, 10]
+    assert [solution['summary'] for solution in solutions] == [
+        "burst of 1", "burst of 4", "burst of 4", "burst of 4", "burst of 4", "burst of 10"
+    ] # The burst analysis replaced the single problem's one
+    assert [solution['solution_cache']['status'] for solution in solutions] == ["miss", "miss", "hit", "hit", "hit", "miss"]
+    assert [solution['solution_cache']['occurrence_count'] for solution in solutions] == [1, 2, 3, 4, 5, 6]
+
+
+def test_burst_summary_reaches_llm_prompt_with_default_cache(monkeypatch):
+    pytest.importorskip("langchain")
+    pytest.importorskip("langchain_google_genai")
+    import ai_backends
+    import llm_service
+
+    class RecordingChatModel(ai_backends.StubChatModel):
+        def __init__(self):
+            super().__init__()
+            self.prompts = []
+
+        def invoke(self, prompt):
+            self.prompts.append(str(prompt))
+            return super().invoke(prompt)
+
+    class EmptyRetriever:
+        def invoke(self, query):
+            return []
+
+    assert config.SOLUTION_CACHE_ENABLED and config.SOLUTION_CACHE_KEY_MODE == "event_id"
+    monkeypatch.setattr(llm_service, "SOLUTION_CACHE", solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600))
+    monkeypatch.setattr(config, "CROSS_NODE_SEQUENCE_ENABLED", False)
+    monkeypatch.setattr(config, "RECENT_ENTRIES_ENABLED", False)
+    monkeypatch.setattr(log_processor, "get_contextual_log_sequence_from_disk", lambda **kwargs: [])
+    llm = RecordingChatModel()
+    problem_queue = queue.Queue()
+    coalescer = problem_coalescer.BurstCoalescer(problem_queue, window_seconds=3600, max_groups=100)
+    for line_id in range(1, 6):
+        coalescer.put(_problem(line_id))
+    coalescer.close()
+
+    for metadata in _drain(problem_queue):
+        llm_service.analyze_and_generate_solution(metadata, llm, EmptyRetriever(), None, "")
+
+    assert len(llm.prompts) == 2
+    assert "burst of 4 occurrences" in llm.prompts[1]
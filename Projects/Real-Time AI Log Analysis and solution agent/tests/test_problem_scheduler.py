@@ -0,0 +1,118 @@
+import queue
+import random
+
+import pytest
+
+import problem_scheduler
+
+LEVELS = ['FATAL', 'ERROR', 'WARN']
+
+
+def _problem(index: int, level: str, event_id: str) -> dict:
+    return {'index': index, 'parsed_entry_metadata': {'level': level, 'event_id': event_id}}
+
+
+def _queue(maxsize: int, overflow_policy: str = "drop", sample_rate: int = 10) -> problem_scheduler.ProblemPriorityQueue:
+    return problem_scheduler.ProblemPriorityQueue(maxsize=maxsize, level_priority=LEVELS, overflow_policy=overflow_policy,
+                                                  sample_rate=sample_rate, protected_levels=['FATAL', 'ERROR'])
+
+
+class ReferenceDropQueue:
+    """Brute-force model of the "drop" policy: a list scanned for the best / worst problem."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items = [] # (level_rank, rarity, sequence, problem)
+        self.occurrences = {}
+        self.sequence = 0
+        self.dropped = []
+
+    def put(self, problem: dict) -> bool:
+        """Returns False where the real queue would raise queue.Full (non-blocking put)."""
+        metadata = problem['parsed_entry_metadata']
+        self.occurrences[metadata['event_id']] = self.occurrences.get(metadata['event_id'], 0) + 1
+        self.sequence += 1
+        item = (LEVELS.index(metadata['level']), self.occurrences[metadata['event_id']].bit_length(), self.sequence, problem)
+        if len(self.items) >= self.maxsize:
+            droppable = [queued for queued in self.items if queued[3]['parsed_entry_metadata']['level'] == 'WARN']
+            worst = max(droppable, key=lambda queued: queued[:3], default=None)
+            if metadata['level'] == 'WARN' and (worst is None or item[:3] > worst[:3]):
+                self.dropped.append(problem['index'])
+                return True
+            if worst is None:
+                return False
+            self.items.remove(worst)
+            self.dropped.append(worst[3]['index'])
+        self.items.append(item)
+        return True
+
+    def get(self) -> dict:
+        best = min(self.items, key=lambda queued: queued[:3])
+        self.items.remove(best)
+        return best[3]
+
+
+def test_problems_are_served_by_level_then_rarity_then_age():
+    problem_queue = _queue(maxsize=0)
+    problems = [_problem(0, 'WARN', "A"), _problem(1, 'ERROR', "B"), _problem(2, 'ERROR', "B"), _problem(3, 'ERROR', "B"),
+                _problem(4, 'ERROR', "C"), _problem(5, 'FATAL', "D")]
+    for problem in problems:
+        problem_queue.put(problem)
+    # B's second and third occurrences fall in a later rarity bucket (2-3 occurrences) than C's first
+    assert [problem_queue.get()['index'] for _ in problems] == [5, 1, 4, 2, 3, 0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_drop_policy_matches_brute_force(seed):
+    rng = random.Random(seed)
+    problem_queue = _queue(maxsize=25)
+    reference = ReferenceDropQueue(maxsize=25)
+    served, reference_served = [], []
+    for index in range(3000):
+        if rng.random() < 0.3 and reference.items:
+            served.append(problem_queue.get()['index'])
+            problem_queue.task_done()
+            reference_served.append(reference.get()['index'])
+        problem = _problem(index, rng.choice(LEVELS + ['WARN'] * 3), rng.choice("ABCDEFGH"))
+        if reference.put(problem):
+            problem_queue.put(problem, block=False)
+        else:
+            with pytest.raises(queue.Full):
+                problem_queue.put(problem, block=False)
+    while reference.items:
+        served.append(problem_queue.get()['index'])
+        problem_queue.task_done()
+        reference_served.append(reference.get()['index'])
+
+    assert served == reference_served
+    stats = problem_queue.stats()
+    assert sum(stats['dropped'].values()) == len(reference.dropped) > 0
+    assert set(stats['dropped']) == {'WARN'}
+    assert stats['depth'] == 0 and problem_queue.empty()
+    assert problem_queue.unfinished_tasks == 0 # Evicted problems are not waited for by join()
+    problem_queue.join()
+
+
+def test_protected_problem_evicts_droppable_one_and_otherwise_waits():
+    problem_queue = _queue(maxsize=2)
+    problem_queue.put(_problem(0, 'WARN', "A"))
+    problem_queue.put(_problem(1, 'ERROR', "B"))
+    problem_queue.put(_problem(2, 'ERROR', "C"), block=False) # Evicts the WARN
+    with pytest.raises(queue.Full):
+        problem_queue.put(_problem(3, 'FATAL', "D"), block=False) # Nothing left to evict
+    assert problem_queue.stats()['dropped'] == {'WARN': 1}
+    assert problem_queue.unfinished_tasks == 2
+
+
+def test_sample_policy_keeps_one_in_sample_rate_overflowing_problems_per_template():
+    problem_queue = _queue(maxsize=1, overflow_policy="sample", sample_rate=3)
+    problem_queue.put(_problem(0, 'WARN', "A"))
+    outcomes = []
+    for index in range(1, 7):
+        try:
+            problem_queue.put(_problem(index, 'WARN', "B"), block=False)
+            outcomes.append("dropped")
+        except queue.Full:
+            outcomes.append("sampled") # Kept: waits for room like "block"
+    assert outcomes == ["sampled", "dropped", "dropped", "sampled", "dropped", "dropped"]
+    assert problem_queue.get()['index'] == 0
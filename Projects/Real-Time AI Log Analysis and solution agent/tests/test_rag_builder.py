@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+import config
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+from langchain_core.documents import Document
+import embedding_cache
+import rag_builder
+
+
+def _load_lines(file_path: str) -> list:
+    """Stands in for the document loaders: one chunk per non-empty line."""
+    with open(file_path, encoding='utf-8') as f_doc:
+        return [Document(page_content=line.strip(), metadata={'source': file_path}) for line in f_doc if line.strip()]
+
+
+@pytest.fixture
+def kb_dirs(tmp_path, monkeypatch):
+    docs_dir = tmp_path / "solution_docs"
+    docs_dir.mkdir()
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_FILE", str(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.setattr(rag_builder, "load_and_split_solution_doc", _load_lines)
+    return tmp_path
+
+
+def _indexer(kb_dirs, embeddings) -> rag_builder.KnowledgeBaseIndexer:
+    return rag_builder.KnowledgeBaseIndexer(
+        embeddings, str(kb_dirs / "solution_docs"), str(kb_dirs / "faiss_index"), str(kb_dirs / "kb_manifest.json")
+    )
+
+
+def _write_doc(kb_dirs, name: str, lines: list):
+    (kb_dirs / "solution_docs" / name).write_text("".join(f"{line}\n" for line in lines), encoding='utf-8')
+
+
+def _indexed_texts(indexer: rag_builder.KnowledgeBaseIndexer) -> list:
+    vectorstore = indexer.vectorstore
+    doc_ids = list(vectorstore.index_to_docstore_id.values())
+    assert vectorstore.index.ntotal == len(doc_ids)
+    assert sorted(doc_ids) == sorted(doc_id for entry in indexer.files.values() for doc_id in entry['ids'])
+    return sorted(vectorstore.docstore.search(doc_id).page_content for doc_id in doc_ids)
+
+
+def test_sync_applies_added_changed_touched_and_removed_documents(kb_dirs):
+    embeddings = embedding_cache.FakeEmbeddings(dimensions=16)
+    _write_doc(kb_dirs, "disk.txt", ["disk full", "clean up /tmp"])
+    _write_doc(kb_dirs, "network.md", ["connection refused", "check the firewall"])
+    (kb_dirs / "solution_docs" / "notes.csv").write_text("skipped\n", encoding='utf-8')
+    indexer = _indexer(kb_dirs, embeddings)
+    indexer.load_or_build()
+    assert _indexed_texts(indexer) == ["check the firewall", "clean up /tmp", "connection refused", "disk full"]
+    assert sorted(indexer.files) == ["disk.txt", "network.md"]
+
+    embedded = embeddings.documents_embedded
+    assert indexer.sync() == {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 2, 'failed': 0}
+    disk_path = kb_dirs / "solution_docs" / "disk.txt"
+    os.utime(disk_path, ns=(disk_path.stat().st_mtime_ns + 10**9,) * 2) # Touched, same content
+    assert indexer.sync()['unchanged'] == 2
+    assert embeddings.documents_embedded == embedded
+
+    _write_doc(kb_dirs, "disk.txt", ["disk full", "rotate the logs"])
+    (kb_dirs / "solution_docs" / "network.md").unlink()
+    _write_doc(kb_dirs, "memory.txt", ["out of memory"])
+    assert indexer.sync() == {'added': 1, 'changed': 1, 'removed': 1, 'unchanged': 0, 'failed': 0}
+    assert _indexed_texts(indexer) == ["disk full", "out of memory", "rotate the logs"]
+    assert embeddings.documents_embedded == embedded + 2 # "disk full" came from the embedding cache
+
+
+def test_persisted_index_is_reused_without_reembedding(kb_dirs):
+    _write_doc(kb_dirs, "disk.txt", ["disk full", "clean up /tmp"])
+    first = _indexer(kb_dirs, embedding_cache.FakeEmbeddings(dimensions=16))
+    first.load_or_build()
+    first.stop()
+
+    embeddings = embedding_cache.FakeEmbeddings(dimensions=16)
+    second = _indexer(kb_dirs, embeddings)
+    second.load_or_build()
+    assert _indexed_texts(second) == ["clean up /tmp", "disk full"]
+    assert embeddings.documents_embedded == 0
+    second.stop()
+
+    other_model = _indexer(kb_dirs, embedding_cache.FakeEmbeddings(dimensions=8))
+    other_model.load_or_build() # Vectors of another model are never mixed in: rebuilt
+    assert other_model.embedding_model.documents_embedded == 2
+    other_model.stop()
+
+
+def test_served_retriever_switches_to_the_updated_index(kb_dirs):
+    _write_doc(kb_dirs, "disk.txt", ["disk full"])
+    indexer = _indexer(kb_dirs, embedding_cache.FakeEmbeddings(dimensions=16))
+    indexer.load_or_build()
+    retriever = indexer.as_retriever()
+    served = retriever.vectorstore
+
+    _write_doc(kb_dirs, "memory.txt", ["out of memory"])
+    indexer.sync()
+    assert served.index.ntotal == 1 # The served index was never modified in place
+    assert retriever.vectorstore is indexer.vectorstore and indexer.vectorstore.index.ntotal == 2
+    assert [doc.page_content for doc in retriever.invoke("out of memory")][0] == "out of memory"
+
+
+def test_document_that_fails_to_load_keeps_its_previous_vectors(kb_dirs, monkeypatch):
+    _write_doc(kb_dirs, "disk.txt", ["disk full"])
+    indexer = _indexer(kb_dirs, embedding_cache.FakeEmbeddings(dimensions=16))
+    indexer.load_or_build()
+
+    def failing_load(file_path: str) -> list:
+        raise ValueError("corrupt document")
+
+    monkeypatch.setattr(rag_builder, "load_and_split_solution_doc", failing_load)
+    _write_doc(kb_dirs, "disk.txt", ["disk full", "rotate the logs"])
+    assert indexer.sync()['failed'] == 1
+    assert _indexed_texts(indexer) == ["disk full"]
+
+    monkeypatch.setattr(rag_builder, "load_and_split_solution_doc", _load_lines)
+    assert indexer.sync()['changed'] == 1 # Retried on the next sync
+    assert _indexed_texts(indexer) == ["disk full", "rotate the logs"]
@@ -0,0 +1,84 @@
+import pytest
+
+import config
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("pypdf")
+import embedding_cache
+import rag_builder
+
+
+def _minimal_pdf(pages: list) -> bytes:
+    """A small valid PDF with one line of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    body, offsets = b"%PDF-1.4\n", []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref_offset = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return body
+
+
+@pytest.fixture
+def pdf_docs_dir(tmp_path, monkeypatch):
+    docs_dir = tmp_path / "solution_docs"
+    docs_dir.mkdir()
+    for doc_number in range(6):
+        (docs_dir / f"runbook-{doc_number}.pdf").write_bytes(
+            _minimal_pdf([f"runbook {doc_number} step {step}" for step in range(doc_number + 1)])
+        )
+    (docs_dir / "corrupt.pdf").write_bytes(b"%PDF-1.4\nnot really a pdf\n")
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_FILE", str(tmp_path / "embedding_cache.sqlite3"))
+    return docs_dir
+
+
+def _indexer(tmp_path, name: str, loader_workers: int) -> rag_builder.KnowledgeBaseIndexer:
+    return rag_builder.KnowledgeBaseIndexer(
+        embedding_cache.FakeEmbeddings(dimensions=16), str(tmp_path / "solution_docs"), str(tmp_path / f"{name}_index"),
+        str(tmp_path / f"{name}_manifest.json"), loader_workers=loader_workers
+    )
+
+
+def test_process_pool_loads_every_document_once_like_serial_loading(pdf_docs_dir, tmp_path):
+    file_paths = sorted(str(path) for path in pdf_docs_dir.iterdir())
+    serial = {file_path: (chunks, error) for file_path, chunks, error in
+              _indexer(tmp_path, "serial", loader_workers=1)._load_and_split_solution_docs(file_paths)}
+    parallel = list(_indexer(tmp_path, "parallel", loader_workers=2)._load_and_split_solution_docs(file_paths))
+
+    assert sorted(file_path for file_path, _, _ in parallel) == file_paths
+    for file_path, chunks, error in parallel:
+        if file_path.endswith("corrupt.pdf"):
+            assert chunks is None and error is not None and serial[file_path][1] is not None
+        else:
+            assert error is None
+            assert [chunk.page_content for chunk in chunks] == [chunk.page_content for chunk in serial[file_path][0]]
+    assert [chunk.page_content for chunk in serial[str(pdf_docs_dir / "runbook-2.pdf")][0]] == [
+        "runbook 2 step 0", "runbook 2 step 1", "runbook 2 step 2"
+    ]
+
+
+def test_parallel_sync_builds_the_same_index(pdf_docs_dir, tmp_path):
+    indexed = []
+    for name, loader_workers in (("serial", 1), ("parallel", 3)):
+        indexer = _indexer(tmp_path, name, loader_workers)
+        indexer.load_or_build()
+        assert indexer.sync()['failed'] == 1 # corrupt.pdf, retried on every sync
+        indexed.append((sorted(indexer.files), sorted(
+            indexer.vectorstore.docstore.search(doc_id).page_content
+            for doc_id in indexer.vectorstore.index_to_docstore_id.values()
+        )))
+        indexer.stop()
+    assert indexed[0] == indexed[1]
+    assert len(indexed[0][1]) == sum(range(1, 7))
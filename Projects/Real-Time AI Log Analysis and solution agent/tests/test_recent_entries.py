@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import config
+import log_processor
+import sequence_reader
+import synthetic_hdfs
+
+from conftest import run_stream, read_parsed_jsonl
+
+
+def _ingest(num_files: int = 3, seed: int = 22) -> tuple:
+    """Streams synthetic logs into the parsed JSONL. Returns (offset_map, parsed records in file order)."""
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=3000, num_files=num_files, error_rate=0.1,
+                                      multiline_ratio=0.3, seed=seed)
+    offset_map, _ = run_stream()
+    return offset_map, [json.loads(line) for _, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+
+
+def test_stream_buffer_serves_what_the_disk_reader_reads(pipeline_dirs):
+    offset_map, records = _ingest()
+    reader = sequence_reader.ParsedLogSequenceReader(config.OUTPUT_PARSED_JSONL)
+    try:
+        for num_lines_before in (1, 4, config.NUM_PRECEDING_LOGS_FOR_SEQUENCE):
+            for record in records:
+                assert log_processor.RECENT_ENTRIES.get_sequence(record, num_lines_before) == \
+                    reader.read_sequence(record, num_lines_before, offset_map)
+    finally:
+        reader.close()
+    stats = log_processor.RECENT_ENTRIES.stats()
+    assert stats['misses'] == 0 and stats['hits'] == 3 * len(records)
+    assert stats['source_files'] == 3 and stats['entries'] == len(records)
+
+
+@pytest.mark.parametrize("headroom", [0, 5, 40])
+def test_evicted_sequences_are_misses_and_the_rest_match_disk(pipeline_dirs, headroom):
+    offset_map, records = _ingest()
+    buffer = sequence_reader.RecentEntryBuffer(num_lines_before=10, headroom=headroom)
+    reader = sequence_reader.ParsedLogSequenceReader(config.OUTPUT_PARSED_JSONL)
+    try:
+        served = 0
+        for position, record in enumerate(records):
+            buffer.append(record)
+            # Problems are looked up a little after they were written, while the stream moves on
+            for target in records[max(0, position - 60):position + 1:7]:
+                sequence = buffer.get_sequence(target)
+                if sequence is not None:
+                    served += 1
+                    assert sequence == reader.read_sequence(target, 10, offset_map)
+    finally:
+        reader.close()
+    stats = buffer.stats()
+    assert stats['hits'] == served > 0
+    assert stats['misses'] > 0
+    assert stats['entries'] <= 3 * buffer.capacity
+
+
+def test_rotation_drops_the_previous_entries_of_that_file():
+    buffer = sequence_reader.RecentEntryBuffer(num_lines_before=3, headroom=10)
+    for line_id in range(1, 8):
+        buffer.append({'source_file': "node-00.log", 'line_id_in_file_header': line_id, 'level': "INFO"})
+        buffer.append({'source_file': "node-01.log", 'line_id_in_file_header': line_id, 'level': "INFO"})
+    buffer.append({'source_file': "node-00.log", 'line_id_in_file_header': 2, 'level': "WARN"}) # File was truncated
+
+    assert buffer.get_sequence({'source_file': "node-00.log", 'line_id_in_file_header': 2}) is None
+    assert [entry['line_id_in_file_header'] for entry in buffer.get_sequence({'source_file': "node-01.log", 'line_id_in_file_header': 7})] == [4, 5, 6]
+    assert buffer.stats()['entries'] == 8
+
+
+def brute_force_latest(file_records: list, max_entries: int, before_line_id: int, max_timestamp: str,
+                       min_timestamp: str = None) -> tuple:
+    """latest_entries() from all buffered records of a file: (entries newest first, oldest line id if the buffer ran out)."""
+    candidates = [record for record in file_records
+                  if record['line_id_in_file_header'] < before_line_id and record['timestamp'] <= max_timestamp]
+    latest = [record for record in candidates if min_timestamp is None or record['timestamp'] >= min_timestamp][::-1][:max_entries]
+    reached_min = min_timestamp is not None and any(record['timestamp'] < min_timestamp for record in candidates)
+    ran_out = len(latest) < max_entries and not reached_min # Older entries may still be on disk
+    return latest, file_records[0]['line_id_in_file_header'] if ran_out else None
+
+
+def test_latest_entries_match_brute_force(pipeline_dirs):
+    _, records = _ingest()
+    buffer = sequence_reader.RecentEntryBuffer(num_lines_before=10, headroom=100)
+    for record in records:
+        buffer.append(record)
+
+    checked_windows = 0
+    for source_file in buffer.source_files():
+        file_records = [record for record in records if record['source_file'] == source_file][-buffer.capacity:]
+        middle_timestamp = file_records[len(file_records) // 2]['timestamp']
+        for target in file_records[::9]:
+            for max_entries, min_timestamp in ((5, None), (20, middle_timestamp), (500, middle_timestamp), (500, None)):
+                expected = brute_force_latest(file_records, max_entries, target['line_id_in_file_header'],
+                                              target['timestamp'], min_timestamp)
+                assert buffer.latest_entries(source_file, max_entries, target['line_id_in_file_header'],
+                                             target['timestamp'], min_timestamp) == expected
+                checked_windows += min_timestamp is not None and expected[1] is None and len(expected[0]) < max_entries
+    assert checked_windows > 0 # Some lookups stopped at the time window, not the buffer's end
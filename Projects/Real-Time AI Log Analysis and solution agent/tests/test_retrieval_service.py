@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+from langchain_community.vectorstores import FAISS
+import embedding_cache
+import retrieval_service
+
+DOC_TEXTS = [f"runbook {number}: restart datanode {number}" for number in range(30)]
+
+
+class CountingEmbeddings(embedding_cache.FakeEmbeddings):
+    def __init__(self, dimensions: int = 16):
+        super().__init__(dimensions)
+        self.queries = []
+
+    def embed_query(self, text: str) -> list:
+        with self.lock:
+            self.queries.append(text)
+        return super().embed_query(text)
+
+
+def _retriever(embeddings, top_k: int = 3):
+    return FAISS.from_texts(DOC_TEXTS, embeddings).as_retriever(search_kwargs={'k': top_k})
+
+
+def _brute_force(embeddings, query: str, top_k: int = 3) -> list:
+    doc_vectors = np.array([embeddings.embed_query(text) for text in DOC_TEXTS])
+    distances = ((doc_vectors - np.array(embeddings.embed_query(query))) ** 2).sum(axis=1)
+    return [DOC_TEXTS[position] for position in np.argsort(distances)[:top_k]]
+
+
+def _invoke_concurrently(batching_retriever, queries: list) -> list:
+    results = [None] * len(queries)
+
+    def invoke(position):
+        results[position] = [doc.page_content for doc in batching_retriever.invoke(queries[position])]
+
+    threads = [threading.Thread(target=invoke, args=(position,)) for position in range(len(queries))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_batched_results_match_brute_force_search():
+    embeddings = CountingEmbeddings()
+    batching_retriever = retrieval_service.BatchingRetriever(_retriever(embeddings), max_batch_size=8, batch_wait_seconds=0.2)
+    queries = [f"Block blk_{number} is corrupt on node {chr(ord('a') + number)}" for number in range(8)]
+
+    results = _invoke_concurrently(batching_retriever, queries)
+
+    assert results == [_brute_force(embeddings, query) for query in queries]
+    assert batching_retriever.stats()['batches'] == 1 # All eight misses in one FAISS search
+    assert [doc.page_content for doc in batching_retriever.retriever.invoke(queries[0])] == results[0]
+
+
+def test_queries_of_one_template_share_a_cached_search():
+    embeddings = CountingEmbeddings()
+    batching_retriever = retrieval_service.BatchingRetriever(_retriever(embeddings), batch_wait_seconds=0.2)
+    queries = [f"Connection refused from 10.0.0.{number}:50010" for number in range(6)]
+
+    first = _invoke_concurrently(batching_retriever, queries[:3]) # Concurrent misses wait for one search
+    later = [[doc.page_content for doc in batching_retriever.invoke(query)] for query in queries[3:]]
+
+    (searched_query,) = embeddings.queries # One search, with the original text of whichever miss came first
+    assert searched_query in queries[:3]
+    assert first + later == [_brute_force(embeddings, searched_query)] * 6
+    stats = batching_retriever.stats()
+    assert (stats['hits'], stats['misses'], stats['batches'], stats['size']) == (3, 3, 1, 1)
+
+
+def test_cache_is_bounded_and_cleared_when_the_vector_store_is_swapped():
+    embeddings = CountingEmbeddings()
+    retriever = _retriever(embeddings)
+    batching_retriever = retrieval_service.BatchingRetriever(retriever, max_entries=2, batch_wait_seconds=0)
+    for query in ("disk full", "out of memory", "disk full", "connection refused"):
+        batching_retriever.invoke(query)
+    assert batching_retriever.stats()['evictions'] == 1
+    assert list(batching_retriever.cache) == ["disk full", "connection refused"]
+
+    retriever.vectorstore = FAISS.from_texts(["new runbook"], embeddings)
+    assert [doc.page_content for doc in batching_retriever.invoke("disk full")] == ["new runbook"]
+    assert batching_retriever.stats()['size'] == 1
+
+
+def test_search_errors_reach_the_caller_and_are_not_cached():
+    class FailingEmbeddings(CountingEmbeddings):
+        def embed_query(self, text: str) -> list:
+            raise RuntimeError("provider unavailable")
+
+    retriever = _retriever(CountingEmbeddings())
+    retriever.vectorstore.embedding_function = FailingEmbeddings()
+    batching_retriever = retrieval_service.BatchingRetriever(retriever, batch_wait_seconds=0)
+    with pytest.raises(RuntimeError, match="provider unavailable"):
+        batching_retriever.invoke("disk full")
+    assert batching_retriever.stats()['size'] == 0 and not batching_retriever.in_progress
@@ -0,0 +1,97 @@
+import os
+import json
+from collections import Counter
+
+import pytest
+
+import config
+import secondary_index
+import synthetic_hdfs
+
+from conftest import run_stream, read_parsed_jsonl
+
+
+@pytest.fixture
+def indexed(pipeline_dirs, monkeypatch):
+    """Streams synthetic logs with the secondary index on (small buckets and batches). Returns [(byte offset, record)]."""
+    monkeypatch.setattr(config, "SECONDARY_INDEX_ENABLED", True)
+    monkeypatch.setattr(config, "SECONDARY_INDEX_BUCKET_SECONDS", 5)
+    monkeypatch.setattr(config, "SECONDARY_INDEX_FLUSH_ENTRIES", 200)
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=4000, num_files=3, error_rate=0.2,
+                                      multiline_ratio=0.1, seed=24)
+    run_stream()
+    return [(byte_offset, json.loads(line)) for byte_offset, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+
+
+def brute_force_search(entries: list, levels=None, event_ids=None, source_files=None, start_timestamp=None,
+                       end_timestamp=None, limit=None) -> list:
+    """Every entry checked against the filters, in time order (JSONL order among equal timestamps)."""
+    as_list = lambda values: [values] if isinstance(values, str) else values
+    levels, event_ids, source_files = as_list(levels), as_list(event_ids), as_list(source_files)
+    matching = [(record['timestamp'], byte_offset, record) for byte_offset, record in entries
+                if (levels is None or record['level'] in levels)
+                and (event_ids is None or record['event_id'] in event_ids)
+                and (source_files is None or record['source_file'] in source_files)
+                and (start_timestamp is None or record['timestamp'] >= start_timestamp)
+                and (end_timestamp is None or record['timestamp'] < end_timestamp)]
+    return [record for _, _, record in sorted(matching, key=lambda match: match[:2])][:limit]
+
+
+def _queries(entries: list) -> list:
+    timestamps = sorted(record['timestamp'] for _, record in entries)
+    event_counts = Counter(record['event_id'] for _, record in entries if record['level'] != "INFO").most_common()
+    ranges = [(None, None), ("2016-04-13", "2016-04-14"), (timestamps[len(timestamps) // 4], timestamps[len(timestamps) // 2]),
+              (timestamps[-1], None), (None, timestamps[0])]
+    value_filters = [
+        {}, {'levels': "WARN"}, {'levels': ["ERROR", "FATAL"]}, {'event_ids': event_counts[0][0]},
+        {'event_ids': [event_counts[1][0], event_counts[-1][0]], 'levels': ["WARN", "ERROR"]},
+        {'source_files': "node-01.log", 'levels': "ERROR"}, {'source_files': ["node-00.log", "node-02.log"]},
+        {'levels': "DEBUG"}, {'source_files': "node-99.log"},
+    ]
+    return [dict(filters, start_timestamp=start, end_timestamp=end) for filters in value_filters for start, end in ranges]
+
+
+def test_search_matches_brute_force(indexed):
+    index = secondary_index.SecondaryIndex(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL)
+    assert index.stats()['chunks'] > 3 * len(secondary_index.DIMENSIONS) # Several batches and buckets
+    for query in _queries(indexed):
+        expected = brute_force_search(indexed, **query)
+        assert index.search(**query) == expected, query
+        assert index.count(**query) == len(expected)
+        assert index.search(limit=7, **query) == expected[:7]
+
+
+def test_unindexed_tail_is_searched_and_caught_up(indexed, tmp_path):
+    parsed_jsonl_path = str(tmp_path / "partial.jsonl")
+    index_dir = str(tmp_path / "partial_index")
+    half = len(indexed) // 2
+    with open(config.OUTPUT_PARSED_JSONL, 'rb') as f_parsed, open(parsed_jsonl_path, 'wb') as f_partial:
+        data = f_parsed.read()
+        f_partial.write(data[:indexed[half][0]])
+    secondary_index.build_index(parsed_jsonl_path, index_dir)
+    with open(parsed_jsonl_path, 'ab') as f_partial:
+        f_partial.write(data[indexed[half][0]:]) # Written after the index's last batch
+
+    index = secondary_index.SecondaryIndex(index_dir, parsed_jsonl_path)
+    assert index.indexed_jsonl_size() == indexed[half][0]
+    for query in _queries(indexed)[::3]:
+        assert index.search(**query) == brute_force_search(indexed, **query), query
+        assert index.search(include_unindexed=False, **query) == brute_force_search(indexed[:half], **query), query
+
+    stats = secondary_index.build_index(parsed_jsonl_path, index_dir)
+    assert stats['indexed_jsonl_bytes'] == os.path.getsize(parsed_jsonl_path)
+    index.refresh()
+    assert index.unindexed_tail() == []
+    assert index.search(include_unindexed=False, levels="WARN") == brute_force_search(indexed, levels="WARN")
+
+
+def test_reopening_at_an_earlier_size_drops_and_reindexes(indexed):
+    restored_size = indexed[len(indexed) // 3][0] # A checkpoint restore truncated the JSONL here
+    os.truncate(config.OUTPUT_PARSED_JSONL, restored_size)
+    secondary_index.SecondaryIndexWriter.from_config(config.OUTPUT_PARSED_JSONL, restored_size).close()
+
+    index = secondary_index.SecondaryIndex(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL)
+    remaining = [(byte_offset, record) for byte_offset, record in indexed if byte_offset < restored_size]
+    assert index.indexed_jsonl_size() == restored_size
+    for query in _queries(indexed)[::4]:
+        assert index.search(include_unindexed=False, **query) == brute_force_search(remaining, **query), query
@@ -0,0 +1,128 @@
+import os
+import json
+
+import pytest
+
+import config
+import log_processor
+import sequence_reader
+import synthetic_hdfs
+
+from conftest import run_stream, read_parsed_jsonl
+
+
+def _ingest(num_files: int = 3, seed: int = 21) -> tuple:
+    """Streams synthetic logs into the parsed JSONL. Returns (offset_map, parsed records in file order)."""
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=3000, num_files=num_files, error_rate=0.1,
+                                      multiline_ratio=0.3, seed=seed)
+    offset_map, _ = run_stream()
+    return offset_map, [json.loads(line) for _, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+
+
+def brute_force_sequence(records: list, offset_map, target: dict, num_lines_before: int, fields: list) -> list:
+    """The original lookup's result from all records: same-file entries from the indexed sequence start up to the target."""
+    start_line_id = max(1, target['line_id_in_file_header'] - num_lines_before)
+    if offset_map.get((target['source_file'], start_line_id)) is None:
+        return []
+    sequence = sorted((record for record in records if record['source_file'] == target['source_file']
+                       and start_line_id <= record['line_id_in_file_header'] < target['line_id_in_file_header']),
+                      key=lambda record: record['line_id_in_file_header'])
+    return [{field: record[field] for field in fields if field in record} for record in sequence[-num_lines_before:]]
+
+
+@pytest.mark.parametrize("num_lines_before", [1, 4, 10])
+def test_sequences_match_brute_force(pipeline_dirs, num_lines_before):
+    offset_map, records = _ingest()
+    reader = sequence_reader.ParsedLogSequenceReader(config.OUTPUT_PARSED_JSONL)
+    try:
+        sequences = [reader.read_sequence(record, num_lines_before, offset_map) for record in records]
+        assert sequences == [brute_force_sequence(records, offset_map, record, num_lines_before, config.SEQUENCE_FIELDS)
+                             for record in records]
+        assert any(len(sequence) == num_lines_before for sequence in sequences)
+        assert any(sequence == [] for sequence in sequences[num_lines_before:]) # Started on a continuation line
+        # Batched: any order, one pass over the file
+        shuffled = records[::7] + records[::-3]
+        assert reader.read_sequences(shuffled, num_lines_before, offset_map) == [
+            reader.read_sequence(record, num_lines_before, offset_map) for record in shuffled
+        ]
+    finally:
+        reader.close()
+
+
+def test_only_requested_fields_are_returned(pipeline_dirs):
+    offset_map, records = _ingest()
+    fields = ['event_id', 'level', 'missing_field']
+    reader = sequence_reader.ParsedLogSequenceReader(config.OUTPUT_PARSED_JSONL, fields=fields)
+    try:
+        for record in records[::11]:
+            assert reader.read_sequence(record, 10, offset_map) == brute_force_sequence(records, offset_map, record, 10, fields)
+    finally:
+        reader.close()
+
+
+class _WithoutKey:
+    """An offset map missing one key (e.g. a target whose offset was not indexed)."""
+
+    def __init__(self, offset_map, missing_key: tuple):
+        self.offset_map = offset_map
+        self.missing_key = missing_key
+
+    def get(self, key: tuple, default=None):
+        return default if key == self.missing_key else self.offset_map.get(key, default)
+
+
+def test_unindexed_target_is_read_by_counting_lines(pipeline_dirs):
+    offset_map, records = _ingest()
+    reader = sequence_reader.ParsedLogSequenceReader(config.OUTPUT_PARSED_JSONL)
+    try:
+        for record in records[::13]:
+            partial_map = _WithoutKey(offset_map, (record['source_file'], record['line_id_in_file_header']))
+            assert reader.read_sequence(record, 10, partial_map) == brute_force_sequence(
+                records, offset_map, record, 10, config.SEQUENCE_FIELDS
+            )
+    finally:
+        reader.close()
+
+
+def test_replaced_file_is_reopened_and_invalid_targets_return_nothing(pipeline_dirs):
+    offset_map, records = _ingest()
+    target = next(record for record in reversed(records)
+                  if len(brute_force_sequence(records, offset_map, record, 10, config.SEQUENCE_FIELDS)) == 10)
+    expected = brute_force_sequence(records, offset_map, target, 10, config.SEQUENCE_FIELDS)
+    assert log_processor.get_contextual_log_sequence_from_disk(config.OUTPUT_PARSED_JSONL, target, 10, offset_map) == expected
+
+    # Regeneration writes a new file at the same path
+    replaced_offsets = {}
+    tmp_path = config.OUTPUT_PARSED_JSONL + ".tmp"
+    with open(tmp_path, 'wb') as f_parsed_jsonl:
+        for record in records:
+            replaced_offsets[(record['source_file'], record['line_id_in_file_header'])] = f_parsed_jsonl.tell()
+            f_parsed_jsonl.write((json.dumps(dict(record, original_log_full="replaced")) + "\n").encode('ascii'))
+    os.replace(tmp_path, config.OUTPUT_PARSED_JSONL)
+    sequence = log_processor.get_contextual_log_sequence_from_disk(config.OUTPUT_PARSED_JSONL, target, 10, replaced_offsets)
+    assert sequence == [dict(entry, original_log_full="replaced") for entry in expected]
+
+    reader = sequence_reader.reader_for(config.OUTPUT_PARSED_JSONL)
+    assert reader.read_sequence({'source_file': target['source_file']}, 10, replaced_offsets) == []
+    assert reader.read_sequence(target, 0, replaced_offsets) == []
+    sequence_reader.close_readers()
+
+
+def test_non_ascii_records_are_decoded(tmp_path):
+    # ParsedLogWriter escapes non-ASCII characters; a JSONL written by other tools may not
+    parsed_jsonl_path = str(tmp_path / "parsed.jsonl")
+    offset_map = {}
+    with open(parsed_jsonl_path, 'wb') as f_parsed_jsonl:
+        for line_id in range(1, 6):
+            for source_file in ("node-a.log", "node-b.log"):
+                offset_map[(source_file, line_id)] = f_parsed_jsonl.tell()
+                record = {'line_id_in_file_header': line_id, 'source_file': source_file, 'original_log_full': f"Größe {line_id}"}
+                f_parsed_jsonl.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+
+    reader = sequence_reader.ParsedLogSequenceReader(parsed_jsonl_path, fields=['line_id_in_file_header', 'original_log_full'])
+    try:
+        assert reader.read_sequence({'source_file': "node-a.log", 'line_id_in_file_header': 5}, 3, offset_map) == [
+            {'line_id_in_file_header': line_id, 'original_log_full': f"Größe {line_id}"} for line_id in (2, 3, 4)
+        ]
+    finally:
+        reader.close()
@@ -0,0 +1,93 @@
+import time
+import threading
+
+import solution_cache
+
+
+def _counting_compute(calls: list, solution: dict = None):
+    def compute():
+        calls.append(1)
+        return dict(solution or {'summary': f"analysis {len(calls)}"})
+    return compute
+
+
+def test_repeated_key_reuses_the_solution_and_counts_occurrences():
+    cache = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600)
+    calls = []
+
+    first = cache.get_or_compute("HDFS_A", _counting_compute(calls))
+    second = cache.get_or_compute("HDFS_A", _counting_compute(calls))
+    second['summary'] = "changed by the caller"
+    third = cache.get_or_compute("HDFS_A", _counting_compute(calls))
+
+    assert len(calls) == 1
+    assert first['solution_cache']['status'] == "miss" and second['solution_cache']['status'] == "hit"
+    assert [solution['solution_cache']['occurrence_count'] for solution in (first, second, third)] == [1, 2, 3]
+    assert third['summary'] == "analysis 1" # Hits are copies
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_errors_are_not_cached():
+    cache = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600)
+    calls = []
+    assert cache.get_or_compute("HDFS_A", _counting_compute(calls, {'error': "timeout"})) == {'error': "timeout"}
+    cache.get_or_compute("HDFS_A", _counting_compute(calls))
+    assert len(calls) == 2 and cache.stats()['size'] == 1
+
+
+def test_expired_and_least_recently_used_entries_are_recomputed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(solution_cache.time, "time", lambda: now[0])
+    cache = solution_cache.SolutionCache(max_entries=2, ttl_seconds=60)
+    calls = []
+    for key in ("HDFS_A", "HDFS_B", "HDFS_A", "HDFS_C"): # HDFS_B is the least recently used when HDFS_C arrives
+        cache.get_or_compute(key, _counting_compute(calls))
+    assert len(calls) == 3 and cache.stats()['evictions'] == 1
+
+    assert cache.get_or_compute("HDFS_B", _counting_compute(calls))['solution_cache']['status'] == "miss"
+    now[0] += 61
+    assert cache.get_or_compute("HDFS_C", _counting_compute(calls))['solution_cache']['status'] == "miss"
+    assert cache.stats()['expirations'] == 1
+
+
+def test_concurrent_requests_for_a_missing_key_compute_once():
+    cache = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600)
+    calls = []
+    release = threading.Event()
+
+    def slow_compute():
+        calls.append(1)
+        release.wait(5)
+        return {'summary': "analysis"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("HDFS_A", slow_compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert sorted(result['solution_cache']['status'] for result in results) == ["hit"] * 4 + ["miss"]
+
+
+def test_persisted_cache_is_reloaded(tmp_path):
+    persist_path = str(tmp_path / "solution_cache.json")
+    cache = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600, persist_path=persist_path)
+    cache.get_or_compute("HDFS_A", _counting_compute([]))
+    cache.save()
+
+    reloaded = solution_cache.SolutionCache(max_entries=10, ttl_seconds=3600, persist_path=persist_path).load()
+    calls = []
+    solution = reloaded.get_or_compute("HDFS_A", _counting_compute(calls))
+    assert calls == [] and solution['summary'] == "analysis 1"
+    assert solution['solution_cache']['occurrence_count'] == 2
+
+
+def test_cache_key_ignores_order_and_repeats_of_sequence_templates():
+    sequence = [{'event_id': "HDFS_X"}, {'event_id': "HDFS_Y"}, {'event_id': "HDFS_X"}]
+    assert solution_cache.make_cache_key("HDFS_A") == "HDFS_A"
+    assert solution_cache.make_cache_key("HDFS_A", sequence) == solution_cache.make_cache_key("HDFS_A", sequence[::-1][:2])
+    assert solution_cache.make_cache_key("HDFS_A", sequence) != solution_cache.make_cache_key("HDFS_A", sequence[:1])
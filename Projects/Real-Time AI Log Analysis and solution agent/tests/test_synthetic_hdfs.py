@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+
+import config
+import log_processor
+import synthetic_hdfs
+import bench_pipeline
+
+from conftest import run_stream
+
+
+def _read_files(file_paths: list) -> list:
+    contents = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f_log:
+            contents.append(f_log.read())
+    return contents
+
+
+def test_generation_is_deterministic_per_seed(tmp_path):
+    first = synthetic_hdfs.generate_node_logs(str(tmp_path / "first"), total_lines=2000, num_files=2, seed=7)
+    again = synthetic_hdfs.generate_node_logs(str(tmp_path / "again"), total_lines=2000, num_files=2, seed=7)
+    other = synthetic_hdfs.generate_node_logs(str(tmp_path / "other"), total_lines=2000, num_files=2, seed=8)
+
+    assert _read_files(first['files']) == _read_files(again['files'])
+    assert _read_files(first['files']) != _read_files(other['files'])
+    assert {key: value for key, value in first.items() if key != 'files'} == {key: value for key, value in again.items() if key != 'files'}
+
+
+def test_summary_matches_the_written_logs(tmp_path):
+    summary = synthetic_hdfs.generate_node_logs(str(tmp_path), total_lines=3000, num_files=3, error_rate=0.2,
+                                                multiline_ratio=0.1, extra_templates=5, seed=11)
+    raw_lines = bench_pipeline.read_raw_lines(summary['files'])
+    headers = [log_processor.parse_log_line_hybrid_single(raw_line) for raw_line in raw_lines]
+    entry_headers = [header for header in headers if header]
+
+    assert [os.path.basename(file_path) for file_path in summary['files']] == ["node-00.log", "node-01.log", "node-02.log"]
+    assert summary['raw_lines'] == len(raw_lines) >= 3000
+    assert summary['bytes'] == sum(os.path.getsize(file_path) for file_path in summary['files'])
+    assert summary['entries'] == len(entry_headers)
+    assert summary['problem_entries'] == sum(1 for header in entry_headers if header['level'] in synthetic_hdfs.PROBLEM_LEVEL_WEIGHTS)
+    assert summary['multiline_entries'] == sum(1 for previous, header in zip(headers, headers[1:]) if previous and not header)
+    assert 0.1 < summary['problem_entries'] / summary['entries'] < 0.3
+
+
+def test_stream_parses_every_generated_entry(pipeline_dirs):
+    summary = synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=2000, num_files=2, multiline_ratio=0.2, seed=5)
+    _, parsed_entries = run_stream()
+    assert parsed_entries == summary['entries']
+
+
+def test_benchmark_writes_json_results(pipeline_dirs, monkeypatch, capsys):
+    # The benchmark points config at its work dir; pipeline_dirs restores every setting it changes afterwards
+    results_path = pipeline_dirs / "results.json"
+    monkeypatch.setattr(sys, "argv", ["bench_pipeline.py", "--lines", "2000", "--files", "2", "--sequence-lookups", "50",
+                                      "--output", str(results_path), "--keep-dir", str(pipeline_dirs / "work")])
+    bench_pipeline.main()
+
+    with open(results_path, encoding='utf-8') as f_results:
+        results = json.load(f_results)
+    assert results['benchmark'] == "pipeline" and results['version'] == bench_pipeline.RESULTS_FORMAT_VERSION
+    assert results['stages']['parse']['items'] == results['dataset']['raw_lines']
+    assert results['stages']['normalize']['uncached']['items'] == results['dataset']['entries']
+    assert results['stages']['ingest']['entries']['items'] == results['dataset']['entries']
+    assert "normalize:" in capsys.readouterr().out
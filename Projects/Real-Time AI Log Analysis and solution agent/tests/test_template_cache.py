@@ -0,0 +1,38 @@
+import hashlib
+
+import config
+import log_processor
+import template_normalizer
+
+
+def _template_cache(probe_lookups: int, min_hit_rate: float) -> template_normalizer.TemplateCache:
+    return template_normalizer.TemplateCache(
+        1000, template_normalizer.build_digit_signature_table(config.NORMALIZATION_RULES), min_hit_rate, probe_lookups
+    )
+
+
+def test_low_hit_rate_bypasses_cache():
+    template_cache = _template_cache(probe_lookups=100, min_hit_rate=0.3)
+    # Hex ids differ in letters, which the digit signature cannot mask: nearly every signature is new
+    contents = [f"Receiving block BP-{hashlib.md5(str(index).encode()).hexdigest()[:12]} src: /10.0.0.{index % 250}:50010"
+                for index in range(300)]
+
+    results = [template_cache.get_or_compute(content, log_processor._normalize_and_derive_event_id) for content in contents]
+
+    assert results == [log_processor._normalize_and_derive_event_id(content) for content in contents]
+    stats = template_cache.stats()
+    assert stats['bypassed'] and stats['size'] == 0
+    assert stats['hits'] + stats['misses'] == 100
+    assert stats['bypassed_lookups'] == 200
+
+
+def test_repeating_signatures_keep_cache():
+    template_cache = _template_cache(probe_lookups=100, min_hit_rate=0.3)
+    contents = [f"Served block to /10.0.0.{index % 250} in {index}ms" for index in range(300)]
+
+    results = [template_cache.get_or_compute(content, log_processor._normalize_and_derive_event_id) for content in contents]
+
+    assert results == [log_processor._normalize_and_derive_event_id(content) for content in contents]
+    stats = template_cache.stats()
+    assert not stats['bypassed'] and stats['bypassed_lookups'] == 0
+    assert stats['hit_rate'] > 0.9
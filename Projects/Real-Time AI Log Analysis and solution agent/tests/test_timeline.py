@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+import config
+import columnar_store
+import log_processor
+import secondary_index
+import sequence_reader
+import synthetic_hdfs
+import timeline
+
+from conftest import run_stream, read_parsed_jsonl
+
+
+@pytest.fixture
+def indexed(pipeline_dirs, monkeypatch):
+    """Streams synthetic logs with the secondary index on. Returns (offset_map, [(byte offset, record)])."""
+    monkeypatch.setattr(config, "SECONDARY_INDEX_ENABLED", True)
+    monkeypatch.setattr(config, "SECONDARY_INDEX_BUCKET_SECONDS", 5)
+    monkeypatch.setattr(config, "SECONDARY_INDEX_FLUSH_ENTRIES", 200)
+    synthetic_hdfs.generate_node_logs(config.RAW_LOGS_DIR, total_lines=4000, num_files=3, error_rate=0.1,
+                                      multiline_ratio=0.1, seed=25)
+    offset_map, _ = run_stream()
+    return offset_map, [(byte_offset, json.loads(line)) for byte_offset, line in read_parsed_jsonl(config.OUTPUT_PARSED_JSONL)]
+
+
+def brute_force_candidates(records: list, target: dict, window_seconds: float, located: bool = True) -> list:
+    """
+    Every entry the merge may return: entries in [window start, target time], and of the target's own file only those
+    before it (by position if the target is located on disk).
+    """
+    target_ms = columnar_store.timestamp_to_ms(target['timestamp'])
+    start_timestamp = columnar_store.ms_to_timestamps([target_ms - int(window_seconds * 1000)])[0]
+    return [record for record in records if record['timestamp'] >= start_timestamp and (
+        record['line_id_in_file_header'] < target['line_id_in_file_header']
+        if located and record['source_file'] == target['source_file'] else record['timestamp'] <= target['timestamp'])]
+
+
+def assert_newest_merged(result: list, candidates: list, num_events: int):
+    """result holds the num_events newest candidates, oldest first (entries with equal timestamps may come in any file order)."""
+    key = lambda entry: (entry['source_file'], entry['line_id_in_file_header'])
+    by_key = {key(record): {field: record[field] for field in config.SEQUENCE_FIELDS} for record in candidates}
+    assert len(result) == min(num_events, len(candidates))
+    assert len({key(entry) for entry in result}) == len(result)
+    assert all(by_key.get(key(entry)) == entry for entry in result)
+    assert [entry['timestamp'] for entry in result] == sorted(entry['timestamp'] for entry in result)
+    for source_file in {entry['source_file'] for entry in result}:
+        line_ids = [entry['line_id_in_file_header'] for entry in result if entry['source_file'] == source_file]
+        assert line_ids == sorted(line_ids)
+    if result:
+        oldest_timestamp = result[0]['timestamp']
+        assert oldest_timestamp == sorted(record['timestamp'] for record in candidates)[-len(result)]
+        newer = {key(record) for record in candidates if record['timestamp'] > oldest_timestamp}
+        assert newer <= {key(entry) for entry in result}
+
+
+def _check_targets(merged_timeline: timeline.CrossNodeTimeline, records: list, offset_map) -> int:
+    compared = 0
+    for target in records[5::17]:
+        for num_events, window_seconds in ((5, 60.0), (20, 60.0), (40, 0.5)):
+            result = merged_timeline.preceding_entries(target, num_events, window_seconds, offset_map)
+            assert_newest_merged(result, brute_force_candidates(records, target, window_seconds), num_events)
+            compared += len({entry['source_file'] for entry in result}) > 1
+    return compared
+
+
+def test_index_only_timeline_matches_brute_force_merge(indexed):
+    offset_map, entries = indexed
+    records = [record for _, record in entries]
+    index = secondary_index.SecondaryIndex(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL)
+    assert _check_targets(timeline.CrossNodeTimeline(index), records, offset_map) > 0 # Sequences do span files
+
+
+@pytest.mark.parametrize("headroom", [0, 30, 5000])
+def test_buffered_and_disk_entries_merge_like_brute_force(indexed, headroom):
+    offset_map, entries = indexed
+    records = [record for _, record in entries]
+    buffer = sequence_reader.RecentEntryBuffer(num_lines_before=10, headroom=headroom)
+    for record in records:
+        buffer.append(record)
+    index = secondary_index.SecondaryIndex(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL)
+    _check_targets(timeline.CrossNodeTimeline(index, buffer), records, offset_map)
+
+
+def test_unindexed_tail_is_merged(indexed, tmp_path):
+    offset_map, entries = indexed
+    records = [record for _, record in entries]
+    parsed_jsonl_path = str(tmp_path / "partial.jsonl")
+    index_dir = str(tmp_path / "partial_index")
+    split_offset = entries[2 * len(entries) // 3][0]
+    with open(config.OUTPUT_PARSED_JSONL, 'rb') as f_parsed:
+        data = f_parsed.read()
+    with open(parsed_jsonl_path, 'wb') as f_partial:
+        f_partial.write(data[:split_offset])
+    secondary_index.build_index(parsed_jsonl_path, index_dir)
+    with open(parsed_jsonl_path, 'ab') as f_partial:
+        f_partial.write(data[split_offset:]) # Not indexed yet
+
+    index = secondary_index.SecondaryIndex(index_dir, parsed_jsonl_path)
+    assert index.indexed_jsonl_size() == split_offset
+    _check_targets(timeline.CrossNodeTimeline(index), records, offset_map)
+
+
+def test_cross_node_sequence_lookup(indexed, monkeypatch):
+    offset_map, entries = indexed
+    records = [record for _, record in entries]
+    monkeypatch.setattr(config, "RECENT_ENTRIES_ENABLED", True)
+    target = records[len(records) // 2]
+    sequence = log_processor.get_cross_node_log_sequence(config.OUTPUT_PARSED_JSONL, target, 20, 60.0, offset_map)
+    assert_newest_merged(sequence, brute_force_candidates(records, target, 60.0), 20)
+
+    monkeypatch.setattr(config, "SECONDARY_INDEX_ENABLED", False)
+    assert log_processor.get_cross_node_log_sequence(config.OUTPUT_PARSED_JSONL, target, 20, 60.0, offset_map) == []
+
+
+def test_unlocated_target_bounds_its_file_by_time_and_invalid_targets_return_nothing(indexed):
+    _, entries = indexed
+    records = [record for _, record in entries]
+    merged_timeline = timeline.CrossNodeTimeline(secondary_index.SecondaryIndex(config.SECONDARY_INDEX_DIR, config.OUTPUT_PARSED_JSONL))
+    for target in records[3::41]:
+        assert_newest_merged(merged_timeline.preceding_entries(target, 20, 60.0),
+                             brute_force_candidates(records, target, 60.0, located=False), 20)
+
+    target = records[len(records) // 2]
+    assert merged_timeline.preceding_entries(dict(target, timestamp=""), 20, 60.0) == []
+    assert merged_timeline.preceding_entries({'timestamp': target['timestamp']}, 20, 60.0) == []
+    assert merged_timeline.preceding_entries(target, 0, 60.0) == []
@@ -0,0 +1,58 @@
+import time
+import queue
+import threading
+
+import pytest
+
+import config
+
+# worker_manager imports llm_service, which needs the LLM provider packages
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_google_genai")
+import llm_service
+import worker_manager
+
+
+def _problem(index: int) -> dict:
+    return {'parsed_entry_metadata': {'event_id': f"HDFS_{index:08X}", 'level': "ERROR", 'original_log_full': f"problem {index}"}}
+
+
+def test_results_are_written_in_dequeue_order_with_bounded_concurrency(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "OUTPUT_SOLUTIONS_JSONL", str(tmp_path / "solutions.jsonl"))
+    lock = threading.Lock()
+    running = [0, 0] # current, max
+
+    def analyze(parsed_entry_metadata, **kwargs):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        index = int(parsed_entry_metadata['event_id'][5:], 16)
+        time.sleep(0.05 if index % 3 == 0 else 0.01) # Later problems often finish first
+        with lock:
+            running[0] -= 1
+        if index == 7:
+            return {'error': "provider failure"}
+        return {'event_id': parsed_entry_metadata['event_id'], 'summary': f"solution {index}"}
+
+    monkeypatch.setattr(llm_service, "analyze_and_generate_solution", analyze)
+    problem_queue, ui_queue, stop_event = queue.Queue(), queue.Queue(), threading.Event()
+    for index in range(20):
+        problem_queue.put(_problem(index))
+    worker = threading.Thread(target=worker_manager.llm_analysis_worker_thread,
+                              args=(None, None, problem_queue, None, "", stop_event, ui_queue, 3))
+    worker.start()
+    problem_queue.join() # Every problem is task_done once its result is written, errors included
+    stop_event.set()
+    worker.join(timeout=10)
+
+    messages = []
+    while not ui_queue.empty():
+        messages.append(ui_queue.get_nowait())
+    solutions = [message['data']['event_id'] for message in messages if message['type'] == 'solution_generated']
+    assert solutions == [f"HDFS_{index:08X}" for index in range(20) if index != 7]
+    assert [message['type'] for message in messages].count('error_message') == 1
+    assert messages[-1] == {'type': 'worker_stopped', 'count': 19}
+    assert 1 < running[1] <= 3
+    with open(config.OUTPUT_SOLUTIONS_JSONL, encoding='utf-8') as f_solutions:
+        written = f_solutions.read()
+    assert [written.index(f"solution {index}") for index in (0, 1, 19)] == sorted(written.index(f"solution {index}") for index in (0, 1, 19))
@@ -0,0 +1,159 @@
+import heapq
+import bisect
+import threading
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+
+# Import configurations, the secondary index (per-file timestamp postings) and the recent-entry buffer
+import config
+import columnar_store
+import secondary_index
+
+# Item kinds in the per-file streams
+DECODED = 0 # value: parsed entry (from the recent-entry buffer or the decoded unindexed JSONL tail)
+ON_DISK = 1 # value: byte offset in the parsed JSONL
+
+
+class CrossNodeTimeline:
+    """
+    The events leading up to a problem across all source files (NameNode and DataNodes), merged by timestamp.
+
+    Every source file contributes a stream walking back through its own entries, newest first: what the
+    recent-entry buffer still holds (live), then the JSONL written since the secondary index's last batch,
+    then the file's secondary-index postings in the window's time buckets. heapq.merge combines the streams
+    lazily, so only the entries returned are read from the JSONL. Streams read postings in pages of num_events
+    and stop at the window start, so memory is bounded by files * num_events whatever the history size
+    (plus the unindexed tail, at most one secondary-index batch). Each file is assumed to be in timestamp
+    order, as log files are.
+    """
+
+    def __init__(self, index: secondary_index.SecondaryIndex, recent_entries=None, fields: list = None):
+        self.index = index
+        self.recent_entries = recent_entries # sequence_reader.RecentEntryBuffer, or None (historical data only)
+        fields = list(config.SEQUENCE_FIELDS if fields is None else fields)
+        self.fields = tuple(fields if 'source_file' in fields else ['source_file'] + fields)
+        self.tail = None # The index's unindexed tail list, grouped by source file up to tail_grouped
+        self.tail_grouped = 0
+        self.tail_by_file = {}
+        self.lock = threading.Lock()
+
+    def _unindexed_by_file(self) -> dict:
+        """source_file -> its (byte offset, entry) pairs in the index's unindexed tail, grouped incrementally."""
+        tail = self.index.unindexed_tail()
+        with self.lock:
+            if tail is not self.tail:
+                self.tail, self.tail_grouped, self.tail_by_file = tail, 0, {}
+            for item in tail[self.tail_grouped:]:
+                self.tail_by_file.setdefault(item[1]['source_file'], []).append(item)
+            self.tail_grouped = len(tail)
+            return dict(self.tail_by_file) # Lists are only appended to, so readers may keep using them
+
+    # --- Per-File Streams (newest first; items are (timestamp ms, kind, value)) ---
+    def _buffered_stream(self, entries: list):
+        for entry in entries:
+            yield columnar_store.timestamp_to_ms(entry['timestamp']), DECODED, entry
+
+    def _disk_stream(self, postings: np.ndarray, file_chunks, unindexed: list, before_offset, max_timestamp: tuple,
+                     start_timestamp: tuple, page_size: int):
+        """
+        Entries before before_offset (None = no bound) and at or before max_timestamp (None = no bound), down to start_timestamp
+        (both as (string, epoch ms)): first from the unindexed tail, then from the file's chunks of postings.
+        """
+        max_timestamp, max_ms = max_timestamp or (None, None)
+        start_timestamp, start_ms = start_timestamp
+        end = len(unindexed)
+        if before_offset is not None:
+            end = bisect.bisect_left(unindexed, before_offset, key=itemgetter(0))
+        if max_timestamp is not None:
+            end = bisect.bisect_right(unindexed, max_timestamp, hi=end, key=lambda item: item[1]['timestamp'])
+        for position in range(end - 1, -1, -1):
+            entry = unindexed[position][1]
+            if entry['timestamp'] < start_timestamp:
+                return
+            yield columnar_store.timestamp_to_ms(entry['timestamp']), DECODED, entry
+        if file_chunks is None:
+            return
+        for first, count in zip(file_chunks['first_posting'][::-1].tolist(), file_chunks['count'][::-1].tolist()):
+            # A chunk holds one file's postings in file (= time) order: the eligible ones are one contiguous range
+            chunk = np.asarray(postings[first:first + count])
+            low = int(np.searchsorted(chunk['timestamp'], start_ms, 'left'))
+            high = count if max_ms is None else int(np.searchsorted(chunk['timestamp'], max_ms, 'right'))
+            if before_offset is not None:
+                high = min(high, int(np.searchsorted(chunk['offset'], before_offset, 'left')))
+            while high > low:
+                begin = max(low, high - page_size)
+                page = chunk[begin:high][::-1]
+                high = begin
+                for timestamp, byte_offset in zip(page['timestamp'].tolist(), page['offset'].tolist()):
+                    yield timestamp, ON_DISK, byte_offset
+            if low > 0:
+                return # Everything earlier in the file is before the window
+
+    # --- Query ---
+    def preceding_entries(self, target_entry_metadata: dict, num_events: int, window_seconds: float, offset_map=None) -> list:
+        """
+        Up to num_events entries of any source file within window_seconds before the target, oldest first: entries
+        of other files timestamped at or before the target, and entries preceding the target in its own file.
+        offset_map (offset_index.OffsetMap) locates the target and the oldest buffered entries on disk.
+        Entries carry self.fields (config.SEQUENCE_FIELDS plus source_file).
+        """
+        target_timestamp = target_entry_metadata.get('timestamp')
+        target_file = target_entry_metadata.get('source_file')
+        target_line_id = target_entry_metadata.get('line_id_in_file_header')
+        if not target_timestamp or not target_file or num_events <= 0:
+            return []
+        target_ms = columnar_store.timestamp_to_ms(target_timestamp)
+        start_ms = target_ms - int(window_seconds * 1000)
+        start_timestamp = columnar_store.ms_to_timestamps([start_ms])[0]
+        lookup = (lambda key: None) if offset_map is None else offset_map.get
+        target_offset = lookup((target_file, target_line_id))
+
+        chunks_by_file = self.index.source_file_chunks(start_ms, target_ms)
+        postings = np.asarray(self.index.postings) # Plain array view of the memory map (cheaper to slice)
+        unindexed_by_file = self._unindexed_by_file()
+        streams = []
+        buffered_files = set(self.recent_entries.source_files()) if self.recent_entries is not None else set()
+        for source_file in buffered_files | set(chunks_by_file) | set(unindexed_by_file):
+            is_target_file = source_file == target_file
+            before_offset = target_offset if is_target_file else None
+            # Entries of the target's file are taken by position; if the target is not located, by time
+            max_timestamp = None if is_target_file and target_offset is not None else (target_timestamp, target_ms)
+            if source_file in buffered_files:
+                entries, oldest_line_id = self.recent_entries.latest_entries(
+                    source_file, num_events,
+                    before_line_id=target_line_id if is_target_file else None,
+                    max_timestamp=None if is_target_file else target_timestamp,
+                    min_timestamp=start_timestamp,
+                )
+                if entries:
+                    streams.append(self._buffered_stream(entries))
+                if oldest_line_id is None:
+                    continue # Complete from the buffer
+                buffer_start_offset = lookup((source_file, oldest_line_id))
+                if buffer_start_offset is None:
+                    continue # Cannot tell which entries on disk the buffer already covers
+                before_offset = buffer_start_offset if before_offset is None else min(before_offset, buffer_start_offset)
+            streams.append(self._disk_stream(postings, chunks_by_file.get(source_file), unindexed_by_file.get(source_file, []),
+                                             before_offset, max_timestamp, (start_timestamp, start_ms), num_events))
+
+        newest = list(islice(heapq.merge(*streams, key=lambda item: item[0], reverse=True), num_events))
+        disk_items = [item for item in newest if item[1] == ON_DISK]
+        disk_entries = dict(zip((byte_offset for _, _, byte_offset in disk_items),
+                                self.index.read_entries([byte_offset for _, _, byte_offset in disk_items])))
+        timeline = [item[2] if item[1] == DECODED else disk_entries[item[2]] for item in reversed(newest)]
+        return [{field: entry[field] for field in self.fields if field in entry} for entry in timeline]
+
+
+# --- Shared Timelines (one per secondary index and parsed JSONL) ---
+_TIMELINES = {}
+_TIMELINES_LOCK = threading.Lock()
+
+def timeline_for(index_dir: str, parsed_jsonl_path: str, recent_entries=None) -> CrossNodeTimeline:
+    """The shared timeline over a secondary index (created on first use; the index picks up new postings itself)."""
+    with _TIMELINES_LOCK:
+        key = (index_dir, parsed_jsonl_path, id(recent_entries))
+        timeline = _TIMELINES.get(key)
+        if timeline is None:
+            timeline = _TIMELINES[key] = CrossNodeTimeline(secondary_index.SecondaryIndex(index_dir, parsed_jsonl_path), recent_entries)
+        return timeline
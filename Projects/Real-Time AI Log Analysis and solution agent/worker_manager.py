@@ -2,30 +2,127 @@ import queue
 import threading
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from tqdm import tqdm
 
 # Import components from other modules
 import config
 import llm_service
 import log_processor
+import offset_index
+import metrics
 import output_formatter # Ensure output_formatter.py exists in the same directory or is importable
 
+# How long the dispatcher waits for the oldest in-flight analysis before checking the queue again
+RESULT_POLL_SECONDS = 0.05
+
+
+# --- Result Handling (runs on the dispatcher thread only, so file writes never interleave) ---
+def _write_solution_result(
+    problem_context: dict,
+    generated_solution: dict,
+    solutions_generated_count: int,
+    solutions_file,
+    ui_update_queue_instance: queue.Queue
+) -> int:
+    """
+    Saves one analysis result to the solutions file and forwards it to the UI update queue.
+    Returns the updated count of solutions generated.
+    """
+    parsed_entry_metadata = problem_context['parsed_entry_metadata']
+
+    if generated_solution and not generated_solution.get('error'):
+        solutions_generated_count += 1
+
+        llm_feedback = generated_solution.get('llm_analysis_feedback', {})
+        seq_status = llm_feedback.get('sequence_retrieval_status', 'N/A')
+        seq_count = llm_feedback.get('sequence_retrieved_count', 'N/A')
+        rag_count = llm_feedback.get('rag_chunks_retrieved_count', 'N/A')
+        cache_info = generated_solution.get('solution_cache', {})
+        cache_note = cache_line = ""
+        metrics.SOLUTIONS.labels("cached" if cache_info.get('status') == 'hit' else "generated").inc()
+        if cache_info.get('status') == 'hit':
+            cache_note = f" [cached solution, occurrence #{cache_info.get('occurrence_count')}]"
+            cache_line = f"Solution cache: reused an earlier analysis of this problem (occurrence #{cache_info.get('occurrence_count')})\n"
+        retrieval_note = " (from the cached analysis)" if llm_feedback.get('retrieval_source') == 'cached_analysis' else ""
+
+        burst_summary = parsed_entry_metadata.get('burst_summary')
+        burst_line = ""
+        if burst_summary and burst_summary['count'] > 1:
+            burst_line = (f"Burst: {burst_summary['count']} occurrences between {burst_summary['first_timestamp']} and "
+                          f"{burst_summary['last_timestamp']} in {', '.join(burst_summary['source_files'])}\n")
+            generated_solution['burst_summary'] = burst_summary
+
+        # This diagnostic header is written to the file
+        diagnostic_header = (
+            f"--- Analyzing Entry (ID: {parsed_entry_metadata.get('event_id', 'N/A')}, Level: {parsed_entry_metadata.get('level', 'N/A')}) ---\n"
+            f"Event Template: {parsed_entry_metadata.get('event_template', 'N/A')}\n"
+            f"Original Full Log Snippet:\n{parsed_entry_metadata.get('original_log_full', '')[:500]}...\n"
+            f"{burst_line}"
+            f"Sequence analysis result: {seq_status} ({seq_count} entries retrieved){retrieval_note}\n"
+            f"Retrieving relevant context from knowledge base...\n"
+            f"Retrieved {rag_count} document chunks{retrieval_note}.\n"
+            f"Sending final prompt to Gemini LLM for solution generation...\n"
+            f"{cache_line}\n"
+        )
+        solutions_file.write(diagnostic_header)
+
+        # Use the formatter from output_formatter for the file content
+        formatted_solution_text = output_formatter.format_solution_for_display(generated_solution)
+        solutions_file.write(formatted_solution_text + '\n')
+        solutions_file.write("---\n")
+        solutions_file.flush() # Ensure data is written to disk immediately
+
+        # Only print the concise status to the terminal
+        print(f"[Worker] Solution saved #{solutions_generated_count} (ID: {generated_solution.get('event_id', 'N/A')}) - Level: {generated_solution.get('severity', 'N/A')}){cache_note}")
+
+        # --- Send solution to UI update queue for Streamlit display ---
+        # Send the full JSON object to the UI for flexible rendering
+        ui_update_queue_instance.put({
+            'type': 'solution_generated',
+            'data': generated_solution
+        })
+
+    elif generated_solution and generated_solution.get('error'):
+        metrics.SOLUTIONS.labels("error").inc()
+        print(f"ERROR: Worker skipped invalid solution for {parsed_entry_metadata.get('event_id', 'N/A')}: {generated_solution.get('error')[:50]}...")
+        # Signal UI about this error
+        ui_update_queue_instance.put({
+            'type': 'error_message',
+            'message': f"Solution ERROR for {parsed_entry_metadata.get('event_id', 'N/A')}: {generated_solution.get('error')}"
+        })
+
+    return solutions_generated_count
+
+
 # --- LLM Analysis Worker (Concurrent Thread) ---
 def llm_analysis_worker_thread(
     llm_instance_arg,
     retriever_instance_arg,
     problem_queue_arg: queue.Queue,
-    offset_map_arg: dict,
+    offset_map_arg: offset_index.OffsetMap,
     parsed_jsonl_path_arg: str,
     stop_event_arg: threading.Event,
-    ui_update_queue_instance: queue.Queue # This parameter is crucial for UI communication
+    ui_update_queue_instance: queue.Queue, # This parameter is crucial for UI communication
+    concurrency: int = None
 ):
     """
     Worker thread that continuously pulls problematic entries from the queue
     and generates LLM solutions, saving them to a file and printing structured output.
+
+    Up to `concurrency` (default config.LLM_WORKER_CONCURRENCY) analyses run at once on a thread
+    pool. This thread stays the only writer: results are written and sent to the UI in the order
+    the problems were dequeued, and a problem is marked task_done only once its result is written.
     """
-    print("\n--- LLM Analysis Worker Started ---")
+    concurrency = max(1, config.LLM_WORKER_CONCURRENCY if concurrency is None else concurrency)
+    # Problems submitted but not yet written; twice the pool size keeps the pool busy while the
+    # oldest result is awaited, without pulling the whole backlog off the queue
+    max_in_flight = concurrency * 2
+    print(f"\n--- LLM Analysis Worker Started (concurrency {concurrency}) ---")
     solutions_generated_count = 0
+    problems_dispatched_count = 0
+    in_flight = deque() # (problem_context, future), in dequeue order
 
     # It's generally better to import specific functions rather than the whole module inside a function
     # but for simplicity and maintaining the original structure, keeping it here.
@@ -34,80 +131,50 @@ def llm_analysis_worker_thread(
     os.makedirs(os.path.dirname(config.OUTPUT_SOLUTIONS_JSONL), exist_ok=True)
 
     try:
-        with open(config.OUTPUT_SOLUTIONS_JSONL, 'a', encoding='utf-8') as solutions_file:
-            while not stop_event_arg.is_set() or not problem_queue_arg.empty():
-                try:
-                    problem_context = problem_queue_arg.get(timeout=1)
-
+        with open(config.OUTPUT_SOLUTIONS_JSONL, 'a', encoding='utf-8') as solutions_file, \
+                ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-worker") as executor:
+            while not stop_event_arg.is_set() or not problem_queue_arg.empty() or in_flight:
+                # --- Dispatch new problems while there is room ---
+                while len(in_flight) < max_in_flight:
+                    try:
+                        # Block (like the single-threaded worker) only when nothing is in flight
+                        problem_context = problem_queue_arg.get(timeout=1) if not in_flight else problem_queue_arg.get_nowait()
+                    except queue.Empty:
+                        break
+                    problems_dispatched_count += 1
                     parsed_entry_metadata = problem_context['parsed_entry_metadata']
-                    # raw_log_entry_string = problem_context['raw_log_entry_string'] # This variable is not used after assignment
-
-                    print(f"[Worker] Analyzing problem #{solutions_generated_count + 1} (ID: {parsed_entry_metadata.get('event_id', 'N/A')}, Level: {parsed_entry_metadata.get('level', 'N/A')})...")
+                    print(f"[Worker] Analyzing problem #{problems_dispatched_count} (ID: {parsed_entry_metadata.get('event_id', 'N/A')}, Level: {parsed_entry_metadata.get('level', 'N/A')})...")
 
-                    # --- Perform LLM Analysis for this Problem ---
-                    generated_solution = analyze_and_generate_solution(
+                    # --- Perform LLM Analysis for this Problem (on the pool) ---
+                    in_flight.append((problem_context, executor.submit(
+                        analyze_and_generate_solution,
                         parsed_entry_metadata=parsed_entry_metadata,
                         llm_instance=llm_instance_arg,
                         retriever_instance=retriever_instance_arg,
                         offset_map=offset_map_arg,
                         parsed_jsonl_path=parsed_jsonl_path_arg
-                    )
-
-                    if generated_solution and not generated_solution.get('error'):
-                        solutions_generated_count += 1
-
-                        llm_feedback = generated_solution.get('llm_analysis_feedback', {})
-                        seq_status = llm_feedback.get('sequence_retrieval_status', 'N/A')
-                        seq_count = llm_feedback.get('sequence_retrieved_count', 'N/A')
-                        rag_count = llm_feedback.get('rag_chunks_retrieved_count', 'N/A')
-
-                        # This diagnostic header is written to the file
-                        diagnostic_header = (
-                            f"--- Analyzing Entry (ID: {parsed_entry_metadata.get('event_id', 'N/A')}, Level: {parsed_entry_metadata.get('level', 'N/A')}) ---\n"
-                            f"Event Template: {parsed_entry_metadata.get('event_template', 'N/A')}\n"
-                            f"Original Full Log Snippet:\n{parsed_entry_metadata.get('original_log_full', '')[:500]}...\n"
-                            f"Sequence analysis result: {seq_status} ({seq_count} entries retrieved)\n"
-                            f"Retrieving relevant context from knowledge base...\n"
-                            f"Retrieved {rag_count} document chunks.\n"
-                            f"Sending final prompt to Gemini LLM for solution generation...\n\n"
+                    )))
+
+                if not in_flight:
+                    continue # No items in queue, continue waiting or check stop event
+
+                # --- Write finished results in order ---
+                wait([in_flight[0][1]], timeout=RESULT_POLL_SECONDS)
+                while in_flight and in_flight[0][1].done():
+                    problem_context, future = in_flight.popleft()
+                    try:
+                        solutions_generated_count = _write_solution_result(
+                            problem_context, future.result(), solutions_generated_count,
+                            solutions_file, ui_update_queue_instance
                         )
-                        solutions_file.write(diagnostic_header)
-
-                        # Use the formatter from output_formatter for the file content
-                        formatted_solution_text = output_formatter.format_solution_for_display(generated_solution)
-                        solutions_file.write(formatted_solution_text + '\n')
-                        solutions_file.write("---\n")
-                        solutions_file.flush() # Ensure data is written to disk immediately
-
-                        # Only print the concise status to the terminal
-                        print(f"[Worker] Solution saved #{solutions_generated_count} (ID: {generated_solution.get('event_id', 'N/A')}) - Level: {generated_solution.get('severity', 'N/A')})")
-
-                        # --- Send solution to UI update queue for Streamlit display ---
-                        # Send the full JSON object to the UI for flexible rendering
-                        ui_update_queue_instance.put({
-                            'type': 'solution_generated',
-                            'data': generated_solution
-                        })
-
-                    elif generated_solution and generated_solution.get('error'):
-                        print(f"ERROR: Worker skipped invalid solution for {parsed_entry_metadata.get('event_id', 'N/A')}: {generated_solution.get('error')[:50]}...")
-                        # Signal UI about this error
-                        ui_update_queue_instance.put({
-                            'type': 'error_message',
-                            'message': f"Solution ERROR for {parsed_entry_metadata.get('event_id', 'N/A')}: {generated_solution.get('error')}"
-                        })
-
-                    problem_queue_arg.task_done()
-                except queue.Empty:
-                    # No items in queue, continue waiting or check stop event
-                    continue
-                except Exception as e:
-                    # Catching broad exceptions for robustness in the worker thread
-                    print(f"ERROR in LLM analysis worker (processing item): {e}")
-                    ui_update_queue_instance.put({'type': 'error_message', 'message': f"Worker processing error: {str(e)}"})
-                    # Ensure task is marked as done even on error to prevent deadlock
-                    problem_queue_arg.task_done()
+                    except Exception as e:
+                        # Catching broad exceptions for robustness in the worker thread
+                        print(f"ERROR in LLM analysis worker (processing item): {e}")
+                        ui_update_queue_instance.put({'type': 'error_message', 'message': f"Worker processing error: {str(e)}"})
+                    finally:
+                        # Ensure task is marked as done even on error to prevent deadlock
+                        problem_queue_arg.task_done()
     finally:
         print(f"\n--- LLM Analysis Worker Stopped. Total solutions generated: {solutions_generated_count} ---")
         # Signal the UI that the worker has stopped and the final count
-        ui_update_queue_instance.put({'type': 'worker_stopped', 'count': solutions_generated_count})
\ No newline at end of file
+        ui_update_queue_instance.put({'type': 'worker_stopped', 'count': solutions_generated_count})